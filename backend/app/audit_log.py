@@ -0,0 +1,424 @@
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+import bson
+from bson import ObjectId, json_util
+from bson.errors import InvalidBSON, InvalidDocument
+from pymongo.errors import BulkWriteError, DocumentTooLarge
+from .config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, so other workers' files are never adopted
+    fcntl = None
+
+# ============================================
+# Write-behind audit log sink
+# ============================================
+# Nothing reads audit_logs on the request path, yet every upload, review
+# decision and /logs/add call waited for its own insert_one. Entries now go
+# to a bounded in-memory queue, and a background thread writes them with
+# insert_many. It flushes when AUDIT_BATCH_SIZE entries are waiting or
+# AUDIT_FLUSH_INTERVAL_MS after the first one, whichever comes first.
+#
+# - Durability: each entry gets a client-side ObjectId and is appended (and
+#   fsynced) to a local JSONL spill file before it is queued. After a flush
+#   the file is truncated once nothing is pending, or rewritten with only the
+#   pending entries once it passes AUDIT_SPILL_MAX_BYTES. Each process has its
+#   own spill file (<spill>.<pid>.jsonl) and holds an flock on it while it
+#   runs, so uvicorn workers never truncate each other's entries. On start-up,
+#   a worker replays its own file and adopts every sibling file nobody holds
+#   (a worker that crashed, or the shared file of older builds), then removes
+#   them. Duplicate _id errors are ignored, so a replay of entries that did
+#   reach Mongo is harmless.
+# - Backpressure: when the queue is full, submit() blocks for up to
+#   AUDIT_BLOCK_SECONDS and then writes the entry itself. If that write fails
+#   too, the entry stays in the spill file and an overflow list the flusher
+#   drains first; a caller never waits longer than twice the block time.
+#   Entries are never dropped; async callers wait in the threadpool, not on
+#   the event loop.
+# - Failures: entries are BSON-encoded in submit(), so one that cannot be
+#   stored (not encodable, over AUDIT_ENTRY_MAX_BYTES) is rejected there with
+#   InvalidAuditEntry. A flush that still fails is classified: encoding
+#   errors and server-side write errors are permanent, and the batch is split
+#   until the offending entries are isolated and moved to the dead-letter
+#   file (<spill>.dead.jsonl). Anything else (network, failover, auth) is
+#   transient and the batch is retried with backoff.
+# - Until start() runs (scripts, tests) and after stop(), the sink writes
+#   inline.
+
+# Write error codes worth retrying (shutdown, failover, timeouts); any other
+# write error on an insert (validation, bad value, too large) fails again
+_TRANSIENT_CODES = {6, 7, 50, 89, 91, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+_DUPLICATE_KEY = 11000
+# Raised for the whole insert_many when one of its documents cannot be encoded
+_PERMANENT_ERRORS = (InvalidDocument, InvalidBSON, DocumentTooLarge)
+
+
+class InvalidAuditEntry(ValueError):
+    """An audit entry that cannot be stored (status_code: the HTTP status for routes)."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _spill_path() -> str:
+    return settings.AUDIT_SPILL_PATH or os.path.join(settings.UPLOAD_DIR, ".audit_spill.jsonl")
+
+
+def _lock(f, block: bool = False) -> bool:
+    """flock f exclusively; False when another process holds it."""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if block else fcntl.LOCK_NB))
+        return True
+    except OSError:
+        return False
+
+
+def _same_file(f, path: str) -> bool:
+    """False once another process has adopted and removed (or replaced) the file at path."""
+    try:
+        return os.path.samestat(os.fstat(f.fileno()), os.stat(path))
+    except OSError:
+        return False
+
+
+def _read_spill(f) -> Dict[Any, Dict[str, Any]]:
+    entries: Dict[Any, Dict[str, Any]] = {}
+    f.seek(0)
+    for line in f:
+        try:
+            entry = json_util.loads(line)
+        except Exception:
+            continue  # torn last line from a crash mid-write
+        entries[entry.get("_id")] = entry
+    return entries
+
+
+def _sibling_spills(base: str, own: str) -> List[str]:
+    """Other workers' spill files for this base path, and the base file itself (older builds)."""
+    if fcntl is None:
+        return []
+    folder = os.path.dirname(os.path.abspath(base))
+    stem, ext = os.path.splitext(os.path.basename(base))
+    pattern = re.compile(re.escape(stem) + r"(\.\d+)?" + re.escape(ext))
+    own = os.path.abspath(own)
+    return [os.path.join(folder, name) for name in sorted(os.listdir(folder))
+            if pattern.fullmatch(name) and os.path.join(folder, name) != own]
+
+
+def _encode(entry: Dict[str, Any]) -> str:
+    """The entry's spill line; raises InvalidAuditEntry if Mongo would refuse it."""
+    try:
+        size = len(bson.encode(entry))
+        line = json_util.dumps(entry) + "\n"
+    except Exception as e:
+        raise InvalidAuditEntry(f"Audit entry is not storable: {e}")
+    if size > settings.AUDIT_ENTRY_MAX_BYTES:
+        raise InvalidAuditEntry(f"Audit entry is {size} bytes (limit {settings.AUDIT_ENTRY_MAX_BYTES})", 413)
+    return line
+
+
+class AuditSink:
+    def __init__(self, collection=None, spill_path: Optional[str] = None, max_queue: Optional[int] = None,
+                 batch_size: Optional[int] = None, flush_interval_ms: Optional[int] = None,
+                 block_seconds: Optional[float] = None):
+        self._collection = collection
+        self.base_spill_path = spill_path  # this process writes <base>.<pid>.jsonl next to it
+        self.spill_path: Optional[str] = None
+        self.dead_letter_path: Optional[str] = None
+        self.max_queue = max_queue or settings.AUDIT_QUEUE_SIZE
+        self.batch_size = batch_size or settings.AUDIT_BATCH_SIZE
+        self.flush_interval = (flush_interval_ms or settings.AUDIT_FLUSH_INTERVAL_MS) / 1000.0
+        self.block_seconds = settings.AUDIT_BLOCK_SECONDS if block_seconds is None else block_seconds
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(self.max_queue)
+        self._overflow: deque = deque()  # spilled entries that found the queue full; flushed first
+        self._lock = threading.Lock()
+        self._pending: Dict[Any, Dict[str, Any]] = {}  # _id -> entry, not yet in Mongo
+        self._spill = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._flush_ms: deque = deque(maxlen=200)
+        self.submitted = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dead_lettered = 0
+        self.blocked = 0
+        self.overflowed = 0
+        self.inline = 0
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            from .db import audit_logs_collection
+            return audit_logs_collection
+        return self._collection
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ---------- producers ----------
+    def submit(self, entry: Dict[str, Any]) -> ObjectId:
+        """Queue an audit entry (a copy, with an _id assigned if missing); returns its _id.
+
+        Raises InvalidAuditEntry for an entry that Mongo would refuse.
+        """
+        entry = dict(entry)
+        if entry.get("_id") is None:
+            entry["_id"] = ObjectId()
+        line = _encode(entry)
+        with self._lock:
+            spooled = self._spill is not None  # None before start() and after stop()
+            if spooled:
+                self._spill.write(line)
+                self._spill.flush()
+                os.fsync(self._spill.fileno())
+                self._pending[entry["_id"]] = entry
+                self.submitted += 1
+        if not spooled:
+            self.collection.insert_one(entry)
+            self.inline += 1
+            return entry["_id"]
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.blocked += 1
+            try:
+                self._queue.put(entry, timeout=self.block_seconds)
+            except queue.Full:
+                # Still full: the caller writes it rather than dropping it
+                if self._write([entry]):
+                    # Failed too: it is in the spill file; the flusher takes it before the queue
+                    with self._lock:
+                        self._overflow.append(entry)
+                        self.overflowed += 1
+        return entry["_id"]
+
+    @staticmethod
+    def check(entry: Dict[str, Any]):
+        """Raise InvalidAuditEntry now for an entry submit() would refuse (before other writes)."""
+        _encode(entry)
+
+    async def submit_async(self, entry: Dict[str, Any]) -> ObjectId:
+        """submit() for async routes: a full queue (or inline mode) waits in the threadpool."""
+        if self.running and not self._queue.full():
+            return self.submit(entry)
+        from starlette.concurrency import run_in_threadpool
+        return await run_in_threadpool(self.submit, entry)
+
+    # ---------- flusher ----------
+    def start(self) -> int:
+        """Open this process's spill file, start the flusher and replay entries left from a crash."""
+        if self.running:
+            return 0
+        base = self.base_spill_path or _spill_path()
+        stem, ext = os.path.splitext(base)
+        path = f"{stem}.{os.getpid()}{ext}"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        while True:
+            spill = open(path, "a+", encoding="utf-8")
+            # A file left by an earlier process with this pid may be being adopted by another worker
+            _lock(spill, block=True)
+            if _same_file(spill, path):
+                break
+            spill.close()
+        recovered = _read_spill(spill)
+        adopted = []
+        for orphan in _sibling_spills(base, path):
+            try:
+                f = open(orphan, "r", encoding="utf-8")
+            except OSError:
+                continue
+            if _lock(f) and _same_file(f, orphan):
+                recovered.update(_read_spill(f))
+                adopted.append((orphan, f))
+            else:
+                f.close()  # a live worker's file, or adopted by another one meanwhile
+        with self._lock:
+            self.spill_path = path
+            self.dead_letter_path = stem + ".dead.jsonl"
+            self._spill = spill
+            self._pending.update(recovered)
+            self._compact()  # adopted entries are in our own file before theirs are removed
+        for orphan, f in adopted:
+            os.remove(orphan)
+            f.close()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-log-flusher", daemon=True)
+        self._thread.start()
+        for entry in recovered.values():
+            self._queue.put(entry)
+        if recovered:
+            print(f"✅ Audit log: replaying {len(recovered)} unflushed entries from {path}")
+        return len(recovered)
+
+    def stop(self, timeout: float = 10.0):
+        """Flush what is queued and stop; anything unwritten stays in the spill file."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+        if self._pending:
+            print(f"⚠️ Audit log: {len(self._pending)} entries left in {self.spill_path}")
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            batch = [self._overflow.popleft() for _ in range(min(len(self._overflow), self.batch_size))]
+        if batch:
+            return batch
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        delay = 0.1
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self._stop.is_set():
+                    return
+                continue
+            while batch:
+                batch = self._write(batch)
+                if not batch:
+                    break
+                if self._stop.is_set():
+                    return  # database unreachable on shutdown: entries stay in the spill file
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+            delay = 0.1
+
+    def _write(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """insert_many the batch; returns the entries to retry. Permanent failures are dead-lettered."""
+        t0 = time.perf_counter()
+        retry, dead = self._insert(batch)
+        if len(retry) == len(batch):
+            return retry
+        retrying = {e["_id"] for e in retry}
+        with self._lock:
+            self._flush_ms.append((time.perf_counter() - t0) * 1000)
+            self.flushes += 1
+            self.flushed += len(batch) - len(retry) - len(dead)
+            if dead:
+                self._dead_letter(dead)
+            for entry in batch:
+                if entry["_id"] not in retrying:
+                    self._pending.pop(entry["_id"], None)
+            self._compact()
+        return retry
+
+    def _insert(self, batch: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Tuple[Dict[str, Any], str]]]:
+        """(entries to retry, (entry, error) pairs that will never be stored)."""
+        try:
+            self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            retry, dead = [], []
+            for err in (e.details or {}).get("writeErrors", []):
+                code, entry = err.get("code"), batch[err["index"]]
+                if code == _DUPLICATE_KEY:
+                    continue  # already stored (a replay)
+                if code in _TRANSIENT_CODES:
+                    retry.append(entry)
+                else:
+                    dead.append((entry, f"{code}: {err.get('errmsg')}"))
+            if retry:
+                self.failed_flushes += 1
+                print(f"⚠️ Audit log flush failed ({len(retry)} of {len(batch)} entries): {e}")
+            return retry, dead
+        except _PERMANENT_ERRORS as e:
+            if len(batch) == 1:
+                return [], [(batch[0], f"{type(e).__name__}: {e}")]
+            # Split until the entries that cannot be encoded are on their own
+            mid = len(batch) // 2
+            left, right = self._insert(batch[:mid]), self._insert(batch[mid:])
+            return left[0] + right[0], left[1] + right[1]
+        except Exception as e:
+            self.failed_flushes += 1
+            print(f"⚠️ Audit log flush failed ({len(batch)} entries): {e}")
+            return list(batch), []
+        return [], []
+
+    def _dead_letter(self, dead: List[Tuple[Dict[str, Any], str]]):
+        # Caller holds the lock
+        self.dead_lettered += len(dead)
+        print(f"❌ Audit log: {len(dead)} entries cannot be stored, moved to {self.dead_letter_path}")
+        if not self.dead_letter_path:
+            return
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            for entry, error in dead:
+                f.write(json_util.dumps({"error": error, "entry": entry}, default=str) + "\n")
+
+    def _compact(self):
+        # Caller holds the lock
+        if self._spill is None:
+            return
+        if not self._pending:
+            self._spill.seek(0)
+            self._spill.truncate()
+        elif self._spill.tell() > settings.AUDIT_SPILL_MAX_BYTES or not self.running:
+            # Locked before it replaces the old file, so no other worker can adopt it
+            tmp = self.spill_path + ".tmp"
+            spill = open(tmp, "w", encoding="utf-8")
+            _lock(spill)
+            spill.writelines(json_util.dumps(e) + "\n" for e in self._pending.values())
+            spill.flush()
+            os.fsync(spill.fileno())
+            os.replace(tmp, self.spill_path)
+            self._spill.close()
+            self._spill = spill
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            times = sorted(self._flush_ms)
+        return {
+            "running": self.running,
+            "queueDepth": self._queue.qsize(),
+            "maxQueue": self.max_queue,
+            "pending": len(self._pending),
+            "overflow": len(self._overflow),
+            "submitted": self.submitted,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failedFlushes": self.failed_flushes,
+            "deadLettered": self.dead_lettered,
+            "blocked": self.blocked,
+            "overflowed": self.overflowed,
+            "inline": self.inline,
+            "flushMsAvg": round(sum(times) / len(times), 2) if times else 0.0,
+            "flushMsP95": round(times[int(0.95 * (len(times) - 1))], 2) if times else 0.0,
+        }
+
+
+audit_sink = AuditSink()
+
+
+def start_audit_sink() -> int:
+    return audit_sink.start()
+
+
+def stop_audit_sink():
+    audit_sink.stop()
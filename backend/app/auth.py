@@ -1,12 +1,13 @@
 from datetime import datetime
 from fastapi import HTTPException, status
-from .db import users_collection
+from fastapi.concurrency import run_in_threadpool
+from .db_async import async_db
 from .models import UserCreate
 from .security import hash_password, verify_password, create_access_token
 
-def signup_user(user_in: UserCreate):
+async def signup_user(user_in: UserCreate):
     # 1. Check if user already exists
-    existing = users_collection.find_one({"email": user_in.email})
+    existing = await async_db.users.find_one({"email": user_in.email})
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -24,14 +25,14 @@ def signup_user(user_in: UserCreate):
     user_doc = {
         "name": (user_in.name or "").strip(),
         "email": user_in.email.lower().strip(),
-        "password": hash_password(pw_safe),             # hash it
+        "password": await run_in_threadpool(hash_password, pw_safe),  # bcrypt: off the event loop
         "dob": user_in.dob.strip() if user_in.dob else None,  # Date of Birth
         "gender": user_in.gender.strip() if user_in.gender else None,  # Gender
         "role": user_in.role or "user",  # User role: "user" or "admin"
         "createdAt": datetime.utcnow(),
     }
 
-    result = users_collection.insert_one(user_doc)
+    result = await async_db.users.insert_one(user_doc)
 
     # 4. Return sanitized response (NEVER return password)
     return {
@@ -41,13 +42,13 @@ def signup_user(user_in: UserCreate):
     }
 
 
-def authenticate_user(email: str, password: str):
-	user = users_collection.find_one({"email": email})
+async def authenticate_user(email: str, password: str):
+	user = await async_db.users.find_one({"email": email})
 	if not user:
 		return None
 	hashed = user.get("password") or user.get("hashed_password")
 	# if verify_password expects hashed (passlib) it'll work; adapt if different
-	if not hashed or not verify_password(password, hashed):
+	if not hashed or not await run_in_threadpool(verify_password, password, hashed):
 		return None
 	# create token with subject as email
 	token = create_access_token({"sub": user["email"]})
@@ -0,0 +1,332 @@
+import csv
+import json
+import re
+from datetime import date, datetime
+from functools import lru_cache
+from io import TextIOWrapper
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from .identifier_index import IdentifierMatches, lookup_identifiers_async
+from .verification import verhoeff_validate, _d as VERHOEFF_D, _p as VERHOEFF_P
+
+# ============================================
+# Streaming bulk verification (CSV / XLSX)
+# ============================================
+# Rows are read lazily from the spooled upload (csv.DictReader, openpyxl
+# read-only) in chunks of settings.BULK_CHUNK_ROWS. Each chunk is parsed and
+# checked in the threadpool, with the Verhoeff checksum vectorized over the
+# chunk. One identifier-index $in query covers all the Aadhaar/PAN values in
+# the chunk. The row results can then be yielded (NDJSON) before the next
+# chunk is read, so memory does not grow with the file.
+#
+# Duplicates within the file are tracked as int64 keys: a 12-digit Aadhaar
+# as an integer, a PAN as base 36. They are stored as sorted numpy runs
+# merged LSM-style, probed with searchsorted per chunk. A million rows
+# take ~16 MB instead of a dict of strings.
+
+AADHAAR_RE = re.compile(r'^\d{12}$')
+PAN_RE = re.compile(r'^[A-Z]{5}\d{4}[A-Z]$')
+# The four DOB formats the row check accepts: %d/%m/%Y, %d-%m-%Y, %d/%m/%y, %Y-%m-%d
+_DMY_RE = re.compile(r'^(\d{1,2})(?:/(\d{1,2})/(\d{4}|\d{2})|-(\d{1,2})-(\d{4}))$')
+_YMD_RE = re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})$')
+
+CSV_SUFFIXES = ('.csv',)
+EXCEL_SUFFIXES = ('.xlsx', '.xls')
+
+
+# ---------- row sources ----------
+def _csv_rows(upload) -> Iterator[Dict[str, Any]]:
+    # Decoded straight from the spooled upload, no full-text copy
+    # utf-8-sig: spreadsheet exports start with a BOM that would otherwise stick to the first header
+    with TextIOWrapper(upload.open(), encoding='utf-8-sig', errors='ignore', newline='') as text:
+        yield from csv.DictReader(text)
+
+
+def _excel_rows(upload) -> Iterator[Dict[str, Any]]:
+    import openpyxl
+    wb = openpyxl.load_workbook(upload.open(), read_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        headers = next(rows, None)
+        if headers is None:
+            return
+        for row in rows:
+            # Read-only sheets report formatted-but-empty rows; csv.DictReader skips blank lines too
+            if any(v is not None and str(v).strip() for v in row):
+                yield dict(zip(headers, row))
+    finally:
+        wb.close()
+
+
+def iter_rows(upload, filename: str) -> Iterator[Dict[str, Any]]:
+    """Rows of an uploaded CSV / XLSX as dicts keyed by the header row."""
+    name = (filename or '').lower()
+    if name.endswith(CSV_SUFFIXES):
+        return _csv_rows(upload)
+    if name.endswith(EXCEL_SUFFIXES):
+        return _excel_rows(upload)
+    raise ValueError("Unsupported file format. Use .csv or .xlsx")
+
+
+def chunks(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ---------- field checks ----------
+def _cell(value: Any) -> str:
+    """A CSV or spreadsheet cell as text; Excel dates and whole numbers read as they display."""
+    if value is None:
+        return ''
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+@lru_cache(maxsize=65536)
+def parse_dob(value: str) -> Optional[date]:
+    """DOB in any accepted format (same results as trying each strptime format), cached."""
+    s = value.strip()
+    m = _DMY_RE.match(s)
+    try:
+        if m:
+            day, month, year = (m.group(1), m.group(2), m.group(3)) if m.group(2) else (m.group(1), m.group(4), m.group(5))
+            if len(year) == 2:
+                return datetime.strptime(f"{day}/{month}/{year}", '%d/%m/%y').date()  # strptime's century pivot
+            return date(int(year), int(month), int(day))
+        m = _YMD_RE.match(s)
+        if m:
+            return date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+    except ValueError:
+        pass
+    return None
+
+
+_VD = np.array(VERHOEFF_D, dtype=np.int8)
+_VP = np.array(VERHOEFF_P, dtype=np.int8)
+
+
+def verhoeff_ok(numbers: List[str]) -> np.ndarray:
+    """verification.verhoeff_validate for a chunk of 12-digit strings (all 8 offsets, vectorized)."""
+    if not numbers:
+        return np.zeros(0, dtype=bool)
+    digits = np.frombuffer("".join(numbers).encode(), dtype=np.uint8).reshape(-1, 12) - ord("0")
+    digits = digits[:, ::-1]
+    ok = np.zeros(len(numbers), dtype=bool)
+    for offset in range(8):
+        c = np.zeros(len(numbers), dtype=np.int8)
+        for i in range(12):
+            c = _VD[c, _VP[(i + offset) % 8, digits[:, i]]]
+        ok |= c == 0
+    return ok
+
+
+def _pan_key(pan: str) -> int:
+    return int(pan, 36)
+
+
+class SeenKeys:
+    """int64 keys seen so far in the file, with the first row of each (sorted runs)."""
+
+    def __init__(self):
+        self.runs: List[Tuple[np.ndarray, np.ndarray]] = []
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys, _ in self.runs)
+
+    def check_and_add(self, keys: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """For each key (in row order): the first earlier row with the same key, or -1."""
+        first = np.full(len(keys), -1, dtype=np.int64)
+        if not len(keys):
+            return first
+        unique, first_idx, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        earliest = rows[first_idx].astype(np.int64)
+        # Repeats inside this chunk point at their first occurrence
+        within = earliest[inverse]
+        repeat = within != rows
+        first[repeat] = within[repeat]
+        # Earlier chunks
+        known = np.full(len(unique), -1, dtype=np.int64)
+        for run_keys, run_rows in self.runs:
+            pos = np.minimum(np.searchsorted(run_keys, unique), len(run_keys) - 1)
+            hit = run_keys[pos] == unique
+            known[hit] = run_rows[pos[hit]]
+        seen = known[inverse] >= 0
+        first[seen] = known[inverse][seen]
+        new = known < 0
+        self._add(unique[new], earliest[new])
+        return first
+
+    def _add(self, keys: np.ndarray, rows: np.ndarray):
+        if not len(keys):
+            return
+        self.runs.append((keys, rows))
+        # Merge while the newest run is at least half the size of the one before it
+        while len(self.runs) > 1 and len(self.runs[-1][0]) * 2 >= len(self.runs[-2][0]):
+            (k2, r2), (k1, r1) = self.runs.pop(), self.runs.pop()
+            k, r = np.concatenate([k1, k2]), np.concatenate([r1, r2])
+            order = np.argsort(k, kind='stable')
+            self.runs.append((k[order], r[order]))
+
+
+# ---------- verifier ----------
+class BulkVerifier:
+    """Checks rows chunk by chunk and keeps the running summary."""
+
+    def __init__(self):
+        self.rows = 0
+        self.counts = {"Pass": 0, "Review": 0, "Failed": 0}
+        self._seen = {"aadhaar": SeenKeys(), "pan": SeenKeys()}
+        self._now = datetime.now()
+
+    def prepare(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Everything except the database duplicate check (runs in the threadpool)."""
+        prepared = []
+        for row in rows:
+            self.rows += 1
+            # Normalize column names (case-insensitive)
+            norm_row = {str(k).lower().strip() if k else '': v for k, v in row.items()}
+            prepared.append({
+                "row": self.rows,
+                "name": _cell(norm_row.get('name')),
+                "aadhaar": _cell(norm_row.get('aadhaar')).replace(' ', '').replace('-', ''),
+                "pan": _cell(norm_row.get('pan')).upper().replace(' ', ''),
+                "dob": _cell(norm_row.get('dob')),
+                "errors": [], "warnings": [], "fraudScore": 0,
+            })
+        self._check_fields(prepared)
+        self._check_in_file(prepared)
+        return prepared
+
+    def _check_fields(self, prepared: List[Dict[str, Any]]):
+        well_formed = [r["aadhaar"] for r in prepared if AADHAAR_RE.match(r["aadhaar"]) and r["aadhaar"].isascii()]
+        checksum = dict(zip(well_formed, verhoeff_ok(well_formed).tolist()))
+        for r in prepared:
+            errors, warnings = r["errors"], r["warnings"]
+            aadhaar, pan = r["aadhaar"], r["pan"]
+
+            # Validate Aadhaar (12 digits, Verhoeff checksum)
+            if aadhaar:
+                if not AADHAAR_RE.match(aadhaar):
+                    errors.append("Invalid Aadhaar format (must be 12 digits)")
+                    r["fraudScore"] += 30
+                elif not (checksum[aadhaar] if aadhaar in checksum else verhoeff_validate(aadhaar)):
+                    warnings.append("Aadhaar checksum (Verhoeff) failed")
+                    r["fraudScore"] += 20
+            else:
+                warnings.append("Aadhaar not provided")
+
+            # Validate PAN (5 letters + 4 digits + 1 letter)
+            if pan:
+                if not PAN_RE.match(pan):
+                    errors.append("Invalid PAN format (must be ABCDE1234F)")
+                    r["fraudScore"] += 25
+            else:
+                warnings.append("PAN not provided")
+
+            # Validate DOB
+            if r["dob"]:
+                born = parse_dob(r["dob"])
+                if born is not None:
+                    age = (self._now - datetime(born.year, born.month, born.day)).days // 365
+                    if age < 18:
+                        errors.append(f"Underage: {age} years old")
+                        r["fraudScore"] += 40
+
+            # Validate Name
+            if not r["name"] or len(r["name"].strip()) < 3:
+                errors.append("Name is required (min 3 characters)")
+                r["fraudScore"] += 10
+
+    def _check_in_file(self, prepared: List[Dict[str, Any]]):
+        for kind, pattern, to_key, label in (("aadhaar", AADHAAR_RE, int, "Aadhaar"),
+                                              ("pan", PAN_RE, _pan_key, "PAN")):
+            valid = [r for r in prepared if r[kind] and pattern.match(r[kind])]
+            keys = np.fromiter((to_key(r[kind]) for r in valid), dtype=np.int64, count=len(valid))
+            rows = np.fromiter((r["row"] for r in valid), dtype=np.int64, count=len(valid))
+            for r, first in zip(valid, self._seen[kind].check_and_add(keys, rows)):
+                if first >= 0:
+                    r["warnings"].append(f"{label} repeats row {int(first)} of this file")
+                    r["fraudScore"] += 20
+
+    @staticmethod
+    def identifiers(prepared: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        """Valid Aadhaar/PAN values of a chunk, for its single identifier-index query."""
+        out = {}
+        for r in prepared:
+            if AADHAAR_RE.match(r["aadhaar"]):
+                out[("aadhaar", r["aadhaar"])] = None
+            if PAN_RE.match(r["pan"]):
+                out[("pan", r["pan"])] = None
+        return list(out)
+
+    def finish(self, prepared: List[Dict[str, Any]], known: IdentifierMatches) -> List[Dict[str, Any]]:
+        results = []
+        known_aadhaar, known_pan = known.seen_values("aadhaar"), known.seen_values("pan")
+        for r in prepared:
+            aadhaar, pan, errors, warnings = r["aadhaar"], r["pan"], r["errors"], r["warnings"]
+            if aadhaar in known_aadhaar:
+                warnings.append("Aadhaar already exists in system")
+                r["fraudScore"] += 20
+            if pan in known_pan:
+                warnings.append("PAN already exists in system")
+                r["fraudScore"] += 20
+
+            # Determine status
+            status = "Failed" if errors else "Review" if warnings else "Pass"
+            self.counts[status] += 1
+            results.append({
+                "row": r["row"],
+                "filename": f"Row {r['row']}",
+                "name": r["name"],
+                "aadhaar": f"XXXX-XXXX-{aadhaar[-4:]}" if len(aadhaar) >= 4 else aadhaar,
+                "pan": f"XXXXX{pan[-5:]}" if len(pan) >= 5 else pan,
+                "success": status != "Failed",
+                "status": status,
+                "fraudScore": min(r["fraudScore"], 100),
+                "decision": status,
+                "errors": errors,
+                "warnings": warnings,
+            })
+        return results
+
+    def summary(self) -> Dict[str, int]:
+        # Rows with a result; a chunk that failed before finish() is not counted
+        return {"passed": self.counts["Pass"], "review": self.counts["Review"],
+                "failed": self.counts["Failed"], "total": sum(self.counts.values())}
+
+
+async def verify_chunks(chunk_iter: Iterator[List[Dict[str, Any]]], verifier: BulkVerifier):
+    """Async generator of each chunk's row results; parsing and checks run in the threadpool."""
+    async for rows in iterate_in_threadpool(chunk_iter):
+        prepared = await run_in_threadpool(verifier.prepare, rows)
+        known = await lookup_identifiers_async(verifier.identifiers(prepared))
+        yield verifier.finish(prepared, known)
+
+
+async def ndjson_stream(upload, chunk_iter: Iterator[List[Dict[str, Any]]], verifier: BulkVerifier):
+    """
+    NDJSON body: a {"type": "row"} line per row, a running {"type": "summary"}
+    line after each chunk and a final {"type": "done"} line (or "error").
+    The stream owns the upload and closes it when done.
+    """
+    with upload:
+        try:
+            async for results in verify_chunks(chunk_iter, verifier):
+                lines = [json.dumps({"type": "row", **r}) for r in results]
+                lines.append(json.dumps({"type": "summary", **verifier.summary()}))
+                yield "\n".join(lines) + "\n"
+        except Exception as e:
+            print(f"❌ Bulk verify failed after {verifier.rows} rows: {e}")
+            yield json.dumps({"type": "error", "error": str(e), "summary": verifier.summary()}) + "\n"
+            return
+    summary = verifier.summary()
+    yield json.dumps({"type": "done", "message": f"Processed {summary['total']} rows", "summary": summary}) + "\n"
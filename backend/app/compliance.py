@@ -1,23 +1,27 @@
 import time
 from datetime import datetime, date
 from typing import Dict, Any, Optional, List
-from .db import documents_collection, kyc_data_collection, alerts_collection, audit_logs_collection, aml_blacklist_collection
+from .db import documents_collection, kyc_data_collection, alerts_collection, aml_blacklist_collection
 from .utils import doc_type_from_parsed
+from .image_context import DecodedImage, as_decoded
+from .image_hash import record_document
+from .identity_graph import identity_graph, document_identifiers, record_identities, EDGE_WEIGHTS
+from .fraud_rings import ring_index, record_ring_links
+from .name_match import record_name
+from .identifier_index import IdentifierMatches, upload_identifiers, lookup_identifiers, record_identifiers
+from .unit_of_work import UnitOfWork, commit
+from .audit_log import audit_sink, InvalidAuditEntry
 
 # lazy import
-def _verify_document_bytes(image_bytes: bytes) -> Dict[str, Any]:
+def _verify_document_bytes(image_bytes: bytes | DecodedImage, doc_type: Optional[str] = None) -> Dict[str, Any]:
     from .verification import verify_document
-    from .pdf_utils import convert_pdf_to_image
-    
-    # Try converting PDF to image first
-    converted_bytes = convert_pdf_to_image(image_bytes)
-    final_bytes = converted_bytes if converted_bytes else image_bytes
-    
-    return verify_document(final_bytes)
 
-def _fraud_analyze(user: Dict[str, Any], file_bytes: bytes, parsed: Dict[str, Any], document_id: Optional[str] = None, device_fingerprint: Dict[str, Any] = None, cnn_prob: float = None, gnn_prob: float = None) -> Dict[str, Any]:
+    # PDFs go straight to OCR, which reads their pages lazily
+    return verify_document(image_bytes, doc_type)
+
+def _fraud_analyze(user: Dict[str, Any], file_bytes: bytes | DecodedImage, parsed: Dict[str, Any], document_id: Optional[str] = None, device_fingerprint: Dict[str, Any] = None, cnn_prob: float = None, gnn_prob: float = None, fraud_ring: Dict[str, Any] = None, identifier_matches: Optional[IdentifierMatches] = None) -> Dict[str, Any]:
     from .fraud import analyze_for_fraud
-    return analyze_for_fraud(user, file_bytes, parsed, document_id=document_id, device_fingerprint=device_fingerprint, cnn_prob=cnn_prob, gnn_prob=gnn_prob)
+    return analyze_for_fraud(user, file_bytes, parsed, document_id=document_id, device_fingerprint=device_fingerprint, cnn_prob=cnn_prob, gnn_prob=gnn_prob, fraud_ring=fraud_ring, identifier_matches=identifier_matches)
 
 # --- AML CHECKS ---
 
@@ -28,6 +32,15 @@ def aml_check_aadhaar(aadhaar: Optional[str]) -> Dict[str, Any]:
         return {"flagged": True, "reason": f"Aadhaar in AML blacklist: {entry.get('reason', 'Generic')}"}
     return {"flagged": False, "reason": None}
 
+async def aml_check_aadhaar_async(aadhaar: Optional[str]) -> Dict[str, Any]:
+    """aml_check_aadhaar for async routes (motor, no event-loop blocking)."""
+    from .db_async import async_db
+    if not aadhaar: return {"flagged": False, "reason": None}
+    entry = await async_db.aml_blacklist.find_one({"aadhaar": aadhaar})
+    if entry:
+        return {"flagged": True, "reason": f"Aadhaar in AML blacklist: {entry.get('reason', 'Generic')}"}
+    return {"flagged": False, "reason": None}
+
 def aml_check_pan(pan: Optional[str]) -> Dict[str, Any]:
     if not pan: return {"flagged": False, "reason": None}
     entry = aml_blacklist_collection.find_one({"pan": pan})
@@ -57,143 +70,106 @@ def aml_check_age(dob: Optional[str]) -> Dict[str, Any]:
         pass 
     return {"flagged": False, "reason": None}
 
-def check_duplicate(aadhaar: Optional[str], pan: Optional[str], dl: Optional[str] = None) -> Dict[str, Any]:
+def check_duplicate(aadhaar: Optional[str], pan: Optional[str], dl: Optional[str] = None,
+                    matches: Optional[IdentifierMatches] = None) -> Dict[str, Any]:
+    # Answered from one identifier-index lookup; the pipeline passes the one it made
+    # before storing the upload, so a document never counts as its own duplicate
+    if matches is None:
+        matches = lookup_identifiers(upload_identifiers({"aadhaarNumber": aadhaar, "panNumber": pan, "dlNumber": dl}))
     reasons: List[str] = []
     dup = False
     
-    if aadhaar and documents_collection.find_one({"parsed.aadhaarNumber": aadhaar}):
+    if aadhaar and matches.seen("aadhaar", aadhaar):
         dup = True; reasons.append("Aadhaar already used")
-    if pan and documents_collection.find_one({"parsed.panNumber": pan}):
+    if pan and matches.seen("pan", pan):
         dup = True; reasons.append("PAN already used")
-    if dl and documents_collection.find_one({"parsed.dlNumber": dl}):
+    if dl and matches.seen("dl", dl):
         dup = True; reasons.append("DL already used")
         
     return {"duplicate": dup, "reasons": reasons}
 
-def add_alert(aadhaar, pan, dl, user_email, risk, reason):
+def add_alert(aadhaar, pan, dl, user_email, risk, reason, uow: Optional[UnitOfWork] = None):
     alert = {
         "aadhaar": aadhaar, "pan": pan, "dl": dl, "user": user_email,
         "risk": risk, "alert": reason, "timestamp": datetime.utcnow().isoformat(), "seen": False
     }
+    if uow is not None:
+        # Written with the rest of the upload when the unit of work is committed
+        alert["_id"] = str(uow.insert(alerts_collection, alert))
+        return alert
     res = alerts_collection.insert_one(alert)
     alert["_id"] = str(res.inserted_id)
     return alert
 
 # --- MAIN PIPELINE ---
 
-def run_full_pipeline(user: Dict[str, Any], filename: str, file_bytes: bytes, device_info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+def run_full_pipeline(user: Dict[str, Any], filename: str, file_bytes: bytes | DecodedImage, device_info: Optional[Dict[str, Any]] = None,
+                      doc_type: Optional[str] = None) -> Dict[str, Any]:
     start = time.time()
     
     # 0. Deep Learning Predictions (Real Integration)
     cnn_score = None
     gnn_score = None
     
-    # === ENHANCED GNN: Build Duplicate Network Graph ===
-    # Nodes = Users, Edges = Shared identifiers (Aadhaar, PAN, DL, email, device)
-    
-    graph_edges = {
-        "shared_aadhaar": set(),      # Users with same Aadhaar
-        "shared_pan": set(),          # Users with same PAN
-        "shared_dl": set(),           # Users with same DL
-        "shared_email": set(),        # Users with same email domain pattern (fraud rings)
-        "shared_device": set(),       # Users from same device fingerprint
-    }
+    # === ENHANCED GNN: Persistent identity graph (identity_graph.py) ===
+    # Nodes = Users + identifiers (Aadhaar, PAN, DL, device, suspicious email domain)
     
     current_user_id = str(user.get("_id", ""))
     current_user_email = user.get("email", "")
     
-    # 1. Pre-scan document for identifiers (quick OCR check)
+    # The upload is decoded once; OCR, CNN and the fraud image checks share it
+    # (routes pass the ingested upload's context, which already carries its SHA-256)
+    image = as_decoded(file_bytes)
+
+    # 1. Verification (single OCR pass) - the same result feeds the graph
+    #    edges, the CNN/GNN stage, fraud analysis and persistence below.
+    verification = _verify_document_bytes(image, doc_type)
+    parsed = verification.get("parsed", {})
+
+    # Users sharing an identifier with this upload, read from the in-memory
+    # identity graph instead of scanning documents / users per request
+    identifiers = document_identifiers(parsed, device_info, current_user_email)
+
+    # Every exact-duplicate check below (fraud file/Aadhaar/PAN, AML duplicate)
+    # reads this single identifier-index query, made before the upload is stored
+    upload_ids = upload_identifiers(parsed, image.sha256)
     try:
-        from .verification import verify_document
-        from .pdf_utils import convert_pdf_to_image
-        
-        converted = convert_pdf_to_image(file_bytes)
-        temp_parsed = verify_document(converted if converted else file_bytes).get("parsed", {})
-        
-        extracted_aadhaar = temp_parsed.get("aadhaarNumber")
-        extracted_pan = temp_parsed.get("panNumber")
-        extracted_dl = temp_parsed.get("dlNumber")
-        
-        # Check for shared Aadhaar (different users, same Aadhaar = FRAUD)
-        if extracted_aadhaar:
-            aadhaar_matches = documents_collection.find(
-                {"parsed.aadhaarNumber": extracted_aadhaar, "userId": {"$ne": current_user_id}},
-                {"userId": 1, "userEmail": 1}
-            )
-            for doc in aadhaar_matches:
-                graph_edges["shared_aadhaar"].add(str(doc.get("userId", "")))
-        
-        # Check for shared PAN
-        if extracted_pan:
-            pan_matches = documents_collection.find(
-                {"parsed.panNumber": extracted_pan, "userId": {"$ne": current_user_id}},
-                {"userId": 1}
-            )
-            for doc in pan_matches:
-                graph_edges["shared_pan"].add(str(doc.get("userId", "")))
-        
-        # Check for shared DL
-        if extracted_dl:
-            dl_matches = documents_collection.find(
-                {"parsed.dlNumber": extracted_dl, "userId": {"$ne": current_user_id}},
-                {"userId": 1}
-            )
-            for doc in dl_matches:
-                graph_edges["shared_dl"].add(str(doc.get("userId", "")))
-        
+        identifier_matches = lookup_identifiers(upload_ids)
     except Exception as e:
-        print(f"⚠️ Pre-scan for GNN edges failed: {e}")
-    
-    # 2. Check for shared device fingerprint
-    if device_info and device_info.get("hash"):
-        d_hash = device_info.get("hash")
-        device_matches = documents_collection.find(
-            {"deviceInfo.hash": d_hash, "userId": {"$ne": current_user_id}},
-            {"userId": 1}
-        )
-        for doc in device_matches:
-            graph_edges["shared_device"].add(str(doc.get("userId", "")))
-    
-    # 3. Check for same email pattern (e.g., fraud rings: user1@tempmail.com, user2@tempmail.com)
-    if current_user_email and "@" in current_user_email:
-        email_domain = current_user_email.split("@")[1].lower()
-        suspicious_domains = ["tempmail", "guerrilla", "10minute", "throwaway", "fake", "mailinator"]
-        
-        if any(sus in email_domain for sus in suspicious_domains):
-            # Find other users with same suspicious domain
-            from .db import users_collection
-            similar_emails = users_collection.find(
-                {"email": {"$regex": f"@{email_domain}$", "$options": "i"}, "_id": {"$ne": user.get("_id")}},
-                {"_id": 1}
-            )
-            for u in similar_emails:
-                graph_edges["shared_email"].add(str(u.get("_id", "")))
+        print(f"⚠️ Identifier index lookup failed: {e}")
+        identifier_matches = IdentifierMatches(upload_ids)
+    graph_edges = {edge: set() for edge in EDGE_WEIGHTS}
+    subgraph = None
+    fraud_ring = None
+    try:
+        graph_edges = identity_graph.shared_with(current_user_id, identifiers)
+        subgraph = identity_graph.subgraph(current_user_id, identifiers)
+    except Exception as e:
+        print(f"⚠️ Identity graph lookup failed: {e}")
+    try:
+        # Whole multi-hop ring this upload belongs to (union-find, near-constant time)
+        fraud_ring = ring_index.preview(current_user_id, identifiers)
+    except Exception as e:
+        print(f"⚠️ Fraud ring lookup failed: {e}")
     
     # 4. Calculate total connections for GNN
     all_connected_users = set()
-    edge_weights = {
-        "shared_aadhaar": 5.0,    # Highest risk - identity theft
-        "shared_pan": 4.0,        # High risk - financial fraud
-        "shared_dl": 3.0,         # Medium-high risk
-        "shared_device": 2.0,     # Medium risk - could be shared computer
-        "shared_email": 1.0,      # Lower risk - suspicious but not definitive
-    }
-    
     total_edge_weight = 0.0
     for edge_type, user_set in graph_edges.items():
         all_connected_users.update(user_set)
-        total_edge_weight += len(user_set) * edge_weights[edge_type]
+        total_edge_weight += len(user_set) * EDGE_WEIGHTS[edge_type]
     
     connection_count = len(all_connected_users)
     
     # Calculate risk score based on edge types
     risk_score = min(1.0, total_edge_weight / 10.0)  # Normalize to 0-1
     
+    ml_loaded = False
     try:
-        from .ml_integration import predict_cnn_manipulation, predict_gnn_fraud
+        from .ml_integration import predict_cnn_manipulation, predict_gnn_fraud, models_loaded
         
         # Run CNN
-        cnn_score = predict_cnn_manipulation(file_bytes)
+        cnn_score = predict_cnn_manipulation(image)
         
         # Run GNN (Dynamic Graph with meaningful edges)
         gnn_input = {
@@ -207,40 +183,48 @@ def run_full_pipeline(user: Dict[str, Any], filename: str, file_bytes: bytes, de
                 len(graph_edges["shared_device"]),
                 len(graph_edges["shared_email"]),
                 risk_score,
-            ]
+            ],
+            "subgraph": subgraph,  # real k-hop neighbourhood; FraudGNN runs on this
         }
         gnn_score = predict_gnn_fraud(gnn_input)
+        ml_loaded = models_loaded()
         
     except Exception as e:
         print(f"⚠️ ML Integration failed: {e}")
 
-    # 1. Verification
-    verification = _verify_document_bytes(file_bytes)
-    parsed = verification.get("parsed", {})
     doc_type = doc_type_from_parsed(parsed)
     masked_id = verification.get("maskedAadhaar") or verification.get("maskedPan") or verification.get("maskedDl")
 
-    # 2. Store Initial Record
+    # Every write below is queued on one unit of work and committed at the end;
+    # the document id is assigned client-side so fraud analysis can use it now
+    uow = UnitOfWork()
+    doc_id = uow.new_id()
+
+    # 2. Initial Record
     doc_record = {
+        "_id": doc_id,
         "userId": str(user.get("_id")), "userEmail": user.get("email"),
         "filename": filename, "rawText": verification.get("rawText"),
         "parsed": parsed, "verification": verification,
         "docType": doc_type, "maskedId": masked_id, "createdAt": datetime.utcnow().isoformat(),
         "deviceInfo": device_info
     }
-    doc_id = documents_collection.insert_one(doc_record).inserted_id
-    doc_record["_id"] = str(doc_id)
 
     # 3. Fraud Analysis
     fraud = _fraud_analyze(
-        user, file_bytes, parsed, 
+        user, image, parsed, 
         document_id=str(doc_id), 
         device_fingerprint=device_info,
         cnn_prob=cnn_score,
-        gnn_prob=gnn_score
+        gnn_prob=gnn_score,
+        fraud_ring=fraud_ring,
+        identifier_matches=identifier_matches
     )
-    fraud["modelVersion"] = "heuristic-v2.0 + CNN/GNN"
-    documents_collection.update_one({"_id": doc_id}, {"$set": {"fraud": fraud, "fileHash": fraud.get("details", {}).get("fileHash")}})
+    # Until the models have loaded, documents are scored by the heuristics alone
+    fraud["modelVersion"] = "heuristic-v2.0 + CNN/GNN" if ml_loaded else "heuristic-v2.0 (CNN/GNN loading)"
+    image_hashes = fraud.get("details", {}).get("imageHash")
+    doc_record.update({"fraud": fraud, "fileHash": fraud.get("details", {}).get("fileHash"), "imageHash": image_hashes})
+    uow.insert(documents_collection, doc_record)
 
     # 4. AML Checks
     aadhaar = parsed.get("aadhaarNumber")
@@ -260,7 +244,7 @@ def run_full_pipeline(user: Dict[str, Any], filename: str, file_bytes: bytes, de
         if c["flagged"]: aml_results.append(c["reason"])
 
     # 5. Duplicate Check
-    dup_res = check_duplicate(aadhaar, pan, dl)
+    dup_res = check_duplicate(aadhaar, pan, dl, matches=identifier_matches)
     if dup_res["duplicate"]: aml_results.extend(dup_res["reasons"])
 
     # 6. Final Decision
@@ -271,7 +255,7 @@ def run_full_pipeline(user: Dict[str, Any], filename: str, file_bytes: bytes, de
     if aml_results or score >= 71:
         decision = "Flagged"
         reason = "; ".join(aml_results) if aml_results else f"High fraud score {score}"
-        alert = add_alert(aadhaar, pan, dl, user.get("email"), "High" if score >= 71 else "Medium", reason)
+        alert = add_alert(aadhaar, pan, dl, user.get("email"), "High" if score >= 71 else "Medium", reason, uow=uow)
         alerts.append(alert)
     elif score >= 31:
         decision = "Review"
@@ -283,14 +267,37 @@ def run_full_pipeline(user: Dict[str, Any], filename: str, file_bytes: bytes, de
         "decision": decision, "alerts": [a.get("_id") for a in alerts], "userEmail": user.get("email"),
         "createdAt": datetime.utcnow().isoformat(), "processingTimeMs": int((time.time() - start) * 1000)
     }
-    kyc_data_collection.insert_one(kyc_snapshot)
+    uow.insert(kyc_data_collection, kyc_snapshot)
 
-    audit_logs_collection.insert_one({
+    # 8. Audit entry, checked before anything is stored. deviceInfo is whatever
+    #    the client sent: an oversized one is left out rather than failing the upload
+    audit_entry = {
         "userId": str(user.get("_id")), "docId": str(doc_id),
         "aadhaar": aadhaar, "pan": pan, "dl": dl,
         "decision": decision, "createdAt": datetime.utcnow().isoformat(),
         "deviceInfo": device_info
-    })
+    }
+    try:
+        audit_sink.check(audit_entry)
+    except InvalidAuditEntry as e:
+        print(f"⚠️ Audit entry for {doc_id}: device info omitted ({e})")
+        audit_entry["deviceInfo"] = {"omitted": str(e)}
+        audit_sink.check(audit_entry)
+
+    # 9. Commit: one bulk write per collection (shared with concurrent uploads,
+    #    identifier entries included), then audit (write-behind) and the
+    #    in-memory indexes. The document is stored by now, so an audit failure
+    #    must not skip the index updates.
+    record_identifiers(str(doc_id), current_user_id, upload_ids, uow=uow)
+    commit(uow)
+    try:
+        audit_sink.submit(audit_entry)
+    except Exception as e:
+        print(f"❌ Audit log submit failed for {doc_id}: {e}")
+    record_document(str(doc_id), image_hashes)
+    record_identities(current_user_id, identifiers)
+    record_ring_links(current_user_id, identifiers, doc_record["createdAt"])
+    record_name(current_user_id, str(doc_id), parsed.get("name"))
 
     return {
         "docId": str(doc_id), "verification": verification,
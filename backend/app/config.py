@@ -8,6 +8,14 @@ UPLOAD_DIR = str(BASE_DIR / "uploads")
 class Settings(BaseSettings):
     MONGO_URI: str = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
     MONGO_DB: str = os.getenv("MONGO_DB", "kyc_database")
+    # Connection pools (per client: motor for routes, pymongo for the pipeline threads);
+    # a request waiting longer than the queue timeout for a connection fails
+    MONGO_MAX_POOL_SIZE: int = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+    MONGO_MIN_POOL_SIZE: int = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+    MONGO_MAX_IDLE_MS: int = int(os.getenv("MONGO_MAX_IDLE_MS", "60000"))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+    # Identifier index: latest document ids kept per (type, value) entry
+    IDENTIFIER_MAX_DOCS: int = int(os.getenv("IDENTIFIER_MAX_DOCS", "100"))
 
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your_secret_key_here")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
@@ -24,6 +32,111 @@ class Settings(BaseSettings):
 
     UPLOAD_DIR: str = str(BASE_DIR / "uploads")   # ✅ ADD THIS BACK
 
+    # Stage-result cache (OCR, image quality, CNN) keyed by SHA-256 of the upload
+    STAGE_CACHE_MAX_ENTRIES: int = int(os.getenv("STAGE_CACHE_MAX_ENTRIES", "512"))
+    STAGE_CACHE_DISK: bool = os.getenv("STAGE_CACHE_DISK", "false").lower() in ("1", "true", "yes")
+
+    # OCR worker processes (each preloads EasyOCR); 0 = run OCR inline
+    OCR_POOL_SIZE: int = int(os.getenv("OCR_POOL_SIZE", str(max(1, (os.cpu_count() or 2) // 2))))
+
+    # Adaptive OCR preprocessing: resolution band (min image side) and noise gate
+    OCR_MIN_SIDE: int = int(os.getenv("OCR_MIN_SIDE", "800"))
+    OCR_MAX_SIDE: int = int(os.getenv("OCR_MAX_SIDE", "1600"))
+    OCR_UPSCALE_TARGET: int = int(os.getenv("OCR_UPSCALE_TARGET", "1200"))
+    OCR_DENOISE_SIGMA: float = float(os.getenv("OCR_DENOISE_SIGMA", "4.0"))
+
+    # Cross-request OCR micro-batching
+    OCR_BATCH_MAX_SIZE: int = int(os.getenv("OCR_BATCH_MAX_SIZE", "8"))
+    OCR_BATCH_MAX_WAIT_MS: float = float(os.getenv("OCR_BATCH_MAX_WAIT_MS", "5"))
+
+    # EasyOCR readers per language set: drop readers idle this long (0 = never), and the sets
+    # each OCR worker loads at start-up ("en+hi,en"; empty = load on first use)
+    OCR_READER_IDLE_SECONDS: float = float(os.getenv("OCR_READER_IDLE_SECONDS", "900"))
+    OCR_PRELOAD_READERS: str = os.getenv("OCR_PRELOAD_READERS", "")
+
+    # Unhinted card photos: read the header strip with the English reader first, so the
+    # full page is read with the model its document type needs (PAN/DL never load en+hi)
+    OCR_PREDETECT: bool = os.getenv("OCR_PREDETECT", "true").lower() in ("1", "true", "yes")
+
+    # Template-driven ROI OCR: read only the field boxes of a detected card
+    OCR_ROI_MODE: bool = os.getenv("OCR_ROI_MODE", "false").lower() in ("1", "true", "yes")
+
+    # OCR cascade: fast Tesseract tier first, EasyOCR only when its fields fail checks.
+    # Opt-in like OCR_ROI_MODE: accepted documents carry Tesseract text, not EasyOCR's
+    OCR_CASCADE: bool = os.getenv("OCR_CASCADE", "false").lower() in ("1", "true", "yes")
+    OCR_CASCADE_MIN_CONF: float = float(os.getenv("OCR_CASCADE_MIN_CONF", "60"))
+
+    # PDF uploads: render DPI, page cap, text-layer reuse, pages OCR'd per batch
+    PDF_OCR_DPI: int = int(os.getenv("PDF_OCR_DPI", "200"))
+    PDF_MAX_PAGES: int = int(os.getenv("PDF_MAX_PAGES", "50"))
+    PDF_TEXT_LAYER_MIN_CHARS: int = int(os.getenv("PDF_TEXT_LAYER_MIN_CHARS", "40"))
+    PDF_PAGE_BATCH: int = int(os.getenv("PDF_PAGE_BATCH", "1"))
+
+    # Image quality checks: long side of the pyramid level used for crop/glare/exposure,
+    # and the full-resolution pixel budget sampled for the blur (Laplacian) estimate
+    QUALITY_MAX_SIDE: int = int(os.getenv("QUALITY_MAX_SIDE", "1024"))
+    QUALITY_BLUR_PIXELS: int = int(os.getenv("QUALITY_BLUR_PIXELS", str(1024 * 1024)))
+
+    # Near-duplicate images: max Hamming distance of the 64-bit pHash and the 256-bit dHash,
+    # index file, save interval
+    PHASH_MAX_DISTANCE: int = int(os.getenv("PHASH_MAX_DISTANCE", "6"))
+    DHASH_MAX_DISTANCE: int = int(os.getenv("DHASH_MAX_DISTANCE", "16"))
+    PHASH_INDEX_PATH: str = os.getenv("PHASH_INDEX_PATH", "")
+    PHASH_INDEX_SAVE_EVERY: int = int(os.getenv("PHASH_INDEX_SAVE_EVERY", "100"))
+
+    # Upload ingestion: per-file and per-request size limits, read chunk, the size up to
+    # which an upload is kept as bytes (larger ones are mmapped from a named spool file),
+    # and where those spool files go (empty = the system temp dir)
+    MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+    MAX_REQUEST_BYTES: int = int(os.getenv("MAX_REQUEST_BYTES", str(100 * 1024 * 1024)))
+    UPLOAD_CHUNK_BYTES: int = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+    UPLOAD_INMEMORY_BYTES: int = int(os.getenv("UPLOAD_INMEMORY_BYTES", str(1024 * 1024)))
+    UPLOAD_SPOOL_DIR: str = os.getenv("UPLOAD_SPOOL_DIR", "")
+
+    # CNN/GNN models: load in a background thread at start-up (else on first use), run a
+    # warm-up inference, and how long scoring waits for loading (0 = score without them)
+    ML_LOAD_ON_STARTUP: bool = os.getenv("ML_LOAD_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+    ML_WARMUP: bool = os.getenv("ML_WARMUP", "true").lower() in ("1", "true", "yes")
+    ML_WAIT_SECONDS: float = float(os.getenv("ML_WAIT_SECONDS", "0"))
+
+    # Identity graph (users <-> Aadhaar/PAN/DL/device/email domain): snapshot file and interval,
+    # and the k-hop neighbourhood (user hops, node cap) that FraudGNN scores
+    IDENTITY_GRAPH_PATH: str = os.getenv("IDENTITY_GRAPH_PATH", "")
+    IDENTITY_GRAPH_SAVE_EVERY: int = int(os.getenv("IDENTITY_GRAPH_SAVE_EVERY", "100"))
+    GNN_HOPS: int = int(os.getenv("GNN_HOPS", "2"))
+    GNN_MAX_NODES: int = int(os.getenv("GNN_MAX_NODES", "32"))
+
+    # Fraud rings (users joined through shared Aadhaar/PAN/DL/device): size that adds the
+    # ring penalty, and members listed per ring
+    FRAUD_RING_MIN_SIZE: int = int(os.getenv("FRAUD_RING_MIN_SIZE", "3"))
+    FRAUD_RING_MEMBER_LIMIT: int = int(os.getenv("FRAUD_RING_MEMBER_LIMIT", "25"))
+
+    # Name matching: raw names whose normalized form/Soundex/variations are cached, and
+    # distinct document names kept per user for the cross-document check
+    NAME_CACHE_SIZE: int = int(os.getenv("NAME_CACHE_SIZE", "4096"))
+    NAME_PROFILE_MAX: int = int(os.getenv("NAME_PROFILE_MAX", "10"))
+
+    # Bulk verification: rows parsed, checked and looked up per chunk
+    BULK_CHUNK_ROWS: int = int(os.getenv("BULK_CHUNK_ROWS", "1000"))
+
+    # Pipeline writes: most uploads flushed together by the group committer (unit_of_work.py)
+    WRITE_BATCH_MAX_UNITS: int = int(os.getenv("WRITE_BATCH_MAX_UNITS", "64"))
+
+    # Audit log sink (audit_log.py): queue size, insert_many batch size and interval, how long
+    # a full queue blocks the caller, the append-only spill file (each process writes
+    # <path>.<pid>.jsonl, compacted past the size), and the largest BSON-encoded entry accepted
+    AUDIT_QUEUE_SIZE: int = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+    AUDIT_BATCH_SIZE: int = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+    AUDIT_FLUSH_INTERVAL_MS: int = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", "200"))
+    AUDIT_BLOCK_SECONDS: float = float(os.getenv("AUDIT_BLOCK_SECONDS", "5"))
+    AUDIT_SPILL_PATH: str = os.getenv("AUDIT_SPILL_PATH", "")
+    AUDIT_SPILL_MAX_BYTES: int = int(os.getenv("AUDIT_SPILL_MAX_BYTES", str(16 * 1024 * 1024)))
+    AUDIT_ENTRY_MAX_BYTES: int = int(os.getenv("AUDIT_ENTRY_MAX_BYTES", str(1024 * 1024)))
+
+    # Listing routes (pagination.py): default and largest page size
+    LIST_PAGE_SIZE: int = int(os.getenv("LIST_PAGE_SIZE", "100"))
+    LIST_PAGE_MAX: int = int(os.getenv("LIST_PAGE_MAX", "1000"))
+
 settings = Settings()
 
 # --- FS prep ---
@@ -1,7 +1,10 @@
 from pymongo import MongoClient
 from .config import settings
+from .db_async import client_options
 
-_client = MongoClient(settings.MONGO_URI)
+# Synchronous client for code running in worker threads (pipeline, start-up rebuilds);
+# async routes use db_async.async_db
+_client = MongoClient(settings.MONGO_URI, **client_options())
 _db = _client[settings.MONGO_DB]
 
 users_collection = _db["users"]
@@ -13,13 +16,25 @@ alerts_collection = _db["alerts"]
 audit_logs_collection = _db["audit_logs"]
 aml_blacklist_collection = _db["aml_blacklist"]
 
+# (type, normalized value) -> users/documents carrying it; see identifier_index.py
+identifiers_collection = _db["identifiers"]
+
+# Progress of start-up jobs that must survive a restart (e.g. the identifier backfill marker)
+meta_collection = _db["meta"]
+
 # create indexes for frequent lookups
 try:
 	users_collection.create_index("email", unique=True)
 	documents_collection.create_index("fileHash", sparse=True)
+	documents_collection.create_index("imageHash.phash", sparse=True)
 	documents_collection.create_index("parsed.aadhaarNumber", sparse=True)
 	documents_collection.create_index("parsed.panNumber", sparse=True)
 	audit_logs_collection.create_index("createdAt")
 	alerts_collection.create_index("seen")
+	# Keyset pages (pagination.py): equality filter, then (key, _id) descending
+	documents_collection.create_index([("userId", 1), ("createdAt", -1), ("_id", -1)])
+	documents_collection.create_index([("userEmail", 1), ("createdAt", -1), ("_id", -1)])
+	audit_logs_collection.create_index([("createdAt", -1), ("_id", -1)])
+	alerts_collection.create_index([("seen", 1), ("timestamp", -1), ("_id", -1)])
 except Exception:
 	pass
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+from .config import settings
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:  # motor is in requirements.txt; without it routes fail on first query
+    AsyncIOMotorClient = None
+
+# ============================================
+# Async MongoDB layer (motor) for request paths
+# ============================================
+# db.py's pymongo client blocks whichever thread calls it. That is right
+# for the OCR/fraud pipeline, which runs in the threadpool anyway, but
+# async routes awaiting nothing would stall the event loop on every
+# find_one. Routes use these motor collections instead; the two clients
+# share the URI, database and pool settings.
+#
+# A motor client is bound to the event loop it first runs on, so it is
+# created lazily on first use and recreated if the running loop changes
+# (each TestClient runs its own loop; production has one).
+
+COLLECTIONS = {
+    "users": "users",
+    "documents": "uploaded_documents",
+    "kyc_data": "kyc_data",
+    "alerts": "alerts",
+    "audit_logs": "audit_logs",
+    "aml_blacklist": "aml_blacklist",
+    "identifiers": "identifiers",
+}
+
+
+def client_options() -> Dict[str, Any]:
+    """Pool settings shared by the motor and pymongo clients."""
+    return {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGO_MAX_IDLE_MS,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    }
+
+
+class AsyncDB:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._loop = None
+
+    def _database(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._client is None or self._loop is not loop:
+                if AsyncIOMotorClient is None:
+                    raise RuntimeError("motor is not installed")
+                if self._client is not None:
+                    self._client.close()
+                self._client = AsyncIOMotorClient(settings.MONGO_URI, io_loop=loop, **client_options())
+                self._loop = loop
+            return self._client[settings.MONGO_DB]
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = self._loop = None
+
+    # Collection handles (call from inside a coroutine)
+    @property
+    def users(self):
+        return self._database()[COLLECTIONS["users"]]
+
+    @property
+    def documents(self):
+        return self._database()[COLLECTIONS["documents"]]
+
+    @property
+    def kyc_data(self):
+        return self._database()[COLLECTIONS["kyc_data"]]
+
+    @property
+    def alerts(self):
+        return self._database()[COLLECTIONS["alerts"]]
+
+    @property
+    def audit_logs(self):
+        return self._database()[COLLECTIONS["audit_logs"]]
+
+    @property
+    def aml_blacklist(self):
+        return self._database()[COLLECTIONS["aml_blacklist"]]
+
+    @property
+    def identifiers(self):
+        return self._database()[COLLECTIONS["identifiers"]]
+
+
+async_db = AsyncDB()
+
+
+async def to_list(cursor, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Drain a motor cursor (limit=None reads every document)."""
+    return await cursor.to_list(length=limit)
+
+
+def close_async_db():
+    async_db.close()
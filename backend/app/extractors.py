@@ -0,0 +1,602 @@
+import re
+import math
+from functools import cached_property
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# ============================================
+# Field extraction from OCR text
+# ============================================
+# The OCR text is tokenised once (_Text) and then handed to the extractor
+# chain registered for its document type. Every pattern is compiled at import
+# time; keyword lists are compiled into single alternations instead of being
+# scanned one substring at a time.
+
+
+def _alternation(words, flags=0) -> "re.Pattern":
+    # Longest first so overlapping keywords behave like plain substring tests
+    return re.compile("|".join(re.escape(w) for w in sorted(set(words), key=len, reverse=True)), flags)
+
+
+def _prefix_grouped(words) -> str:
+    """Alternation grouped by first letter, so the engine tries one branch per position."""
+    groups: Dict[str, List[str]] = {}
+    for w in words:
+        groups.setdefault(w[0], []).append(w[1:])
+    return "(?:" + "|".join(
+        re.escape(first) + "(?:" + "|".join(re.escape(r) for r in sorted(rest, key=len, reverse=True)) + ")"
+        for first, rest in groups.items()
+    ) + ")"
+
+
+# ---------- document type keywords (tested on the upper-cased text) ----------
+_AADHAAR_KW = _alternation(["AADHAAR", "UNIQUE IDENTIFICATION", "UIDAI", "आधार"])
+_PAN_KW = _alternation(["INCOME TAX", "PERMANENT ACCOUNT", "PAN CARD", "आयकर विभाग"])
+_DL_KW = _alternation(["DRIVING LICENCE", "DRIVING LICENSE", "MOTOR DRIVING", "FORM 7", "LMV", "MCWG"])
+_DL_NO_KW = _alternation(["NO.:", "NO. :"])
+_DL_HINT_KW = _alternation(["VALID TO", "VALID FROM", "NON TRANSPORT", "NON TRANSPON", "BLOOD GROUP", "KERAL",
+                            "STATE DRIVING"])
+
+# ---------- identifiers ----------
+_AADHAAR_RE = re.compile(r"\b(\d{4}\s?\d{4}\s?\d{4})\b")
+_PAN_EXACT_RE = re.compile(r"\b[A-Z]{5}\d{4}[A-Z]\b")
+_PAN_PARTIAL_RE = re.compile(r"\b([A-Z]{4,5}\d{4}[A-Z]?)\b")
+_PAN_LINE_TOKEN_RE = re.compile(r"[A-Za-z0-9]{8,12}")
+_NON_ALNUM_RE = re.compile(r"[^A-Za-z0-9]")
+
+# Cost of OCR reading `seen` where the card says `truth`, as (seen, truth).
+# Lower = more common confusion; exp(-total cost) is reported as confidence.
+_PAN_CONFUSION_COSTS = {
+    ('0', 'O'): 0.1, ('O', '0'): 0.1, ('0', 'D'): 0.5, ('D', '0'): 0.5, ('Q', '0'): 0.6,
+    ('1', 'I'): 0.2, ('I', '1'): 0.2, ('1', 'L'): 0.4, ('L', '1'): 0.4, ('J', '1'): 0.7,
+    ('5', 'S'): 0.2, ('S', '5'): 0.2, ('8', 'B'): 0.3, ('B', '8'): 0.3,
+    ('2', 'Z'): 0.3, ('Z', '2'): 0.3, ('6', 'G'): 0.3, ('G', '6'): 0.3,
+    ('4', 'A'): 0.5, ('A', '4'): 0.5, ('7', 'T'): 0.5, ('T', '7'): 0.5, ('9', 'G'): 0.7,
+}
+_PAN_SKIP_COST = 0.8        # stray character inside the token
+_PAN_MAX_COST = 1.5         # repairs above this are not trusted as a PAN
+# PAN grammar: [A-Z]{5}[0-9]{4}[A-Z]
+_PAN_GRAMMAR = "LLLLLDDDDL"
+
+
+def _best_fixes(want_digit: bool) -> Dict[str, Tuple[float, str]]:
+    """char -> (cost, replacement) for one grammar class."""
+    fixes: Dict[str, Tuple[float, str]] = {}
+    for ch in "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789":
+        if ch.isdigit() == want_digit:
+            fixes[ch] = (0.0, ch)
+    for (seen, truth), cost in _PAN_CONFUSION_COSTS.items():
+        if truth.isdigit() == want_digit and cost < fixes.get(seen, (float("inf"), ""))[0]:
+            fixes[seen] = (cost, truth)
+    return fixes
+
+
+_PAN_FIXES = {"L": _best_fixes(False), "D": _best_fixes(True)}
+_NO_FIX = (float("inf"), "")
+_PAN_PARTIAL_CONFIDENCE = 0.3   # shape-only guess on a PAN card
+_PAN_MISSING_LAST_CONFIDENCE = 0.6
+
+# ---------- dates, gender ----------
+# Case-insensitive patterns run on the lower-cased text without re.IGNORECASE,
+# which is several times faster in the re engine.
+_DATE_RE = re.compile(r"\b(\d{1,2}[-/]\d{1,2}[-/]\d{4})\b")
+_DOB_LABEL_DATE_RE = re.compile(r"(year|yob|dob)[\s:\-]*(\d{1,2}[-/]\d{1,2}[-/]\d{4})")
+_YOB_RE = re.compile(r"(year|yob)[\s:\-]*(\d{4})")
+_ISSUE_RE = re.compile(r"(issue|issued|iss)[\s:\-]*(\d{1,2}[-/]\d{1,2}[-/]\d{4})")
+_VALID_RE = re.compile(r"(valid|validity|exp|expiry|until)[\s:\-]*(\d{1,2}[-/]\d{1,2}[-/]\d{4})")
+_GENDER_RE = re.compile(r"\b(male|female|transgender)\b")
+_M_RE = re.compile(r"\bM\b")
+_F_RE = re.compile(r"\bF\b")
+
+# ---------- names ----------
+_NAME_LABEL_RE = re.compile(r"(?i)(?:s\.?\s*)?name['\s:\-]*([A-Za-z][A-Za-z\s\.]{2,60}?)(?=\n|$|[0-9]|Date|DOB)")
+_TRAILING_INITIAL_RE = re.compile(r'\s+[A-Z]$')
+_NON_NAME_RE = re.compile(r'[^A-Za-z\s\.]')
+_SPACES_RE = re.compile(r'\s+')
+_FATHER_RE = re.compile(r"(?i)father['s]*\s*name[:\-]?\s*([A-Za-z][A-Za-z\s]{2,100}?)(?=\n|$)")
+
+_BAD_NAME = _alternation([
+    "GOVERNMENT", "INDIA", "FATHER", "ADDRESS", "YEAR", "MALE", "FEMALE",
+    "AADHAAR", "PAN", "LICENSE", "LICENCE", "DOB", "DATE", "PSSST", "SSS",
+    "SRI", "SHRI", "GOVT", "PROOF", "BIRTH", "CITIZENSHIP", "VERIFICATION",
+    "AUTHENTICATION", "CODE", "OFFLINE", "BLOOD", "GROUP", "CATEGORY",
+    "TRANSPORT", "VALID", "FROM", "MP", "OOOS", "ES", "LON", "ENC", "RAS", "NEU",
+    # Department and header text to exclude
+    "INCOME TAX", "DEPARTMENT", "PERMANENT ACCOUNT", "NUMBER CARD", "SIGNATURE",
+    "HOLDER", "PHOTO", "CARD", "UNION", "REPUBLIC", "MINISTRY", "UNIQUE",
+    "IDENTIFICATION", "AUTHORITY", "REVENUE", "CENTRAL", "MOTOR", "DRIVING",
+    "REPUBLIC OF INDIA", "GOVT OF INDIA", "TAX DEPARTMENT", "ACCOUNT NUMBER",
+    # State names (to avoid header text like "KERALA STATE" being parsed as name)
+    "KERALA", "KARNATAKA", "TAMIL NADU", "ANDHRA", "TELANGANA", "MAHARASHTRA",
+    "GUJARAT", "RAJASTHAN", "PUNJAB", "HARYANA", "DELHI", "UTTAR PRADESH",
+    "MADHYA PRADESH", "WEST BENGAL", "BIHAR", "ODISHA", "JHARKHAND",
+    "CHHATTISGARH", "ASSAM", "MEGHALAYA", "TRIPURA", "MANIPUR", "NAGALAND",
+    "MIZORAM", "SIKKIM", "GOA", "HIMACHAL", "UTTARAKHAND", "JAMMU",
+    # DL-specific headers
+    "INDIAN UNION", "STATE DRIVING", "FORM", "PILLAI",
+    "NON-TRANSPORT", "LMV", "MCWG", "THIRUVANANTHAPURAM",
+])
+_BAD_NAME_WORDS = frozenset({
+    "THE", "AND", "OR", "NOT", "FOR", "WITH", "ONLY", "SHOULD", "USED", "BE", "IT", "IS", "OF", "TO", "IN",
+    "AT", "BY", "FROM", "ON", "A", "AN", "NO", "TAX", "DEPARTMENT", "INCOME", "STATE", "KERALA", "KERAL",
+})
+_BAD_DL_NAME = _alternation(["KERALA", "STATE", "INDIAN", "UNION", "DRIVING", "LICENCE", "LICENSE", "TRANSPORT",
+                             "MOTOR", "FORM", "PILLAI", "KERAL", "TRANSPON", "BLOOD", "GROUP", "CATEGORY", "VALID"])
+
+# ---------- address, PIN, state ----------
+_ADDRESS_RE = re.compile(r"(?i)address[:\-]?\s*(.+?)(?=\n|$)")
+_ADDRESS_ID_RE = re.compile(r"\d{4}\s?\d{4}\s?\d{4}")
+_PIN_RES = [  # searched in the lower-cased text
+    re.compile(r"(?:pin|pincode|pin\s*code|postal\s*code)[:\s\-]*(\d{6})\b"),  # Explicit PIN label
+    re.compile(r"\b(\d{6})\s*(?:india)?\s*$"),  # 6 digits at end of text
+    re.compile(r"[\-,\s](\d{6})\b"),  # 6 digits after separator
+]
+# First digit of an Indian PIN code is the postal region
+PIN_ZONES = {
+    '1': 'Delhi/Haryana/Punjab/HP/J&K',
+    '2': 'UP/Uttarakhand',
+    '3': 'Rajasthan/Gujarat',
+    '4': 'Maharashtra/Goa/MP/Chhattisgarh',
+    '5': 'AP/Telangana/Karnataka',
+    '6': 'Kerala/Tamil Nadu',
+    '7': 'West Bengal/Odisha/NE States',
+    '8': 'Bihar/Jharkhand',
+    '9': 'Army Post Office',
+}
+STATES = [
+    "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh",
+    "Goa", "Gujarat", "Haryana", "Himachal Pradesh", "Jharkhand", "Karnataka",
+    "Kerala", "Madhya Pradesh", "Maharashtra", "Manipur", "Meghalaya", "Mizoram",
+    "Nagaland", "Odisha", "Punjab", "Rajasthan", "Sikkim", "Tamil Nadu",
+    "Telangana", "Tripura", "Uttar Pradesh", "Uttarakhand", "West Bengal",
+    "Delhi", "Chandigarh", "Puducherry", "Jammu", "Kashmir", "Ladakh",
+]
+_STATE_RANK = {s.lower(): i for i, s in enumerate(STATES)}
+_STATE_RE = re.compile(r"\b" + _prefix_grouped(list(_STATE_RANK)) + r"\b")
+
+# ---------- driving licence ----------
+_DL_SLASH_NO_RE = re.compile(r"(\d{1,2}/\d{2,5}/\d{4})")
+_DL_SLASH_RE = re.compile(r"(\d{1,2}/\d{3,5}/\d{4})")
+_DL_DATE_RE = re.compile(r"(\d{1,2}[/\-]\d{1,2}[/\-]\d{4})")
+_DL_DOB_LABELS = _alternation(["DATE OF BIRTH", "DOB", "BIRTH", "BINH", "D.O.B"])
+_DL_LABEL_RE = re.compile(r"(?i)(?:dl|driv|license|licence|lic)\s*(?:no|number|#|:)?[\s:\-]*([A-Za-z0-9\-/]{5,20})")
+_DL_STATE_CODE_RE = re.compile(r"[A-Z]{2}[-\s]?\d{1,3}[-\s]?\d{3,15}")
+_DL_SEPARATORS_RE = re.compile(r"[\s\-]")
+_DL_SLASH_ANY_RE = re.compile(r"(\d{1,2}[/]\d{2,4}[/]\d{4})")
+_DL_TOKEN_RE = re.compile(r"[A-Za-z0-9\-/]{8,20}")
+
+
+class _Text:
+    """The OCR text split once into the views the extractors work on."""
+
+    def __init__(self, text: str):
+        self.raw = text
+        stripped = [l.strip() for l in text.splitlines()]
+        # Lines longer than 2 chars drop single-letter noise
+        self.lines = [l for l in stripped if len(l) > 2]
+        self.all_lines = [l for l in stripped if l]
+        self.full = " ".join(self.lines)
+        self.upper = self.full.upper()
+        self.lower = self.full.lower()
+
+    @cached_property
+    def name_lines(self) -> List[str]:
+        """Lines reduced to letters, spaces and dots (name candidates)."""
+        return [_NON_NAME_RE.sub('', l).strip() for l in self.lines]
+
+
+Extractor = Callable[[_Text, Dict], None]
+
+
+# ---------- document type ----------
+def detect_document_type(t: _Text) -> Optional[str]:
+    up = t.upper
+    if _AADHAAR_KW.search(up):
+        return "Aadhaar"
+    if _PAN_KW.search(up):
+        return "PAN"
+    if _DL_KW.search(up) or _DL_NO_KW.search(up) or _DL_HINT_KW.search(up):
+        return "DrivingLicence"
+    # TRANSPORT alone might be DL if no other doc indicators
+    if "TRANSPORT" in up:
+        return "DrivingLicence"
+    return None
+
+
+# ---------- identifiers ----------
+def _aadhaar(t: _Text, parsed: Dict):
+    m = _AADHAAR_RE.search(t.full)
+    if m:
+        candidate = m.group(1).replace(" ", "")
+        # Validate: should not be all same digits
+        if len(set(candidate)) > 2:
+            parsed["aadhaarNumber"] = candidate
+
+
+class PanMatch(NamedTuple):
+    pan: str
+    cost: float
+    confidence: float
+
+
+def match_pan(token: str) -> Optional[PanMatch]:
+    """
+    Minimum-cost repair of an OCR token into the PAN grammar. A DP over
+    (token position, grammar position): each character is either kept,
+    swapped for its cheapest confusion of the required class, or skipped as
+    noise. Linear in the token length, with no cap on ambiguous characters.
+    """
+    token = _NON_ALNUM_RE.sub("", token).upper()
+    n, g = len(token), len(_PAN_GRAMMAR)
+    if not g <= n <= g + int(_PAN_MAX_COST // _PAN_SKIP_COST):
+        return None
+
+    if n == g:
+        # Same length: no skips possible, so each position takes its cheapest fix
+        total, chars = 0.0, []
+        for ch, cls in zip(token, _PAN_GRAMMAR):
+            fix_cost, fixed = _PAN_FIXES[cls].get(ch, _NO_FIX)
+            total += fix_cost
+            if total > _PAN_MAX_COST:
+                return None
+            chars.append(fixed)
+        total = round(total, 3)
+        return PanMatch("".join(chars), total, round(math.exp(-total), 2))
+
+    inf = float("inf")
+    # cost[i][j]: best cost of reading token[:i] as grammar[:j]; back[i][j]: (prev_i, prev_j, char)
+    cost = [[inf] * (g + 1) for _ in range(n + 1)]
+    back = [[None] * (g + 1) for _ in range(n + 1)]
+    cost[0][0] = 0.0
+    for i in range(n):
+        ch = token[i]
+        for j in range(min(i, g) + 1):
+            c = cost[i][j]
+            if c > _PAN_MAX_COST:
+                continue
+            if c + _PAN_SKIP_COST < cost[i + 1][j]:
+                cost[i + 1][j] = c + _PAN_SKIP_COST
+                back[i + 1][j] = (i, j, "")
+            if j < g:
+                fix_cost, fixed = _PAN_FIXES[_PAN_GRAMMAR[j]].get(ch, _NO_FIX)
+                if c + fix_cost < cost[i + 1][j + 1]:
+                    cost[i + 1][j + 1] = c + fix_cost
+                    back[i + 1][j + 1] = (i, j, fixed)
+
+    total = cost[n][g]
+    if total > _PAN_MAX_COST:
+        return None
+    chars, i, j = [], n, g
+    while i or j:
+        i, j, fixed = back[i][j]
+        chars.append(fixed)
+    total = round(total, 3)
+    return PanMatch("".join(reversed(chars)), total, round(math.exp(-total), 2))
+
+
+def _pan_candidates(full: str):
+    """
+    Words mixing letters and digits, plus a 5-character word joined with the
+    following words when they carry the digits (PANs split by OCR spacing,
+    "ABCDE 1234 F"). Words with '/' are dates or DL numbers, never a PAN.
+    """
+    words = [None if "/" in w else _NON_ALNUM_RE.sub("", w) for w in full.split()]
+    g = len(_PAN_GRAMMAR)
+    limit = g + int(_PAN_MAX_COST // _PAN_SKIP_COST)
+    for i, word in enumerate(words):
+        if not word:
+            continue
+        if g <= len(word) <= limit:
+            if not (word.isalpha() or word.isdigit()):
+                yield word
+        elif len(word) == 5:
+            joined = word
+            for nxt in words[i + 1:i + 3]:
+                if not nxt or nxt.isalpha():
+                    break
+                joined += nxt
+                if len(joined) >= g:
+                    if len(joined) <= limit:
+                        yield joined
+                    break
+
+
+def _pan(t: _Text, parsed: Dict):
+    full = t.full
+    m = _PAN_EXACT_RE.search(full)
+    if m:
+        parsed["panNumber"] = m.group().upper()
+        parsed["panConfidence"] = 1.0
+        return
+
+    # OCR sometimes misses the last letter
+    m = _PAN_PARTIAL_RE.search(full)
+    if m:
+        candidate = m.group(1).upper()
+        if len(candidate) == 9 and candidate[:5].isalpha() and candidate[5:9].isdigit():
+            idx = full.find(candidate)
+            if idx >= 0 and idx + 10 <= len(full):
+                next_char = full[idx + 9:idx + 10]
+                if next_char.isalpha():
+                    parsed["panNumber"] = candidate + next_char.upper()
+                    parsed["panConfidence"] = _PAN_MISSING_LAST_CONFIDENCE
+                    return
+        elif len(candidate) == 10:
+            parsed["panNumber"] = candidate
+            parsed["panConfidence"] = 1.0
+            return
+
+    # Cheapest OCR-confusion repair over all candidate tokens
+    best = None
+    for tok in _pan_candidates(full):
+        found = match_pan(tok)
+        if found and (best is None or found.cost < best.cost):
+            best = found
+            if not best.cost:
+                break
+    if best:
+        parsed["panNumber"] = best.pan
+        parsed["panConfidence"] = best.confidence
+        return
+
+    # Last resort on a PAN card: anything shaped like a partial PAN
+    if parsed.get("documentType") == "PAN":
+        for line in t.lines:
+            for tok in _PAN_LINE_TOKEN_RE.findall(line.replace(" ", "")):
+                tok = tok.upper()
+                letters = sum(1 for c in tok if c.isalpha())
+                digits = sum(1 for c in tok if c.isdigit())
+                if letters >= 4 and digits >= 3:
+                    parsed["panNumber"] = tok[:10]
+                    parsed["panConfidence"] = _PAN_PARTIAL_CONFIDENCE
+                    return
+
+
+# ---------- dates, gender ----------
+def _dob(t: _Text, parsed: Dict):
+    m = _DATE_RE.search(t.full)
+    if m:
+        parsed["dob"] = m.group(1)
+        return
+    m = _DOB_LABEL_DATE_RE.search(t.lower) or _YOB_RE.search(t.lower)
+    if m:
+        parsed["dob"] = m.group(2)
+
+
+def _gender(t: _Text, parsed: Dict):
+    full = t.full
+    m = _GENDER_RE.search(t.lower)
+    if m:
+        parsed["gender"] = m.group(1).capitalize()
+    elif " M\n" in t.raw or _M_RE.search(full):
+        parsed["gender"] = "Male"
+    elif " F\n" in t.raw or _F_RE.search(full):
+        parsed["gender"] = "Female"
+
+
+def _issue_valid_dates(t: _Text, parsed: Dict):
+    m = _ISSUE_RE.search(t.lower)
+    if m:
+        parsed["issueDate"] = m.group(2)
+    m = _VALID_RE.search(t.lower)
+    if m:
+        parsed["validUntil"] = m.group(2)
+
+
+# ---------- names ----------
+def _name_from_label(t: _Text, parsed: Dict):
+    """'Name:' label anywhere, tolerant of 'S. Name', 'S.Name' and stray punctuation."""
+    m = _NAME_LABEL_RE.search(t.full)
+    if m:
+        candidate = _TRAILING_INITIAL_RE.sub('', m.group(1).strip()).strip()
+        if candidate and 3 <= len(candidate) <= 60 and not _BAD_NAME.search(candidate.upper()):
+            parsed["name"] = candidate
+
+
+def _name_from_lines(t: _Text, parsed: Dict):
+    """First line that looks like a real multi-word name."""
+    if parsed.get("name"):
+        return
+    for clean in t.name_lines:
+        words = clean.split()
+        if (3 <= len(clean) <= 60 and
+                len(words) >= 2 and
+                all(len(w) >= 2 for w in words) and
+                any(len(w) >= 4 for w in words) and
+                clean.replace(" ", "").isalpha() and
+                not _BAD_NAME.search(clean.upper()) and
+                not all(w.upper() in _BAD_NAME_WORDS for w in words)):
+            if clean[0].isupper():
+                parsed["name"] = clean
+                return
+
+
+def _name_before_dob(t: _Text, parsed: Dict):
+    """Line directly above the date of birth."""
+    if parsed.get("name") or not parsed.get("dob"):
+        return
+    for i, line in enumerate(t.lines):
+        up = line.upper()
+        if parsed["dob"] in line or "DOB" in up or "DATE OF BIRTH" in up:
+            if i > 0:
+                candidate = t.name_lines[i - 1]
+                if (3 <= len(candidate) <= 60 and
+                        candidate.replace(" ", "").isalpha() and
+                        not _BAD_NAME.search(candidate.upper())):
+                    parsed["name"] = candidate
+                    return
+
+
+def _father_name(t: _Text, parsed: Dict):
+    m = _FATHER_RE.search(t.full)
+    if m:
+        parsed["fatherName"] = m.group(1).strip()
+
+
+# ---------- address, PIN, state ----------
+def _address(t: _Text, parsed: Dict):
+    m = _ADDRESS_RE.search(t.full)
+    if m:
+        # Remove ID numbers from address if captured by mistake
+        addr = _ADDRESS_ID_RE.sub("", m.group(1)).strip()
+        if len(addr) > 3:
+            parsed["address"] = addr
+
+
+def _pin_code(t: _Text, parsed: Dict):
+    for pattern in _PIN_RES:
+        m = pattern.search(t.lower)
+        # Indian PIN codes start with 1-9
+        if m and m.group(1)[0] != '0':
+            pin = m.group(1)
+            parsed["pinCode"] = pin
+            parsed["pinZone"] = PIN_ZONES.get(pin[0], 'Unknown')
+            return
+
+
+def _state(t: _Text, parsed: Dict):
+    # Earliest state in STATES order wins, not earliest in the text
+    ranks = [_STATE_RANK[m.group()] for m in _STATE_RE.finditer(t.lower)]
+    if ranks:
+        parsed["state"] = STATES[min(ranks)]
+
+
+# ---------- driving licence ----------
+def _dl_name(t: _Text, parsed: Dict):
+    """The line after a 'Name' label, or a line starting with ':'."""
+    found_label = False
+    for line in t.all_lines:
+        up = line.upper()
+        if up == "NAME" or up.startswith("NAME "):
+            found_label = True
+            continue
+        if found_label or line.startswith(":"):
+            candidate = line[1:].strip() if line.startswith(":") else line
+            candidate = _SPACES_RE.sub(' ', _NON_NAME_RE.sub('', candidate).strip())
+            candidate = _TRAILING_INITIAL_RE.sub('', candidate).strip()
+            if (5 <= len(candidate) <= 50 and
+                    candidate.replace(" ", "").replace(".", "").isalpha() and
+                    not _BAD_DL_NAME.search(candidate.upper())):
+                parsed["name"] = candidate
+                return
+            found_label = False
+
+
+def _is_dl_slash_number(value: str) -> bool:
+    # DL numbers have a 3+ digit middle part; dates have 2
+    parts = value.split("/")
+    return len(parts) == 3 and len(parts[1]) >= 3
+
+
+def _dl_dob(t: _Text, parsed: Dict):
+    lines = t.all_lines
+    for i, line in enumerate(lines):
+        # OCR sometimes turns "Birth" into "Binh"
+        if _DL_DOB_LABELS.search(line.upper()):
+            m = _DL_DATE_RE.search(line) or (_DL_DATE_RE.search(lines[i + 1]) if i + 1 < len(lines) else None)
+            if m:
+                parsed["dob"] = m.group(1)
+                return
+
+    # DOB year is typically 1950-2010 for adults (the other dates are issue/validity)
+    if not parsed.get("dob"):
+        for date_str in _DL_DATE_RE.findall(t.full):
+            parts = date_str.replace("-", "/").split("/")
+            if len(parts) == 3 and 1950 <= int(parts[2]) <= 2010:
+                parsed["dob"] = date_str
+                return
+
+
+def _dl_number(t: _Text, parsed: Dict):
+    # "No.:  1/1626/2006" (Kerala format)
+    for line in t.all_lines:
+        if "no" in line.lower() and (":" in line or "/" in line):
+            m = _DL_SLASH_NO_RE.search(line)
+            if m and _is_dl_slash_number(m.group(1)):
+                parsed["dlNumber"] = m.group(1)
+                return
+    for line in t.all_lines:
+        m = _DL_SLASH_RE.search(line)
+        if m and _is_dl_slash_number(m.group(1)):
+            parsed["dlNumber"] = m.group(1)
+            return
+
+    full = t.full
+    # Explicit DL label
+    m = _DL_LABEL_RE.search(full)
+    if m:
+        candidate = m.group(1).strip()
+        if 5 <= len(candidate) <= 20:
+            parsed["dlNumber"] = candidate
+            return
+
+    # State code format: "KL01XXXXX12345"
+    for tok in _DL_STATE_CODE_RE.findall(full):
+        norm = _DL_SEPARATORS_RE.sub("", tok).upper()
+        if 8 <= len(norm) <= 20:
+            parsed["dlNumber"] = norm
+            return
+
+    # Slash format near the top or after "No"
+    m = _DL_SLASH_ANY_RE.search(full)
+    if m:
+        context_before = full[:m.start()][-20:] if m.start() > 20 else full[:m.start()]
+        if "No" in context_before or m.start() < 100:
+            parsed["dlNumber"] = m.group(1)
+            return
+
+    # Anything with some letters and several digits
+    for tok in _DL_TOKEN_RE.findall(full):
+        norm = _NON_ALNUM_RE.sub("", tok).upper()
+        if 8 <= len(norm) <= 20:
+            letters = sum(1 for c in norm if c.isalpha())
+            digits = sum(1 for c in norm if c.isdigit())
+            if letters >= 1 and digits >= 3:
+                parsed["dlNumber"] = norm
+                return
+
+
+# ---------- registry ----------
+_IDS: List[Extractor] = [_aadhaar, _pan, _dob, _gender]
+_DETAILS: List[Extractor] = [_father_name, _address, _pin_code, _state]
+_CARD_CHAIN: List[Extractor] = _IDS + [_name_from_label, _name_from_lines, _name_before_dob] + _DETAILS
+
+# documentType -> extractors, run in order over the shared _Text
+EXTRACTORS: Dict[Optional[str], List[Extractor]] = {
+    "Aadhaar": _CARD_CHAIN + [_issue_valid_dates],
+    "PAN": _CARD_CHAIN + [_issue_valid_dates],
+    # The label strategy picks up header text ("KERALA STATE") on DL cards;
+    # the DL extractors below override name and DOB when they find them.
+    "DrivingLicence": _IDS + [_name_from_lines, _name_before_dob] + _DETAILS
+                      + [_dl_name, _dl_number, _dl_dob, _issue_valid_dates],
+    None: _CARD_CHAIN + [_issue_valid_dates],
+}
+
+
+def empty_parsed() -> Dict:
+    return {
+        "panNumber": None,
+        "panConfidence": None,  # 1.0 exact read, lower when OCR confusions were repaired
+        "aadhaarNumber": None,
+        "name": None,
+        "fatherName": None,
+        "dob": None,
+        "gender": None,
+        "address": None,
+        "dlNumber": None,
+        "issueDate": None,
+        "validUntil": None,
+        "pinCode": None,      # 6-digit Indian postal code
+        "pinZone": None,      # Region derived from PIN
+        "state": None,        # Indian state from address
+        "documentType": None,
+    }
+
+
+def extract_fields(text: str) -> Dict:
+    t = _Text(text or "")
+    parsed = empty_parsed()
+    parsed["documentType"] = detect_document_type(t)
+    for extractor in EXTRACTORS[parsed["documentType"]]:
+        extractor(t, parsed)
+    print(f"   ✅ Final parsed: docType={parsed.get('documentType')}, aadhaar={parsed.get('aadhaarNumber')}, pan={parsed.get('panNumber')}, name={parsed.get('name')}")
+    return parsed
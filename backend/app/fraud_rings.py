@@ -0,0 +1,225 @@
+import heapq
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .config import settings
+from .identity_graph import node_key, document_identifiers
+
+# ============================================
+# Fraud rings: incremental union-find over users
+# ============================================
+# The pipeline's shared-identifier sets only look one hop out. If A shares
+# an Aadhaar with B and B shares a PAN with C, then A and C are in one ring,
+# but neither lookup sees it. A disjoint-set forest over users, joined
+# whenever two users' documents carry the same Aadhaar, PAN, DL or device
+# hash, answers "which ring is this user in" in near-constant time, as
+# amortised inverse Ackermann (union by size + path halving). Email domains
+# are not used: a disposable-mail domain would join unrelated users.
+#
+# Per ring (set root) we keep:
+#   size      number of users
+#   members   a circular linked list through all users, spliced in O(1) on
+#             union, so listing members costs O(listed) and no graph walk
+#   formedAt  when the set first reached two users (earliest over merges)
+# Each identifier maps to the first user seen with it; later users are
+# unioned with that owner. The forest is rebuilt from the documents
+# collection (oldest first) at startup and updated as documents are stored.
+# The replay sorts on createdAt in Mongo, which only orders values of one
+# BSON type, so it runs after the page-key backfill has made them all ISO
+# strings. Documents without a userId are skipped.
+
+RING_KINDS = ("aadhaar", "pan", "dl", "device")
+
+
+def _timestamp(value: Any) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Epoch seconds or milliseconds (the same rule as pagination.page_key_value)
+        return float(value) / 1000.0 if value > 1e11 else float(value)
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=value.tzinfo or timezone.utc).timestamp()
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            return parsed.replace(tzinfo=parsed.tzinfo or timezone.utc).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts is not None else None
+
+
+class RingIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._ids: Dict[str, int] = {}
+        self._users: List[str] = []
+        self._parent: List[int] = []
+        self._size: List[int] = []
+        self._next: List[int] = []
+        self._formed: Dict[int, float] = {}
+        self._owner: Dict[str, int] = {}
+        self._rings = set()  # roots of sets with >= 2 users
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    # ---------- disjoint set ----------
+    def _user(self, user_id: str) -> int:
+        x = self._ids.get(user_id)
+        if x is None:
+            x = len(self._users)
+            self._ids[user_id] = x
+            self._users.append(user_id)
+            self._parent.append(x)
+            self._size.append(1)
+            self._next.append(x)
+        return x
+
+    def _find(self, x: int) -> int:
+        parent = self._parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]  # path halving
+            x = parent[x]
+        return x
+
+    def _union(self, a: int, b: int, ts: float):
+        ra, rb = self._find(a), self._find(b)
+        if ra == rb:
+            return
+        if self._size[ra] < self._size[rb]:
+            ra, rb = rb, ra
+        self._parent[rb] = ra
+        self._size[ra] += self._size[rb]
+        # Splice the two member cycles into one
+        self._next[ra], self._next[rb] = self._next[rb], self._next[ra]
+        formed = [t for t in (self._formed.pop(ra, None), self._formed.pop(rb, None)) if t is not None]
+        self._formed[ra] = min(formed) if formed else ts
+        self._rings.discard(rb)
+        self._rings.add(ra)
+
+    def _members(self, root: int, limit: int) -> List[str]:
+        out, x = [self._users[root]], self._next[root]
+        while x != root and len(out) < limit:
+            out.append(self._users[x])
+            x = self._next[x]
+        return out
+
+    @staticmethod
+    def _keys(identifiers: Iterable[Tuple[str, str]]) -> List[str]:
+        return [node_key(kind, value) for kind, value in identifiers if kind in RING_KINDS]
+
+    # ---------- writes ----------
+    def add(self, user_id: str, identifiers: Iterable[Tuple[str, str]], ts: Optional[float] = None):
+        """Union a stored document's user with every earlier user of its identifiers."""
+        if not user_id:
+            return  # ownerless documents would all be joined through one "" user
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            u = self._user(str(user_id))
+            for key in self._keys(identifiers):
+                owner = self._owner.setdefault(key, u)
+                if owner != u:
+                    self._union(u, owner, ts)
+
+    def rebuild_from_mongo(self, collection) -> int:
+        """Replay every stored document, oldest first."""
+        fresh = RingIndex()
+        projection = {"userId": 1, "createdAt": 1, "parsed.aadhaarNumber": 1, "parsed.panNumber": 1,
+                      "parsed.dlNumber": 1, "deviceInfo.hash": 1}
+        count = 0
+        for d in collection.find({}, projection).sort("createdAt", 1):
+            if d.get("userId") in (None, ""):
+                continue
+            fresh.add(str(d["userId"]), document_identifiers(d.get("parsed"), d.get("deviceInfo")),
+                      _timestamp(d.get("createdAt")))
+            count += 1
+        with self._lock:
+            self.__dict__.update({k: v for k, v in fresh.__dict__.items() if k != "_lock"})
+        return count
+
+    # ---------- reads ----------
+    def _describe(self, roots: List[int], extra_users: int, limit: int, now: float) -> Dict[str, Any]:
+        size = sum(self._size[r] for r in roots) + extra_users
+        members: List[str] = []
+        for r in roots:
+            members.extend(self._members(r, limit - len(members)))
+            if len(members) >= limit:
+                break
+        formed = [self._formed[r] for r in roots if r in self._formed]
+        # Joining two previously separate users / rings forms (or grows) a ring now
+        formed_at = min(formed) if formed else (now if size > 1 else None)
+        return {
+            "size": size,
+            "members": members,
+            "formedAt": _iso(formed_at),
+            "ageDays": round((now - formed_at) / 86400, 2) if formed_at is not None else None,
+        }
+
+    def preview(self, user_id: str, identifiers: Iterable[Tuple[str, str]] = (),
+                limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        The ring the user would be in once this upload is stored (the user's
+        ring merged with the rings of every earlier owner of its identifiers),
+        without changing the index.
+        """
+        limit = limit or settings.FRAUD_RING_MEMBER_LIMIT
+        with self._lock:
+            roots = []
+            u = self._ids.get(str(user_id))
+            if u is not None:
+                roots.append(self._find(u))
+            for key in self._keys(identifiers):
+                owner = self._owner.get(key)
+                if owner is not None and self._find(owner) not in roots:
+                    roots.append(self._find(owner))
+            info = self._describe(roots, 0 if u is not None else 1, limit, time.time())
+            if u is None:
+                info["members"] = [str(user_id)] + info["members"][:limit - 1]
+            info["linkedGroups"] = len(roots) - (1 if u is not None else 0)
+            return info
+
+    def ring_of(self, user_id: str, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            u = self._ids.get(str(user_id))
+            if u is None:
+                return None
+            return self._describe([self._find(u)], 0, limit or settings.FRAUD_RING_MEMBER_LIMIT, time.time())
+
+    def largest(self, n: int = 20, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The n largest rings (size >= 2), biggest first."""
+        limit = limit or settings.FRAUD_RING_MEMBER_LIMIT
+        with self._lock:
+            now = time.time()
+            roots = heapq.nlargest(n, self._rings, key=lambda r: (self._size[r], -self._formed.get(r, now)))
+            return [dict(self._describe([r], 0, limit, now), ringId=self._users[r]) for r in roots]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sizes = [self._size[r] for r in self._rings]
+            return {"users": len(self._users), "identifiers": len(self._owner), "rings": len(sizes),
+                    "largestRing": max(sizes, default=0),
+                    "usersInRings": sum(sizes)}
+
+
+ring_index = RingIndex()
+
+
+def rebuild_rings() -> int:
+    """Startup: rebuild the forest from the documents collection."""
+    from .db import documents_collection
+    t0 = time.perf_counter()
+    try:
+        count = ring_index.rebuild_from_mongo(documents_collection)
+    except Exception as e:
+        print(f"⚠️ Fraud ring index rebuild failed: {e}")
+        return 0
+    ms = round((time.perf_counter() - t0) * 1000, 1)
+    print(f"✅ Fraud ring index ready: {ring_index.stats()['rings']} rings from {count} documents ({ms} ms)")
+    return count
+
+
+def record_ring_links(user_id: str, identifiers: Iterable[Tuple[str, str]], created_at: Any = None):
+    ring_index.add(user_id, identifiers, _timestamp(created_at) if created_at is not None else None)
@@ -0,0 +1,239 @@
+import re
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from .config import settings
+from .db import identifiers_collection, documents_collection, meta_collection
+from .unit_of_work import UnitOfWork
+
+# ============================================
+# Identifier index: one round trip per upload
+# ============================================
+# Exact-duplicate checks (same file hash, same Aadhaar/PAN/DL on another
+# document) used to be separate documents queries, several per upload and
+# repeated by fraud analysis, the AML duplicate check and the
+# /check-duplicate and bulk-verify routes. The `identifiers` collection
+# keeps one entry per (type, normalized value):
+#
+#   _id      "<type>:<value>", e.g. "pan:ABCDE1234F"
+#   userIds  every user that uploaded it
+#   docIds   the latest settings.IDENTIFIER_MAX_DOCS documents carrying it
+#   count    documents carrying it
+#
+# An upload's identifiers are looked up with a single {_id: {$in: [...]}}
+# query before its document is stored (so it never matches itself). The
+# IdentifierMatches result is shared by every check in the pipeline, and
+# the entry upserts are queued on the upload's unit of work, so they are
+# written in the same commit as the document. Masked PANs ("ABCDE****F")
+# match through an anchored _id regex in the same query.
+#
+# Documents stored before the index existed are added by a start-up
+# backfill. It walks documents in _id order, in bounded batches, and
+# records the last _id done in the meta collection, so an interrupted run
+# resumes where it stopped. It stops for good once the marker says done.
+# Its upserts skip entries that already list the document, so replaying a
+# batch (a crash before the marker moved) or a document recorded live does
+# not count it twice.
+
+IDENTIFIER_TYPES = ("file", "aadhaar", "pan", "dl")
+_PARSED_FIELDS = {"aadhaar": "aadhaarNumber", "pan": "panNumber", "dl": "dlNumber"}
+# A masked PAN needs this many visible characters ("ABCDE****F" has 6);
+# "**********" would otherwise match every PAN in the index
+_MIN_VISIBLE_PAN = 5
+_BACKFILL_MARKER = "identifierIndexBackfill"
+_DUPLICATE_KEY = 11000
+
+
+def normalize_value(kind: str, value: Any) -> Optional[str]:
+    """Canonical form of an identifier value (None when empty)."""
+    if value is None:
+        return None
+    s = str(value).strip()
+    if kind == "file":
+        return s.lower() or None
+    s = re.sub(r"[\s\-]", "", s.upper())
+    if kind == "pan":
+        s = "".join(ch for ch in s if ch.isalnum() or ch == "*")
+        if "*" in s and len(s) - s.count("*") < _MIN_VISIBLE_PAN:
+            return None
+    return s or None
+
+
+def identifier_key(kind: str, value: str) -> str:
+    return f"{kind}:{value}"
+
+
+def upload_identifiers(parsed: Optional[Dict[str, Any]], file_hash: Optional[str] = None) -> List[Tuple[str, str]]:
+    """Normalized (type, value) pairs of an upload: its file hash plus parsed Aadhaar/PAN/DL."""
+    file_value = normalize_value("file", file_hash)
+    out = [("file", file_value)] if file_value else []
+    for kind, field in _PARSED_FIELDS.items():
+        value = normalize_value(kind, (parsed or {}).get(field))
+        if value:
+            out.append((kind, value))
+    return out
+
+
+def _masked(kind: str, value: str) -> bool:
+    return kind == "pan" and "*" in value
+
+
+def _pattern(kind: str, value: str) -> str:
+    return "^" + re.escape(identifier_key(kind, value)).replace("\\*", ".") + "$"
+
+
+def _query(identifiers: Iterable[Tuple[str, str]]) -> Optional[Dict[str, Any]]:
+    exact, patterns = [], []
+    for kind, value in identifiers:
+        (patterns if _masked(kind, value) else exact).append((kind, value))
+    clauses = []
+    if exact:
+        clauses.append({"_id": {"$in": [identifier_key(k, v) for k, v in exact]}})
+    clauses.extend({"_id": {"$regex": _pattern(k, v)}} for k, v in patterns)
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+class IdentifierMatches:
+    """Stored entries for an upload's identifiers, from one lookup."""
+
+    def __init__(self, identifiers: Iterable[Tuple[str, str]], entries: Iterable[Dict[str, Any]] = ()):
+        self.identifiers = list(identifiers)
+        entries = list(entries)
+        self._found: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for kind, value in self.identifiers:
+            if _masked(kind, value):
+                pattern = re.compile(_pattern(kind, value))
+                hits = [e for e in entries if pattern.match(str(e["_id"]))]
+            else:
+                key = identifier_key(kind, value)
+                hits = [e for e in entries if e["_id"] == key]
+            self._found[(kind, value)] = hits
+
+    def users(self, kind: str, value: Optional[str] = None) -> Set[str]:
+        return {str(u) for e in self._entries(kind, value) for u in e.get("userIds", [])}
+
+    def docs(self, kind: str, value: Optional[str] = None) -> Set[str]:
+        return {str(d) for e in self._entries(kind, value) for d in e.get("docIds", [])}
+
+    def seen(self, kind: str, value: Optional[str] = None) -> bool:
+        return bool(self._entries(kind, value))
+
+    def seen_values(self, kind: str) -> Set[str]:
+        """Values of this type that matched at least one stored entry."""
+        return {v for (k, v), hits in self._found.items() if k == kind and hits}
+
+    def _entries(self, kind: str, value: Optional[str]) -> List[Dict[str, Any]]:
+        if value is not None:
+            return self._found.get((kind, normalize_value(kind, value)), [])
+        return [e for (k, _), hits in self._found.items() if k == kind for e in hits]
+
+    def summary(self) -> Dict[str, Any]:
+        return {kind: {"users": len(self.users(kind)), "docs": len(self.docs(kind))}
+                for kind, _ in self.identifiers}
+
+
+def lookup_identifiers(identifiers: Iterable[Tuple[str, str]]) -> IdentifierMatches:
+    """Entries for every identifier of an upload, in one query."""
+    identifiers = list(identifiers)
+    query = _query(identifiers)
+    entries = list(identifiers_collection.find(query, {"userIds": 1, "docIds": 1})) if query else []
+    return IdentifierMatches(identifiers, entries)
+
+
+async def lookup_identifiers_async(identifiers: Iterable[Tuple[str, str]]) -> IdentifierMatches:
+    """lookup_identifiers for async routes (motor)."""
+    from .db_async import async_db
+    identifiers = list(identifiers)
+    query = _query(identifiers)
+    entries = await async_db.identifiers.find(query, {"userIds": 1, "docIds": 1}).to_list(length=None) if query else []
+    return IdentifierMatches(identifiers, entries)
+
+
+def _entry_update(kind: str, value: str, user_id: str, doc_id: str, now: datetime) -> Dict[str, Any]:
+    return {
+        "$setOnInsert": {"type": kind, "value": value, "firstSeen": now},
+        "$set": {"lastSeen": now},
+        "$addToSet": {"userIds": {"$each": [user_id]}},
+        "$push": {"docIds": {"$each": [doc_id], "$slice": -settings.IDENTIFIER_MAX_DOCS}},
+        "$inc": {"count": 1},
+    }
+
+
+def record_identifiers(doc_id: str, user_id: str, identifiers: Iterable[Tuple[str, str]],
+                       uow: Optional[UnitOfWork] = None):
+    """Add the document and its user to each identifier's entry.
+
+    With a unit of work the upserts are written in its commit (which raises if
+    they fail); without one they go out now in one bulk_write, and a failure is
+    only logged.
+    """
+    now = datetime.utcnow()
+    updates = [(identifier_key(k, v), _entry_update(k, v, str(user_id), str(doc_id), now)) for k, v in identifiers]
+    if uow is not None:
+        for key, update in updates:
+            uow.update(identifiers_collection, {"_id": key}, update, upsert=True)
+        return
+    if not updates:
+        return
+    try:
+        identifiers_collection.bulk_write([UpdateOne({"_id": key}, update, upsert=True) for key, update in updates],
+                                          ordered=False)
+    except Exception as e:
+        print(f"⚠️ Identifier index update failed: {e}")
+
+
+def _backfill_batch(docs: List[Dict[str, Any]], now: datetime) -> int:
+    """Upsert one batch of documents' identifiers; returns the (identifier, document) pairs added."""
+    ops = []
+    for d in docs:
+        doc_id = str(d["_id"])
+        for kind, value in upload_identifiers(d.get("parsed"), d.get("fileHash")):
+            # An entry that already lists this document does not match, and its upsert
+            # fails with a duplicate key instead of counting the document again
+            ops.append(UpdateOne({"_id": identifier_key(kind, value), "docIds": {"$ne": doc_id}},
+                                 _entry_update(kind, value, str(d.get("userId", "")), doc_id, now), upsert=True))
+    if not ops:
+        return 0
+    try:
+        identifiers_collection.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        errors = (e.details or {}).get("writeErrors", [])
+        if not errors or any(err.get("code") != _DUPLICATE_KEY for err in errors):
+            raise
+        return len(ops) - len(errors)
+    return len(ops)
+
+
+def rebuild_identifier_index(batch: int = 1000) -> int:
+    """Startup: backfill the index from stored documents, resuming where the last run stopped."""
+    t0 = time.perf_counter()
+    added = 0
+    try:
+        marker = meta_collection.find_one({"_id": _BACKFILL_MARKER}) or {}
+        if marker.get("done"):
+            return 0
+        query = {"_id": {"$gt": marker["lastDocId"]}} if marker.get("lastDocId") is not None else {}
+        projection = {"userId": 1, "fileHash": 1, "parsed.aadhaarNumber": 1, "parsed.panNumber": 1,
+                      "parsed.dlNumber": 1}
+        cursor = documents_collection.find(query, projection).sort("_id", 1).batch_size(batch)
+        while True:
+            docs = list(islice(cursor, batch))
+            if not docs:
+                break
+            now = datetime.utcnow()
+            added += _backfill_batch(docs, now)
+            meta_collection.update_one({"_id": _BACKFILL_MARKER},
+                                       {"$set": {"lastDocId": docs[-1]["_id"], "updatedAt": now}}, upsert=True)
+        meta_collection.update_one({"_id": _BACKFILL_MARKER},
+                                   {"$set": {"done": True, "finishedAt": datetime.utcnow()}}, upsert=True)
+    except Exception as e:
+        print(f"⚠️ Identifier index backfill stopped, resumes on next start: {e}")
+        return added
+    ms = round((time.perf_counter() - t0) * 1000, 1)
+    print(f"✅ Identifier index backfilled: {added} identifier links ({ms} ms)")
+    return added
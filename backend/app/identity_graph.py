@@ -0,0 +1,384 @@
+import os
+import threading
+import time
+import hashlib
+import numpy as np
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from .config import settings
+
+# ============================================
+# Persistent identity graph (CSR + delta)
+# ============================================
+# run_full_pipeline used to build a throwaway star graph per upload from
+# five Mongo scans, and predict_gnn_fraud padded it with at most 5 synthetic
+# neighbours. This module keeps one graph across uploads:
+#   nodes  users and identifiers: Aadhaar, PAN, DL, device hash and
+#          suspicious email domain (the disposable-mail list below; common
+#          domains would only produce hubs)
+#   edges  user -- identifier, one per identifier seen on a user's documents
+# Identifier values are stored as truncated SHA-256 keys, so the snapshot on
+# disk holds no raw ID numbers.
+#
+# Adjacency is CSR (indptr / indices int arrays) plus a small dict-of-sets
+# delta for edges added since the last merge. It is merged into the CSR once
+# it grows (the same tail pattern as the image hash index). A request reads
+# the real k-hop neighbourhood of the uploader from memory:
+# - shared_with() gives the one-hop shared-identifier sets that feed the
+#   risk score,
+# - subgraph() gives the user-projected k-hop subgraph with FraudGNN
+#   features.
+# Neither queries Mongo. The graph is snapshotted to an .npz file and rebuilt
+# from the documents collection when the snapshot is missing or stale.
+
+IDENTIFIER_KINDS = ("aadhaar", "pan", "dl", "device", "email")
+NODE_TYPES = ("user",) + IDENTIFIER_KINDS
+EDGE_WEIGHTS = {
+    "shared_aadhaar": 5.0,    # Highest risk - identity theft
+    "shared_pan": 4.0,        # High risk - financial fraud
+    "shared_dl": 3.0,         # Medium-high risk
+    "shared_device": 2.0,     # Medium risk - could be shared computer
+    "shared_email": 1.0,      # Lower risk - suspicious but not definitive
+}
+SUSPICIOUS_EMAIL_DOMAINS = ["tempmail", "guerrilla", "10minute", "throwaway", "fake", "mailinator"]
+GNN_FEATURES = 16
+
+_USER = 0
+
+
+def _normalize(kind: str, value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    if kind == "aadhaar":
+        value = "".join(ch for ch in value if ch.isdigit())
+    elif kind in ("pan", "dl"):
+        value = value.upper().replace(" ", "").replace("-", "")
+    elif kind == "email":
+        value = value.lower()
+    return value or None
+
+
+def suspicious_email_domain(email: Optional[str]) -> Optional[str]:
+    if not email or "@" not in email:
+        return None
+    domain = email.split("@")[1].lower()
+    return domain if any(sus in domain for sus in SUSPICIOUS_EMAIL_DOMAINS) else None
+
+
+def document_identifiers(parsed: Optional[Dict[str, Any]], device_info: Optional[Dict[str, Any]] = None,
+                         email: Optional[str] = None) -> List[Tuple[str, str]]:
+    """[(kind, normalized value)] for the identifiers of one document."""
+    parsed = parsed or {}
+    raw = [
+        ("aadhaar", parsed.get("aadhaarNumber")),
+        ("pan", parsed.get("panNumber")),
+        ("dl", parsed.get("dlNumber")),
+        ("device", (device_info or {}).get("hash") if isinstance(device_info, dict) else None),
+        ("email", suspicious_email_domain(email)),
+    ]
+    out = []
+    for kind, value in raw:
+        value = _normalize(kind, value)
+        if value:
+            out.append((kind, value))
+    return out
+
+
+def node_key(kind: str, value: str) -> str:
+    if kind == "user":
+        return f"user:{value}"
+    return f"{kind}:{hashlib.sha256(f'{kind}:{value}'.encode()).hexdigest()[:20]}"
+
+
+class IdentityGraph:
+    def __init__(self, merge_limit: int = 4096, hub_degree: int = 256):
+        self.merge_limit = merge_limit
+        self.hub_degree = hub_degree
+        self._lock = threading.RLock()
+        self._keys: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._types = bytearray()
+        self._indptr = np.zeros(1, np.int64)
+        self._indices = np.zeros(0, np.int32)
+        self._delta: Dict[int, Set[int]] = {}
+        self._delta_edges = 0
+        self._documents = 0
+        self._dirty = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    # ---------- writes ----------
+    def _node(self, key: str, node_type: int) -> int:
+        node = self._ids.get(key)
+        if node is None:
+            node = len(self._keys)
+            self._ids[key] = node
+            self._keys.append(key)
+            self._types.append(node_type)
+        return node
+
+    def _has_edge(self, u: int, v: int) -> bool:
+        if v in self._delta.get(u, ()):
+            return True
+        if u < len(self._indptr) - 1:
+            row = self._indices[self._indptr[u]:self._indptr[u + 1]]
+            i = np.searchsorted(row, v)
+            return i < len(row) and row[i] == v
+        return False
+
+    def _link(self, user_id: str, identifiers: Iterable[Tuple[str, str]]) -> int:
+        u = self._node(node_key("user", user_id), _USER)
+        added = 0
+        for kind, value in identifiers:
+            v = self._node(node_key(kind, value), NODE_TYPES.index(kind))
+            if not self._has_edge(u, v):
+                self._delta.setdefault(u, set()).add(v)
+                self._delta.setdefault(v, set()).add(u)
+                self._delta_edges += 1
+                added += 1
+        return added
+
+    def add_document(self, user_id: str, identifiers: Iterable[Tuple[str, str]]) -> int:
+        """Link a stored document's identifiers to its user. Returns the number of new edges."""
+        if not user_id:
+            return 0
+        with self._lock:
+            added = self._link(str(user_id), identifiers)
+            self._documents += 1
+            self._dirty += 1
+            if self._delta_edges > max(self.merge_limit, len(self._indices) // 32):
+                self._merge_delta()
+            return added
+
+    def _merge_delta(self):
+        """Fold the delta edges into the CSR arrays (vectorised COO -> CSR)."""
+        n = len(self._keys)
+        old_n = len(self._indptr) - 1
+        rows = np.repeat(np.arange(old_n, dtype=np.int64), np.diff(self._indptr))
+        cols = self._indices.astype(np.int64)
+        if self._delta:
+            d_rows = np.fromiter((u for u, vs in self._delta.items() for _ in vs), np.int64)
+            d_cols = np.fromiter((v for vs in self._delta.values() for v in vs), np.int64)
+            rows, cols = np.concatenate([rows, d_rows]), np.concatenate([cols, d_cols])
+        order = np.lexsort((cols, rows))
+        rows, cols = rows[order], cols[order]
+        self._indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n))]).astype(np.int64)
+        self._indices = cols.astype(np.int32)
+        self._delta = {}
+        self._delta_edges = 0
+
+    # ---------- reads ----------
+    def _neighbors(self, u: int) -> Set[int]:
+        out = set(self._delta.get(u, ()))
+        if u < len(self._indptr) - 1:
+            out.update(self._indices[self._indptr[u]:self._indptr[u + 1]].tolist())
+        return out
+
+    def _seed(self, user_id: str, identifiers: Iterable[Tuple[str, str]]) -> Tuple[Optional[int], Set[int]]:
+        """The user's node (if known) and its identifier nodes, including ones on the current upload."""
+        u = self._ids.get(node_key("user", str(user_id)))
+        idents = self._neighbors(u) if u is not None else set()
+        for kind, value in identifiers:
+            v = self._ids.get(node_key(kind, value))
+            if v is not None:
+                idents.add(v)
+        return u, idents
+
+    def _degree(self, v: int) -> int:
+        csr = int(self._indptr[v + 1] - self._indptr[v]) if v < len(self._indptr) - 1 else 0
+        return csr + len(self._delta.get(v, ()))
+
+    def _shared(self, u: Optional[int], idents: Set[int], hub_degree: Optional[int] = None):
+        """
+        ({"shared_<kind>": {user nodes}}, {"shared_<kind>": count}) for the users
+        sharing one of `idents` with u. Identifiers linked to more than
+        hub_degree users (a cyber-cafe device, a disposable-mail domain) only
+        contribute a count, so one hub does not make every lookup O(hub size).
+        """
+        shared = {f"shared_{kind}": set() for kind in IDENTIFIER_KINDS}
+        hubs = {edge: 0 for edge in shared}
+        for v in idents:
+            edge = f"shared_{NODE_TYPES[self._types[v]]}"
+            if hub_degree is not None:
+                degree = self._degree(v)
+                if degree > hub_degree:
+                    hubs[edge] += degree - 1
+                    continue
+            shared[edge].update(self._neighbors(v))
+            shared[edge].discard(u)
+        return shared, hubs
+
+    def shared_with(self, user_id: str, identifiers: Iterable[Tuple[str, str]] = ()) -> Dict[str, Set[str]]:
+        """{"shared_aadhaar": {other user ids}, ...} one hop out through shared identifiers."""
+        with self._lock:
+            u, idents = self._seed(user_id, identifiers)
+            shared, _ = self._shared(u, idents)
+            return {edge: {self._keys[w][5:] for w in users} for edge, users in shared.items()}
+
+    def _features(self, shared: Dict[str, Set[int]], hubs: Dict[str, int]) -> List[float]:
+        counts = {edge: len(users) + hubs[edge] for edge, users in shared.items()}
+        connected = len(set().union(*shared.values())) + sum(hubs.values())
+        risk = min(1.0, sum(n * EDGE_WEIGHTS[edge] for edge, n in counts.items()) / 10.0)
+        per_kind = [float(counts[f"shared_{kind}"]) for kind in IDENTIFIER_KINDS]
+        # Same layout as the per-request vector the model was trained on:
+        # [shared counts x5, risk, connections] + the "features" list [shared counts x5, risk]
+        feat = per_kind + [risk, float(connected)] + per_kind + [risk]
+        return feat + [0.0] * (GNN_FEATURES - len(feat))
+
+    def subgraph(self, user_id: str, identifiers: Iterable[Tuple[str, str]] = (), hops: Optional[int] = None,
+                 max_users: Optional[int] = None) -> Dict[str, Any]:
+        """
+        User-projected k-hop neighbourhood of `user_id` (two users are adjacent
+        when they share an identifier), breadth-first up to max_users nodes,
+        strongest identifier types first. Hub identifiers are counted in the
+        features but not expanded. Node 0 is the uploader. Returns FraudGNN
+        inputs as plain lists:
+        {"users", "x" (n x 16), "edge_index" (2 x E, both directions), "hops"}.
+        """
+        hops = settings.GNN_HOPS if hops is None else hops
+        max_users = max_users or settings.GNN_MAX_NODES
+        identifiers = list(identifiers)
+        with self._lock:
+            u, idents = self._seed(user_id, identifiers)
+            # Breadth-first over users; node 0 is the uploader even if not in the graph yet
+            order: List[Optional[int]] = [u]
+            profile = {u: self._shared(u, idents, self.hub_degree)}
+            frontier = deque([(u, 0)])
+            while frontier and len(order) < max_users:
+                node, depth = frontier.popleft()
+                if depth >= hops:
+                    continue
+                shared = profile[node][0]
+                for edge in EDGE_WEIGHTS:  # dict order = descending weight
+                    for w in sorted(shared[edge]):
+                        if w in profile or len(order) >= max_users:
+                            continue
+                        order.append(w)
+                        profile[w] = self._shared(w, self._neighbors(w), self.hub_degree)
+                        frontier.append((w, depth + 1))
+
+            pos = {node: i for i, node in enumerate(order)}
+            pairs = set()
+            for node in order:
+                for w in set().union(*profile[node][0].values()):
+                    if w in pos and pos[w] != pos[node]:
+                        pairs.add((min(pos[node], pos[w]), max(pos[node], pos[w])))
+            pairs = sorted(pairs)
+            src = [a for a, _ in pairs] + [b for _, b in pairs]
+            dst = [b for _, b in pairs] + [a for a, _ in pairs]
+            if not src:
+                src, dst = [0], [0]  # single node, self loop
+            return {
+                "users": [str(user_id)] + [self._keys[w][5:] for w in order[1:]],
+                "x": [self._features(*profile[node]) for node in order],
+                "edge_index": [src, dst],
+                "hops": hops,
+            }
+
+    # ---------- persistence ----------
+    def save(self, path: str):
+        with self._lock:
+            self._merge_delta()
+            keys = np.array(self._keys, dtype=str)
+            types = np.frombuffer(bytes(self._types), np.int8)
+            indptr, indices, documents = self._indptr.copy(), self._indices.copy(), self._documents
+            self._dirty = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, keys=keys, types=types, indptr=indptr, indices=indices, documents=np.int64(documents))
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> bool:
+        try:
+            with np.load(path) as data:
+                keys, types = data["keys"].tolist(), data["types"].tobytes()
+                indptr, indices, documents = data["indptr"], data["indices"], int(data["documents"])
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"⚠️ Identity graph snapshot unreadable ({e}); will rebuild")
+            return False
+        with self._lock:
+            self._keys, self._types = keys, bytearray(types)
+            self._ids = {k: i for i, k in enumerate(keys)}
+            self._indptr, self._indices = indptr.astype(np.int64), indices.astype(np.int32)
+            self._delta, self._delta_edges = {}, 0
+            self._documents, self._dirty = documents, 0
+        return True
+
+    def rebuild_from_mongo(self, collection) -> int:
+        """Replace the graph with the identifiers of every stored document."""
+        fresh = IdentityGraph(self.merge_limit, self.hub_degree)
+        projection = {"userId": 1, "userEmail": 1, "parsed.aadhaarNumber": 1, "parsed.panNumber": 1,
+                      "parsed.dlNumber": 1, "deviceInfo.hash": 1}
+        for d in collection.find({}, projection):
+            if d.get("userId") in (None, ""):
+                continue  # ownerless documents would all link through one "" user
+            fresh._link(str(d["userId"]), document_identifiers(d.get("parsed"), d.get("deviceInfo"),
+                                                               d.get("userEmail")))
+            fresh._documents += 1
+        fresh._merge_delta()
+        with self._lock:
+            self.__dict__.update({k: v for k, v in fresh.__dict__.items() if k != "_lock"})
+            self._dirty = self._documents
+        return self._documents
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = np.bincount(np.frombuffer(bytes(self._types), np.int8), minlength=len(NODE_TYPES))
+            return {
+                "documents": self._documents,
+                "nodes": {t: int(c) for t, c in zip(NODE_TYPES, counts)},
+                "edges": len(self._indices) // 2 + self._delta_edges,
+                "deltaEdges": self._delta_edges,
+                "unsaved": self._dirty,
+            }
+
+
+identity_graph = IdentityGraph()
+
+
+def _graph_path() -> str:
+    return settings.IDENTITY_GRAPH_PATH or os.path.join(settings.UPLOAD_DIR, ".identity_graph.npz")
+
+
+def load_or_rebuild_graph() -> int:
+    """Startup: load the snapshot, or rebuild the graph from Mongo if it is missing or stale."""
+    from .db import documents_collection
+    t0 = time.perf_counter()
+    path = _graph_path()
+    try:
+        expected = documents_collection.count_documents({"userId": {"$nin": [None, ""]}})
+    except Exception as e:
+        print(f"⚠️ Identity graph: cannot count documents ({e})")
+        expected = None
+    if identity_graph.load(path) and expected in (None, identity_graph.stats()["documents"]):
+        source = "disk"
+    else:
+        try:
+            identity_graph.rebuild_from_mongo(documents_collection)
+        except Exception as e:
+            print(f"⚠️ Identity graph rebuild failed: {e}")
+            return 0
+        identity_graph.save(path)
+        source = "mongo"
+    ms = round((time.perf_counter() - t0) * 1000, 1)
+    print(f"✅ Identity graph ready: {len(identity_graph)} nodes from {source} ({ms} ms)")
+    return len(identity_graph)
+
+
+def save_graph():
+    if identity_graph.stats()["unsaved"]:
+        try:
+            identity_graph.save(_graph_path())
+        except Exception as e:
+            print(f"⚠️ Identity graph save failed: {e}")
+
+
+def record_identities(user_id: str, identifiers: Iterable[Tuple[str, str]]):
+    """Link a stored document into the graph; snapshots every IDENTITY_GRAPH_SAVE_EVERY documents."""
+    identity_graph.add_document(user_id, identifiers)
+    if identity_graph.stats()["unsaved"] >= settings.IDENTITY_GRAPH_SAVE_EVERY:
+        save_graph()
@@ -0,0 +1,184 @@
+import io
+import mmap
+import hashlib
+import numpy as np
+from functools import cached_property
+from typing import Any, Dict, List, Optional, Tuple, Union
+from PIL import Image
+
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+# ============================================
+# Decode-once image context
+# ============================================
+# One upload used to be decoded from bytes by OCR preprocessing, the EXIF
+# check, the blur and crop metrics and the CNN. A DecodedImage is built once
+# per document and handed to every stage. Each view is computed on first
+# access and then shared:
+#   bgr      full-resolution BGR array (cv2.imdecode)
+#   gray     grayscale of bgr
+#   pyramid  bgr halved repeatedly (cv2.pyrDown) down to PYRAMID_MIN_SIDE
+#            (gray_pyramid: the same for the grayscale view)
+#   exif     EXIF tags, read from the header without decoding pixels
+#   sha256   hex digest of the bytes (stage-cache key, duplicate hash)
+#
+# `data` is bytes or any read-only buffer: large uploads ingested by ingest.py
+# arrive as a memoryview over an mmap of their named spool file, with the
+# digest computed while streaming. open() gives PIL a file object over the
+# buffer without copying it.
+#
+# When a stage runs in another process (the OCR worker pool) only the digest
+# and the content are pickled, never the decoded arrays. An image over a
+# named spool file (`source`, see ingest.SpoolFile) ships just the path and
+# the worker maps the same file; anything else ships its bytes. The image
+# holds `source`, so the file outlives every image taken from it.
+
+PYRAMID_MIN_SIDE = 64
+
+
+class _BufferReader(io.RawIOBase):
+    """Seekable read-only file object over a bytes-like buffer (no copy)."""
+
+    def __init__(self, buf):
+        self._buf = memoryview(buf).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), len(self._buf) - self._pos))
+        b[:n] = self._buf[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._buf)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        self._buf.release()
+        super().close()
+
+
+def open_buffer(data) -> io.BufferedReader:
+    """File object over bytes / memoryview / mmap for readers that want a stream."""
+    return io.BufferedReader(_BufferReader(data))
+
+
+class DecodedImage:
+    def __init__(self, data: Union[bytes, memoryview], sha256: Optional[str] = None, source: Any = None):
+        self.data = data
+        self.sha256 = sha256 or hashlib.sha256(data).hexdigest()
+        self.source = source  # owner of `data` with a .path (a spool file), kept alive with the image
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DecodedImage":
+        return cls(data)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Ship the spool file's name, or the bytes; never the decoded arrays
+        path = getattr(self.source, "path", None)
+        if path:
+            return {"path": path, "size": len(self.data), "sha256": self.sha256}
+        return {"data": bytes(self.data), "sha256": self.sha256}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.sha256 = state["sha256"]
+        self.source = None
+        if "path" in state:
+            with open(state["path"], "rb") as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # The view keeps the mapping open for as long as this image lives
+            self.data = memoryview(mapping)[:state["size"]]
+        else:
+            self.data = state["data"]
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @cached_property
+    def bgr(self) -> Optional[np.ndarray]:
+        """Decoded BGR image, or None for PDFs / undecodable bytes."""
+        if cv2 is None or not self.data:
+            return None
+        try:
+            return cv2.imdecode(np.frombuffer(self.data, np.uint8), cv2.IMREAD_COLOR)
+        except Exception:
+            return None
+
+    @cached_property
+    def gray(self) -> Optional[np.ndarray]:
+        if self.bgr is None:
+            return None
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+
+    @cached_property
+    def pyramid(self) -> List[np.ndarray]:
+        """[bgr, bgr/2, bgr/4, ...] while the short side stays >= PYRAMID_MIN_SIDE."""
+        if self.bgr is None:
+            return []
+        levels = [self.bgr]
+        while min(levels[-1].shape[:2]) // 2 >= PYRAMID_MIN_SIDE:
+            levels.append(cv2.pyrDown(levels[-1]))
+        return levels
+
+    @cached_property
+    def gray_pyramid(self) -> List[np.ndarray]:
+        """Grayscale pyramid [gray, gray/2, ...], built the same way as `pyramid`."""
+        if self.gray is None:
+            return []
+        levels = [self.gray]
+        while min(levels[-1].shape[:2]) // 2 >= PYRAMID_MIN_SIDE:
+            levels.append(cv2.pyrDown(levels[-1]))
+        return levels
+
+    def gray_level(self, max_side: int) -> Tuple[Optional[np.ndarray], int]:
+        """(first gray level whose long side is <= max_side, number of halvings)."""
+        for k, level in enumerate(self.gray_pyramid):
+            if max(level.shape[:2]) <= max_side:
+                return level, k
+        levels = self.gray_pyramid
+        return (levels[-1], len(levels) - 1) if levels else (None, 0)
+
+    def level_for(self, min_side: int) -> Optional[np.ndarray]:
+        """Smallest pyramid level whose short side is still >= min_side."""
+        best = None
+        for level in self.pyramid:
+            if min(level.shape[:2]) < min_side:
+                break
+            best = level
+        return best if best is not None else self.bgr
+
+    def open(self) -> io.BufferedReader:
+        """File object over the raw bytes (for PIL) that does not copy them."""
+        return open_buffer(self.data)
+
+    @cached_property
+    def exif(self) -> Optional[Dict[int, Any]]:
+        """EXIF tags (None if absent or the bytes are not an image PIL can open)."""
+        try:
+            with self.open() as f:
+                img = Image.open(f)
+                return getattr(img, "_getexif", lambda: None)() or None
+        except Exception:
+            return None
+
+
+def as_decoded(image: Union[bytes, DecodedImage]) -> DecodedImage:
+    """Accept raw bytes or an existing context (stages keep their bytes-based signatures)."""
+    return image if isinstance(image, DecodedImage) else DecodedImage(image)
+
+
+def raw_bytes(image: Union[bytes, DecodedImage]) -> bytes:
+    return image.data if isinstance(image, DecodedImage) else image
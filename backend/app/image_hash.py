@@ -0,0 +1,299 @@
+import os
+import threading
+import time
+import numpy as np
+from itertools import combinations
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from .config import settings
+from .image_context import DecodedImage, as_decoded
+
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+# ============================================
+# Perceptual hashes + near-duplicate index
+# ============================================
+# fileHash (SHA-256) only catches byte-identical uploads. A re-saved, resized
+# or re-compressed copy of the same card keeps almost the same 64-bit pHash
+# (low DCT frequencies) and 256-bit dHash (16x16 horizontal gradients), so
+# both are stored with every document and indexed for Hamming-distance
+# search. The pHash finds candidates. On its own it mostly encodes the card
+# layout, so two different cards of the same type can sit a few bits apart.
+# The finer dHash confirms the match: copies differ by a handful of its 256
+# bits, while distinct cards differ by 30 or more.
+#
+# The index is multi-index hashing: the pHash is split into four 16-bit
+# chunks, each kept as a sorted array. If two hashes differ in at most r
+# bits, one chunk differs in at most r // 4 bits (pigeonhole), so a query
+# only probes the few chunk values within that radius with searchsorted and
+# verifies the candidates with a vectorised popcount. New rows go to a small
+# unsorted tail that is scanned directly and merged into the sorted arrays
+# once it grows.
+
+_CHUNKS = 4
+_CHUNK_BITS = 16
+_HASH_SIZE = 8          # 8x8 = 64-bit pHash
+_DHASH_SIZE = 16        # 16x16 = 256-bit dHash
+_DHASH_WORDS = _DHASH_SIZE * _DHASH_SIZE // 64
+_PHASH_DCT_SIZE = 32
+_THUMB_SOURCE_SIDE = 256  # pyramid level the thumbnails are resized from
+
+
+# ---------- hashing ----------
+def _bits_to_hex(bits: np.ndarray) -> str:
+    return np.packbits(bits.astype(np.uint8).ravel()).tobytes().hex()
+
+
+def _dhash_words(hex_value: str) -> np.ndarray:
+    return np.frombuffer(bytes.fromhex(hex_value), ">u8").astype(np.uint64)
+
+
+def perceptual_hashes(image: Union[bytes, DecodedImage]) -> Optional[Dict[str, str]]:
+    """{"phash": 16 hex chars, "dhash": 64 hex chars}, or None if the bytes are not an image."""
+    if cv2 is None:
+        return None
+    image = as_decoded(image)
+    # A small pyramid level is plenty for a 32x32 thumbnail and avoids resizing 12 MP
+    gray, _ = image.gray_level(_THUMB_SOURCE_SIDE)
+    if gray is None:
+        return None
+
+    thumb = cv2.resize(gray, (_PHASH_DCT_SIZE, _PHASH_DCT_SIZE), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(np.float32(thumb))[:_HASH_SIZE, :_HASH_SIZE]
+    phash = _bits_to_hex(low > np.median(low.ravel()[1:]))  # DC term excluded from the median
+
+    small = cv2.resize(gray, (_DHASH_SIZE + 1, _DHASH_SIZE), interpolation=cv2.INTER_AREA).astype(np.int16)
+    dhash = _bits_to_hex(small[:, 1:] > small[:, :-1])
+    return {"phash": phash, "dhash": dhash}
+
+
+def hamming(a: Union[str, int], b: Union[str, int]) -> int:
+    a = int(a, 16) if isinstance(a, str) else a
+    b = int(b, 16) if isinstance(b, str) else b
+    return (a ^ b).bit_count()
+
+
+if hasattr(np, "bitwise_count"):
+    def _popcount(x: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(x)
+else:
+    _BYTE_POP = np.array([bin(i).count("1") for i in range(256)], np.uint8)
+
+    def _popcount(x: np.ndarray) -> np.ndarray:
+        x = np.ascontiguousarray(x)
+        return _BYTE_POP[x.view(np.uint8)].reshape(*x.shape, 8).sum(axis=-1)
+
+
+_FLIP_MASKS: Dict[int, np.ndarray] = {}
+
+
+def _flip_masks(radius: int) -> np.ndarray:
+    """XOR masks of every 16-bit pattern with at most `radius` set bits."""
+    if radius not in _FLIP_MASKS:
+        masks = [0]
+        for r in range(1, radius + 1):
+            masks += [sum(1 << b for b in bits) for bits in combinations(range(_CHUNK_BITS), r)]
+        _FLIP_MASKS[radius] = np.array(masks, np.uint16)
+    return _FLIP_MASKS[radius]
+
+
+# ---------- index ----------
+class HashIndex:
+    def __init__(self, max_distance: int = 6, dhash_max_distance: int = 16, tail_limit: int = 4096):
+        self.max_distance = max_distance
+        self.dhash_max_distance = dhash_max_distance
+        self.tail_limit = tail_limit
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._phash = np.zeros(0, np.uint64)
+        self._dhash = np.zeros((0, _DHASH_WORDS), np.uint64)
+        self._sorted_n = 0                        # rows [0, _sorted_n) are in the chunk arrays
+        self._chunk_values: List[np.ndarray] = [np.zeros(0, np.uint16) for _ in range(_CHUNKS)]
+        self._chunk_rows: List[np.ndarray] = [np.zeros(0, np.int64) for _ in range(_CHUNKS)]
+        self._dirty = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @staticmethod
+    def _chunks(values: np.ndarray) -> List[np.ndarray]:
+        return [((values >> np.uint64(_CHUNK_BITS * j)) & np.uint64(0xFFFF)).astype(np.uint16) for j in range(_CHUNKS)]
+
+    def _merge_tail(self):
+        """Re-sort every row into the chunk arrays (amortised: the tail grows with the index)."""
+        n = len(self._ids)
+        for j, chunk in enumerate(self._chunks(self._phash[:n])):
+            order = np.argsort(chunk, kind="stable")
+            self._chunk_values[j] = chunk[order]
+            self._chunk_rows[j] = order
+        self._sorted_n = len(self._ids)
+
+    # ---------- writes ----------
+    def add(self, document_id: str, hashes: Optional[Dict[str, str]]):
+        if not hashes or not document_id:
+            return
+        self.add_many([(document_id, hashes["phash"], hashes["dhash"])])
+
+    def add_many(self, rows: Iterable[Tuple[str, str, str]]):
+        rows = list(rows)
+        if not rows:
+            return
+        ids = [str(r[0]) for r in rows]
+        ph = np.array([int(r[1], 16) for r in rows], np.uint64)
+        dh = np.stack([_dhash_words(r[2]) for r in rows])
+        with self._lock:
+            n = len(self._ids)
+            if n + len(ids) > len(self._phash):
+                # Grow the hash arrays geometrically so single adds stay O(1) amortised
+                cap = max(1024, 2 * (n + len(ids)))
+                self._phash = np.concatenate([self._phash[:n], np.zeros(cap - n, np.uint64)])
+                self._dhash = np.concatenate([self._dhash[:n], np.zeros((cap - n, _DHASH_WORDS), np.uint64)])
+            self._phash[n:n + len(ids)] = ph
+            self._dhash[n:n + len(ids)] = dh
+            self._ids.extend(ids)
+            self._dirty += len(rows)
+            if len(self._ids) - self._sorted_n > max(self.tail_limit, self._sorted_n // 16):
+                self._merge_tail()
+
+    # ---------- reads ----------
+    def _candidates(self, phash: int, radius: int) -> np.ndarray:
+        masks = _flip_masks(radius // _CHUNKS)
+        rows = [np.arange(self._sorted_n, len(self._ids))]  # unsorted tail: scanned directly
+        if self._sorted_n:
+            for j in range(_CHUNKS):
+                probes = np.uint16((phash >> (_CHUNK_BITS * j)) & 0xFFFF) ^ masks
+                lo = np.searchsorted(self._chunk_values[j], probes, "left")
+                hi = np.searchsorted(self._chunk_values[j], probes, "right")
+                counts = hi - lo
+                total = int(counts.sum())
+                if total:
+                    # Concatenate the ranges [lo, hi) without a Python loop
+                    starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+                    rows.append(self._chunk_rows[j][starts + np.arange(total)])
+        # A row can come back from several chunks; duplicates are harmless for the argmin
+        return np.concatenate(rows)
+
+    def query(self, hashes: Optional[Dict[str, str]], exclude: Optional[str] = None,
+              max_distance: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Closest indexed document within max_distance pHash bits (and the dHash bound), or None."""
+        if not hashes:
+            return None
+        radius = self.max_distance if max_distance is None else max_distance
+        ph, dh = int(hashes["phash"], 16), _dhash_words(hashes["dhash"])
+        with self._lock:
+            if not self._ids:
+                return None
+            rows = self._candidates(ph, radius)
+            if not len(rows):
+                return None
+            pd = _popcount(self._phash[rows] ^ np.uint64(ph)).astype(np.int32)
+            dd = _popcount(self._dhash[rows] ^ dh).sum(axis=1).astype(np.int32)
+            ok = (pd <= radius) & (dd <= self.dhash_max_distance)
+            if exclude is not None:
+                for i in np.flatnonzero(ok):
+                    ok[i] = self._ids[rows[i]] != exclude
+            if not ok.any():
+                return None
+            best = np.flatnonzero(ok)[np.argmin((pd + dd)[ok])]
+            return {"documentId": self._ids[rows[best]], "phashDistance": int(pd[best]),
+                    "dhashDistance": int(dd[best])}
+
+    # ---------- persistence ----------
+    def save(self, path: str):
+        with self._lock:
+            n = len(self._ids)
+            ids = np.array(self._ids, dtype=str)
+            ph, dh = self._phash[:n].copy(), self._dhash[:n].copy()
+            self._dirty = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, ids=ids, phash=ph, dhash=dh)
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> bool:
+        try:
+            with np.load(path) as data:
+                ids, ph, dh = data["ids"].tolist(), data["phash"], data["dhash"]
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"⚠️ Image hash index unreadable ({e}); will rebuild")
+            return False
+        with self._lock:
+            self._ids, self._phash, self._dhash = ids, ph.astype(np.uint64), dh.astype(np.uint64).reshape(-1, _DHASH_WORDS)
+            self._merge_tail()
+            self._dirty = 0
+        return True
+
+    def rebuild_from_mongo(self, collection) -> int:
+        """Replace the index with every document that has an imageHash."""
+        rows = [
+            (str(d["_id"]), d["imageHash"]["phash"], d["imageHash"]["dhash"])
+            for d in collection.find({"imageHash.phash": {"$exists": True}}, {"imageHash": 1})
+            if d.get("imageHash", {}).get("dhash")
+        ]
+        fresh = HashIndex(self.max_distance, self.dhash_max_distance, self.tail_limit)
+        fresh.add_many(rows)
+        with fresh._lock:
+            fresh._merge_tail()
+        with self._lock:
+            self._ids, self._phash, self._dhash = fresh._ids, fresh._phash, fresh._dhash
+            self._chunk_values, self._chunk_rows = fresh._chunk_values, fresh._chunk_rows
+            self._sorted_n = fresh._sorted_n
+            self._dirty = len(rows)
+        return len(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"documents": len(self._ids), "sorted": self._sorted_n, "unsaved": self._dirty}
+
+
+image_hash_index = HashIndex(
+    max_distance=settings.PHASH_MAX_DISTANCE,
+    dhash_max_distance=settings.DHASH_MAX_DISTANCE,
+)
+
+
+def _index_path() -> str:
+    return settings.PHASH_INDEX_PATH or os.path.join(settings.UPLOAD_DIR, ".image_hash_index.npz")
+
+
+def load_or_rebuild_index() -> int:
+    """Startup: load the persisted index, or rebuild it from Mongo if it is missing or stale."""
+    from .db import documents_collection
+    t0 = time.perf_counter()
+    path = _index_path()
+    try:
+        expected = documents_collection.count_documents({"imageHash.phash": {"$exists": True}})
+    except Exception as e:
+        print(f"⚠️ Image hash index: cannot count documents ({e})")
+        expected = None
+    if image_hash_index.load(path) and expected in (None, len(image_hash_index)):
+        source = "disk"
+    else:
+        try:
+            image_hash_index.rebuild_from_mongo(documents_collection)
+        except Exception as e:
+            print(f"⚠️ Image hash index rebuild failed: {e}")
+            return 0
+        image_hash_index.save(path)
+        source = "mongo"
+    ms = round((time.perf_counter() - t0) * 1000, 1)
+    print(f"✅ Image hash index ready: {len(image_hash_index)} documents from {source} ({ms} ms)")
+    return len(image_hash_index)
+
+
+def save_index():
+    if image_hash_index.stats()["unsaved"]:
+        try:
+            image_hash_index.save(_index_path())
+        except Exception as e:
+            print(f"⚠️ Image hash index save failed: {e}")
+
+
+def record_document(document_id: str, hashes: Optional[Dict[str, str]]):
+    """Add a stored document to the index; persists every PHASH_INDEX_SAVE_EVERY additions."""
+    image_hash_index.add(document_id, hashes)
+    if image_hash_index.stats()["unsaved"] >= settings.PHASH_INDEX_SAVE_EVERY:
+        save_index()
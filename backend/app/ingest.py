@@ -0,0 +1,224 @@
+import os
+import mmap
+import shutil
+import hashlib
+import tempfile
+import weakref
+from typing import Any, Dict, FrozenSet, Optional, Union
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from .config import settings
+from .image_context import DecodedImage, open_buffer
+
+# ============================================
+# Streaming upload ingestion
+# ============================================
+# Routes used to do `content = await file.read()`, which holds the whole
+# upload in memory, and fraud analysis then hashed those bytes again.
+#
+# Starlette's multipart parser already streams each file part into a
+# SpooledTemporaryFile (in memory up to 1 MB, then on disk). ingest_upload()
+# reads that spool in UPLOAD_CHUNK_BYTES chunks and, in the same pass:
+# - sniffs the format from the magic bytes of the first chunk (415 if the
+#   route does not accept it),
+# - stops with 413 as soon as MAX_UPLOAD_BYTES is crossed,
+# - updates a SHA-256 digest.
+# Uploads up to UPLOAD_INMEMORY_BYTES are then kept as bytes. Larger ones are
+# copied (chunk by chunk) to a named spool file in UPLOAD_SPOOL_DIR and
+# mmapped, so downstream stages get a memoryview backed by the page cache
+# instead of a private copy, and per-upload RSS no longer grows with the file
+# size. The name is what crosses into the OCR worker pool: the worker maps
+# the same file instead of receiving a pickled copy of the bytes.
+#
+# Every DecodedImage over a spool file gets its own view and holds the
+# SpoolFile, so IngestedUpload.close() never invalidates an image that is
+# still in use. The mapping is closed and the file removed once the upload
+# and the last image over it are gone.
+#
+# UploadSizeLimitMiddleware rejects multipart requests whose Content-Length
+# is above MAX_REQUEST_BYTES before any of the body is read.
+
+# (kind, offset, magic)
+_SIGNATURES = (
+    ("jpeg", 0, b"\xff\xd8\xff"),
+    ("png", 0, b"\x89PNG\r\n\x1a\n"),
+    ("pdf", 0, b"%PDF-"),
+    ("tiff", 0, b"II*\x00"),
+    ("tiff", 0, b"MM\x00*"),
+    ("bmp", 0, b"BM"),
+    ("webp", 8, b"WEBP"),
+    ("zip", 0, b"PK\x03\x04"),                        # .xlsx
+    ("ole", 0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"),  # legacy .xls
+)
+
+DOCUMENT_KINDS: FrozenSet[str] = frozenset({"jpeg", "png", "pdf", "tiff", "bmp", "webp"})
+SPREADSHEET_KINDS: FrozenSet[str] = frozenset({"zip", "ole", "text"})
+
+
+def sniff_kind(head: bytes) -> Optional[str]:
+    """File kind from its first bytes; "text" for NUL-free UTF-8 (CSV), None if unknown."""
+    for kind, offset, magic in _SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            if kind == "webp" and head[:4] != b"RIFF":
+                continue
+            return kind
+    if head and b"\x00" not in head:
+        try:
+            # A chunk boundary may split a multi-byte character
+            head.decode("utf-8")
+            return "text"
+        except UnicodeDecodeError as e:
+            if e.start >= len(head) - 3:
+                return "text"
+    return None
+
+
+def _remove_spool(mapping: mmap.mmap, path: str):
+    try:
+        mapping.close()
+    except BufferError:
+        pass  # a stray view outlived its image; the mapping goes when it is collected
+    try:
+        os.remove(path)
+    except OSError:
+        pass  # Windows: a worker still maps it; left for the temp dir cleanup
+
+
+class SpoolFile:
+    """A named upload spool file, mapped read-only. Removed when the last reference goes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        weakref.finalize(self, _remove_spool, self.mapping, path)
+
+    def view(self) -> memoryview:
+        return memoryview(self.mapping)
+
+
+class IngestedUpload:
+    """
+    One streamed upload: filename, sniffed kind, size, SHA-256 and the
+    content as bytes (small files) or a memoryview over a mapped spool file
+    (large files). Call close() (or use it as a context manager) once the
+    pipeline is done; images taken from it stay valid after that.
+    """
+
+    def __init__(self, filename: Optional[str], kind: str, size: int, sha256: str,
+                 data: Union[bytes, memoryview], spool: Optional[SpoolFile] = None):
+        self.filename = filename
+        self.kind = kind
+        self.size = size
+        self.sha256 = sha256
+        self.data = data
+        self._spool = spool
+
+    @property
+    def mapped(self) -> bool:
+        return self._spool is not None
+
+    def image(self) -> DecodedImage:
+        """Decode-once context for the pipeline; the digest is reused, not recomputed."""
+        if self._spool is None:
+            return DecodedImage(self.data, sha256=self.sha256)
+        return DecodedImage(self._spool.view(), sha256=self.sha256, source=self._spool)
+
+    def open(self):
+        """Readable file object over the content (openpyxl, csv), without copying it."""
+        return open_buffer(self.data)
+
+    def close(self):
+        if self._spool is None:
+            return
+        # Only this upload's own view; images hold theirs and the SpoolFile
+        if isinstance(self.data, memoryview):
+            self.data.release()
+        self._spool = None
+
+    def __enter__(self) -> "IngestedUpload":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def describe(self) -> Dict[str, Any]:
+        return {"filename": self.filename, "kind": self.kind, "size": self.size,
+                "sha256": self.sha256, "mapped": self.mapped}
+
+
+def _too_large(limit: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File too large (limit {limit // (1024 * 1024)} MB)")
+
+
+def _materialize(spool, size: int):
+    """Small uploads -> bytes; larger ones -> a named spool file, mapped read-only."""
+    spool.seek(0)
+    if size <= settings.UPLOAD_INMEMORY_BYTES:
+        return spool.read(), None
+    # Starlette's spool file has no name, so it is copied to one workers can open
+    fd, path = tempfile.mkstemp(prefix="kyc-upload-", dir=settings.UPLOAD_SPOOL_DIR or None)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(spool, f, settings.UPLOAD_CHUNK_BYTES)
+        named = SpoolFile(path)
+    except Exception:
+        os.remove(path)
+        raise
+    return named.view(), named
+
+
+async def ingest_upload(file: UploadFile, kinds: FrozenSet[str] = DOCUMENT_KINDS,
+                        max_bytes: Optional[int] = None) -> IngestedUpload:
+    """
+    Stream an UploadFile: sniff its kind, enforce the size limit and hash it
+    chunk by chunk. Raises HTTPException 400 (empty), 413 (too large) or
+    415 (kind not in `kinds`).
+    """
+    max_bytes = max_bytes or settings.MAX_UPLOAD_BYTES
+    # The parser records the part size; reject before reading anything
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+
+    await file.seek(0)
+    digest = hashlib.sha256()
+    kind, size = None, 0
+    while True:
+        chunk = await file.read(settings.UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        if kind is None:
+            kind = sniff_kind(chunk[:64])
+            if kind not in kinds:
+                raise HTTPException(status_code=415, detail=f"Unsupported file type ({kind or 'unknown'})")
+        size += len(chunk)
+        if size > max_bytes:
+            raise _too_large(max_bytes)
+        digest.update(chunk)
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Empty file")
+
+    data, spool = await run_in_threadpool(_materialize, file.file, size)
+    return IngestedUpload(file.filename, kind, size, digest.hexdigest(), data, spool)
+
+
+class UploadSizeLimitMiddleware:
+    """Reject multipart requests above MAX_REQUEST_BYTES from their Content-Length header."""
+
+    def __init__(self, app, max_bytes: Optional[int] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            headers = dict(scope.get("headers") or [])
+            content_type = headers.get(b"content-type", b"")
+            length = headers.get(b"content-length")
+            limit = self.max_bytes or settings.MAX_REQUEST_BYTES
+            if content_type.startswith(b"multipart/") and length and length.isdigit() and int(length) > limit:
+                response = JSONResponse(status_code=413, content={
+                    "detail": f"Request too large (limit {limit // (1024 * 1024)} MB)"})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,179 @@
+import re
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+# ============================================
+# Card layout templates for region-of-interest OCR
+# ============================================
+# Boxes are (x0, y0, x1, y1) normalised to the card after perspective
+# correction, so they do not depend on the upload resolution. Only single-line
+# fields are listed: each crop is recognised as one text line without running
+# the text detector.
+
+ID1_ASPECT = 85.6 / 54.0   # ISO/IEC 7810 ID-1 (Aadhaar PVC, PAN, smart-card DL)
+CANONICAL_WIDTH = 1000
+# Issuer banner, read first to choose the template
+HEADER_BOX = (0.0, 0.0, 1.0, 0.22)
+
+LAYOUTS: Dict[str, Dict] = {
+    "Aadhaar": {
+        "aspect": ID1_ASPECT,
+        "header": HEADER_BOX,
+        "fields": {
+            "name": (0.28, 0.24, 0.98, 0.38),
+            "dob": (0.28, 0.36, 0.98, 0.49),
+            "gender": (0.28, 0.47, 0.98, 0.60),
+            "aadhaarNumber": (0.15, 0.70, 0.85, 0.88),
+        },
+        "required": "aadhaarNumber",
+    },
+    "PAN": {
+        "aspect": ID1_ASPECT,
+        "header": HEADER_BOX,
+        "fields": {
+            "panNumber": (0.02, 0.28, 0.60, 0.42),
+            "name": (0.02, 0.42, 0.75, 0.55),
+            "fatherName": (0.02, 0.55, 0.75, 0.68),
+            "dob": (0.02, 0.68, 0.60, 0.82),
+        },
+        "required": "panNumber",
+    },
+    "DrivingLicence": {
+        "aspect": ID1_ASPECT,
+        "header": HEADER_BOX,
+        "fields": {
+            "dlNumber": (0.02, 0.22, 0.75, 0.34),
+            "name": (0.25, 0.34, 0.98, 0.46),
+            "dob": (0.25, 0.46, 0.98, 0.57),
+            "validUntil": (0.25, 0.57, 0.98, 0.68),
+        },
+        "required": "dlNumber",
+    },
+}
+
+# Header keywords used to pick a template before any field is read
+_HEADER_KEYWORDS: List[Tuple[str, Tuple[str, ...]]] = [
+    ("PAN", ("INCOME TAX", "PERMANENT ACCOUNT", "आयकर")),
+    ("DrivingLicence", ("DRIVING", "LICENCE", "LICENSE", "UNION OF INDIA", "TRANSPORT")),
+    ("Aadhaar", ("AADHAAR", "UIDAI", "UNIQUE IDENTIFICATION", "आधार", "GOVERNMENT OF INDIA", "भारत सरकार")),
+]
+
+_REQUIRED_FORMATS = {
+    "aadhaarNumber": re.compile(r"^\d{12}$"),
+    "panNumber": re.compile(r"^[A-Z]{5}\d{4}[A-Z]$"),
+    "dlNumber": re.compile(r"^(?:[A-Z]{2}\d{11,16}|\d{1,4}/\d{3,6}/\d{2,4})$"),
+}
+
+
+def classify_header(text: str) -> Optional[str]:
+    upper = (text or "").upper()
+    for doc_type, keywords in _HEADER_KEYWORDS:
+        if any(kw in upper for kw in keywords):
+            return doc_type
+    return None
+
+
+def _order_corners(pts: np.ndarray) -> np.ndarray:
+    """Order 4 points as top-left, top-right, bottom-right, bottom-left."""
+    pts = pts.reshape(4, 2).astype(np.float32)
+    s = pts.sum(axis=1)
+    d = np.diff(pts, axis=1).ravel()
+    return np.array([pts[np.argmin(s)], pts[np.argmin(d)], pts[np.argmax(s)], pts[np.argmax(d)]], np.float32)
+
+
+def detect_card(img: np.ndarray, min_area_frac: float = 0.25, aspect_tol: float = 0.25) -> Optional[np.ndarray]:
+    """
+    Find the ID card boundary and return a perspective-corrected card image
+    (CANONICAL_WIDTH wide, ID-1 aspect). If no card-shaped quadrilateral is
+    found, the image is accepted as an already-cropped card when its own
+    aspect ratio is close to ID-1. Returns None when alignment fails.
+    """
+    if cv2 is None or img is None:
+        return None
+    h, w = img.shape[:2]
+    out_w, out_h = CANONICAL_WIDTH, int(round(CANONICAL_WIDTH / ID1_ASPECT))
+
+    # Contour search on a small copy; corners are scaled back afterwards
+    scale = min(1.0, 800.0 / max(h, w))
+    small = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else img
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, None, iterations=2)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    small_area = float(gray.shape[0] * gray.shape[1])
+    for c in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        if cv2.contourArea(c) < min_area_frac * small_area:
+            break
+        approx = cv2.approxPolyDP(c, 0.02 * cv2.arcLength(c, True), True)
+        if len(approx) != 4:
+            continue
+        quad = _order_corners(approx) / scale
+        qw = (np.linalg.norm(quad[1] - quad[0]) + np.linalg.norm(quad[2] - quad[3])) / 2
+        qh = (np.linalg.norm(quad[3] - quad[0]) + np.linalg.norm(quad[2] - quad[1])) / 2
+        if qh == 0 or abs(qw / qh - ID1_ASPECT) > aspect_tol * ID1_ASPECT:
+            continue
+        dst = np.array([[0, 0], [out_w - 1, 0], [out_w - 1, out_h - 1], [0, out_h - 1]], np.float32)
+        return cv2.warpPerspective(img, cv2.getPerspectiveTransform(quad, dst), (out_w, out_h))
+
+    if abs((w / float(h)) - ID1_ASPECT) <= aspect_tol * ID1_ASPECT:
+        return cv2.resize(img, (out_w, out_h), interpolation=cv2.INTER_AREA if w > out_w else cv2.INTER_CUBIC)
+    return None
+
+
+def crop_box(card: np.ndarray, box: Tuple[float, float, float, float]) -> np.ndarray:
+    h, w = card.shape[:2]
+    x0, y0, x1, y1 = box
+    crop = card[int(y0 * h):int(y1 * h), int(x0 * w):int(x1 * w)]
+    return cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+
+
+def field_crops(card: np.ndarray, doc_type: str) -> Dict[str, np.ndarray]:
+    return {name: crop_box(card, box) for name, box in LAYOUTS[doc_type]["fields"].items()}
+
+
+def roi_pixels(card: np.ndarray, doc_type: str) -> int:
+    """Pixels actually recognised in ROI mode (header strip + field boxes)."""
+    h, w = card.shape[:2]
+    boxes = [LAYOUTS[doc_type]["header"]] + list(LAYOUTS[doc_type]["fields"].values())
+    return sum(int((y1 - y0) * h) * int((x1 - x0) * w) for x0, y0, x1, y1 in boxes)
+
+
+def _clean_field(field: str, text: str) -> str:
+    text = (text or "").strip()
+    if field in ("aadhaarNumber", "panNumber"):
+        return re.sub(r"[^A-Za-z0-9]", "", text).upper()
+    if field == "dlNumber":
+        return re.sub(r"[^A-Za-z0-9/]", "", text).upper()
+    return text
+
+
+def required_field_ok(doc_type: str, field_texts: Dict[str, str]) -> bool:
+    field = LAYOUTS[doc_type]["required"]
+    value = _clean_field(field, field_texts.get(field, ""))
+    return bool(_REQUIRED_FORMATS[field].match(value))
+
+
+def compose_text(doc_type: str, header_text: str, field_texts: Dict[str, str]) -> str:
+    """
+    Rebuild OCR-like text from the field crops, with the labels parse_text
+    keys on, so the usual field parser runs unchanged.
+    """
+    f = {k: _clean_field(k, v) for k, v in field_texts.items()}
+    lines = [header_text.strip()] if header_text else []
+    if doc_type == "Aadhaar":
+        lines += ["Aadhaar", f"Name: {f.get('name', '')}", f"DOB: {f.get('dob', '')}", f.get("gender", ""),
+                  " ".join(f.get("aadhaarNumber", "")[i:i + 4] for i in (0, 4, 8))]
+    elif doc_type == "PAN":
+        # Father's name last: parse_text reads it up to the end of the text
+        lines += ["INCOME TAX DEPARTMENT", f.get("panNumber", ""), f"Name: {f.get('name', '')}",
+                  f"DOB: {f.get('dob', '')}", f"Father's Name: {f.get('fatherName', '')}"]
+    elif doc_type == "DrivingLicence":
+        lines += ["DRIVING LICENCE", f"No.: {f.get('dlNumber', '')}", "Name", f.get("name", ""),
+                  f"Date of Birth: {f.get('dob', '')}", f"Valid Until: {f.get('validUntil', '')}"]
+    return "\n".join(l for l in lines if l and l.strip())
@@ -1,12 +1,48 @@
 # app/main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
+from fastapi.concurrency import run_in_threadpool
 
 # This imports the list `routers` from app/routers/__init__.py
 from .routers import routers
+from . import ocr_pool, image_hash, identity_graph, fraud_rings, name_match, identifier_index, audit_log, ml_integration
+from .config import settings
+from .ingest import UploadSizeLimitMiddleware
+from .ocr import ocr_batcher
+from .db_async import close_async_db
+from .pagination import NEXT_CURSOR_HEADER, backfill_page_keys
 
-app = FastAPI(title="KYC Verification API", version="1.0.0")
+
+# ----------------------
+# LIFESPAN (worker pools, ML models, page keys, near-duplicate index, identity graph, fraud rings, name profiles, identifier index, audit log)
+# ----------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ocr_pool.start_pool()
+    # Models load in the background; /health/ready reports when they are in
+    if settings.ML_LOAD_ON_STARTUP:
+        ml_integration.start_background_load()
+    # Page keys first: the fraud ring replay sorts documents on createdAt
+    await run_in_threadpool(backfill_page_keys)
+    await run_in_threadpool(image_hash.load_or_rebuild_index)
+    await run_in_threadpool(identity_graph.load_or_rebuild_graph)
+    await run_in_threadpool(fraud_rings.rebuild_rings)
+    await run_in_threadpool(name_match.rebuild_name_profiles)
+    await run_in_threadpool(identifier_index.rebuild_identifier_index)
+    await run_in_threadpool(audit_log.start_audit_sink)
+    yield
+    # Let batches already queued finish on the pool before it goes
+    await run_in_threadpool(ocr_batcher.close)
+    ocr_pool.shutdown_pool()
+    image_hash.save_index()
+    identity_graph.save_graph()
+    await run_in_threadpool(audit_log.stop_audit_sink)
+    close_async_db()
+
+
+app = FastAPI(title="KYC Verification API", version="1.0.0", lifespan=lifespan)
 
 # ----------------------
 # CORS CONFIG
@@ -23,8 +59,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Oversized multipart bodies are refused before they are read (see ingest.py)
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # ----------------------
 # OPENAPI JWT SUPPORT
 # ----------------------
@@ -1,20 +1,37 @@
 
 import os
 import sys
+import time
+import threading
 import numpy as np
 from PIL import Image
-import io
 import traceback
+from typing import Any, Dict, Optional, Union
+from .config import settings
+from .stage_cache import cached_stage
+from .image_context import DecodedImage, as_decoded
 
-# Deep Learning Imports
-try:
-    import torch
-    import torch.nn as nn
-    import torch.nn.functional as F
-    from torch_geometric.data import Data
-    from torch_geometric.nn import GCNConv
-except ImportError:
-    print("⚠️ PyTorch / Geometric not installed. ML features disabled.")
+# ============================================
+# Lazy, background model loading
+# ============================================
+# torch / torch_geometric / TensorFlow used to be imported, and both models
+# loaded, when this module was imported, so every process that touched
+# fraud/compliance paid seconds and hundreds of MB up front. Now:
+# - importing this module is cheap; the frameworks are imported by load_models()
+# - the FastAPI lifespan calls start_background_load(), which loads (and,
+#   with ML_WARMUP, runs one warm-up inference on) each model in a daemon thread
+# - until loading has finished the predict_* functions return None and the
+#   pipeline scores with the heuristics alone; with ML_WAIT_SECONDS > 0 they
+#   first wait up to that long for the loader instead
+# - model_status() reports per-model state and timings for /health/ready
+#
+# Per-model state: pending -> loading -> ready | missing (no model file) |
+# unavailable (framework not installed) | failed
+
+# Deep learning frameworks, bound by _import_torch()
+torch = None
+Data = None
+FraudGNN = None
 
 # Global model variables
 cnn_model = None
@@ -26,85 +43,228 @@ MODELS_DIR = os.path.join(os.path.dirname(BASE_DIR), "models")
 CNN_PATH = os.path.join(MODELS_DIR, "kyc_cnn_model.h5")
 GNN_PATH = os.path.join(MODELS_DIR, "kyc_gnn_model.pth")
 
+# Cache key version for CNN scores; bump when the model file or input resizing changes
+CNN_STAGE_VERSION = "kyc_cnn_model-v2"
+CNN_INPUT_SIDE = 224
+
+_status_lock = threading.Lock()
+_status: Dict[str, Dict[str, Any]] = {
+    name: {"state": "pending", "path": path, "loadMs": None, "warmupMs": None, "error": None}
+    for name, path in (("cnn", CNN_PATH), ("gnn", GNN_PATH))
+}
+_loaded = threading.Event()
+_loader: Optional[threading.Thread] = None
+
+
+def _set_status(name: str, **fields):
+    with _status_lock:
+        _status[name].update(fields)
+
+
+def _import_torch():
+    global torch, Data
+    import torch as _torch
+    from torch_geometric.data import Data as _Data
+    torch, Data = _torch, _Data
+
+
 # ----------------------------------------------------
 # 1. GNN Model Definition (Must match Friend's Code)
 # ----------------------------------------------------
-class FraudGNN(nn.Module):
-    def __init__(self):
-        super(FraudGNN, self).__init__()
-        num_features = 16  # Fixed from code provided
-        # Two Graph Convolutional Layers
-        self.conv1 = GCNConv(num_features, 32)
-        self.conv2 = GCNConv(32, 2) # Output: [Prob_Not_Fraud, Prob_Fraud]
+def _fraud_gnn_class():
+    """Define FraudGNN once torch is importable (the class needs nn.Module)."""
+    global FraudGNN
+    if FraudGNN is not None:
+        return FraudGNN
+    import torch.nn as nn
+    import torch.nn.functional as F
+    from torch_geometric.nn import GCNConv
+
+    class _FraudGNN(nn.Module):
+        def __init__(self):
+            super(_FraudGNN, self).__init__()
+            num_features = 16  # Fixed from code provided
+            # Two Graph Convolutional Layers
+            self.conv1 = GCNConv(num_features, 32)
+            self.conv2 = GCNConv(32, 2) # Output: [Prob_Not_Fraud, Prob_Fraud]
 
-    def forward(self, data):
-        x, edge_index = data.x, data.edge_index
+        def forward(self, data):
+            x, edge_index = data.x, data.edge_index
 
-        x = self.conv1(x, edge_index)
-        x = F.relu(x)
-        x = F.dropout(x, training=self.training)
-        x = self.conv2(x, edge_index)
+            x = self.conv1(x, edge_index)
+            x = F.relu(x)
+            x = F.dropout(x, training=self.training)
+            x = self.conv2(x, edge_index)
 
-        return F.log_softmax(x, dim=1)
+            return F.log_softmax(x, dim=1)
+
+    _FraudGNN.__name__ = _FraudGNN.__qualname__ = "FraudGNN"
+    FraudGNN = _FraudGNN
+    return FraudGNN
 
 # ----------------------------------------------------
 # 2. Model Loading Logic
 # ----------------------------------------------------
-def load_models():
-    """
-    Load CNN and GNN models into memory.
-    """
-    global cnn_model, gnn_model
-    
-    # --- Load CNN ---
+def _load_cnn():
+    global cnn_model
+    if not os.path.exists(CNN_PATH):
+        _set_status("cnn", state="missing")
+        print(f"⚠️ CNN Model not found at {CNN_PATH}")
+        return
+    _set_status("cnn", state="loading")
+    t0 = time.perf_counter()
     try:
-        if os.path.exists(CNN_PATH):
-            import tensorflow as tf
-            cnn_model = tf.keras.models.load_model(CNN_PATH)
-            print(f"✅ CNN Model loaded from {CNN_PATH}")
-        else:
-            print(f"⚠️ CNN Model not found at {CNN_PATH}")
+        import tensorflow as tf
+    except ImportError as e:
+        _set_status("cnn", state="unavailable", error=str(e))
+        print("⚠️ TensorFlow not installed. CNN features disabled.")
+        return
+    try:
+        cnn_model = tf.keras.models.load_model(CNN_PATH)
+        _set_status("cnn", state="ready", loadMs=round((time.perf_counter() - t0) * 1000, 1))
+        print(f"✅ CNN Model loaded from {CNN_PATH}")
     except Exception as e:
+        _set_status("cnn", state="failed", error=str(e))
         print(f"❌ Failed to load CNN Model: {e}")
 
-    # --- Load GNN ---
+
+def _load_gnn():
+    global gnn_model
+    if not os.path.exists(GNN_PATH):
+        _set_status("gnn", state="missing")
+        print(f"⚠️ GNN Model not found at {GNN_PATH}")
+        return
+    _set_status("gnn", state="loading")
+    t0 = time.perf_counter()
     try:
-        if os.path.exists(GNN_PATH):
-            # Initialize the class framework
-            device = torch.device('cpu')
-            gnn_model = FraudGNN().to(device)
-            
-            # Load weights (State Dict)
-            # We try strict=False in case of minor version mismatch
-            try:
-                state_dict = torch.load(GNN_PATH, map_location=device, weights_only=True)
-                gnn_model.load_state_dict(state_dict)
-            except Exception:
-                # Fallback for full model pickle (if friend changed their mind)
-                gnn_model = torch.load(GNN_PATH, map_location=device, weights_only=False)
-                
-            gnn_model.eval()
-            print(f"✅ GNN Model loaded from {GNN_PATH}")
-        else:
-            print(f"⚠️ GNN Model not found at {GNN_PATH}")
+        _import_torch()
+        model_cls = _fraud_gnn_class()
+    except ImportError as e:
+        _set_status("gnn", state="unavailable", error=str(e))
+        print("⚠️ PyTorch / Geometric not installed. GNN features disabled.")
+        return
+    try:
+        # Initialize the class framework
+        device = torch.device('cpu')
+        model = model_cls().to(device)
+
+        # Load weights (State Dict)
+        try:
+            state_dict = torch.load(GNN_PATH, map_location=device, weights_only=True)
+            model.load_state_dict(state_dict)
+        except Exception:
+            # Fallback for full model pickle (if friend changed their mind)
+            model = torch.load(GNN_PATH, map_location=device, weights_only=False)
+
+        model.eval()
+        gnn_model = model
+        _set_status("gnn", state="ready", loadMs=round((time.perf_counter() - t0) * 1000, 1))
+        print(f"✅ GNN Model loaded from {GNN_PATH}")
     except Exception as e:
+        _set_status("gnn", state="failed", error=str(e))
         print(f"❌ Error loading GNN file: {e}")
 
+
+def _warm_up():
+    """One inference per loaded model so the first request does not pay graph/kernel setup."""
+    if cnn_model is not None:
+        import cv2
+        card = np.full((300, 480, 3), 230, np.uint8)
+        cv2.putText(card, "WARMUP 0000", (20, 150), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (30, 30, 30), 2)
+        image = DecodedImage(cv2.imencode(".png", card)[1].tobytes(), sha256="ml-warmup")
+        t0 = time.perf_counter()
+        _cnn_score.uncached(image)  # not cached: a synthetic image
+        _set_status("cnn", warmupMs=round((time.perf_counter() - t0) * 1000, 1))
+    if gnn_model is not None:
+        t0 = time.perf_counter()
+        _predict_gnn({"connections": 1, "risk_score": 0.5, "edge_types": {"shared_pan": 1}})
+        _set_status("gnn", warmupMs=round((time.perf_counter() - t0) * 1000, 1))
+
+
+def load_models(warmup: Optional[bool] = None):
+    """
+    Load CNN and GNN models into memory (blocking). Safe to call again; models
+    that are already loaded are kept.
+    """
+    warmup = settings.ML_WARMUP if warmup is None else warmup
+    try:
+        if cnn_model is None:
+            _load_cnn()
+        if gnn_model is None:
+            _load_gnn()
+        if warmup:
+            try:
+                _warm_up()
+            except Exception as e:
+                print(f"⚠️ ML warm-up failed: {e}")
+    finally:
+        _loaded.set()
+
+
+def start_background_load(warmup: Optional[bool] = None) -> threading.Thread:
+    """Load the models in a daemon thread (idempotent). Returns the loader thread."""
+    global _loader
+    with _status_lock:
+        if _loader is None:
+            _loader = threading.Thread(target=load_models, args=(warmup,), name="ml-model-loader", daemon=True)
+            _loader.start()
+            print("♻️ Loading ML models in the background")
+        return _loader
+
+
+def wait_for_models(timeout: Optional[float] = None) -> bool:
+    """Block until loading has finished (or timeout). True if it has finished."""
+    return _loaded.wait(timeout)
+
+
+def models_loaded() -> bool:
+    return _loaded.is_set()
+
+
+def model_status() -> Dict[str, Any]:
+    with _status_lock:
+        models = {name: dict(s) for name, s in _status.items()}
+    return {"loaded": _loaded.is_set(), "started": _loader is not None, "models": models}
+
+
+def _models_settled() -> bool:
+    """
+    True once loading has finished. Starts the loader on first use (scripts,
+    or ML_LOAD_ON_STARTUP=false) and, with ML_WAIT_SECONDS, waits for it.
+    """
+    if _loaded.is_set():
+        return True
+    start_background_load()
+    return settings.ML_WAIT_SECONDS > 0 and _loaded.wait(settings.ML_WAIT_SECONDS)
+
 # ----------------------------------------------------
 # 3. Prediction Functions
 # ----------------------------------------------------
 
-def predict_cnn_manipulation(image_bytes: bytes):
+def predict_cnn_manipulation(image_bytes: Union[bytes, DecodedImage]):
     """
     Run CNN to detect image manipulation.
+    Returns None while the models are still loading (not scored yet).
     """
+    if not _models_settled(): return None
     if cnn_model is None: return 0.0
 
+    score = _cnn_score(image_bytes)
+    return 0.0 if score is None else score
+
+@cached_stage("cnn_manipulation", CNN_STAGE_VERSION)
+def _cnn_score(image_bytes: Union[bytes, DecodedImage]):
     try:
-        # Preprocess
-        img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-        img = img.resize((224, 224)) 
-        img_array = np.array(img) / 255.0
+        # Preprocess: resize from the smallest pyramid level that still covers the input size
+        image = as_decoded(image_bytes)
+        level = image.level_for(CNN_INPUT_SIDE)
+        if level is not None:
+            import cv2
+            small = cv2.resize(level, (CNN_INPUT_SIDE, CNN_INPUT_SIDE), interpolation=cv2.INTER_AREA)
+            img = small[:, :, ::-1]  # BGR -> RGB
+        else:
+            img = Image.open(image.open()).convert('RGB').resize((CNN_INPUT_SIDE, CNN_INPUT_SIDE))
+        img_array = np.asarray(img, dtype=np.float32) / 255.0
         img_array = np.expand_dims(img_array, axis=0)
         
         # Predict
@@ -113,7 +273,7 @@ def predict_cnn_manipulation(image_bytes: bytes):
         return score
     except Exception as e:
         print(f"❌ CNN Prediction Error: {e}")
-        return 0.0
+        return None
 
 def predict_gnn_fraud(graph_data_dict: dict):
     """
@@ -134,75 +294,96 @@ def predict_gnn_fraud(graph_data_dict: dict):
            - 'risk_score': float (weighted risk from edge types)
            - 'edge_types': dict (breakdown of connections by type)
            - 'features': list (custom features for node embedding)
+           - 'subgraph': optional identity-graph neighbourhood (IdentityGraph.subgraph());
+             when present FraudGNN runs on it instead of the synthetic star
+
+    Returns None while the models are still loading (not scored yet).
     """
+    if not _models_settled(): return None
     if gnn_model is None: return 0.0
+    return _predict_gnn(graph_data_dict)
 
-    try:
-        # 1. Extract edge type counts
-        edge_types = graph_data_dict.get('edge_types', {})
-        connections = graph_data_dict.get('connections', 0)
-        risk = graph_data_dict.get('risk_score', 0)
-        custom_features = graph_data_dict.get('features', [])
-        
-        # 2. Build Feature Vector (16 dimensions)
-        # [aadhaar_count, pan_count, dl_count, device_count, email_count, risk_score, ...]
-        feat_vec = [
-            float(edge_types.get('shared_aadhaar', 0)),
-            float(edge_types.get('shared_pan', 0)),
-            float(edge_types.get('shared_dl', 0)),
-            float(edge_types.get('shared_device', 0)),
-            float(edge_types.get('shared_email', 0)),
-            float(risk),
-            float(connections),
-        ]
-        # Pad remaining features
-        feat_vec += custom_features[:9] if custom_features else [0.0] * 9
-        feat_vec = feat_vec[:16]  # Ensure exactly 16 features
-        
-        # Create Tensor for current user
-        x = torch.tensor([feat_vec], dtype=torch.float32)
+
+def _star_graph(graph_data_dict: dict):
+    """Fallback when no identity-graph subgraph is given: the uploader plus up to 5 synthetic neighbours."""
+    # 1. Extract edge type counts
+    edge_types = graph_data_dict.get('edge_types', {})
+    connections = graph_data_dict.get('connections', 0)
+    risk = graph_data_dict.get('risk_score', 0)
+    custom_features = graph_data_dict.get('features', [])
+    
+    # 2. Build Feature Vector (16 dimensions)
+    # [aadhaar_count, pan_count, dl_count, device_count, email_count, risk_score, ...]
+    feat_vec = [
+        float(edge_types.get('shared_aadhaar', 0)),
+        float(edge_types.get('shared_pan', 0)),
+        float(edge_types.get('shared_dl', 0)),
+        float(edge_types.get('shared_device', 0)),
+        float(edge_types.get('shared_email', 0)),
+        float(risk),
+        float(connections),
+    ]
+    # Pad remaining features
+    feat_vec += custom_features[:9] if custom_features else [0.0] * 9
+    feat_vec = (feat_vec + [0.0] * 16)[:16]  # Ensure exactly 16 features
+    
+    # Create Tensor for current user
+    x = torch.tensor([feat_vec], dtype=torch.float32)
+    
+    # 3. Create Graph Edges based on duplicate types
+    num_neighbors = min(connections, 5)  # Cap at 5 for performance
+    
+    if num_neighbors > 0:
+        # Create feature vectors for neighbors based on their edge type
+        neighbor_features = []
         
-        # 3. Create Graph Edges based on duplicate types
-        num_neighbors = min(connections, 5)  # Cap at 5 for performance
+        # Add neighbors with edge-type-specific features
+        neighbor_idx = 0
+        for edge_type, weight in [
+            ('shared_aadhaar', 5.0), 
+            ('shared_pan', 4.0),
+            ('shared_dl', 3.0),
+            ('shared_device', 2.0),
+            ('shared_email', 1.0)
+        ]:
+            count = edge_types.get(edge_type, 0)
+            for _ in range(min(count, num_neighbors - neighbor_idx)):
+                if neighbor_idx >= num_neighbors:
+                    break
+                # Create neighbor feature with emphasis on their edge type
+                n_feat = [0.0] * 16
+                n_feat[['shared_aadhaar', 'shared_pan', 'shared_dl', 'shared_device', 'shared_email'].index(edge_type)] = weight
+                n_feat[5] = weight / 5.0  # Normalized risk
+                neighbor_features.append(n_feat)
+                neighbor_idx += 1
         
-        if num_neighbors > 0:
-            # Create feature vectors for neighbors based on their edge type
-            neighbor_features = []
-            
-            # Add neighbors with edge-type-specific features
-            neighbor_idx = 0
-            for edge_type, weight in [
-                ('shared_aadhaar', 5.0), 
-                ('shared_pan', 4.0),
-                ('shared_dl', 3.0),
-                ('shared_device', 2.0),
-                ('shared_email', 1.0)
-            ]:
-                count = edge_types.get(edge_type, 0)
-                for _ in range(min(count, num_neighbors - neighbor_idx)):
-                    if neighbor_idx >= num_neighbors:
-                        break
-                    # Create neighbor feature with emphasis on their edge type
-                    n_feat = [0.0] * 16
-                    n_feat[['shared_aadhaar', 'shared_pan', 'shared_dl', 'shared_device', 'shared_email'].index(edge_type)] = weight
-                    n_feat[5] = weight / 5.0  # Normalized risk
-                    neighbor_features.append(n_feat)
-                    neighbor_idx += 1
+        if neighbor_features:
+            x_neighbors = torch.tensor(neighbor_features, dtype=torch.float32)
+            x = torch.cat([x, x_neighbors], dim=0)
             
-            if neighbor_features:
-                x_neighbors = torch.tensor(neighbor_features, dtype=torch.float32)
-                x = torch.cat([x, x_neighbors], dim=0)
-                
-                # Create bidirectional edges (center <-> each neighbor)
-                src = [0] * len(neighbor_features) + list(range(1, len(neighbor_features) + 1))
-                dst = list(range(1, len(neighbor_features) + 1)) + [0] * len(neighbor_features)
-                edge_index = torch.tensor([src, dst], dtype=torch.long)
-            else:
-                # Self-loop if no valid neighbors
-                edge_index = torch.tensor([[0], [0]], dtype=torch.long)
+            # Create bidirectional edges (center <-> each neighbor)
+            src = [0] * len(neighbor_features) + list(range(1, len(neighbor_features) + 1))
+            dst = list(range(1, len(neighbor_features) + 1)) + [0] * len(neighbor_features)
+            edge_index = torch.tensor([src, dst], dtype=torch.long)
         else:
-            # Single node, self loop
+            # Self-loop if no valid neighbors
             edge_index = torch.tensor([[0], [0]], dtype=torch.long)
+    else:
+        # Single node, self loop
+        edge_index = torch.tensor([[0], [0]], dtype=torch.long)
+
+    return x, edge_index
+
+
+def _predict_gnn(graph_data_dict: dict) -> float:
+    try:
+        subgraph = graph_data_dict.get('subgraph')
+        if subgraph:
+            # Real k-hop neighbourhood from the identity graph (node 0 = the uploader)
+            x = torch.tensor(subgraph['x'], dtype=torch.float32)
+            edge_index = torch.tensor(subgraph['edge_index'], dtype=torch.long)
+        else:
+            x, edge_index = _star_graph(graph_data_dict)
             
         data = Data(x=x, edge_index=edge_index)
         
@@ -221,6 +402,3 @@ def predict_gnn_fraud(graph_data_dict: dict):
         print(f"❌ GNN Prediction Error: {e}")
         # traceback.print_exc()
         return 0.0
-
-# Initial load
-load_models()
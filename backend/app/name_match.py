@@ -0,0 +1,349 @@
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+from rapidfuzz import fuzz, process
+from .config import settings
+
+# =========================================
+# AI NAME MATCHING - Multi-Algorithm Engine
+# =========================================
+# Every upload compares the account name with the name on the document
+# (four fuzzy ratios, Soundex, and the best token_set_ratio over the two
+# names' common Indian-name variations) and with the names on the user's
+# earlier documents.
+#
+# The pure per-name work (normalisation, Soundex per word, variations)
+# is cached by raw name: an account name is the same on every upload.
+# The variation grid is scored in one process.cdist call, not a Python
+# loop over V² pairs. Names already on a user's documents are kept in an
+# in-memory profile, rebuilt from Mongo at start-up and updated after each
+# insert, so the cross-document check runs no query.
+
+_TITLES = {"MR", "MRS", "MS", "DR", "SHRI", "SMT", "KUM", "KUMAR", "KUMARI", "PROF", "LATE"}
+
+
+def _soundex(name: str) -> str:
+    """
+    Generate Soundex code for phonetic matching.
+    Useful for catching spelling variations of the same name.
+    """
+    if not name:
+        return ""
+
+    name = name.upper()
+    name = re.sub(r'[^A-Z]', '', name)
+
+    if not name:
+        return ""
+
+    # Soundex code table
+    codes = {
+        'B': '1', 'F': '1', 'P': '1', 'V': '1',
+        'C': '2', 'G': '2', 'J': '2', 'K': '2', 'Q': '2', 'S': '2', 'X': '2', 'Z': '2',
+        'D': '3', 'T': '3',
+        'L': '4',
+        'M': '5', 'N': '5',
+        'R': '6'
+    }
+
+    first_letter = name[0]
+    coded = first_letter
+
+    prev_code = codes.get(first_letter, '0')
+    for char in name[1:]:
+        code = codes.get(char, '0')
+        if code != '0' and code != prev_code:
+            coded += code
+        prev_code = code
+
+    # Pad with zeros and truncate to 4 characters
+    return (coded + '000')[:4]
+
+
+def _normalize_name(name: str) -> str:
+    """Normalize name for comparison."""
+    if not name:
+        return ""
+
+    # Uppercase and remove special characters
+    normalized = name.upper().strip()
+    normalized = re.sub(r'[^A-Z\s]', '', normalized)
+    normalized = re.sub(r'\s+', ' ', normalized).strip()
+
+    return normalized
+
+
+def _get_name_variations(name: str) -> List[str]:
+    """
+    Generate common variations of Indian names.
+    Handles initials, middle names, titles, etc.
+    """
+    variations = [name]
+    normalized = _normalize_name(name)
+
+    if not normalized:
+        return variations
+
+    parts = normalized.split()
+
+    # Variation 1: Just first and last name
+    if len(parts) >= 3:
+        variations.append(f"{parts[0]} {parts[-1]}")
+
+    # Variation 2: First name with initials for middle/last
+    if len(parts) >= 2:
+        initials = " ".join([p[0] for p in parts[1:]])
+        variations.append(f"{parts[0]} {initials}")
+
+    # Variation 3: Last name first (some documents have this)
+    if len(parts) >= 2:
+        variations.append(f"{parts[-1]} {' '.join(parts[:-1])}")
+
+    # Variation 4: Remove common titles/suffixes
+    cleaned_parts = [p for p in parts if p not in _TITLES]
+    if cleaned_parts:
+        variations.append(" ".join(cleaned_parts))
+
+    # Variation 5: First name only
+    if parts:
+        variations.append(parts[0])
+
+    return list(set(variations))
+
+
+class NameForm(NamedTuple):
+    normalized: str
+    words: Tuple[str, ...]
+    soundex: Tuple[str, ...]
+    variations: Tuple[str, ...]  # normalized, deduplicated
+
+
+@lru_cache(maxsize=settings.NAME_CACHE_SIZE)
+def name_form(name: str) -> NameForm:
+    """Normalized form, per-word Soundex codes and variations of a raw name (cached)."""
+    normalized = _normalize_name(name)
+    words = tuple(normalized.split())
+    variations = tuple(dict.fromkeys(_normalize_name(v) for v in _get_name_variations(name)))
+    return NameForm(normalized, words, tuple(_soundex(w) for w in words), variations)
+
+
+def _best_pair_score(left: Tuple[str, ...], right: Tuple[str, ...]) -> float:
+    """Best token_set_ratio over every (left, right) pair, as one cdist call."""
+    if not left or not right:
+        return 0
+    return float(process.cdist(left, right, scorer=fuzz.token_set_ratio, dtype=np.float64).max())
+
+
+# ---------- per-user name profile ----------
+class NameProfiles:
+    """
+    Distinct normalized names seen on each user's documents, with how many
+    documents carried each one and the latest of them. Capped per user at
+    settings.NAME_PROFILE_MAX names (least recently seen dropped).
+    """
+
+    def __init__(self, max_names: Optional[int] = None):
+        self.max_names = max_names or settings.NAME_PROFILE_MAX
+        self._lock = threading.Lock()
+        self._users: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def add(self, user_id: str, doc_id: str, name: Optional[str]):
+        if not user_id or not name:
+            return
+        normalized = name_form(name).normalized
+        if not normalized:
+            return
+        with self._lock:
+            names = self._users.setdefault(str(user_id), {})
+            entry = names.pop(normalized, None) or {"name": name, "count": 0}
+            entry["count"] += 1
+            entry["docId"] = str(doc_id)
+            names[normalized] = entry  # most recently seen last
+            while len(names) > self.max_names:
+                names.pop(next(iter(names)))
+
+    def get(self, user_id: str) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return dict(self._users.get(str(user_id), {}))
+
+    def rebuild_from_mongo(self, collection) -> int:
+        fresh = NameProfiles(self.max_names)
+        count = 0
+        for d in collection.find({"parsed.name": {"$nin": [None, ""]}},
+                                 {"userId": 1, "parsed.name": 1}).sort("createdAt", 1):
+            # Ownerless documents (userId None or "") belong to no profile
+            fresh.add(d.get("userId"), str(d.get("_id")), (d.get("parsed") or {}).get("name"))
+            count += 1
+        with self._lock:
+            self._users = fresh._users
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"users": len(self._users), "names": sum(len(n) for n in self._users.values()),
+                    "cachedForms": name_form.cache_info().currsize}
+
+
+name_profiles = NameProfiles()
+
+
+def rebuild_name_profiles() -> int:
+    """Startup: rebuild the per-user profiles from the documents collection."""
+    from .db import documents_collection
+    t0 = time.perf_counter()
+    try:
+        count = name_profiles.rebuild_from_mongo(documents_collection)
+    except Exception as e:
+        print(f"⚠️ Name profile rebuild failed: {e}")
+        return 0
+    ms = round((time.perf_counter() - t0) * 1000, 1)
+    print(f"✅ Name profiles ready: {len(name_profiles)} users from {count} documents ({ms} ms)")
+    return count
+
+
+def record_name(user_id: str, doc_id: str, name: Optional[str]):
+    name_profiles.add(user_id, doc_id, name)
+
+
+def _cross_document_name_check(user_id: str, document_name: str) -> Dict[str, Any]:
+    """
+    Check if the name matches with names from other documents uploaded by the same user.
+    This helps detect if someone is uploading documents with different names.
+    """
+    if not user_id or not document_name:
+        return {"checked": False, "reason": "Missing data"}
+
+    try:
+        profile = name_profiles.get(user_id)
+        if not profile:
+            return {"checked": True, "matches": [], "consistent": True}
+
+        # One row: this document's name against every distinct earlier name
+        scores = process.cdist([name_form(document_name).normalized], list(profile),
+                               scorer=fuzz.token_set_ratio, dtype=np.float64)[0]
+        counts = np.array([entry["count"] for entry in profile.values()])
+        low = int(counts[scores < 60].sum())
+        total = int(counts.sum())
+
+        return {
+            "checked": True,
+            "total_docs": total,
+            "consistent": low == 0,
+            "avg_similarity": float((scores * counts).sum() / total),
+            "low_matches": low
+        }
+    except Exception as e:
+        return {"checked": False, "error": str(e)}
+
+
+def ai_name_match(user_name: Optional[str], document_name: Optional[str], user_id: str = "") -> Dict[str, Any]:
+    """
+    AI-powered name matching using multiple algorithms.
+
+    Returns:
+        - overall_match_pct: 0-100 score
+        - fuzzy_score: Basic fuzzy matching score
+        - phonetic_match: Whether names sound similar (Soundex)
+        - variation_match: Whether name matches common variations
+        - cross_doc_check: Consistency with the user's earlier documents
+        - reason: Explanation of match/mismatch
+    """
+    result = {
+        "user_name": user_name,
+        "document_name": document_name,
+        "overall_match_pct": 100,
+        "fuzzy_score": 100,
+        "phonetic_match": True,
+        "variation_match_score": 100,
+        "cross_doc_consistent": True,
+        "reason": "Match verified"
+    }
+
+    # If either name is missing, skip matching
+    if not user_name or not document_name:
+        result["reason"] = "Name comparison skipped (missing data)"
+        return result
+
+    user_form = name_form(user_name)
+    doc_form = name_form(document_name)
+    user_norm, doc_norm = user_form.normalized, doc_form.normalized
+
+    if not user_norm or not doc_norm:
+        result["reason"] = "Name comparison skipped (empty after normalization)"
+        return result
+
+    # ----------------------
+    # 1. Fuzzy String Matching (rapidfuzz)
+    # ----------------------
+    fuzzy_ratio = fuzz.ratio(user_norm, doc_norm)
+    fuzzy_partial = fuzz.partial_ratio(user_norm, doc_norm)
+    fuzzy_token_set = fuzz.token_set_ratio(user_norm, doc_norm)
+    fuzzy_token_sort = fuzz.token_sort_ratio(user_norm, doc_norm)
+
+    # Take the best fuzzy score
+    result["fuzzy_score"] = max(fuzzy_ratio, fuzzy_partial, fuzzy_token_set, fuzzy_token_sort)
+    result["fuzzy_details"] = {
+        "ratio": fuzzy_ratio,
+        "partial_ratio": fuzzy_partial,
+        "token_set_ratio": fuzzy_token_set,
+        "token_sort_ratio": fuzzy_token_sort
+    }
+
+    # ----------------------
+    # 2. Phonetic Matching (Soundex, cached per name)
+    # ----------------------
+    phonetic_total = min(len(user_form.words), len(doc_form.words))
+    if phonetic_total > 0:
+        phonetic_matches = sum(u == d for u, d in zip(user_form.soundex, doc_form.soundex))
+        result["phonetic_match"] = (phonetic_matches / phonetic_total) >= 0.5
+        result["phonetic_score"] = int((phonetic_matches / phonetic_total) * 100)
+
+    # ----------------------
+    # 3. Name Variation Matching (all pairs in one cdist call)
+    # ----------------------
+    result["variation_match_score"] = _best_pair_score(user_form.variations, doc_form.variations)
+
+    # ----------------------
+    # 4. Cross-Document Consistency (in-memory profile, no query)
+    # ----------------------
+    if user_id:
+        cross_check = _cross_document_name_check(user_id, document_name)
+        result["cross_doc_check"] = cross_check
+        result["cross_doc_consistent"] = cross_check.get("consistent", True)
+
+    # ----------------------
+    # 5. Calculate Overall Score
+    # ----------------------
+    # Weight different algorithms
+    overall = (
+        result["fuzzy_score"] * 0.4 +
+        result["variation_match_score"] * 0.35 +
+        (100 if result["phonetic_match"] else 60) * 0.15 +
+        (100 if result["cross_doc_consistent"] else 50) * 0.1
+    )
+
+    result["overall_match_pct"] = int(overall)
+
+    # ----------------------
+    # 6. Determine Reason
+    # ----------------------
+    if overall >= 90:
+        result["reason"] = "Strong name match verified"
+    elif overall >= 80:
+        result["reason"] = "Good name match with minor variations"
+    elif overall >= 70:
+        result["reason"] = f"Possible name variation: '{user_name}' vs '{document_name}'"
+    elif overall >= 50:
+        result["reason"] = f"Weak name match - review required"
+    else:
+        result["reason"] = f"Name mismatch: '{user_name}' different from '{document_name}'"
+
+    print(f"   🔤 Name Match: {result['overall_match_pct']}% - {result['reason']}")
+
+    return result
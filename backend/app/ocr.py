@@ -1,8 +1,19 @@
-import io, re
+import re, time
 import numpy as np
-from typing import Dict, List
+from typing import Dict, List, Optional, Union
 from PIL import Image
 from .config import settings
+from .stage_cache import content_key, stage_cache
+from . import ocr_pool
+from .ocr_batch import OCRBatcher
+from . import layouts
+from .pdf_utils import is_pdf, iter_pdf_pages
+from .extractors import extract_fields
+from .ocr_readers import DEFAULT_LANGS, PREDETECT_LANGS, languages_for, reader_registry
+from .image_context import DecodedImage, as_decoded, raw_bytes
+
+# Bump when preprocessing / OCR settings change so cached text is not reused
+OCR_STAGE_VERSION = "easyocr-registry-v6"
 
 # Try imports for OCR and Image Processing
 try:
@@ -10,33 +21,12 @@ try:
 except Exception:
     cv2 = None
 
-try:
-    from pdf2image import convert_from_bytes
-except Exception:
-    convert_from_bytes = None
-
 # ============================================
 # EasyOCR - Better for Indian Documents
 # ============================================
-easyocr_reader = None
-
-def _get_easyocr_reader():
-    """Lazy-load EasyOCR reader (Hindi + English for Aadhaar)"""
-    global easyocr_reader
-    if easyocr_reader is None:
-        try:
-            import easyocr
-            # Load reader with English and Hindi (common on Indian IDs)
-            # GPU=False for compatibility, can set to True if CUDA available
-            easyocr_reader = easyocr.Reader(['en', 'hi'], gpu=False, verbose=False)
-            print("✅ EasyOCR initialized with English + Hindi")
-        except ImportError:
-            print("⚠️ EasyOCR not installed. Falling back to pytesseract.")
-            return None
-        except Exception as e:
-            print(f"⚠️ EasyOCR init error: {e}")
-            return None
-    return easyocr_reader
+def _get_easyocr_reader(langs=DEFAULT_LANGS):
+    """Shared EasyOCR reader for a language set (English + Hindi by default, for Aadhaar)"""
+    return reader_registry.get(langs)
 
 # Fallback to pytesseract if EasyOCR not available
 try:
@@ -47,654 +37,676 @@ except Exception:
     pytesseract = None
 
 
-def preprocess_image_for_ocr(image_bytes: bytes) -> np.ndarray:
+# ============================================
+# Adaptive preprocessing planner
+# ============================================
+# Laplacian-like kernel used by Immerkaer's fast noise estimator
+_NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], np.float32)
+
+
+def estimate_noise_sigma(gray: np.ndarray) -> float:
     """
-    Preprocess image for better OCR accuracy on Indian ID cards.
-    Returns numpy array (for EasyOCR) or PIL Image (for pytesseract fallback).
+    Cheap noise estimate (Immerkaer) on a <=512px centre crop. Pixels on
+    strong edges (text strokes, card borders) are masked out so printed
+    text is not mistaken for sensor noise.
     """
-    if cv2 is None:
-        # Return raw bytes if cv2 not available
-        return image_bytes
+    h, w = gray.shape[:2]
+    ch, cw = min(h, 512), min(w, 512)
+    y, x = (h - ch) // 2, (w - cw) // 2
+    crop = gray[y:y + ch, x:x + cw].astype(np.float32)
+    if ch < 8 or cw < 8:
+        return 0.0
+    resid = np.abs(cv2.filter2D(crop, -1, _NOISE_KERNEL))[1:-1, 1:-1]
+    grad = (np.abs(cv2.Sobel(crop, cv2.CV_32F, 1, 0)) + np.abs(cv2.Sobel(crop, cv2.CV_32F, 0, 1)))[1:-1, 1:-1]
+    flat = grad <= np.percentile(grad, 70)
+    if not flat.any():
+        return 0.0
+    return float(np.sqrt(np.pi / 2) * resid[flat].mean() / 6)
 
-    # 1. Convert bytes to numpy array
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    
-    if img is None:
-        return image_bytes
 
-    # 2. Get image dimensions
+def plan_preprocessing(img: np.ndarray, gray: Optional[np.ndarray] = None) -> Dict:
+    """
+    Decide the cheapest preprocessing that still suits OCR:
+    - resolution band: upscale small images, downscale huge phone photos,
+      leave images inside [OCR_MIN_SIDE, OCR_MAX_SIDE] untouched
+    - denoise only when the measured noise exceeds OCR_DENOISE_SIGMA
+    """
     h, w = img.shape[:2]
-    
-    # 3. Resize if too small (upscale for better OCR)
     min_dim = min(h, w)
-    if min_dim < 800:
-        scale = 1200 / min_dim
-        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
-    
-    # 4. Denoise (helps with scanned documents)
-    img = cv2.fastNlMeansDenoisingColored(img, None, 10, 10, 7, 21)
-    
-    # 5. Optional: Enhance contrast (uncomment if needed)
-    # lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
-    # l, a, b = cv2.split(lab)
-    # clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    # l = clahe.apply(l)
-    # img = cv2.merge([l, a, b])
-    # img = cv2.cvtColor(img, cv2.COLOR_LAB2BGR)
-    
+    if min_dim < settings.OCR_MIN_SIDE:
+        scale, band = settings.OCR_UPSCALE_TARGET / min_dim, "upscale"
+    elif min_dim > settings.OCR_MAX_SIDE:
+        scale, band = settings.OCR_MAX_SIDE / min_dim, "downscale"
+    else:
+        scale, band = 1.0, "keep"
+
+    t0 = time.perf_counter()
+    if gray is None:
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    sigma = estimate_noise_sigma(gray)
+    return {
+        "original": [h, w],
+        "band": band,
+        "scale": round(scale, 4),
+        "target": [int(round(h * scale)), int(round(w * scale))],
+        "noiseSigma": round(sigma, 2),
+        "denoise": sigma > settings.OCR_DENOISE_SIGMA,
+        "steps": [],
+        "ms": {"plan": round((time.perf_counter() - t0) * 1000, 2)},
+    }
+
+
+def apply_preprocessing(img: np.ndarray, plan: Dict) -> np.ndarray:
+    """Execute a plan from plan_preprocessing, recording the steps that ran."""
+    if plan["scale"] != 1.0:
+        t0 = time.perf_counter()
+        interp = cv2.INTER_CUBIC if plan["scale"] > 1 else cv2.INTER_AREA
+        img = cv2.resize(img, (plan["target"][1], plan["target"][0]), interpolation=interp)
+        plan["steps"].append(plan["band"])
+        plan["ms"]["resize"] = round((time.perf_counter() - t0) * 1000, 2)
+
+    if plan["denoise"]:
+        # Grayscale NLM on the bounded-size image: ~3x cheaper than the colour variant
+        t0 = time.perf_counter()
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        img = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
+        plan["steps"].append("denoise_gray")
+        plan["ms"]["denoise"] = round((time.perf_counter() - t0) * 1000, 2)
+
+    plan["ms"]["total"] = round(sum(plan["ms"].values()), 2)
     return img
 
 
-def _pdf_bytes_to_images(pdf_bytes: bytes) -> List[np.ndarray]:
-    """Convert PDF to list of numpy arrays (for EasyOCR)"""
-    if convert_from_bytes is None:
-        return []
-    try:
-        pil_images = convert_from_bytes(pdf_bytes, fmt="png")
-        np_images = []
-        for pil_img in pil_images:
-            np_img = np.array(pil_img)
-            # Convert RGB to BGR for OpenCV compatibility
-            if len(np_img.shape) == 3 and np_img.shape[2] == 3:
-                np_img = cv2.cvtColor(np_img, cv2.COLOR_RGB2BGR)
-            np_images.append(np_img)
-        return np_images
-    except Exception as e:
-        print(f"PDF convert error: {e}")
-        return []
+def preprocess_image_with_plan(image_bytes: Union[bytes, DecodedImage]):
+    """Decode (once, via DecodedImage) and preprocess; returns (image, plan) or (None, None) if undecodable."""
+    if cv2 is None:
+        return None, None
+    image = as_decoded(image_bytes)
+    img = image.bgr
+    if img is None:
+        return None, None
+    plan = plan_preprocessing(img, image.gray)
+    return apply_preprocessing(img, plan), plan
 
 
-def extract_text_from_bytes(image_bytes: bytes) -> str:
+def preprocess_image_for_ocr(image_bytes: Union[bytes, DecodedImage]) -> np.ndarray:
+    """
+    Preprocess image for better OCR accuracy on Indian ID cards.
+    Returns numpy array (for EasyOCR) or the raw bytes if it cannot be decoded.
+    """
+    img, _ = preprocess_image_with_plan(image_bytes)
+    return raw_bytes(image_bytes) if img is None else img
+
+
+def _ocr_cacheable(result: Dict) -> bool:
+    return bool(result and result.get("text"))
+
+
+def _ocr_cache_version(doc_type: Optional[str]) -> str:
+    # The hint selects the recognition model, so it is part of the cache key
+    return f"{OCR_STAGE_VERSION}:{doc_type or 'auto'}"
+
+
+def extract_text_with_stats(image_bytes: Union[bytes, DecodedImage], doc_type: Optional[str] = None) -> Dict:
+    """
+    OCR a document and return {"text": str, "stats": {...}}. The stats record
+    the engine used and, per page, which preprocessing steps ran and the
+    latency they saved. Concurrent calls are micro-batched and run on the
+    OCR worker pool. `doc_type` (Aadhaar / PAN / DrivingLicence), when known,
+    picks the smallest recognition model up front.
+    """
+    return stage_cache.get_or_compute(
+        "ocr", _ocr_cache_version(doc_type), content_key(image_bytes),
+        lambda: ocr_batcher.run((image_bytes, doc_type)),
+        cacheable=_ocr_cacheable,
+    )
+
+
+def extract_text_from_bytes(image_bytes: Union[bytes, DecodedImage], doc_type: Optional[str] = None) -> str:
     """
     Extract text from image using EasyOCR (primary) or Tesseract (fallback).
     EasyOCR is preferred for Indian documents (Aadhaar, PAN, DL).
     """
-    try:
-        # Detect PDF
-        is_pdf = image_bytes[:4] == b"%PDF"
-        
-        if is_pdf:
-            images = _pdf_bytes_to_images(image_bytes)
-            if not images:
-                return ""
-        else:
-            preprocessed = preprocess_image_for_ocr(image_bytes)
-            images = [preprocessed] if isinstance(preprocessed, np.ndarray) else []
-        
-        # Try EasyOCR first (better for Indian documents)
-        reader = _get_easyocr_reader()
-        if reader and images:
-            all_texts = []
-            for img in images:
-                try:
-                    # EasyOCR returns list of (bbox, text, confidence)
-                    # Use text_threshold for better detection
-                    results = reader.readtext(
-                        img, 
-                        detail=1, 
-                        paragraph=False,
-                        text_threshold=0.5,  # Lower threshold for text detection
-                        low_text=0.3,        # Lower threshold for low confidence text
-                        link_threshold=0.3,  # Link nearby characters
-                        width_ths=0.5,       # Width threshold for merging
-                        decoder='greedy'     # Faster decoder
-                    )
-                    
-                    # Debug: Print what EasyOCR found
-                    print(f"🔍 EasyOCR found {len(results)} text regions")
-                    
-                    # Sort results by vertical position (top to bottom), then horizontal
-                    results_sorted = sorted(results, key=lambda x: (x[0][0][1], x[0][0][0]))
-                    
-                    # Extract text, filter low confidence
-                    for bbox, text, conf in results_sorted:
-                        if conf > 0.15 and len(text.strip()) > 0:  # Further lowered threshold
-                            all_texts.append(text.strip())
-                            print(f"   📝 [{conf:.2f}] {text.strip()}")
-                    
-                except Exception as e:
-                    print(f"EasyOCR page error: {e}")
-                    import traceback
-                    traceback.print_exc()
-            
-            if all_texts:
-                combined_text = "\n".join(all_texts)
-                print(f"\n📄 Combined OCR Text ({len(combined_text)} chars):\n{combined_text[:500]}...")
-                return combined_text
-        
-        # Fallback to pytesseract
-        if pytesseract is not None:
-            print("⚠️ Falling back to pytesseract")
-            if is_pdf:
-                pil_images = convert_from_bytes(image_bytes, fmt="png") if convert_from_bytes else []
-            else:
-                pil_images = [Image.open(io.BytesIO(image_bytes))]
-            
-            texts = []
-            for pil_img in pil_images:
-                try:
-                    # Use PSM 6 for uniform block of text
-                    text = pytesseract.image_to_string(pil_img, config='--oem 3 --psm 6')
-                    texts.append(text)
-                except Exception as e:
-                    print(f"Tesseract error: {e}")
-            
-            return "\n".join(texts)
-        
-        return ""
-    except Exception as e:
-        print(f"OCR Error: {e}")
-        import traceback
-        traceback.print_exc()
-        return ""
+    return extract_text_with_stats(image_bytes, doc_type)["text"]
 
 
-def parse_text(text: str) -> Dict:
-    parsed = {
-        "panNumber": None,
-        "aadhaarNumber": None,
-        "name": None,
-        "fatherName": None,
-        "dob": None,
-        "gender": None,
-        "address": None,
-        "dlNumber": None,
-        "issueDate": None,
-        "validUntil": None,
-        "pinCode": None,      # NEW: 6-digit Indian postal code
-        "pinZone": None,      # NEW: Region derived from PIN
-        "state": None,        # NEW: Indian state from address
-        "documentType": None, # Detect early
-    }
-    
-    # Filter out empty lines and very short noise
-    lines = [l.strip() for l in text.splitlines() if len(l.strip()) > 2]
-    full = " ".join(lines)
-    full_upper = full.upper()
-
-    # ==========================================
-    # STEP 0: Detect Document Type FIRST (Critical for avoiding misclassification)
-    # ==========================================
-    if any(kw in full_upper for kw in ["AADHAAR", "UNIQUE IDENTIFICATION", "UIDAI", "आधार"]):
-        parsed["documentType"] = "Aadhaar"
-    elif any(kw in full_upper for kw in ["INCOME TAX", "PERMANENT ACCOUNT", "INCOME TAX DEPARTMENT", "PAN CARD", "आयकर विभाग"]):
-        parsed["documentType"] = "PAN"
-    elif any(kw in full_upper for kw in ["DRIVING LICENCE", "DRIVING LICENSE", "MOTOR DRIVING", "FORM 7", "LMV", "MCWG"]):
-        parsed["documentType"] = "DrivingLicence"
-    # Additional DL detection for poor OCR - look for patterns unique to DL
-    elif "NO.:" in full_upper or "NO. :" in full_upper:
-        # "No.:" pattern is unique to DL (Kerala format)
-        parsed["documentType"] = "DrivingLicence"
-    elif any(kw in full_upper for kw in ["VALID TO", "VALID FROM", "NON TRANSPORT", "NON TRANSPON", "BLOOD GROUP", "KERAL", "STATE DRIVING"]):
-        # These patterns are common on DL but not on other documents
-        parsed["documentType"] = "DrivingLicence"
-    elif "TRANSPORT" in full_upper and "DATE OF BIRTH" not in full_upper.replace(" ", ""):
-        # TRANSPORT alone might be DL if no other doc indicators
-        parsed["documentType"] = "DrivingLicence"
-    
-    print(f"   🔍 Detected document type: {parsed['documentType']}")
-
-    # ==========================================
-    # STEP 1: Extract IDs based on document type
-    # ==========================================
-    
-    # Aadhaar: 12 digits (may have spaces)
-    m = re.search(r"\b(\d{4}\s?\d{4}\s?\d{4})\b", full)
-    if m: 
-        aadhaar_candidate = m.group(1).replace(" ", "")
-        # Validate: should not be all same digits
-        if len(set(aadhaar_candidate)) > 2:
-            parsed["aadhaarNumber"] = aadhaar_candidate
-
-    # PAN: 5 letters + 4 digits + 1 letter (exactly 10 chars)
-    # First try exact match
-    m = re.search(r"\b[A-Z]{5}\d{4}[A-Z]\b", full)
-    if m:
-        parsed["panNumber"] = m.group().upper()
-        print(f"   ✓ Found exact PAN match: {parsed['panNumber']}")
-    
-    # If not found, look for partial matches (OCR sometimes misses last char)
-    if not parsed.get("panNumber"):
-        # Look for patterns like ABCD1234 followed by any letter
-        m = re.search(r"\b([A-Z]{4,5}\d{4}[A-Z]?)\b", full)
-        if m:
-            candidate = m.group(1).upper()
-            print(f"   🔍 Checking PAN candidate: {candidate}")
-            
-            # If it's 9-10 chars and starts with letters and has digits
-            if len(candidate) >= 8:
-                # Pad if needed to look for nearby letter
-                if len(candidate) == 9 and candidate[:5].isalpha() and candidate[5:9].isdigit():
-                    # Missing last letter, try to find it nearby
-                    idx = full.find(candidate)
-                    if idx >= 0 and idx + 10 <= len(full):
-                        next_char = full[idx + 9:idx + 10]
-                        if next_char.isalpha():
-                            parsed["panNumber"] = candidate + next_char.upper()
-                            print(f"   ✓ Repaired PAN: {parsed['panNumber']}")
-                elif len(candidate) == 10:
-                    parsed["panNumber"] = candidate
-                    print(f"   ✓ Found PAN: {parsed['panNumber']}")
-
-    # If PAN not found, attempt to detect common OCR-messed candidates and repair them
-    def _normalize_token(t: str) -> str:
-        return re.sub(r"[^A-Za-z0-9]", "", t).upper()
-
-    def _generate_variants_for_pan(token: str):
-        # Map common OCR confusions both directions
-        mapping = {
-            '0': ['O'], 'O': ['0'],
-            '1': ['I', 'L'], 'I': ['1', 'L'], 'L': ['1', 'I'],
-            '2': ['Z'], 'Z': ['2'],
-            '5': ['S'], 'S': ['5'],
-            '8': ['B'], 'B': ['8'],
-            '6': ['G'], 'G': ['6'],
-            '9': ['g'], 'g': ['9']
-        }
-        token = _normalize_token(token)
-        # Only consider tokens of length 10 (PAN canonical length)
-        if len(token) != 10:
-            return []
-        variants = set()
-        # Simple backtracking limited to ambiguous positions
-        amb_positions = [i for i, ch in enumerate(token) if ch in mapping]
-        # limit branching by only allowing up to 4 ambiguous positions to expand
-        if len(amb_positions) > 4:
-            amb_positions = amb_positions[:4]
-
-        def backtrack(idx, cur):
-            if idx == len(amb_positions):
-                candidates = list(cur)
-                variants.add(''.join(candidates))
-                return
-            pos = amb_positions[idx]
-            # move to next ambiguous position
-            backtrack(idx+1, cur)
-            # replace with each mapped alternative
-            for alt in mapping[cur[pos]]:
-                saved = cur[pos]
-                cur[pos] = alt
-                backtrack(idx+1, cur)
-                cur[pos] = saved
-
-        backtrack(0, list(token))
-        return variants
-
-    if not parsed.get("panNumber"):
-        # Find alphanumeric tokens that could be PAN (8-12 chars)
-        for t in re.findall(r"[A-Za-z0-9][A-Za-z0-9\s\-]{6,12}[A-Za-z0-9]", full):
-            norm = _normalize_token(t)
-            if len(norm) == 10:
-                # test direct
-                if re.match(r"^[A-Z]{5}\d{4}[A-Z]$", norm):
-                    parsed["panNumber"] = norm
-                    print(f"   ✓ Found PAN from token scan: {norm}")
-                    break
-                # try variants
-                for v in _generate_variants_for_pan(norm):
-                    if re.match(r"^[A-Z]{5}\d{4}[A-Z]$", v):
-                        parsed["panNumber"] = v
-                        print(f"   ✓ Found PAN via variant repair: {v}")
-                        break
-                if parsed.get("panNumber"):
-                    break
-        
-        # Last resort: look for any sequence that looks like it could be a partial PAN
-        if not parsed.get("panNumber") and parsed.get("documentType") == "PAN":
-            # On a PAN card, look for anything that looks like XXXX1234X pattern
-            for line in lines:
-                # Find tokens that are mostly alphanumeric and 8-12 chars
-                tokens = re.findall(r"[A-Za-z0-9]{8,12}", line.replace(" ", ""))
-                for tok in tokens:
-                    tok = tok.upper()
-                    letters = sum(1 for c in tok if c.isalpha())
-                    digits = sum(1 for c in tok if c.isdigit())
-                    # PAN has 6 letters and 4 digits
-                    if letters >= 4 and digits >= 3:
-                        parsed["panNumber"] = tok[:10] if len(tok) >= 10 else tok
-                        print(f"   ⚠️ Partial PAN detected: {parsed['panNumber']}")
-                        break
-                if parsed.get("panNumber"):
-                    break
-
-    # 2. Extract DOB - Multiple strategies
-    m = re.search(r"\b(\d{1,2}[-/]\d{1,2}[-/]\d{4})\b", full)
-    if m: 
-        parsed["dob"] = m.group(1)
+async def extract_text_with_stats_async(image_bytes: Union[bytes, DecodedImage], doc_type: Optional[str] = None) -> Dict:
+    """
+    Async variant for routes: awaits the batcher / worker pool instead of
+    blocking the event loop. Shares the stage cache with extract_text_with_stats.
+    """
+    key, version = content_key(image_bytes), _ocr_cache_version(doc_type)
+    cached = stage_cache.lookup("ocr", version, key)
+    if cached is not None:
+        return cached
+    result = await ocr_batcher.run_async((image_bytes, doc_type))
+    if _ocr_cacheable(result):
+        stage_cache.store("ocr", version, key, result)
+    return result
+
+
+async def extract_text_async(image_bytes: Union[bytes, DecodedImage], doc_type: Optional[str] = None) -> str:
+    return (await extract_text_with_stats_async(image_bytes, doc_type))["text"]
+
+
+def _run_ocr(image_bytes: Union[bytes, DecodedImage]) -> Dict:
+    """OCR a single document (no batching)."""
+    return _run_ocr_many([image_bytes])[0]
+
+
+# EasyOCR options shared by the single-image and batched calls
+_READTEXT_KWARGS = dict(
+    detail=1,
+    paragraph=False,
+    text_threshold=0.5,  # Lower threshold for text detection
+    low_text=0.3,        # Lower threshold for low confidence text
+    link_threshold=0.3,  # Link nearby characters
+    width_ths=0.5,       # Width threshold for merging
+    decoder='greedy',    # Faster decoder
+)
+
+# Max fraction of padding pixels tolerated when grouping images into one batch
+_MAX_PAD_WASTE = 0.35
+
+
+def _group_for_batching(images: List[np.ndarray]) -> List[List[int]]:
+    """
+    Group image indices so each group can be padded to one common shape
+    without wasting too much detector work on padding.
+    """
+    order = sorted(range(len(images)), key=lambda i: images[i].shape[0] * images[i].shape[1])
+    groups: List[List[int]] = []
+    for i in order:
+        if groups and images[groups[-1][0]].ndim == images[i].ndim:
+            g = groups[-1] + [i]
+            h = max(images[j].shape[0] for j in g)
+            w = max(images[j].shape[1] for j in g)
+            used = sum(images[j].shape[0] * images[j].shape[1] for j in g)
+            if 1 - used / float(h * w * len(g)) <= _MAX_PAD_WASTE:
+                groups[-1] = g
+                continue
+        groups.append([i])
+    return groups
+
+
+def _pad_to(img: np.ndarray, h: int, w: int) -> np.ndarray:
+    """Pad bottom/right with white so text coordinates are unchanged."""
+    ih, iw = img.shape[:2]
+    if (ih, iw) == (h, w):
+        return img
+    pad = ((0, h - ih), (0, w - iw)) + ((0, 0),) * (img.ndim - 2)
+    return np.pad(img, pad, mode="constant", constant_values=255)
+
+
+def _readtext_batch(reader, images: List[np.ndarray]) -> List[list]:
+    """
+    Run EasyOCR detection + recognition over many images at once and return
+    the per-image result lists. Falls back to one readtext call per image.
+    """
+    results: List[list] = [[] for _ in images]
+    batched = hasattr(reader, "readtext_batched")
+    for group in _group_for_batching(images):
+        if batched and len(group) > 1:
+            try:
+                h = max(images[i].shape[0] for i in group)
+                w = max(images[i].shape[1] for i in group)
+                padded = [_pad_to(images[i], h, w) for i in group]
+                out = reader.readtext_batched(padded, batch_size=len(group), **_READTEXT_KWARGS)
+                for i, res in zip(group, out):
+                    results[i] = res
+                continue
+            except Exception as e:
+                print(f"EasyOCR batch error, retrying per image: {e}")
+        for i in group:
+            try:
+                results[i] = reader.readtext(images[i], **_READTEXT_KWARGS)
+            except Exception as e:
+                print(f"EasyOCR page error: {e}")
+                import traceback
+                traceback.print_exc()
+    return results
+
+
+def _texts_from_results(results: list) -> List[str]:
+    # Debug: Print what EasyOCR found
+    print(f"🔍 EasyOCR found {len(results)} text regions")
+
+    # Sort results by vertical position (top to bottom), then horizontal
+    results_sorted = sorted(results, key=lambda x: (x[0][0][1], x[0][0][0]))
+
+    # Extract text, filter low confidence
+    texts = []
+    for bbox, text, conf in results_sorted:
+        if conf > 0.15 and len(text.strip()) > 0:  # Further lowered threshold
+            texts.append(text.strip())
+            print(f"   📝 [{conf:.2f}] {text.strip()}")
+    return texts
+
+
+def _prepare_images(image: DecodedImage, stats: Dict) -> List[np.ndarray]:
+    img, plan = preprocess_image_with_plan(image)
+    if img is None:
+        return []
+    stats["preprocess"].append(plan)
+    return [img]
+
+
+def _recognize_crops(reader, crops: List[np.ndarray]) -> List[str]:
+    """
+    Recognise single-line crops without running the text detector. All crops
+    are stacked on one white canvas and passed as horizontal boxes, so the
+    recogniser sees them as one batch.
+    """
+    if not crops:
+        return []
+    gap = 8
+    width = max(c.shape[1] for c in crops)
+    canvas = np.full((sum(c.shape[0] + gap for c in crops), width), 255, np.uint8)
+    boxes, y = [], 0
+    for c in crops:
+        h, w = c.shape[:2]
+        canvas[y:y + h, :w] = c
+        boxes.append([0, w, y, y + h])
+        y += h + gap
+
+    results = reader.recognize(canvas, horizontal_list=boxes, free_list=[],
+                               batch_size=len(crops), detail=1)
+    texts = [[] for _ in crops]
+    for bbox, text, conf in results:
+        cy = (bbox[0][1] + bbox[2][1]) / 2.0
+        for i, (_, _, y0, y1) in enumerate(boxes):
+            if y0 <= cy <= y1:
+                if conf > 0.15 and text.strip():
+                    texts[i].append(text.strip())
+                break
+    return [" ".join(t) for t in texts]
+
+
+def _run_roi(pages: List[np.ndarray], owners: List[int], out: List[Dict], doc_types: List[Optional[str]]) -> set:
+    """
+    Template-driven OCR for single-page card uploads: align the card, read the
+    header strip to pick a layout, then read only that layout's field boxes.
+    Returns the indexes of documents handled here; the rest (no card found,
+    unknown header, required field unreadable) go through full-page OCR.
+    """
+    t0 = time.perf_counter()
+    page_count: Dict[int, int] = {}
+    for d in owners:
+        page_count[d] = page_count.get(d, 0) + 1
+
+    cards: Dict[int, np.ndarray] = {}
+    full_px: Dict[int, int] = {}
+    for img, d in zip(pages, owners):
+        if page_count[d] == 1:
+            card = layouts.detect_card(img)
+            if card is not None:
+                cards[d] = card
+                full_px[d] = int(img.shape[0] * img.shape[1])
+    if not cards:
+        return set()
+
+    # Headers are read with the hinted type's reader; unhinted ones may be
+    # Devanagari, so they get the default reader
+    headers: Dict[int, str] = {}
+    header_docs: Dict[tuple, List[int]] = {}
+    for d in cards:
+        header_docs.setdefault(languages_for(doc_types[d]), []).append(d)
+    for langs, docs in header_docs.items():
+        reader = _get_easyocr_reader(langs)
+        if reader is None:
+            continue
+        crops = [layouts.crop_box(cards[d], layouts.HEADER_BOX) for d in docs]
+        headers.update(zip(docs, _recognize_crops(reader, crops)))
+    typed = [(d, h, doc_types[d] or layouts.classify_header(h)) for d, h in headers.items()]
+    typed = [(d, h, t) for d, h, t in typed if t in layouts.LAYOUTS]
+
+    # Field crops, one recognize() call per language set
+    slots_by_langs: Dict[tuple, List[tuple]] = {}
+    for d, _, doc_type in typed:
+        doc_types[d] = doc_type
+        for name, crop in layouts.field_crops(cards[d], doc_type).items():
+            slots_by_langs.setdefault(languages_for(doc_type), []).append((d, name, crop))
+    fields: Dict[int, Dict[str, str]] = {d: {} for d, _, _ in typed}
+    for langs, slots in slots_by_langs.items():
+        reader = _get_easyocr_reader(langs)
+        if reader is None:
+            continue
+        for (d, name, _), text in zip(slots, _recognize_crops(reader, [c for _, _, c in slots])):
+            fields[d][name] = text
+    roi_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+    done = set()
+    for d, header, doc_type in typed:
+        if not layouts.required_field_ok(doc_type, fields[d]):
+            print(f"⚠️ ROI OCR could not read the {doc_type} number; using full-page OCR")
+            continue
+        roi_px = layouts.roi_pixels(cards[d], doc_type)
+        out[d]["text"] = layouts.compose_text(doc_type, header, fields[d])
+        out[d]["stats"].update({
+            "engine": "easyocr-roi", "tier": "roi", "reader": "+".join(languages_for(doc_type)),
+            "ocrMs": roi_ms, "batchSize": len(out),
+            "roi": {"used": True, "docType": doc_type, "pixels": roi_px, "fullPixels": full_px[d],
+                    "reduction": round(full_px[d] / roi_px, 1) if roi_px else None},
+        })
+        print(f"✅ ROI OCR ({doc_type}): {roi_px} of {full_px[d]} pixels recognised")
+        done.add(d)
+    return done
+
+
+def _predetect_types(pages: List[np.ndarray], owners: List[int], out: List[Dict], doc_types: List[Optional[str]]):
+    """
+    Unhinted single-page card uploads: read only the header strip with the
+    English reader and classify it, so the full-page pass uses the model
+    that document type needs instead of the en+hi default. Documents with
+    no card outline or an unrecognised header keep the default.
+    """
+    page_count: Dict[int, int] = {}
+    for d in owners:
+        page_count[d] = page_count.get(d, 0) + 1
+    cards: Dict[int, np.ndarray] = {}
+    for img, d in zip(pages, owners):
+        if doc_types[d] is None and page_count[d] == 1:
+            card = layouts.detect_card(img)
+            if card is not None:
+                cards[d] = card
+    if not cards:
+        return
+    reader = _get_easyocr_reader(PREDETECT_LANGS)
+    if reader is None:
+        return
+    crops = [layouts.crop_box(cards[d], layouts.HEADER_BOX) for d in cards]
+    for d, header in zip(cards, _recognize_crops(reader, crops)):
+        doc_type = layouts.classify_header(header)
+        if doc_type in layouts.LAYOUTS:
+            doc_types[d] = doc_type
+            out[d]["stats"]["detectedType"] = doc_type
+
+
+def _drop_docs(pages: List[np.ndarray], owners: List[int], done: set):
+    keep = [i for i, d in enumerate(owners) if d not in done]
+    return [pages[i] for i in keep], [owners[i] for i in keep]
+
+
+def _tesseract_lines(img: np.ndarray):
+    """Tesseract text grouped by line, plus the mean word confidence (0-100)."""
+    data = pytesseract.image_to_data(img, config='--oem 3 --psm 6', output_type=pytesseract.Output.DICT)
+    lines: Dict[tuple, List[str]] = {}
+    confs = []
+    for i, word in enumerate(data["text"]):
+        conf = float(data["conf"][i])
+        if conf < 0 or not word.strip():
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word.strip())
+        confs.append(conf)
+    text = "\n".join(" ".join(words) for _, words in sorted(lines.items()))
+    return text, (sum(confs) / len(confs) if confs else 0.0)
+
+
+def _fast_tier_problem(parsed: Dict, mean_conf: float) -> str:
+    """
+    Why the fast-tier result is not good enough ("" when it is): the document
+    number must be present and valid for its type, a name must be found and
+    the mean word confidence must reach OCR_CASCADE_MIN_CONF.
+    """
+    from .verification import verhoeff_validate, verify_dl_local
+
+    doc_type = parsed.get("documentType")
+    if doc_type == "Aadhaar":
+        if not parsed.get("aadhaarNumber"):
+            return "aadhaar_missing"
+        if not verhoeff_validate(parsed["aadhaarNumber"]):
+            return "aadhaar_checksum"
+    elif doc_type == "PAN":
+        if not re.fullmatch(r"[A-Z]{5}\d{4}[A-Z]", parsed.get("panNumber") or ""):
+            return "pan_format"
+        if (parsed.get("panConfidence") or 0) < 0.5:
+            return "pan_repaired"
+    elif doc_type == "DrivingLicence":
+        if not verify_dl_local(parsed.get("dlNumber")):
+            return "dl_format"
     else:
-        # Try alternative patterns
-        m_yob = re.search(r"(?i)(year|yob|dob)[\s:\-]*(\d{1,2}[-/]\d{1,2}[-/]\d{4})", full)
-        if m_yob: 
-            parsed["dob"] = m_yob.group(2)
-        else:
-            m_yob = re.search(r"(?i)(year|yob)[\s:\-]*(\d{4})", full)
-            if m_yob: 
-                parsed["dob"] = m_yob.group(2)
-
-    # 3. Extract Gender
-    m = re.search(r"(?i)\b(male|female|transgender)\b", full)
-    if m:
-        parsed["gender"] = m.group(1).capitalize()
-    elif " M " in full or " M\n" in text or re.search(r"\bM\b", full):
-        parsed["gender"] = "Male"
-    elif " F " in full or " F\n" in text or re.search(r"\bF\b", full):
-        parsed["gender"] = "Female"
-
-    # 4. ROBUST NAME EXTRACTION
-    # Extended bad patterns to avoid department names, headers, and government text
-    bad_patterns = [
-        "GOVERNMENT", "INDIA", "FATHER", "ADDRESS", "YEAR", "MALE", "FEMALE", 
-        "AADHAAR", "PAN", "LICENSE", "LICENCE", "DOB", "DATE", "PSSST", "SSS", 
-        "SRI", "SHRI", "GOVT", "PROOF", "BIRTH", "CITIZENSHIP", "VERIFICATION", 
-        "AUTHENTICATION", "CODE", "OFFLINE", "BLOOD", "GROUP", "CATEGORY", 
-        "TRANSPORT", "VALID", "FROM", "MP", "OOOS", "ES", "LON", "ENC", "RAS", "NEU",
-        # Department and header text to exclude
-        "INCOME TAX", "DEPARTMENT", "PERMANENT ACCOUNT", "NUMBER CARD", "SIGNATURE",
-        "HOLDER", "PHOTO", "CARD", "UNION", "REPUBLIC", "MINISTRY", "UNIQUE",
-        "IDENTIFICATION", "AUTHORITY", "REVENUE", "CENTRAL", "MOTOR", "DRIVING",
-        "REPUBLIC OF INDIA", "GOVT OF INDIA", "TAX DEPARTMENT", "ACCOUNT NUMBER",
-        # State names (to avoid header text like "KERALA STATE" being parsed as name)
-        "KERALA", "KARNATAKA", "TAMIL NADU", "ANDHRA", "TELANGANA", "MAHARASHTRA",
-        "GUJARAT", "RAJASTHAN", "PUNJAB", "HARYANA", "DELHI", "UTTAR PRADESH",
-        "MADHYA PRADESH", "WEST BENGAL", "BIHAR", "ODISHA", "JHARKHAND", 
-        "CHHATTISGARH", "ASSAM", "MEGHALAYA", "TRIPURA", "MANIPUR", "NAGALAND",
-        "MIZORAM", "SIKKIM", "GOA", "HIMACHAL", "UTTARAKHAND", "JAMMU",
-        # DL-specific headers
-        "INDIAN UNION", "STATE DRIVING", "FORM", "PILLAI", "CATEGORY",
-        "NON-TRANSPORT", "TRANSPORT", "LMV", "MCWG", "THIRUVANANTHAPURAM"
-    ]
-    bad_words = {"THE", "AND", "OR", "NOT", "FOR", "WITH", "ONLY", "SHOULD", "USED", "BE", "IT", "IS", "OF", "TO", "IN", "AT", "BY", "FROM", "ON", "A", "AN", "NO", "TAX", "DEPARTMENT", "INCOME", "STATE", "KERALA", "KERAL"}
-    
-    # For DL documents, skip general name extraction - we'll handle it specially later
-    # This prevents picking up header text like "KERALA STATE"
-    if parsed.get("documentType") != "DrivingLicence":
-        # Strategy A (PRIORITY): Look for "Name:" anywhere, even with weird punctuation/spacing
-        # Very flexible - handles "S. Name:", "Name:", "S.Name:", etc.
-        m_name = re.search(r"(?i)(?:s\.?\s*)?name['\s:\-]*([A-Za-z][A-Za-z\s\.]{2,60}?)(?=\n|$|[0-9]|Date|DOB)", full)
-        if m_name:
-            candidate = m_name.group(1).strip()
-            # Remove trailing single letters that are artifacts
-            candidate = re.sub(r'\s+[A-Z]$', '', candidate).strip()
-            words = candidate.split()
-            # Must have at least 1 word, and not be a bad pattern
-            if words and 3 <= len(candidate) <= 60 and not any(bp in candidate.upper() for bp in bad_patterns):
-                parsed["name"] = candidate
-    
-    # Strategy B: Look for multi-word lines that look like names - but ONLY if they have real English names
-    # Require minimum word length per word to filter out garbage like "MP OOOS" or "ES A"
-    # Only if name not found yet
+        return "unknown_document"
     if not parsed.get("name"):
-        for idx, line in enumerate(lines):
-            clean_line = re.sub(r'[^A-Za-z\s\.]', '', line).strip()
-            words_in_line = clean_line.split()
-            word_count = len(words_in_line)
-            
-            # Name heuristics:
-            # - 2+ words (handles "SUNIL BHASKAR U" or "Y TEJA")
-            # - 3-60 chars total
-            # - All alphabetic
-            # - Starts with uppercase
-            # - Each word should be 2+ chars (filters out "MP OOOS" which has "MP" = 2 but "OOOS" = 4)
-            # - At least one word with 4+ chars (to avoid acronyms/abbreviations)
-            # - Not matching bad patterns/words
-            word_lengths = [len(w) for w in words_in_line]
-            has_long_word = any(wl >= 4 for wl in word_lengths)
-            all_words_sufficient = all(wl >= 2 for wl in word_lengths)
-            
-            if (3 <= len(clean_line) <= 60 and 
-                word_count >= 2 and
-                all_words_sufficient and
-                has_long_word and
-                clean_line.replace(" ", "").isalpha() and
-                not any(bp in clean_line.upper() for bp in bad_patterns) and
-                not all(w.upper() in bad_words for w in words_in_line)):
-                
-                if clean_line and clean_line[0].isupper():
-                    parsed["name"] = clean_line
-                    break
-    
-    # Strategy C: Look for lines immediately before DOB marker (position-based fallback)
-    if not parsed.get("name") and parsed.get("dob"):
-        for i, line in enumerate(lines):
-            if parsed["dob"] in line or "DOB" in line.upper() or "DATE OF BIRTH" in line.upper():
-                # Check line before
-                if i > 0:
-                    candidate = re.sub(r'[^A-Za-z\s\.]', '', lines[i-1]).strip()
-                    if (3 <= len(candidate) <= 60 and
-                        candidate.replace(" ", "").isalpha() and
-                        not any(b in candidate.upper() for b in bad_patterns)):
-                        parsed["name"] = candidate
-                        break
-    
-    # 5. Extract Father's Name
-    m = re.search(r"(?i)father['s]*\s*name[:\-]?\s*([A-Za-z][A-Za-z\s]{2,100}?)(?=\n|$)", full)
-    if m: 
-        parsed["fatherName"] = m.group(1).strip()
-
-    # 6. Extract Address
-    m_addr = re.search(r"(?i)address[:\-]?\s*(.+?)(?=\n|$)", full)
-    if m_addr:
-        addr = m_addr.group(1)
-        # Remove ID numbers from address if captured by mistake
-        addr = re.sub(r"\d{4}\s?\d{4}\s?\d{4}", "", addr).strip()
-        if len(addr) > 3:
-            parsed["address"] = addr
-
-    # 6b. Extract PIN Code (Indian 6-digit postal code)
-    pin_patterns = [
-        r"(?:PIN|Pin|Pincode|Pin\s*Code|Postal\s*Code)[:\s\-]*(\d{6})\b",  # Explicit PIN label
-        r"\b(\d{6})\s*(?:India|INDIA)?\s*$",  # 6 digits at end of text
-        r"[\-,\s](\d{6})\b",  # 6 digits after separator
-    ]
-    for pat in pin_patterns:
-        m_pin = re.search(pat, full, re.IGNORECASE)
-        if m_pin:
-            pin = m_pin.group(1)
-            # Validate: Indian PIN codes start with 1-9 (not 0)
-            if pin[0] != '0':
-                parsed["pinCode"] = pin
-                # Extract zone from PIN (first digit indicates region)
-                pin_zone_map = {
-                    '1': 'Delhi/Haryana/Punjab/HP/J&K',
-                    '2': 'UP/Uttarakhand',
-                    '3': 'Rajasthan/Gujarat',
-                    '4': 'Maharashtra/Goa/MP/Chhattisgarh',
-                    '5': 'AP/Telangana/Karnataka',
-                    '6': 'Kerala/Tamil Nadu',
-                    '7': 'West Bengal/Odisha/NE States',
-                    '8': 'Bihar/Jharkhand',
-                    '9': 'Army Post Office'
-                }
-                parsed["pinZone"] = pin_zone_map.get(pin[0], 'Unknown')
-                break
+        return "name_missing"
+    if mean_conf < settings.OCR_CASCADE_MIN_CONF:
+        return "low_confidence"
+    return ""
+
+
+def _run_fast_tier(pages: List[np.ndarray], owners: List[int], out: List[Dict],
+                   doc_types: List[Optional[str]], accept_all: bool = False) -> set:
+    """
+    Tesseract pass over the preprocessed pages. Documents whose parsed fields
+    pass _fast_tier_problem are finished here; the rest escalate to EasyOCR.
+    With accept_all (no EasyOCR available) every non-empty result is kept.
+    The document type parsed here (if any) selects the EasyOCR model later.
+    """
+    doc_lines: Dict[int, List[str]] = {}
+    doc_confs: Dict[int, List[float]] = {}
+    doc_ms: Dict[int, float] = {}
+    for img, d in zip(pages, owners):
+        t0 = time.perf_counter()
+        try:
+            text, conf = _tesseract_lines(img)
+        except Exception as e:
+            print(f"Tesseract error: {e}")
+            text, conf = "", 0.0
+        doc_lines.setdefault(d, []).append(text)
+        doc_confs.setdefault(d, []).append(conf)
+        doc_ms[d] = doc_ms.get(d, 0.0) + (time.perf_counter() - t0) * 1000
+
+    done = set()
+    for d, texts in doc_lines.items():
+        text = "\n".join(t for t in texts if t)
+        mean_conf = round(sum(doc_confs[d]) / len(doc_confs[d]), 1)
+        parsed = parse_text(text) if text else {}
+        problem = _fast_tier_problem(parsed, mean_conf) if text else "no_text"
+        doc_types[d] = doc_types[d] or parsed.get("documentType")
+        cascade = {"fastMs": round(doc_ms[d], 1), "fastConf": mean_conf, "escalated": bool(problem)}
+        if problem:
+            cascade["reason"] = problem
+        out[d]["stats"]["cascade"] = cascade
+        if text and (not problem or accept_all):
+            out[d]["text"] = text
+            out[d]["stats"].update({"engine": "tesseract", "tier": "fast", "ocrMs": round(doc_ms[d], 1)})
+            print(f"⚡ Fast OCR tier accepted ({mean_conf} mean conf)")
+            done.add(d)
+        else:
+            print(f"⏫ Escalating to EasyOCR: {problem}")
+    return done
+
+
+def _pdf_identifiers_found(text: str) -> bool:
+    """A valid document number and a name are all the pipeline needs."""
+    return bool(text) and _fast_tier_problem(parse_text(text), 100.0) == ""
+
 
-    # 6c. Extract State (common Indian states from address)
-    state_keywords = [
-        "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh",
-        "Goa", "Gujarat", "Haryana", "Himachal Pradesh", "Jharkhand", "Karnataka",
-        "Kerala", "Madhya Pradesh", "Maharashtra", "Manipur", "Meghalaya", "Mizoram",
-        "Nagaland", "Odisha", "Punjab", "Rajasthan", "Sikkim", "Tamil Nadu",
-        "Telangana", "Tripura", "Uttar Pradesh", "Uttarakhand", "West Bengal",
-        "Delhi", "Chandigarh", "Puducherry", "Jammu", "Kashmir", "Ladakh"
-    ]
-    for state in state_keywords:
-        if re.search(rf"\b{re.escape(state)}\b", full, re.IGNORECASE):
-            parsed["state"] = state
+def _ocr_pdf_pages(langs: Optional[tuple], images: List[np.ndarray]) -> List[str]:
+    reader = _get_easyocr_reader(langs) if langs else None
+    if reader:
+        return ["\n".join(_texts_from_results(r)) for r in _readtext_batch(reader, images)]
+    if pytesseract is not None:
+        return [_tesseract_lines(img)[0] for img in images]
+    return ["" for _ in images]
+
+
+def _run_pdf(pdf_bytes: bytes, langs: Optional[tuple], result: Dict):
+    """
+    OCR a PDF page by page. Embedded text layers are used as-is; other pages
+    are rendered lazily, PDF_PAGE_BATCH at a time (batched through the EasyOCR
+    reader for `langs`, loaded only if a page needs it; None = Tesseract), and
+    reading stops once the identifiers have been found.
+    """
+    stats = result["stats"]
+    t0 = time.perf_counter()
+    texts: List[str] = []
+    pending: List[np.ndarray] = []
+    info = {"pageCount": 0, "pagesProcessed": 0, "textLayerPages": 0, "renderedPages": 0,
+            "stoppedEarly": False, "dpi": settings.PDF_OCR_DPI}
+    engine = "easyocr" if langs else ("tesseract" if pytesseract is not None else None)
+
+    def flush():
+        if pending:
+            texts.extend(t for t in _ocr_pdf_pages(langs, pending) if t)
+            pending.clear()
+
+    for page in iter_pdf_pages(pdf_bytes):
+        info["pageCount"] = page.page_count
+        info["pagesProcessed"] += 1
+        stats["pages"] += 1
+        if page.text:
+            info["textLayerPages"] += 1
+            texts.append(page.text.strip())
+        else:
+            plan = plan_preprocessing(page.image)
+            pending.append(apply_preprocessing(page.image, plan))
+            stats["preprocess"].append(plan)
+            info["renderedPages"] += 1
+            if len(pending) < max(1, settings.PDF_PAGE_BATCH):
+                continue
+            flush()
+        if page.index + 1 < page.read_limit and _pdf_identifiers_found("\n".join(texts)):
+            info["stoppedEarly"] = True
             break
+    flush()
 
+    result["text"] = "\n".join(texts)
+    if info["textLayerPages"] and not info["renderedPages"]:
+        engine = "pdf-text"
+    stats.update({"engine": engine if result["text"] else None, "tier": "pdf", "pdf": info,
+                  "ocrMs": round((time.perf_counter() - t0) * 1000, 1)})
+    print(f"📄 PDF: {info['pagesProcessed']}/{info['pageCount']} pages read "
+          f"({info['textLayerPages']} text layer, {info['renderedPages']} rendered)")
+    if not info["stoppedEarly"] and info["pagesProcessed"] < info["pageCount"]:
+        print(f"⚠️ PDF truncated at PDF_MAX_PAGES={settings.PDF_MAX_PAGES}")
 
-    # 7. Extract Driver's License Number - ONLY for DL documents
-    # This prevents false detection on PAN/Aadhaar cards
-    if parsed.get("documentType") == "DrivingLicence":
-        # Add state-specific bad words for DL
-        dl_bad_patterns = ["KERALA", "STATE", "INDIAN", "UNION", "DRIVING", "LICENCE", 
-                          "LICENSE", "TRANSPORT", "MOTOR", "FORM", "PILLAI", "KERAL", 
-                          "TRANSPON", "BLOOD", "GROUP", "CATEGORY", "VALID"]
-        
-        print(f"   🚗 Processing DL document...")
-        print(f"   📝 Raw text first 500 chars: {full[:500]}")
-        
-        # Process line by line for DL - EasyOCR returns separate lines
-        dl_lines = [l.strip() for l in text.splitlines() if l.strip()]
-        print(f"   📋 DL lines count: {len(dl_lines)}")
-        
-        # Find name - look for line after "Name" or line starting with ":"
-        found_name_label = False
-        for i, line in enumerate(dl_lines):
-            line_clean = line.strip()
-            
-            # Check if this line is the "Name" label
-            if line_clean.upper() == "NAME" or line_clean.upper().startswith("NAME "):
-                found_name_label = True
+
+def _tesseract_text(image: DecodedImage) -> str:
+    print("⚠️ Falling back to pytesseract")
+    if image.bgr is not None:
+        pil_images = [Image.fromarray(image.bgr[:, :, ::-1])]
+    else:
+        pil_images = [Image.open(image.open())]
+
+    texts = []
+    for pil_img in pil_images:
+        try:
+            # Use PSM 6 for uniform block of text
+            text = pytesseract.image_to_string(pil_img, config='--oem 3 --psm 6')
+            texts.append(text)
+        except Exception as e:
+            print(f"Tesseract error: {e}")
+
+    return "\n".join(texts)
+
+
+def _run_ocr_many(docs: List[Union[bytes, DecodedImage]], hints: Optional[List[Optional[str]]] = None) -> List[Dict]:
+    """
+    OCR worker entry point (executed inside the pool processes).
+    Documents go through a cascade and leave at the first tier whose result
+    is good enough: fast Tesseract (OCR_CASCADE), EasyOCR on template crops
+    (OCR_ROI_MODE), then full-page EasyOCR over all remaining pages in one
+    batch. Tesseract on the raw bytes is the last fallback. stats["tier"]
+    records which tier produced the text. EasyOCR uses the smallest model
+    for each document's hinted or detected type (see ocr_readers; with
+    OCR_PREDETECT an unhinted card's header is classified first); a model
+    is loaded only when a tier reaches a document that needs it.
+    """
+    out = [{"text": "", "stats": {"engine": None, "pages": 0, "preprocess": []}} for _ in docs]
+    doc_types: List[Optional[str]] = list(hints) if hints else [None] * len(docs)
+    pages: List[np.ndarray] = []
+    owners: List[int] = []
+    easyocr = reader_registry.available()
+    docs = [as_decoded(doc) for doc in docs]
+    for d, image in enumerate(docs):
+        if is_pdf(image.data):
+            try:
+                _run_pdf(image.data, languages_for(doc_types[d]) if easyocr else None, out[d])
+            except Exception as e:
+                print(f"PDF OCR Error: {e}")
+            continue
+        try:
+            for img in _prepare_images(image, out[d]["stats"]):
+                pages.append(img)
+                owners.append(d)
+                out[d]["stats"]["pages"] += 1
+        except Exception as e:
+            print(f"OCR Error: {e}")
+
+    # Tier 1: fast Tesseract pass, kept only if the parsed fields check out
+    if settings.OCR_CASCADE and pytesseract is not None and pages:
+        fast_done = _run_fast_tier(pages, owners, out, doc_types, accept_all=not easyocr)
+        pages, owners = _drop_docs(pages, owners, fast_done)
+
+    # Pick each unhinted card's model from its header before any EasyOCR tier runs
+    if easyocr and pages and settings.OCR_PREDETECT:
+        try:
+            _predetect_types(pages, owners, out, doc_types)
+        except Exception as e:
+            print(f"⚠️ Document type pre-detection failed, using the default reader: {e}")
+
+    # Tier 2: EasyOCR on template field crops (better for Indian documents)
+    if easyocr and pages and settings.OCR_ROI_MODE:
+        try:
+            roi_done = _run_roi(pages, owners, out, doc_types)
+        except Exception as e:
+            print(f"ROI OCR error, using full-page OCR: {e}")
+            roi_done = set()
+        pages, owners = _drop_docs(pages, owners, roi_done)
+
+    # Tier 3: full-page EasyOCR, batched per language set
+    if easyocr and pages:
+        t0 = time.perf_counter()
+        doc_texts: List[List[str]] = [[] for _ in docs]
+        by_langs: Dict[tuple, List[int]] = {}
+        for i, d in enumerate(owners):
+            by_langs.setdefault(languages_for(doc_types[d]), []).append(i)
+        for langs, idx in by_langs.items():
+            lang_reader = _get_easyocr_reader(langs)
+            if lang_reader is None:
+                continue  # model failed to load: these pages fall back to Tesseract
+            for i, results in zip(idx, _readtext_batch(lang_reader, [pages[i] for i in idx])):
+                doc_texts[owners[i]].extend(_texts_from_results(results))
+                out[owners[i]]["stats"]["reader"] = "+".join(langs)
+        batch_ms = round((time.perf_counter() - t0) * 1000, 1)
+        for d, texts in enumerate(doc_texts):
+            if texts:
+                out[d]["text"] = "\n".join(texts)
+                out[d]["stats"].update({"engine": "easyocr", "tier": "full", "ocrMs": batch_ms, "batchSize": len(docs)})
+                print(f"\n📄 Combined OCR Text ({len(out[d]['text'])} chars):\n{out[d]['text'][:500]}...")
+
+    # Fallback to pytesseract for images EasyOCR could not read
+    if pytesseract is not None:
+        for d, image in enumerate(docs):
+            if out[d]["text"] or is_pdf(image.data):
                 continue
-            
-            # If previous line was "Name", this line might be the actual name
-            if found_name_label or line_clean.startswith(":"):
-                # Extract name from line like ":SUNIL BHASKARU" or "SUNIL BHASKAR"
-                candidate = line_clean
-                if candidate.startswith(":"):
-                    candidate = candidate[1:].strip()
-                
-                # Clean up the name
-                candidate = re.sub(r'[^A-Za-z\s\.]', '', candidate).strip()
-                candidate = re.sub(r'\s+', ' ', candidate)  # Normalize spaces
-                
-                # Remove trailing single letter artifacts
-                candidate = re.sub(r'\s+[A-Z]$', '', candidate).strip()
-                
-                print(f"   🔍 Checking name candidate: '{candidate}'")
-                
-                # Validate - must be alphabetic, reasonable length, not bad pattern
-                if (5 <= len(candidate) <= 50 and 
-                    candidate.replace(" ", "").replace(".", "").isalpha() and
-                    not any(bp in candidate.upper() for bp in dl_bad_patterns)):
-                    parsed["name"] = candidate
-                    print(f"   ✓ DL Name found: {parsed['name']}")
-                    break
-                
-                found_name_label = False  # Reset if this wasn't a valid name
-        
-        # Find DL Number - look for "No.:" pattern or line with format X/XXXX/XXXX
-        for line in dl_lines:
-            line_clean = line.strip()
-            
-            # Pattern: "No.:  1/1626/2006" 
-            if "no" in line_clean.lower() and (":" in line_clean or "/" in line_clean):
-                m = re.search(r"(\d{1,2}/\d{2,5}/\d{4})", line_clean)
-                if m:
-                    dl_num = m.group(1)
-                    # Validate: middle part should be > 2 digits (not a date)
-                    parts = dl_num.split("/")
-                    if len(parts) == 3 and len(parts[1]) >= 3:
-                        parsed["dlNumber"] = dl_num
-                        print(f"   ✓ DL Number found: {parsed['dlNumber']}")
-                        break
-        
-        # Fallback: Look for any X/XXXX/XXXX pattern that's not a date
-        if not parsed.get("dlNumber"):
-            for line in dl_lines:
-                m = re.search(r"(\d{1,2}/\d{3,5}/\d{4})", line)
-                if m:
-                    dl_num = m.group(1)
-                    parts = dl_num.split("/")
-                    # DL number has middle part with 3+ digits (dates have 2)
-                    if len(parts) == 3 and len(parts[1]) >= 3:
-                        parsed["dlNumber"] = dl_num
-                        print(f"   ✓ DL Number found (pattern): {parsed['dlNumber']}")
-                        break
-        
-        # Find DOB - look for "Date of Birth" or "DOB" pattern
-        for i, line in enumerate(dl_lines):
-            line_clean = line.strip().upper()
-            
-            # Check for DOB label patterns (OCR might mangle "Birth" to "Binh")
-            if any(x in line_clean for x in ["DATE OF BIRTH", "DOB", "BIRTH", "BINH", "D.O.B"]):
-                # Look for date in same line or next line
-                m = re.search(r"(\d{1,2}[/\-]\d{1,2}[/\-]\d{4})", line)
-                if m:
-                    parsed["dob"] = m.group(1)
-                    print(f"   ✓ DL DOB found (same line): {parsed['dob']}")
-                    break
-                elif i + 1 < len(dl_lines):
-                    # Check next line for date
-                    m = re.search(r"(\d{1,2}[/\-]\d{1,2}[/\-]\d{4})", dl_lines[i+1])
-                    if m:
-                        parsed["dob"] = m.group(1)
-                        print(f"   ✓ DL DOB found (next line): {parsed['dob']}")
-                        break
-        
-        # Fallback: Find all dates and use the one that looks like DOB (not issue date)
-        if not parsed.get("dob"):
-            all_dates = re.findall(r"(\d{1,2}[/\-]\d{1,2}[/\-]\d{4})", full)
-            print(f"   📅 All dates found: {all_dates}")
-            for date_str in all_dates:
-                parts = date_str.replace("-", "/").split("/")
-                if len(parts) == 3:
-                    try:
-                        year = int(parts[2])
-                        # DOB year is typically 1950-2010 for adults
-                        if 1950 <= year <= 2010:
-                            parsed["dob"] = date_str
-                            print(f"   ✓ DL DOB found (by year): {parsed['dob']}")
-                            break
-                    except:
-                        pass
-        
-        # Pattern 1: Explicit DL label
-        if not parsed.get("dlNumber"):
-            m = re.search(r"(?i)(?:dl|driv|license|licence|lic)\s*(?:no|number|#|:)?[\s:\-]*([A-Za-z0-9\-/]{5,20})", full)
-            if m:
-                dl_candidate = m.group(1).strip()
-                if 5 <= len(dl_candidate) <= 20:
-                    parsed["dlNumber"] = dl_candidate
-                    print(f"   ✓ DL Number (label pattern): {parsed['dlNumber']}")
-        
-        # Pattern 2: Look for Indian DL format with state code: "KL01XXXXX12345" or "HR01XXXXX12345"
-        if not parsed.get("dlNumber"):
-            for t in re.findall(r"[A-Z]{2}[-\s]?\d{1,3}[-\s]?\d{3,15}", full):
-                norm = re.sub(r"[\s\-]", "", t).upper()
-                if 8 <= len(norm) <= 20:
-                    parsed["dlNumber"] = norm
-                    print(f"   ✓ DL Number (state code pattern): {parsed['dlNumber']}")
-                    break
-        
-        # Pattern 3: Look for sequences like "1/1626/2006" (Kerala DL format)
-        if not parsed.get("dlNumber"):
-            m = re.search(r"(\d{1,2}[/]\d{2,4}[/]\d{4})", full)
-            if m:
-                # Determine if this is DL number vs date by context
-                dl_candidate = m.group(1)
-                # Check if this appears after "No" or at start
-                context_before = full[:m.start()][-20:] if m.start() > 20 else full[:m.start()]
-                if "No" in context_before or m.start() < 100:
-                    parsed["dlNumber"] = dl_candidate
-                    print(f"   ✓ DL Number (slash format): {parsed['dlNumber']}")
-        
-        # Pattern 4: Fallback - look for standalone sequences that look like DL
-        if not parsed.get("dlNumber"):
-            for t in re.findall(r"[A-Za-z0-9\-/]{8,20}", full):
-                norm = re.sub(r"[^A-Za-z0-9]", "", t).upper()
-                if 8 <= len(norm) <= 20:
-                    letters = sum(1 for c in norm if c.isalpha())
-                    digits = sum(1 for c in norm if c.isdigit())
-                    # DL typically has some letters and many digits
-                    if letters >= 1 and digits >= 3:
-                        parsed["dlNumber"] = norm
-                        print(f"   ✓ DL Number (fallback): {parsed['dlNumber']}")
-                        break
-    
-    # 8. Extract Issue Date / Valid Until
-    m = re.search(r"(?i)(issue|issued|iss)[\s:\-]*(\d{1,2}[-/]\d{1,2}[-/]\d{4})", full)
-    if m:
-        parsed["issueDate"] = m.group(2)
-    
-    m = re.search(r"(?i)(valid|validity|exp|expiry|until)[\s:\-]*(\d{1,2}[-/]\d{1,2}[-/]\d{4})", full)
-    if m:
-        parsed["validUntil"] = m.group(2)
-    
-    # Document type already detected at the start of this function
-    # Print final parsed result summary
-    print(f"   ✅ Final parsed: docType={parsed.get('documentType')}, aadhaar={parsed.get('aadhaarNumber')}, pan={parsed.get('panNumber')}, name={parsed.get('name')}")
-    
-    return parsed
\ No newline at end of file
+            try:
+                t0 = time.perf_counter()
+                out[d]["text"] = _tesseract_text(image)
+                out[d]["stats"].update({"engine": "tesseract", "tier": "fallback",
+                                        "ocrMs": round((time.perf_counter() - t0) * 1000, 1)})
+            except Exception as e:
+                print(f"OCR Error: {e}")
+                import traceback
+                traceback.print_exc()
+
+    return out
+
+
+def _process_ocr_batch(items: List[tuple]) -> List[Dict]:
+    """Batcher callback: items are (bytes or DecodedImage, document type hint)."""
+    return ocr_pool.run_sync(_run_ocr_many, [b for b, _ in items], [h for _, h in items])
+
+
+ocr_batcher = OCRBatcher(
+    _process_ocr_batch,
+    max_batch_size=settings.OCR_BATCH_MAX_SIZE,
+    max_wait_ms=settings.OCR_BATCH_MAX_WAIT_MS,
+    concurrency=max(1, settings.OCR_POOL_SIZE),
+)
+
+
+def parse_text(text: str) -> Dict:
+    """Extract ID fields from OCR text (see extractors.EXTRACTORS)."""
+    return extract_fields(text)
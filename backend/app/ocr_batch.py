@@ -0,0 +1,161 @@
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# ============================================
+# Cross-request OCR micro-batching
+# ============================================
+# Documents that arrive within a few milliseconds of each other (bulk uploads,
+# concurrent users) are collected into one batch so EasyOCR can run detection
+# and recognition over all of them in a single call. A dispatcher thread forms
+# batches; up to `concurrency` batches are processed at once so every OCR
+# worker process stays busy.
+#
+# A batch that raises is retried one document at a time, so the exception
+# reaches only the future of the document that caused it; its neighbours
+# still get their results. close() stops the dispatcher once everything
+# already queued has been dispatched and waits for running batches; the
+# next submit() starts a new one.
+
+_STOP = object()
+
+
+def _settle(fut: Future, result: Any = None, error: Optional[BaseException] = None):
+    try:
+        if error is not None:
+            fut.set_exception(error)
+        else:
+            fut.set_result(result)
+    except InvalidStateError:
+        pass  # the caller cancelled it meanwhile
+
+
+class OCRBatcher:
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 8, max_wait_ms: float = 5.0, concurrency: int = 1):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.concurrency = max(1, concurrency)
+
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        self._executor = None
+
+        # metrics
+        self._batches = 0
+        self._items = 0
+        self._size_hist: Dict[int, int] = {}
+        self._delay_total_ms = 0.0
+        self._delay_max_ms = 0.0
+        self._split_batches = 0
+
+    # ---------- submission ----------
+    def submit(self, item: Any) -> Future:
+        """Queue one document; the returned future resolves to its OCR result."""
+        fut: Future = Future()
+        # Under the lock so nothing lands behind a close() marker
+        with self._lock:
+            self._ensure_started()
+            self._queue.put((item, fut, time.perf_counter()))
+        return fut
+
+    def run(self, item: Any) -> Any:
+        return self.submit(item).result()
+
+    async def run_async(self, item: Any) -> Any:
+        return await asyncio.wrap_future(self.submit(item))
+
+    # ---------- dispatcher ----------
+    def _ensure_started(self):
+        # Caller holds self._lock
+        if self._dispatcher is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ocr-batch")
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, args=(self._queue, self._executor),
+                                                name="ocr-batcher", daemon=True)
+            self._dispatcher.start()
+
+    def close(self, timeout: Optional[float] = None):
+        """Dispatch what is queued, stop the dispatcher and wait for running batches."""
+        with self._lock:
+            dispatcher, executor, q = self._dispatcher, self._executor, self._queue
+            if dispatcher is None:
+                return
+            q.put(_STOP)
+            # A later submit() starts a fresh dispatcher on a fresh queue
+            self._dispatcher, self._executor, self._queue = None, None, queue.Queue()
+        dispatcher.join(timeout)
+        executor.shutdown(wait=True)
+
+    def _dispatch_loop(self, q: "queue.Queue", executor: ThreadPoolExecutor):
+        stopping = False
+        while not stopping:
+            first = q.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            deadline = first[2] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            self._record(batch)
+            executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[tuple]):
+        try:
+            results = list(self.process_batch([item for item, _, _ in batch]))
+        except Exception as e:
+            if len(batch) == 1:
+                _settle(batch[0][1], error=e)
+                return
+            # One bad document must not fail the others: retry them one at a time
+            with self._lock:
+                self._split_batches += 1
+            for entry in batch:
+                self._run_batch([entry])
+            return
+        for n, (_, fut, _) in enumerate(batch):
+            if n < len(results):
+                _settle(fut, result=results[n])
+            else:
+                _settle(fut, error=RuntimeError(f"OCR batch returned {len(results)} results for {len(batch)} documents"))
+
+    # ---------- metrics ----------
+    def _record(self, batch: List[tuple]):
+        now = time.perf_counter()
+        with self._lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._size_hist[len(batch)] = self._size_hist.get(len(batch), 0) + 1
+            for _, _, enqueued in batch:
+                delay_ms = (now - enqueued) * 1000
+                self._delay_total_ms += delay_ms
+                self._delay_max_ms = max(self._delay_max_ms, delay_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "maxBatchSize": self.max_batch_size,
+                "maxWaitMs": self.max_wait * 1000,
+                "batches": self._batches,
+                "items": self._items,
+                "avgBatchSize": round(self._items / self._batches, 2) if self._batches else 0,
+                "batchSizeHistogram": dict(sorted(self._size_hist.items())),
+                "avgQueueDelayMs": round(self._delay_total_ms / self._items, 2) if self._items else 0,
+                "maxQueueDelayMs": round(self._delay_max_ms, 2),
+                "splitBatches": self._split_batches,
+                "queueDepth": self._queue.qsize(),
+            }
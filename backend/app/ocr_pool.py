@@ -0,0 +1,146 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+from .config import settings
+
+# ============================================
+# Warm OCR worker pool
+# ============================================
+# EasyOCR is CPU-bound and holds the GIL for long stretches, so OCR runs in a
+# pool of worker processes. Each worker keeps its own EasyOCR readers, loaded
+# on first use per language set (or at start-up for OCR_PRELOAD_READERS); the
+# API process only ships bytes in and text out.
+#
+# The pool is started from the FastAPI lifespan. When it is not running
+# (scripts, tests, OCR_POOL_SIZE=0) every call simply runs inline.
+#
+# A worker that dies (OOM kill, segfault in a native library) breaks the
+# whole executor: every pending call fails with BrokenProcessPool. The first
+# caller to notice replaces the pool (the others see it already has been),
+# and each of them resubmits its call once to the new pool. A call that
+# breaks that pool too is most likely the cause: it raises OCRWorkerError
+# instead of a third attempt. Calls never fall back to running in the API
+# process while a pool is configured, since a document that kills a worker
+# would take the server down with it. Calls still queued when
+# shutdown_pool() runs raise OCRWorkerError as well.
+
+class OCRWorkerError(RuntimeError):
+    """An OCR call the worker pool could not complete (worker crashed twice, or pool shut down)."""
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_size = 0
+_restarts = 0
+_restart_lock = threading.Lock()
+
+
+def _init_worker(torch_threads: int):
+    """Runs once in every worker process: pin thread counts and preload OCR_PRELOAD_READERS."""
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except Exception:
+        pass
+    try:
+        import cv2
+        cv2.setNumThreads(1)
+    except Exception:
+        pass
+
+    from .ocr import _get_easyocr_reader
+    from .ocr_readers import parse_lang_sets
+    for langs in parse_lang_sets(settings.OCR_PRELOAD_READERS):
+        _get_easyocr_reader(langs)
+    print(f"✅ OCR worker {os.getpid()} ready")
+
+
+def start_pool(size: Optional[int] = None) -> int:
+    """Start the worker pool (idempotent). Returns the number of workers."""
+    global _pool, _pool_size
+    if _pool is not None:
+        return _pool_size
+
+    size = settings.OCR_POOL_SIZE if size is None else size
+    if size <= 0:
+        print("ℹ️ OCR worker pool disabled (OCR_POOL_SIZE=0); running OCR inline")
+        return 0
+
+    torch_threads = max(1, (os.cpu_count() or 1) // size)
+    # spawn: forking a process that already imported torch/cv2 can deadlock
+    ctx = multiprocessing.get_context("spawn")
+    _pool = ProcessPoolExecutor(
+        max_workers=size,
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(torch_threads,),
+    )
+    _pool_size = size
+    print(f"✅ OCR worker pool started with {size} workers")
+    return size
+
+
+def shutdown_pool():
+    global _pool, _pool_size
+    # Cleared first: callers woken by the cancellation must see the pool is gone
+    pool, _pool, _pool_size = _pool, None, 0
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _restart_after_crash(broken: ProcessPoolExecutor):
+    global _restarts
+    with _restart_lock:
+        if _pool is not broken:
+            return  # already replaced (or shut down) by another caller
+        size = _pool_size
+        print("⚠️ OCR worker pool crashed; restarting")
+        shutdown_pool()
+        start_pool(size)
+        _restarts += 1
+
+
+def _attempt(pool: ProcessPoolExecutor, fn: Callable[..., Any], args: tuple) -> Any:
+    """fn(*args) on pool; pool failures raise BrokenProcessPool or OCRWorkerError, fn's own errors pass through."""
+    try:
+        future = pool.submit(fn, *args)
+    except BrokenProcessPool:
+        raise
+    except RuntimeError as e:
+        raise OCRWorkerError(f"OCR worker pool is shut down: {e}") from e
+    try:
+        return future.result()
+    except CancelledError as e:
+        raise OCRWorkerError("OCR worker pool shut down before the call ran") from e
+
+
+def run_sync(fn: Callable[..., Any], *args) -> Any:
+    """
+    Run `fn(*args)` on the pool and block until it finishes. Use from worker
+    threads (the pipeline runs in the threadpool), never from the event loop.
+    """
+    pool = _pool
+    if pool is None:
+        return fn(*args)
+    try:
+        return _attempt(pool, fn, args)
+    except BrokenProcessPool:
+        _restart_after_crash(pool)
+    except OCRWorkerError:
+        if _pool is None or _pool is pool:
+            raise
+        # Cancelled by another caller's restart: resubmit below
+    retry = _pool
+    if retry is None:
+        raise OCRWorkerError("OCR worker pool shut down before the call ran")
+    try:
+        return _attempt(retry, fn, args)
+    except BrokenProcessPool as e:
+        _restart_after_crash(retry)
+        raise OCRWorkerError("OCR worker crashed twice on the same call") from e
+
+
+def pool_status() -> dict:
+    return {"running": _pool is not None, "workers": _pool_size, "restarts": _restarts}
@@ -0,0 +1,156 @@
+import time
+import threading
+import importlib.util
+from typing import Any, Dict, List, Optional, Tuple
+from .config import settings
+
+# ============================================
+# EasyOCR reader registry (one reader per language set)
+# ============================================
+# PAN and DL cards are printed in Latin script only, so they are read with the
+# English model; Aadhaar (and anything not yet identified) also needs the
+# Devanagari character set. Readers are loaded on first use, shared by every
+# request handled in this process, and dropped again once they have been idle
+# for OCR_READER_IDLE_SECONDS. The default en+hi reader is no exception: a
+# process that only sees PAN/DL traffic never holds the Hindi model.
+# OCR_PRELOAD_READERS names sets to load when an OCR worker starts.
+
+DEFAULT_LANGS: Tuple[str, ...] = ("en", "hi")
+
+LANGS_BY_DOC_TYPE: Dict[Optional[str], Tuple[str, ...]] = {
+    "Aadhaar": ("en", "hi"),
+    "PAN": ("en",),
+    "DrivingLicence": ("en",),
+    None: DEFAULT_LANGS,
+}
+
+
+# Smallest model: reads the (English) issuer banner of every supported card
+PREDETECT_LANGS: Tuple[str, ...] = ("en",)
+
+_DOC_TYPE_ALIASES = {
+    "aadhaar": "Aadhaar", "aadhar": "Aadhaar", "pan": "PAN",
+    "dl": "DrivingLicence", "drivinglicence": "DrivingLicence", "drivinglicense": "DrivingLicence",
+}
+
+
+def languages_for(doc_type: Optional[str]) -> Tuple[str, ...]:
+    return LANGS_BY_DOC_TYPE.get(doc_type, DEFAULT_LANGS)
+
+
+def normalize_doc_type(value: Optional[str]) -> Optional[str]:
+    """A client-supplied document type ("pan", "Driving_Licence", ...) as a hint, or None."""
+    key = "".join(ch for ch in str(value or "").lower() if ch.isalpha())
+    return _DOC_TYPE_ALIASES.get(key)
+
+
+def parse_lang_sets(spec: str) -> List[Tuple[str, ...]]:
+    """"en+hi,en" -> [("en", "hi"), ("en",)]"""
+    return [tuple(part.split("+")) for part in (p.strip() for p in spec.split(",")) if part]
+
+
+def _model_bytes(reader) -> Optional[int]:
+    """Parameter memory of the detector + recogniser networks, if torch exposes them."""
+    total = 0
+    found = False
+    for attr in ("detector", "recognizer"):
+        module = getattr(reader, attr, None)
+        params = getattr(module, "parameters", None)
+        if params is None:
+            continue
+        try:
+            total += sum(p.numel() * p.element_size() for p in params())
+            found = True
+        except Exception:
+            pass
+    return total if found else None
+
+
+class ReaderRegistry:
+    def __init__(self, idle_seconds: float = 900.0):
+        self.idle_seconds = idle_seconds
+        self._readers: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[Tuple[str, ...], threading.Lock] = {}
+        self._unavailable = False
+
+    def _load(self, langs: Tuple[str, ...]):
+        import easyocr
+        t0 = time.perf_counter()
+        # GPU=False for compatibility, can set to True if CUDA available
+        reader = easyocr.Reader(list(langs), gpu=False, verbose=False)
+        load_ms = round((time.perf_counter() - t0) * 1000, 1)
+        mem = _model_bytes(reader)
+        mem_txt = f", {mem / 2**20:.1f} MiB" if mem else ""
+        print(f"✅ EasyOCR reader loaded for {'+'.join(langs)} ({load_ms} ms{mem_txt})")
+        return {"reader": reader, "loadMs": load_ms, "memoryBytes": mem, "uses": 0, "lastUsed": time.time()}
+
+    def available(self) -> bool:
+        """Whether EasyOCR can be loaded at all, without loading a model."""
+        if self._unavailable:
+            return False
+        if importlib.util.find_spec("easyocr") is None:
+            self._unavailable = True
+        return not self._unavailable
+
+    def get(self, langs: Tuple[str, ...] = DEFAULT_LANGS):
+        """Return the shared reader for `langs`, loading it on first use (None if EasyOCR is missing)."""
+        if self._unavailable:
+            return None
+        langs = tuple(langs)
+        self.evict_idle()
+
+        with self._lock:
+            entry = self._readers.get(langs)
+            load_lock = self._load_locks.setdefault(langs, threading.Lock())
+        if entry is None:
+            # One loader per language set; other threads wait for it
+            with load_lock:
+                with self._lock:
+                    entry = self._readers.get(langs)
+                if entry is None:
+                    try:
+                        entry = self._load(langs)
+                    except ImportError:
+                        print("⚠️ EasyOCR not installed. Falling back to pytesseract.")
+                        self._unavailable = True
+                        return None
+                    except Exception as e:
+                        print(f"⚠️ EasyOCR init error ({'+'.join(langs)}): {e}")
+                        return None
+                    with self._lock:
+                        self._readers[langs] = entry
+
+        with self._lock:
+            entry["uses"] += 1
+            entry["lastUsed"] = time.time()
+        return entry["reader"]
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop readers unused for idle_seconds. Returns how many."""
+        if self.idle_seconds <= 0:
+            return 0
+        now = time.time() if now is None else now
+        with self._lock:
+            stale = [k for k, e in self._readers.items() if now - e["lastUsed"] > self.idle_seconds]
+            for k in stale:
+                del self._readers[k]
+        for k in stale:
+            print(f"♻️ Evicted idle EasyOCR reader {'+'.join(k)}")
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                "+".join(k): {
+                    "memoryBytes": e["memoryBytes"],
+                    "loadMs": e["loadMs"],
+                    "uses": e["uses"],
+                    "idleSeconds": round(now - e["lastUsed"], 1),
+                }
+                for k, e in self._readers.items()
+            }
+
+
+reader_registry = ReaderRegistry(idle_seconds=settings.OCR_READER_IDLE_SECONDS)
@@ -0,0 +1,142 @@
+import base64
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId, json_util
+from fastapi import HTTPException, Response
+from pymongo import UpdateOne
+from .config import settings
+
+# ============================================
+# Keyset pagination for the listing routes
+# ============================================
+# /compliance/logs, /compliance/alerts, /compliance/docs, /upload/my-docs and
+# /docs/my-docs used to return whole collections with every field. The
+# admin panel downloaded every rawText and verification blob on each
+# refresh. Each page is now one indexed range scan:
+#
+#   sort   (key desc, _id desc), where key is createdAt (timestamp for alerts)
+#   next   {$or: [{key: {$lt: k}}, {key: k, _id: {$lt: id}}]}
+#   limit  page size + 1, to know whether another page exists
+#
+# Later pages do not get slower, unlike skip/offset. The cursor is the
+# (key, _id) of the last row, JSON-encoded and base64url'd. It is returned
+# in the X-Next-Cursor header, so bodies stay plain lists for existing
+# clients. ?fields=a,b.c selects fields; without it each listing applies
+# its summary projection, which drops large fields (rawText, OCR stats,
+# hashes). The compound indexes are created in db.py.
+#
+# Page keys are ISO-8601 strings. MongoDB compares $lt only within one BSON
+# type, so a row whose key is missing, null or a datetime (older audit logs
+# and decisions) would be skipped or repeated at a page boundary. Pages
+# therefore only scan string keys, cursors must carry one, and
+# backfill_page_keys() rewrites other keys as strings at start-up (from the
+# datetime, epoch number, or the _id's creation time).
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+_FIELD_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$")
+
+# Default projections: fields left out of list pages (fetch a single document for them)
+DOCUMENT_SUMMARY = {
+    "rawText": 0, "verification.rawText": 0, "verification.ocrStats": 0, "imageHash": 0,
+    "fraud.details.imageHash": 0, "fraud.details.fraud_ring.members": 0,
+}
+AUDIT_LOG_SUMMARY = {"deviceInfo": 0}
+ALERT_SUMMARY: Dict[str, int] = {}
+
+
+def encode_cursor(key: Any, _id: Any) -> str:
+    raw = json_util.dumps([key, _id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key, _id = json_util.loads(raw)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(key, str) or _id is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key, _id
+
+
+def projection(fields: Optional[str], summary: Dict[str, int], key: str) -> Optional[Dict[str, int]]:
+    """?fields=a,b.c as an inclusion projection (plus the sort key), else the summary exclusions."""
+    if not fields:
+        return dict(summary) or None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    bad = [f for f in names if not _FIELD_RE.match(f)]
+    if bad:
+        raise HTTPException(status_code=400, detail=f"Invalid field name: {bad[0]}")
+    out = {f: 1 for f in names}
+    out[key] = 1
+    return out
+
+
+def page_size(limit: Optional[int]) -> int:
+    if limit is None:
+        return settings.LIST_PAGE_SIZE
+    return max(1, min(int(limit), settings.LIST_PAGE_MAX))
+
+
+async def list_page(response: Response, collection, query: Dict[str, Any], *, key: str = "createdAt",
+                    limit: Optional[int] = None, cursor: Optional[str] = None, fields: Optional[str] = None,
+                    summary: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+    """One page of collection (newest first); sets X-Next-Cursor when there is another page."""
+    size = page_size(limit)
+    conditions = [query] if query else []
+    conditions.append({key: {"$type": "string"}})  # one BSON type, so $lt sees every row
+    if cursor:
+        last_key, last_id = decode_cursor(cursor)
+        conditions.append({"$or": [{key: {"$lt": last_key}}, {key: last_key, "_id": {"$lt": last_id}}]})
+    query = conditions[0] if len(conditions) == 1 else {"$and": conditions}
+    found = collection.find(query, projection(fields, summary or {}, key))
+    items = await found.sort([(key, -1), ("_id", -1)]).limit(size + 1).to_list(length=size + 1)
+    if len(items) > size:
+        items = items[:size]
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.get(key), last["_id"])
+    for item in items:
+        item["_id"] = str(item["_id"])
+    return items
+
+
+def page_key_value(value: Any, _id: Any) -> str:
+    """A legacy page key as the ISO string new rows store."""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None).isoformat()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = value / 1000.0 if value > 1e11 else value  # epoch milliseconds or seconds
+        return datetime.utcfromtimestamp(seconds).isoformat()
+    if isinstance(_id, ObjectId):
+        return _id.generation_time.replace(tzinfo=None).isoformat()
+    return datetime(1970, 1, 1).isoformat()
+
+
+def backfill_page_keys(batch: int = 1000) -> int:
+    """Startup: store every listing's page key as an ISO string (idempotent)."""
+    from .db import documents_collection, audit_logs_collection, alerts_collection
+
+    t0 = time.perf_counter()
+    fixed = 0
+    for collection, key in ((documents_collection, "createdAt"), (audit_logs_collection, "createdAt"),
+                            (alerts_collection, "timestamp")):
+        try:
+            ops = []
+            for d in collection.find({key: {"$not": {"$type": "string"}}}, {key: 1}):
+                ops.append(UpdateOne({"_id": d["_id"]}, {"$set": {key: page_key_value(d.get(key), d["_id"])}}))
+                if len(ops) >= batch:
+                    collection.bulk_write(ops, ordered=False)
+                    fixed += len(ops)
+                    ops = []
+            if ops:
+                collection.bulk_write(ops, ordered=False)
+                fixed += len(ops)
+        except Exception as e:
+            print(f"⚠️ Page key backfill failed for {collection.name}.{key}: {e}")
+    if fixed:
+        ms = round((time.perf_counter() - t0) * 1000, 1)
+        print(f"✅ Page keys backfilled: {fixed} rows now have ISO string keys ({ms} ms)")
+    return fixed
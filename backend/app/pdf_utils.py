@@ -1,42 +1,67 @@
-
 import io
+import numpy as np
+from typing import Iterator, NamedTuple, Optional
+from .config import settings
 try:
     import fitz  # PyMuPDF
 except ImportError:
     fitz = None
 
-def convert_pdf_to_image(file_bytes: bytes) -> bytes:
+
+def is_pdf(file_bytes: bytes) -> bool:
+    return bool(file_bytes) and file_bytes[:5] == b'%PDF-'
+
+
+def _pdf_stream(file_bytes) -> bytes:
+    # PyMuPDF opens bytes / bytearray; ingested uploads may be a memoryview over an mmap
+    return file_bytes if isinstance(file_bytes, (bytes, bytearray)) else bytes(file_bytes)
+
+
+class PdfPage(NamedTuple):
+    index: int
+    page_count: int                # pages in the file
+    read_limit: int                # pages this iterator yields at most (capped by max_pages)
+    text: str                      # embedded text layer ("" if none / too short)
+    image: Optional[np.ndarray]    # BGR render, only when there is no usable text layer
+
+
+def iter_pdf_pages(file_bytes: bytes, dpi: Optional[int] = None, max_pages: Optional[int] = None,
+                   min_text_chars: Optional[int] = None) -> Iterator[PdfPage]:
     """
-    Convert first page of PDF to PNG image bytes.
-    Returns:
-        bytes: PNG image bytes of the first page
-        None: If conversion fails or not a PDF
+    Yield the pages of a PDF one at a time. Pages with an embedded text layer
+    are returned as text and never rasterised; the others are rendered at the
+    OCR DPI only when the caller asks for them, so a 50-page upload holds one
+    page bitmap at a time and the caller can stop early. At most max_pages
+    pages are yielded; page_count is still the length of the whole file.
     """
     if not fitz:
         print("⚠️ PyMuPDF (fitz) not installed. PDF support disabled.")
-        return None
+        return
+    if not is_pdf(file_bytes):
+        return
+
+    dpi = dpi or settings.PDF_OCR_DPI
+    max_pages = max_pages or settings.PDF_MAX_PAGES
+    min_text_chars = settings.PDF_TEXT_LAYER_MIN_CHARS if min_text_chars is None else min_text_chars
 
     try:
-        # Check if it's a PDF signature
-        if not file_bytes.startswith(b'%PDF-'):
-            return None
-
-        # Open PDF from bytes
-        doc = fitz.open("pdf", file_bytes)
-        if doc.page_count < 1:
-            return None
-        
-        # Get first page
-        page = doc.load_page(0)
-        
-        # Render to image (zoom=2 for better quality OCR)
-        mat = fitz.Matrix(2, 2)
-        pix = page.get_pixmap(matrix=mat)
-        
-        # Convert to PNG bytes
-        img_bytes = pix.tobytes("png")
-        return img_bytes
-        
+        doc = fitz.open("pdf", _pdf_stream(file_bytes))
     except Exception as e:
-        print(f"❌ PDF Conversion Error: {e}")
-        return None
+        print(f"❌ PDF open error: {e}")
+        return
+    try:
+        count = doc.page_count
+        limit = min(count, max_pages)
+        for i in range(limit):
+            page = doc.load_page(i)
+            text = page.get_text("text") or ""
+            if len(text.strip()) >= min_text_chars:
+                yield PdfPage(i, count, limit, text, None)
+                continue
+            pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+            rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+            # RGB -> BGR for OpenCV; the copy also releases the pixmap buffer
+            yield PdfPage(i, count, limit, "", np.ascontiguousarray(rgb[:, :, ::-1]))
+    finally:
+        doc.close()
+
@@ -0,0 +1,145 @@
+import time
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Any, Dict, Optional, Union
+from .config import settings
+from .stage_cache import cached_stage
+from .image_context import DecodedImage, as_decoded
+
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+# ============================================
+# Resolution-bounded image quality analysis
+# ============================================
+# The old blur / crop checks ran GaussianBlur, Laplacian, Otsu and
+# findContours over the full-resolution upload (12 MP for a phone photo).
+# Here every metric has a bounded cost:
+# - crop ratio, glare and exposure are measured on the first grayscale
+#   pyramid level with a long side <= QUALITY_MAX_SIDE. They are ratios, so
+#   they do not depend on resolution.
+# - blur is still the variance of the full-resolution Laplacian, because that
+#   variance depends on scale and the stored values / thresholds (here and in
+#   the dashboard) are in full-resolution units. Above QUALITY_BLUR_PIXELS
+#   it is estimated from stratified 20x20 tiles holding that many pixels,
+#   filtered in one stacked call; smaller images are measured exactly.
+#
+# The thresholds are unchanged. test_quality.py checks that the decisions
+# match the full-resolution implementation on a synthetic corpus and
+# benchmarks both.
+
+BLUR_THRESHOLD = 100.0   # Laplacian variance below this -> blurry
+CROP_THRESHOLD = 0.65    # document bbox / image area below this -> cropped or large margins
+GLARE_THRESHOLD = 0.02   # fraction of saturated pixels above this -> glare
+GLARE_LEVEL = 250
+DARK_LEVEL = 10
+
+# Side of each sampled blur tile, and pixels of context around it (3x3 blur + 3x3 Laplacian)
+_TILE = 20
+_TILE_MARGIN = 2
+
+
+def _variance(values: np.ndarray) -> float:
+    return float(cv2.meanStdDev(values)[1][0, 0]) ** 2
+
+
+def _laplacian_variance(gray: np.ndarray) -> float:
+    # The 3x3 Laplacian of a uint8 image is exact in int16, ~4x cheaper than CV_64F
+    gray = cv2.GaussianBlur(gray, (3, 3), 0)
+    return _variance(cv2.Laplacian(gray, cv2.CV_16S))
+
+
+def blur_variance(gray: np.ndarray, max_pixels: Optional[int] = None) -> float:
+    """Variance of the Laplacian (higher = sharper), sampled from tiles on large images."""
+    max_pixels = max_pixels or settings.QUALITY_BLUR_PIXELS
+    h, w = gray.shape[:2]
+    span = _TILE + 2 * _TILE_MARGIN
+    if h * w <= max_pixels or min(h, w) < 4 * span:
+        return _laplacian_variance(gray)
+
+    # One tile at a random offset inside each cell of a grid over the image
+    # (stratified sampling). Evenly spaced tiles can alias with the regular
+    # line pitch of printed text; the fixed seed keeps results deterministic.
+    n_tiles = max_pixels // (_TILE * _TILE)
+    rows = max(1, min(int(round(np.sqrt(n_tiles * h / w))), h // span))
+    cols = max(1, min(n_tiles // rows, w // span))
+    jitter = np.random.default_rng(h * 31 + w).random((2, rows, cols))
+    ys = ((np.arange(rows)[:, None] + jitter[0]) * ((h - span) / rows)).astype(np.intp).ravel()
+    xs = ((np.arange(cols)[None, :] + jitter[1]) * ((w - span) / cols)).astype(np.intp).ravel()
+
+    # Gather all tiles through a strided view and filter them side by side as one
+    # wide image; the margins absorb the seams between tiles and are dropped
+    tiles = sliding_window_view(gray, (span, span))[ys, xs]
+    strip = np.ascontiguousarray(tiles.transpose(1, 0, 2)).reshape(span, -1)
+    lap = cv2.Laplacian(cv2.GaussianBlur(strip, (3, 3), 0), cv2.CV_16S).reshape(span, -1, span)
+    inner = lap[_TILE_MARGIN:_TILE_MARGIN + _TILE, :, _TILE_MARGIN:_TILE_MARGIN + _TILE]
+    return _variance(np.ascontiguousarray(inner).reshape(_TILE, -1))
+
+
+def crop_ratio(gray: np.ndarray) -> Optional[float]:
+    """
+    Estimate how 'filled' the detected document is in the image.
+    Returns bounding-box-area / image-area (0..1). Lower -> likely cropped or heavy margins.
+    """
+    h, w = gray.shape[:2]
+    if h == 0 or w == 0:
+        return None
+    # Otsu separates the document from the background; the largest contour is the card
+    _, th = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    contours, _ = cv2.findContours(th, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    largest = max(contours, key=cv2.contourArea)
+    _, _, bw, bh = cv2.boundingRect(largest)
+    return float(bw * bh) / float(w * h)
+
+
+def exposure(gray: np.ndarray) -> Dict[str, Any]:
+    """Brightness, clipped-pixel fractions and a coarse label from one histogram."""
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel().astype(np.float64)
+    total = hist.sum()
+    mean = float(hist @ np.arange(256)) / total / 255.0
+    dark = float(hist[:DARK_LEVEL + 1].sum() / total)
+    bright = float(hist[GLARE_LEVEL:].sum() / total)
+    if mean < 0.25 or dark > 0.5:
+        label = "under"
+    elif mean > 0.85 or bright > 0.5:
+        label = "over"
+    else:
+        label = "ok"
+    return {"mean": round(mean, 3), "dark": round(dark, 4), "bright": round(bright, 4), "label": label}
+
+
+@cached_stage("image_quality", "v1", timing="ms")
+def analyze_quality(image: Union[bytes, DecodedImage]) -> Optional[Dict[str, Any]]:
+    """
+    Blur, crop ratio, glare and exposure for one upload. Returns None if cv2
+    is missing or the bytes are not a decodable image (e.g. a PDF).
+    """
+    if cv2 is None:
+        return None
+    image = as_decoded(image)
+    if image.gray is None:
+        return None
+    try:
+        t0 = time.perf_counter()
+        level, halvings = image.gray_level(settings.QUALITY_MAX_SIDE)
+        blur = blur_variance(image.gray)
+        crop = crop_ratio(level)
+        expo = exposure(level)
+        return {
+            "blurVariance": blur,
+            "blurry": blur < BLUR_THRESHOLD,
+            "cropRatio": crop,
+            "cropped": crop is not None and crop < CROP_THRESHOLD,
+            "glareRatio": expo["bright"],
+            "glare": expo["bright"] > GLARE_THRESHOLD,
+            "exposure": expo,
+            "level": {"shape": list(level.shape[:2]), "halvings": halvings},
+            "ms": round((time.perf_counter() - t0) * 1000, 2),
+        }
+    except Exception as e:
+        print(f"⚠️ Image quality analysis failed: {e}")
+        return None
@@ -7,6 +7,7 @@ from .compliance_routes import router as compliance_router
 from .fraud_routes import router as fraud_router
 from .docs_routes import router as docs_router
 from .ocr_routes import router as ocr_router
+from .health_routes import router as health_router
 
 routers = [
     auth_router,
@@ -16,4 +17,5 @@ routers = [
     fraud_router,
     docs_router,
     ocr_router,      # <-- Real-time OCR preview using EasyOCR
+    health_router,   # <-- /health/live, /health/ready (model loading state)
 ]
@@ -3,12 +3,11 @@ from fastapi.security import OAuth2PasswordRequestForm
 from ..models import UserCreate, Token
 from ..auth import signup_user, authenticate_user
 from ..security import get_current_user
-from ..db import users_collection
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.post("/signup", response_model=Token)
-def signup(
+async def signup(
     name: str = Form(None), 
     email: str = Form(...), 
     password: str = Form(...),
@@ -24,26 +23,26 @@ def signup(
 	valid_role = "admin" if role == "admin" else "user"
 	user_in = UserCreate(name=name, email=email, password=pw, dob=dob, gender=gender, role=valid_role)
 	try:
-		signup_user(user_in)
+		await signup_user(user_in)
 	except HTTPException:
 		raise
 	except Exception as e:
 		raise HTTPException(status_code=400, detail=str(e))
 	# auto-login after signup
-	token = authenticate_user(email, pw)
+	token = await authenticate_user(email, pw)
 	if not token:
 		raise HTTPException(status_code=400, detail="Could not create token")
 	return {"access_token": token, "token_type": "bearer"}
 
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
-	token = authenticate_user(form_data.username, form_data.password)
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+	token = await authenticate_user(form_data.username, form_data.password)
 	if not token:
 		raise HTTPException(status_code=401, detail="Invalid credentials")
 	return {"access_token": token, "token_type": "bearer"}
 
 @router.get("/me")
-def get_me(current_user: dict = Depends(get_current_user)):
+async def get_me(current_user: dict = Depends(get_current_user)):
     """Get current user's profile info"""
     return {
         "email": current_user.get("email"),
@@ -1,15 +1,23 @@
 # app/routers/compliance_routes.py
-from fastapi import APIRouter, UploadFile, File, BackgroundTasks, HTTPException, Body, Request, Depends
+from fastapi import APIRouter, UploadFile, File, BackgroundTasks, HTTPException, Body, Request, Depends, Response
 from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from typing import Optional, Dict, Any, List
 from bson import ObjectId
 import traceback
+from datetime import datetime
 from io import BytesIO
+from itertools import chain
 # Keep original relative imports (this file lives in app/routers/)
-from ..compliance import run_full_pipeline, check_duplicate, aml_check_aadhaar
+from ..compliance import run_full_pipeline, check_duplicate, aml_check_aadhaar_async
 from ..security import get_current_user
-from ..db import alerts_collection, audit_logs_collection, documents_collection, aml_blacklist_collection, kyc_data_collection, users_collection
+from ..db_async import async_db, to_list
+from ..identifier_index import upload_identifiers, lookup_identifiers_async
+from ..audit_log import audit_sink, InvalidAuditEntry
+from ..pagination import list_page, page_key_value, DOCUMENT_SUMMARY, AUDIT_LOG_SUMMARY, ALERT_SUMMARY
+from ..bulk_verify import BulkVerifier, chunks, iter_rows, ndjson_stream, verify_chunks
 from ..config import settings
+from ..ingest import ingest_upload, SPREADSHEET_KINDS
 import jwt
 
 router = APIRouter(prefix="/compliance", tags=["compliance"])
@@ -19,11 +27,14 @@ router = APIRouter(prefix="/compliance", tags=["compliance"])
 # NEW: List user documents
 # -----------------------
 @router.get("/docs", response_model=List[Dict[str, Any]])
-def list_user_docs(current_user=Depends(get_current_user)):
+async def list_user_docs(response: Response, limit: Optional[int] = None, cursor: Optional[str] = None,
+                         fields: Optional[str] = None, current_user=Depends(get_current_user)):
     """
     Return documents uploaded by the current user ONLY.
     This applies to ALL users including admins.
     Admins can use the /submissions endpoint (Admin Panel) to see all users' docs.
+    Newest first, one page at a time: pass the X-Next-Cursor header back as ?cursor=.
+    Summary fields by default (no rawText / OCR stats); ?fields=a,b.c selects fields.
     """
     try:
         user_id = None
@@ -44,38 +55,58 @@ def list_user_docs(current_user=Depends(get_current_user)):
         # ALWAYS filter by current user - admins see their own docs in Submissions tab
         # They use Admin Panel for viewing all users' submissions
         if user_id:
-            docs = list(documents_collection.find({"userId": user_id}).sort("createdAt", -1))
+            query = {"userId": user_id}
         elif user_email:
-            docs = list(documents_collection.find({"userEmail": user_email}).sort("createdAt", -1))
+            query = {"userEmail": user_email}
         else:
             # No user context - return empty for security
-            docs = []
+            return []
 
-        # normalize _id to string
-        out = []
-        for d in docs:
-            dd = dict(d)
-            dd["_id"] = str(dd.get("_id", dd.get("id", "")))
-            out.append(dd)
-        return out
+        return await list_page(response, async_db.documents, query, limit=limit, cursor=cursor,
+                               fields=fields, summary=DOCUMENT_SUMMARY)
+    except HTTPException:
+        raise
     except Exception as e:
         tb = traceback.format_exc()
         print(tb)
         return JSONResponse(status_code=500, content={"error": str(e), "traceback": tb})
 
 
+@router.get("/docs/{doc_id}")
+async def get_user_doc(doc_id: str, current_user=Depends(get_current_user)):
+    """One document with every field (the list pages leave out rawText and OCR stats). Owner or admin."""
+    try:
+        doc = await async_db.documents.find_one({"_id": ObjectId(doc_id) if ObjectId.is_valid(doc_id) else doc_id})
+    except Exception as e:
+        tb = traceback.format_exc()
+        print(tb)
+        return JSONResponse(status_code=500, content={"error": str(e), "traceback": tb})
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if doc.get("userId") != str(current_user.get("_id", "")) and current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Not your document")
+    doc["_id"] = str(doc["_id"])
+    return doc
+
+
 # -----------------------
 # Existing endpoints (kept from original)
 # -----------------------
+def _run_pipeline_and_close(upload, user, filename):
+    with upload:
+        return run_full_pipeline(user, filename, upload.image())
+
+
 @router.post("/verify_identity")
 async def verify_identity(file: UploadFile = File(...), user_email: Optional[str] = None):
     """
     Run full KYC pipeline synchronously and return result.
     """
+    upload = await ingest_upload(file)
     try:
-        content = await file.read()
         user = {"_id": user_email or "anonymous", "email": user_email}
-        result = run_full_pipeline(user, file.filename, content)
+        with upload:
+            result = await run_in_threadpool(run_full_pipeline, user, file.filename, upload.image())
         return result
     except Exception as e:
         tb = traceback.format_exc()
@@ -88,10 +119,11 @@ async def process_kyc(background: BackgroundTasks, file: UploadFile = File(...),
     """
     Start background KYC processing; returns immediately.
     """
+    upload = await ingest_upload(file)
     try:
-        content = await file.read()
         user = {"_id": user_email or "anonymous", "email": user_email}
-        background.add_task(run_full_pipeline, user, file.filename, content)
+        # The task owns the upload: its mmap stays valid after the request's file is closed
+        background.add_task(_run_pipeline_and_close, upload, user, file.filename)
         return {"status": "processing"}
     except Exception as e:
         tb = traceback.format_exc()
@@ -100,9 +132,9 @@ async def process_kyc(background: BackgroundTasks, file: UploadFile = File(...),
 
 
 @router.get("/fraud-score/{aadhaar}")
-def fraud_score_for_aadhaar(aadhaar: str):
+async def fraud_score_for_aadhaar(aadhaar: str):
     try:
-        docs = list(audit_logs_collection.find({"aadhaar": aadhaar}))
+        docs = await to_list(async_db.audit_logs.find({"aadhaar": aadhaar}))
         scores = [d.get("fraud_score", 0) for d in docs if d.get("fraud_score") is not None]
         if scores:
             avg = sum(scores) / len(scores)
@@ -116,9 +148,9 @@ def fraud_score_for_aadhaar(aadhaar: str):
 
 
 @router.get("/aml/check/{aadhaar}")
-def aml_check(aadhaar: str):
+async def aml_check(aadhaar: str):
     try:
-        res = aml_check_aadhaar(aadhaar)
+        res = await aml_check_aadhaar_async(aadhaar)
         return res
     except Exception as e:
         tb = traceback.format_exc()
@@ -127,12 +159,25 @@ def aml_check(aadhaar: str):
 
 
 @router.get("/alerts")
-def get_alerts():
+async def get_alerts(response: Response, limit: Optional[int] = None, cursor: Optional[str] = None,
+                     fields: Optional[str] = None):
+    """Undismissed alerts, newest first, one page at a time (X-Next-Cursor / ?cursor=, ?fields=)."""
+    try:
+        return await list_page(response, async_db.alerts, {"seen": {"$ne": True}}, key="timestamp",
+                               limit=limit, cursor=cursor, fields=fields, summary=ALERT_SUMMARY)
+    except HTTPException:
+        raise
+    except Exception as e:
+        tb = traceback.format_exc()
+        print(tb)
+        return JSONResponse(status_code=500, content={"error": str(e), "traceback": tb})
+
+
+@router.get("/alerts/count")
+async def count_alerts():
+    """Number of undismissed alerts (for badges; the list itself is paged)."""
     try:
-        items = list(alerts_collection.find({"seen": {"$ne": True}}).sort("timestamp", -1))
-        for i in items:
-            i["_id"] = str(i["_id"])
-        return items
+        return {"count": await async_db.alerts.count_documents({"seen": {"$ne": True}})}
     except Exception as e:
         tb = traceback.format_exc()
         print(tb)
@@ -140,9 +185,9 @@ def get_alerts():
 
 
 @router.post("/alerts/dismiss/{alert_id}")
-def dismiss_alert_endpoint(alert_id: str):
+async def dismiss_alert_endpoint(alert_id: str):
     try:
-        alerts_collection.update_one({"_id": ObjectId(alert_id)}, {"$set": {"seen": True}})
+        await async_db.alerts.update_one({"_id": ObjectId(alert_id)}, {"$set": {"seen": True}})
         return {"status": "dismissed"}
     except Exception as e:
         tb = traceback.format_exc()
@@ -151,10 +196,16 @@ def dismiss_alert_endpoint(alert_id: str):
 
 
 @router.post("/logs/add")
-def add_log(payload: Dict[str, Any] = Body(...)):
+async def add_log(payload: Dict[str, Any] = Body(...)):
     try:
-        res = audit_logs_collection.insert_one(payload)
-        return {"ok": True, "id": str(res.inserted_id)}
+        # Every log needs the page key as an ISO string; pages are ordered on it
+        created = payload.get("createdAt")
+        if not isinstance(created, str):
+            payload["createdAt"] = datetime.utcnow().isoformat() if created is None else page_key_value(created, None)
+        log_id = await audit_sink.submit_async(payload)
+        return {"ok": True, "id": str(log_id)}
+    except InvalidAuditEntry as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         tb = traceback.format_exc()
         print(tb)
@@ -162,12 +213,14 @@ def add_log(payload: Dict[str, Any] = Body(...)):
 
 
 @router.get("/logs")
-def get_logs():
+async def get_logs(response: Response, limit: Optional[int] = None, cursor: Optional[str] = None,
+                   fields: Optional[str] = None):
+    """Audit logs, newest first, one page at a time (X-Next-Cursor / ?cursor=, ?fields=)."""
     try:
-        docs = list(audit_logs_collection.find().sort("createdAt", -1))
-        for d in docs:
-            d["_id"] = str(d["_id"])
-        return docs
+        return await list_page(response, async_db.audit_logs, {}, limit=limit, cursor=cursor,
+                               fields=fields, summary=AUDIT_LOG_SUMMARY)
+    except HTTPException:
+        raise
     except Exception as e:
         tb = traceback.format_exc()
         print(tb)
@@ -175,11 +228,13 @@ def get_logs():
 
 
 @router.post("/check-duplicate")
-def check_duplicate_endpoint(payload: Dict[str, Any] = Body(...)):
+async def check_duplicate_endpoint(payload: Dict[str, Any] = Body(...)):
     try:
         aadhaar = payload.get("aadhaar")
         pan = payload.get("pan")
-        res = check_duplicate(aadhaar, pan)
+        dl = payload.get("dl")
+        matches = await lookup_identifiers_async(upload_identifiers({"aadhaarNumber": aadhaar, "panNumber": pan, "dlNumber": dl}))
+        res = check_duplicate(aadhaar, pan, dl, matches=matches)
         return res
     except Exception as e:
         tb = traceback.format_exc()
@@ -187,8 +242,20 @@ def check_duplicate_endpoint(payload: Dict[str, Any] = Body(...)):
         return JSONResponse(status_code=500, content={"error": str(e), "traceback": tb})
 
 
+def _report_filename_ids(docs: List[Dict[str, Any]]) -> List[Any]:
+    """kyc snapshots without a stored filename: their document ids, for one batched lookup."""
+    ids = []
+    for d in docs:
+        if not d.get("verification", {}).get("filename"):
+            try:
+                ids.append(ObjectId(str(d.get("docId", ""))))
+            except Exception:
+                pass
+    return ids
+
+
 @router.get("/documents/report")
-def documents_report(request: Request, user_email: Optional[str] = None):
+async def documents_report(request: Request, user_email: Optional[str] = None):
     """
     Generate a PDF report of uploaded documents. Optional `user_email` query param
     filters documents for a specific user.
@@ -213,7 +280,7 @@ def documents_report(request: Request, user_email: Optional[str] = None):
         # Build filter: if user_email provided, find document IDs for that user
         doc_id_set = None
         if user_email:
-            docs_for_user = list(documents_collection.find({"userEmail": user_email}, {"_id": 1}))
+            docs_for_user = await to_list(async_db.documents.find({"userEmail": user_email}, {"_id": 1}))
             doc_id_set = set(str(d["_id"]) for d in docs_for_user)
 
         id_variants = None
@@ -232,128 +299,26 @@ def documents_report(request: Request, user_email: Optional[str] = None):
         else:
             q = {}
 
-        docs = list(kyc_data_collection.find(q).sort("createdAt", -1))
+        docs = await to_list(async_db.kyc_data.find(q).sort("createdAt", -1))
 
         source = 'kyc'
+        filenames = {}
         if not docs:
             source = 'documents'
             if user_email:
-                docs = list(documents_collection.find({"userEmail": user_email}).sort("createdAt", -1))
+                docs = await to_list(async_db.documents.find({"userEmail": user_email}).sort("createdAt", -1))
             else:
-                docs = list(documents_collection.find().sort("createdAt", -1))
-
-        try:
-            from reportlab.lib.pagesizes import letter, landscape
-            from reportlab.lib import colors
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.units import inch
-        except ImportError:
+                docs = await to_list(async_db.documents.find().sort("createdAt", -1))
+        else:
+            missing = _report_filename_ids(docs)
+            if missing:
+                found = await to_list(async_db.documents.find({"_id": {"$in": missing}}, {"filename": 1}))
+                filenames = {str(d["_id"]): d.get("filename", "") for d in found}
+
+        # reportlab layout is CPU-bound: build the PDF off the event loop
+        buf = await run_in_threadpool(_render_documents_report, docs, source, user_email, filenames)
+        if buf is None:
             return JSONResponse(status_code=500, content={"error": "reportlab is not installed. Run 'pip install reportlab'"})
-
-        buf = BytesIO()
-        doc = SimpleDocTemplate(buf, pagesize=landscape(letter), leftMargin=40, rightMargin=40, topMargin=60, bottomMargin=40)
-        styles = getSampleStyleSheet()
-        small = ParagraphStyle("small", parent=styles["Normal"], fontSize=8)
-
-        elements = []
-        from datetime import datetime
-        title = Paragraph("<b>Uploaded Documents Report</b>", styles["Title"])
-        gen = Paragraph(f"Generated: {datetime.utcnow().isoformat()} UTC", styles["Normal"])
-        user_header = Paragraph(f"User: <b>{user_email or 'N/A'}</b>", styles["Normal"])
-        elements.extend([title, gen, user_header, Spacer(1, 12)])
-
-        table_data = [["Doc ID", "Filename", "Type", "Created At", "Decision", "Fraud Score", "Fraud Reasons"]]
-
-        def _format_created(c):
-            try:
-                if hasattr(c, "strftime"):
-                    return c.strftime("%Y-%m-%d %H:%M")
-                if isinstance(c, (int, float)):
-                    from datetime import datetime as _dt
-                    return _dt.utcfromtimestamp(c).strftime("%Y-%m-%d %H:%M")
-                if isinstance(c, str):
-                    s = c.strip()
-                    if s.endswith("Z"):
-                        s = s[:-1] + "+00:00"
-                    try:
-                        from datetime import datetime as _dt
-                        dt = _dt.fromisoformat(s)
-                        return dt.strftime("%Y-%m-%d %H:%M")
-                    except Exception:
-                        return s if len(s) <= 19 else s[:19] + "..."
-            except Exception:
-                pass
-            return str(c)
-
-        for d in docs:
-            if source == 'kyc':
-                doc_id = str(d.get("docId", ""))
-                filename = d.get("verification", {}).get("filename") or ""
-                if not filename:
-                    try:
-                        from bson import ObjectId as _OID
-                        doc_obj = documents_collection.find_one({"_id": _OID(doc_id)})
-                        if doc_obj:
-                            filename = doc_obj.get("filename", "")
-                    except Exception:
-                        pass
-                doc_type = d.get("docType", "")
-                created = d.get("createdAt", "")
-                decision = d.get("decision", "")
-                fraud = d.get("fraud", {}) or {}
-            else:
-                doc_id = str(d.get("_id", ""))
-                filename = d.get("filename", "")
-                doc_type = d.get("docType", d.get("parsed", {}).get("aadhaarNumber") and "Aadhaar" or d.get("parsed", {}).get("panNumber") and "PAN" or "UNKNOWN")
-                created = d.get("createdAt", "")
-                decision = d.get("decision", d.get("verification", {}).get("decision", ""))
-                fraud = d.get("fraud", {}) or d.get("verification", {}).get("fraud", {}) or {}
-
-            fscore = fraud.get("score", "")
-            freasons = fraud.get("reasons", [])
-            if isinstance(freasons, list):
-                freasons = ", ".join(str(x) for x in freasons)
-            if not fscore and isinstance(fraud.get("details"), dict):
-                fscore = fraud.get("details", {}).get("score", "")
-                if not freasons:
-                    freasons = fraud.get("details", {}).get("reasons", [])
-                    if isinstance(freasons, list):
-                        freasons = ", ".join(str(x) for x in freasons)
-
-            doc_id_display = doc_id[:12] + "..." if len(doc_id) > 15 else doc_id
-            filename = filename or ""
-            doc_type = doc_type or ""
-            created_display = _format_created(created or "")
-            decision = decision or ""
-            fscore = "" if fscore is None else str(fscore)
-            freasons = freasons or ""
-
-            row = [
-                doc_id_display,
-                Paragraph(filename, small),
-                Paragraph(doc_type, small),
-                Paragraph(created_display, small),
-                Paragraph(decision, small),
-                Paragraph(fscore, small),
-                Paragraph(freasons, small),
-            ]
-            table_data.append(row)
-
-        col_widths = [1.2 * inch, 2.5 * inch, 0.7 * inch, 1.2 * inch, 0.8 * inch, 0.6 * inch, 2.2 * inch]
-        table = Table(table_data, colWidths=col_widths, repeatRows=1)
-        table.setStyle(TableStyle([
-            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f2f4f8")),
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("VALIGN", (0, 0), (-1, -1), "TOP"),
-            ("LEFTPADDING", (0, 0), (-1, -1), 6),
-            ("RIGHTPADDING", (0, 0), (-1, -1), 6),
-        ]))
-
-        elements.append(table)
-        doc.build(elements)
-        buf.seek(0)
         headers = {"Content-Disposition": "attachment; filename=documents_report.pdf"}
         return StreamingResponse(buf, media_type="application/pdf", headers=headers)
     except Exception as e:
@@ -362,43 +327,153 @@ def documents_report(request: Request, user_email: Optional[str] = None):
         return JSONResponse(status_code=500, content={"error": str(e), "traceback": tb})
 
 
+def _render_documents_report(docs: List[Dict[str, Any]], source: str, user_email: Optional[str],
+                             filenames: Dict[str, str]) -> Optional[BytesIO]:
+    """Lay out the documents report PDF (None when reportlab is not installed)."""
+    try:
+        from reportlab.lib.pagesizes import letter, landscape
+        from reportlab.lib import colors
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+        from reportlab.lib.units import inch
+    except ImportError:
+        return None
+
+    buf = BytesIO()
+    doc = SimpleDocTemplate(buf, pagesize=landscape(letter), leftMargin=40, rightMargin=40, topMargin=60, bottomMargin=40)
+    styles = getSampleStyleSheet()
+    small = ParagraphStyle("small", parent=styles["Normal"], fontSize=8)
+
+    elements = []
+    from datetime import datetime
+    title = Paragraph("<b>Uploaded Documents Report</b>", styles["Title"])
+    gen = Paragraph(f"Generated: {datetime.utcnow().isoformat()} UTC", styles["Normal"])
+    user_header = Paragraph(f"User: <b>{user_email or 'N/A'}</b>", styles["Normal"])
+    elements.extend([title, gen, user_header, Spacer(1, 12)])
+
+    table_data = [["Doc ID", "Filename", "Type", "Created At", "Decision", "Fraud Score", "Fraud Reasons"]]
+
+    def _format_created(c):
+        try:
+            if hasattr(c, "strftime"):
+                return c.strftime("%Y-%m-%d %H:%M")
+            if isinstance(c, (int, float)):
+                from datetime import datetime as _dt
+                return _dt.utcfromtimestamp(c).strftime("%Y-%m-%d %H:%M")
+            if isinstance(c, str):
+                s = c.strip()
+                if s.endswith("Z"):
+                    s = s[:-1] + "+00:00"
+                try:
+                    from datetime import datetime as _dt
+                    dt = _dt.fromisoformat(s)
+                    return dt.strftime("%Y-%m-%d %H:%M")
+                except Exception:
+                    return s if len(s) <= 19 else s[:19] + "..."
+        except Exception:
+            pass
+        return str(c)
+
+    for d in docs:
+        if source == 'kyc':
+            doc_id = str(d.get("docId", ""))
+            filename = d.get("verification", {}).get("filename") or filenames.get(doc_id, "")
+            doc_type = d.get("docType", "")
+            created = d.get("createdAt", "")
+            decision = d.get("decision", "")
+            fraud = d.get("fraud", {}) or {}
+        else:
+            doc_id = str(d.get("_id", ""))
+            filename = d.get("filename", "")
+            doc_type = d.get("docType", d.get("parsed", {}).get("aadhaarNumber") and "Aadhaar" or d.get("parsed", {}).get("panNumber") and "PAN" or "UNKNOWN")
+            created = d.get("createdAt", "")
+            decision = d.get("decision", d.get("verification", {}).get("decision", ""))
+            fraud = d.get("fraud", {}) or d.get("verification", {}).get("fraud", {}) or {}
+
+        fscore = fraud.get("score", "")
+        freasons = fraud.get("reasons", [])
+        if isinstance(freasons, list):
+            freasons = ", ".join(str(x) for x in freasons)
+        if not fscore and isinstance(fraud.get("details"), dict):
+            fscore = fraud.get("details", {}).get("score", "")
+            if not freasons:
+                freasons = fraud.get("details", {}).get("reasons", [])
+                if isinstance(freasons, list):
+                    freasons = ", ".join(str(x) for x in freasons)
+
+        doc_id_display = doc_id[:12] + "..." if len(doc_id) > 15 else doc_id
+        filename = filename or ""
+        doc_type = doc_type or ""
+        created_display = _format_created(created or "")
+        decision = decision or ""
+        fscore = "" if fscore is None else str(fscore)
+        freasons = freasons or ""
+
+        row = [
+            doc_id_display,
+            Paragraph(filename, small),
+            Paragraph(doc_type, small),
+            Paragraph(created_display, small),
+            Paragraph(decision, small),
+            Paragraph(fscore, small),
+            Paragraph(freasons, small),
+        ]
+        table_data.append(row)
+
+    col_widths = [1.2 * inch, 2.5 * inch, 0.7 * inch, 1.2 * inch, 0.8 * inch, 0.6 * inch, 2.2 * inch]
+    table = Table(table_data, colWidths=col_widths, repeatRows=1)
+    table.setStyle(TableStyle([
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f2f4f8")),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("LEFTPADDING", (0, 0), (-1, -1), 6),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 6),
+    ]))
+
+    elements.append(table)
+    doc.build(elements)
+    buf.seek(0)
+    return buf
+
+
 @router.get("/submissions")
-def list_submissions(current_user=Depends(get_current_user)):
+async def list_submissions(current_user=Depends(get_current_user)):
     """Return recent submissions (kyc snapshots preferred, fallback to documents)."""
     try:
-        docs = list(kyc_data_collection.find().sort("createdAt", -1).limit(200))
+        docs = await to_list(async_db.kyc_data.find().sort("createdAt", -1).limit(200))
         if not docs:
-            docs = list(documents_collection.find().sort("createdAt", -1).limit(200))
+            docs = await to_list(async_db.documents.find().sort("createdAt", -1).limit(200))
             source = 'documents'
         else:
             source = 'kyc'
 
-        # Cache user roles for efficiency
-        user_roles_cache = {}
-        
-        def get_user_role(user_email):
-            if not user_email:
-                return 'user'
-            if user_email in user_roles_cache:
-                return user_roles_cache[user_email]
-            user = users_collection.find_one({"email": user_email})
-            role = user.get('role', 'user') if user else 'user'
-            user_roles_cache[user_email] = role
-            return role
+        # One query each for the uploaders' roles and the snapshots' documents
+        emails = list({d.get('userEmail') for d in docs if d.get('userEmail')})
+        users = await to_list(async_db.users.find({"email": {"$in": emails}}, {"email": 1, "role": 1}))
+        user_roles = {u.get('email'): u.get('role', 'user') for u in users}
+
+        documents_by_id = {}
+        if source == 'kyc':
+            doc_ids = []
+            for d in docs:
+                doc_id = str(d.get('docId') or '')
+                doc_ids.append(doc_id)
+                try:
+                    doc_ids.append(ObjectId(doc_id))
+                except Exception:
+                    pass
+            found = await to_list(async_db.documents.find({"_id": {"$in": doc_ids}}, {"filename": 1}))
+            documents_by_id = {str(d["_id"]): d for d in found}
 
         out = []
         for d in docs:
             user_email = d.get('userEmail')
-            user_role = get_user_role(user_email)
+            user_role = user_roles.get(user_email, 'user') if user_email else 'user'
             
             if source == 'kyc':
                 doc_id = str(d.get('docId') or '')
-                doc_obj = None
-                try:
-                    from bson import ObjectId as _OID
-                    doc_obj = documents_collection.find_one({"_id": _OID(doc_id)})
-                except Exception:
-                    doc_obj = documents_collection.find_one({"_id": doc_id})
+                doc_obj = documents_by_id.get(doc_id)
                 record = {
                     'docId': doc_id,
                     'userEmail': user_email,
@@ -430,8 +505,17 @@ def list_submissions(current_user=Depends(get_current_user)):
         return JSONResponse(status_code=500, content={"error": str(e), "traceback": tb})
 
 
+@router.get("/rings")
+def list_fraud_rings(limit: int = 20, members: Optional[int] = None, current_user=Depends(get_current_user)):
+    """Largest fraud rings (users linked through shared Aadhaar/PAN/DL/device), biggest first."""
+    if (current_user or {}).get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    from ..fraud_rings import ring_index
+    return {"rings": ring_index.largest(max(1, min(limit, 200)), members), "stats": ring_index.stats()}
+
+
 @router.post("/documents/{doc_id}/decision")
-def set_document_decision(doc_id: str, payload: Dict[str, Any] = Body(...), current_user=Depends(get_current_user)):
+async def set_document_decision(doc_id: str, payload: Dict[str, Any] = Body(...), current_user=Depends(get_current_user)):
     """Admin endpoint: set decision for a document (Approve/Reject).
     payload: { decision: 'Approve'|'Reject', notes: optional }
     """
@@ -441,19 +525,24 @@ def set_document_decision(doc_id: str, payload: Dict[str, Any] = Body(...), curr
         if decision not in ("Approve", "Reject"):
             return JSONResponse(status_code=400, content={"error": "invalid decision"})
 
-        updated = documents_collection.update_one({"_id": ObjectId(doc_id)}, {"$set": {"decision": decision, "reviewer": current_user.get('email'), "reviewedAt": __import__('datetime').datetime.utcnow()}})
-        kyc_data_collection.update_many({"docId": {"$in": [doc_id, ObjectId(doc_id)]}}, {"$set": {"decision": decision, "reviewer": current_user.get('email'), "reviewedAt": __import__('datetime').datetime.utcnow()}})
-
-        audit_logs_collection.insert_one({
+        entry = {
             "action": "document_decision",
             "docId": doc_id,
             "decision": decision,
             "notes": notes,
             "userEmail": current_user.get('email'),
-            "createdAt": __import__('datetime').datetime.utcnow()
-        })
+            "createdAt": datetime.utcnow().isoformat()  # same type as the other logs' page key
+        }
+        audit_sink.check(entry)  # reject unstorable notes before the decision is written
+
+        updated = await async_db.documents.update_one({"_id": ObjectId(doc_id)}, {"$set": {"decision": decision, "reviewer": current_user.get('email'), "reviewedAt": __import__('datetime').datetime.utcnow()}})
+        await async_db.kyc_data.update_many({"docId": {"$in": [doc_id, ObjectId(doc_id)]}}, {"$set": {"decision": decision, "reviewer": current_user.get('email'), "reviewedAt": __import__('datetime').datetime.utcnow()}})
+
+        await audit_sink.submit_async(entry)
 
         return {"ok": True, "updated": updated.modified_count}
+    except InvalidAuditEntry as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         tb = traceback.format_exc()
         print(tb)
@@ -464,145 +553,48 @@ def set_document_decision(doc_id: str, payload: Dict[str, Any] = Body(...), curr
 # NEW: Bulk Verification from Excel/CSV
 # -----------------------
 @router.post("/bulk-verify")
-async def bulk_verify_excel(file: UploadFile = File(...), current_user=Depends(get_current_user)):
+async def bulk_verify_excel(request: Request, file: UploadFile = File(...), format: Optional[str] = None,
+                            current_user=Depends(get_current_user)):
     """
     Accept an Excel (.xlsx) or CSV file with KYC data and validate each row.
     Expected columns: Name, Aadhaar, PAN, DOB, Address
-    Returns validation results for each row.
+    Returns validation results for each row: one JSON body by default, or an
+    NDJSON stream (rows + running summary) with ?format=ndjson or
+    Accept: application/x-ndjson.
     """
+    upload = await ingest_upload(file, kinds=SPREADSHEET_KINDS)
     try:
-        import re
-        from datetime import datetime
-        
-        content = await file.read()
-        filename = file.filename.lower()
-        
-        rows = []
-        
-        # Parse CSV
-        if filename.endswith('.csv'):
-            import csv
-            from io import StringIO
-            text = content.decode('utf-8', errors='ignore')
-            reader = csv.DictReader(StringIO(text))
-            for row in reader:
-                rows.append(dict(row))
-        
-        # Parse Excel
-        elif filename.endswith('.xlsx') or filename.endswith('.xls'):
-            try:
-                import openpyxl
-                from io import BytesIO as BIO
-                wb = openpyxl.load_workbook(BIO(content), read_only=True)
-                ws = wb.active
-                headers = [cell.value for cell in next(ws.iter_rows(min_row=1, max_row=1))]
-                for row in ws.iter_rows(min_row=2, values_only=True):
-                    row_dict = dict(zip(headers, row))
-                    rows.append(row_dict)
-            except ImportError:
-                return JSONResponse(status_code=400, content={"error": "openpyxl not installed. Use CSV format or install openpyxl."})
-        else:
-            return JSONResponse(status_code=400, content={"error": "Unsupported file format. Use .csv or .xlsx"})
-        
-        if not rows:
+        # Rows are read lazily in chunks; peek at the first one to reject empty files
+        try:
+            chunk_iter = chunks(iter_rows(upload, file.filename), max(1, settings.BULK_CHUNK_ROWS))
+            first = await run_in_threadpool(next, chunk_iter, None)
+        except ValueError as e:
+            upload.close()
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        except ImportError:
+            upload.close()
+            return JSONResponse(status_code=400, content={"error": "openpyxl not installed. Use CSV format or install openpyxl."})
+        if first is None:
+            upload.close()
             return JSONResponse(status_code=400, content={"error": "No data rows found in file"})
-        
+
+        verifier = BulkVerifier()
+        chunk_iter = chain([first], chunk_iter)
+        if format == "ndjson" or "application/x-ndjson" in request.headers.get("accept", ""):
+            return StreamingResponse(ndjson_stream(upload, chunk_iter, verifier), media_type="application/x-ndjson")
+
         results = []
-        
-        for idx, row in enumerate(rows):
-            # Normalize column names (case-insensitive)
-            norm_row = {k.lower().strip() if k else '': v for k, v in row.items()}
-            
-            name = norm_row.get('name', '')
-            aadhaar = str(norm_row.get('aadhaar', '') or '').replace(' ', '').replace('-', '')
-            pan = str(norm_row.get('pan', '') or '').upper().replace(' ', '')
-            dob = str(norm_row.get('dob', '') or '')
-            address = str(norm_row.get('address', '') or '')
-            
-            errors = []
-            warnings = []
-            fraud_score = 0
-            
-            # Validate Aadhaar (12 digits)
-            if aadhaar:
-                if not re.match(r'^\d{12}$', aadhaar):
-                    errors.append("Invalid Aadhaar format (must be 12 digits)")
-                    fraud_score += 30
-                else:
-                    # Check for duplicate
-                    if documents_collection.find_one({"parsed.aadhaarNumber": aadhaar}):
-                        warnings.append("Aadhaar already exists in system")
-                        fraud_score += 20
-            else:
-                warnings.append("Aadhaar not provided")
-            
-            # Validate PAN (5 letters + 4 digits + 1 letter)
-            if pan:
-                if not re.match(r'^[A-Z]{5}\d{4}[A-Z]$', pan):
-                    errors.append("Invalid PAN format (must be ABCDE1234F)")
-                    fraud_score += 25
-                else:
-                    if documents_collection.find_one({"parsed.panNumber": pan}):
-                        warnings.append("PAN already exists in system")
-                        fraud_score += 20
-            else:
-                warnings.append("PAN not provided")
-            
-            # Validate DOB
-            if dob:
-                try:
-                    # Try common formats
-                    for fmt in ['%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%d/%m/%y']:
-                        try:
-                            parsed_date = datetime.strptime(dob.strip(), fmt)
-                            age = (datetime.now() - parsed_date).days // 365
-                            if age < 18:
-                                errors.append(f"Underage: {age} years old")
-                                fraud_score += 40
-                            break
-                        except ValueError:
-                            continue
-                except Exception:
-                    warnings.append("Could not parse DOB")
-            
-            # Validate Name
-            if not name or len(name.strip()) < 3:
-                errors.append("Name is required (min 3 characters)")
-                fraud_score += 10
-            
-            # Determine status
-            if errors:
-                status = "Failed"
-            elif warnings:
-                status = "Review"
-            else:
-                status = "Pass"
-            
-            results.append({
-                "row": idx + 1,
-                "filename": f"Row {idx + 1}",
-                "name": name,
-                "aadhaar": f"XXXX-XXXX-{aadhaar[-4:]}" if len(aadhaar) >= 4 else aadhaar,
-                "pan": f"XXXXX{pan[-5:]}" if len(pan) >= 5 else pan,
-                "success": status != "Failed",
-                "status": status,
-                "fraudScore": min(fraud_score, 100),
-                "decision": status,
-                "errors": errors,
-                "warnings": warnings,
-            })
-        
-        # Summary
-        passed = len([r for r in results if r['status'] == 'Pass'])
-        review = len([r for r in results if r['status'] == 'Review'])
-        failed = len([r for r in results if r['status'] == 'Failed'])
-        
+        with upload:
+            async for chunk_results in verify_chunks(chunk_iter, verifier):
+                results.extend(chunk_results)
+        summary = verifier.summary()
         return {
-            "message": f"Processed {len(results)} rows",
-            "summary": {"passed": passed, "review": review, "failed": failed, "total": len(results)},
+            "message": f"Processed {summary['total']} rows",
+            "summary": summary,
             "results": results
         }
     except Exception as e:
+        upload.close()
         tb = traceback.format_exc()
         print(tb)
         return JSONResponse(status_code=500, content={"error": str(e), "traceback": tb})
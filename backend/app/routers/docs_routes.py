@@ -1,24 +1,27 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional
 from bson import ObjectId
 from ..security import get_current_user
 from ..upload import process_upload
-from ..db import documents_collection
+from ..ingest import ingest_upload
+from ..db_async import async_db
+from ..pagination import list_page, DOCUMENT_SUMMARY
 
 router = APIRouter(prefix="/docs", tags=["upload"])
 
 @router.post("/upload")
 async def upload_file(file: UploadFile = File(...), current_user = Depends(get_current_user)):
+    upload = await ingest_upload(file)
     try:
-        content = await file.read()
-        record = process_upload(current_user, file.filename, content)
+        with upload:
+            record = await run_in_threadpool(process_upload, current_user, file.filename, upload.image())
         return {"message": "File uploaded successfully", "data": record}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/my-docs", response_model=List[dict])
-def my_docs(current_user = Depends(get_current_user)):
-    docs = list(documents_collection.find({"userId": str(current_user["_id"])}))
-    for d in docs:
-        d["_id"] = str(d["_id"])
-    return docs
+async def my_docs(response: Response, limit: Optional[int] = None, cursor: Optional[str] = None,
+                  fields: Optional[str] = None, current_user = Depends(get_current_user)):
+    return await list_page(response, async_db.documents, {"userId": str(current_user["_id"])},
+                           limit=limit, cursor=cursor, fields=fields, summary=DOCUMENT_SUMMARY)
@@ -1,15 +1,17 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Query
+from fastapi.concurrency import run_in_threadpool
 from bson import ObjectId
 from ..security import get_current_user
-from ..db import documents_collection
+from ..db_async import async_db
 from ..verification import verify_document
 from ..fraud import analyze_for_fraud
+from ..ingest import ingest_upload
 
 router = APIRouter(prefix="/fraud", tags=["fraud"])
 
 @router.get("/fraud-score")
-def fraud_score(doc_id: str = Query(...), current_user = Depends(get_current_user)):
-    doc = documents_collection.find_one({"_id": ObjectId(doc_id)})
+async def fraud_score(doc_id: str = Query(...), current_user = Depends(get_current_user)):
+    doc = await async_db.documents.find_one({"_id": ObjectId(doc_id)})
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
     if str(doc["userId"]) != str(current_user["_id"]):
@@ -21,8 +23,10 @@ def fraud_score(doc_id: str = Query(...), current_user = Depends(get_current_use
 
 @router.post("/fraud-score", summary="Upload and return fraud score (without saving doc)")
 async def fraud_score_upload(file: UploadFile = File(...), current_user = Depends(get_current_user)):
-    content = await file.read()
-    verification = verify_document(content)
-    parsed = verification.get("parsed", {})
-    fraud = analyze_for_fraud(current_user, content, parsed)
+    with await ingest_upload(file) as upload:
+        # One decoded context for both stages; fraud reuses the streamed SHA-256
+        image = upload.image()
+        verification = await run_in_threadpool(verify_document, image)
+        parsed = verification.get("parsed", {})
+        fraud = await run_in_threadpool(analyze_for_fraud, current_user, image, parsed)
     return {"verification": verification, "fraud": fraud}
@@ -0,0 +1,54 @@
+# app/routers/health_routes.py
+# Liveness / readiness probes for load balancers and the admin dashboard
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from ..config import settings
+from .. import ml_integration
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+@router.get("/live")
+def live():
+    """The process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+def ready():
+    """
+    Ready once the CNN/GNN loader has finished (whatever each model's final
+    state: ready, missing, unavailable or failed). Returns 503 while loading.
+    Also reports the OCR pool, batcher, readers, stage cache, hash index and
+    identity graph, fraud ring index, name profiles, write batching and
+    the audit log sink.
+    """
+    from ..ocr import ocr_batcher
+    from ..ocr_pool import pool_status
+    from ..ocr_readers import reader_registry
+    from ..stage_cache import stage_cache
+    from ..image_hash import image_hash_index
+    from ..identity_graph import identity_graph
+    from ..fraud_rings import ring_index
+    from ..name_match import name_profiles
+    from ..unit_of_work import group_committer
+    from ..audit_log import audit_sink
+
+    models = ml_integration.model_status()
+    # With ML_LOAD_ON_STARTUP off the models load on first use, so they do not gate readiness
+    is_ready = models["loaded"] or not settings.ML_LOAD_ON_STARTUP
+    body = {
+        "ready": is_ready,
+        "models": models,
+        "ocrPool": pool_status(),
+        "ocrBatcher": ocr_batcher.stats(),
+        "ocrReaders": reader_registry.stats(),
+        "stageCache": stage_cache.stats(),
+        "imageHashIndex": image_hash_index.stats(),
+        "identityGraph": identity_graph.stats(),
+        "fraudRings": ring_index.stats(),
+        "nameProfiles": name_profiles.stats(),
+        "writeBatches": group_committer.stats(),
+        "auditLog": audit_sink.stats(),
+    }
+    return JSONResponse(status_code=200 if is_ready else 503, content=body)
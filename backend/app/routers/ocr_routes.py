@@ -15,17 +15,16 @@ async def ocr_preview(file: UploadFile = File(...)):
     No authentication required for quick preview.
     """
     try:
-        from ..ocr import extract_text_from_bytes, parse_text
+        from ..ocr import extract_text_async, parse_text
         from ..utils import mask_aadhaar, mask_pan, mask_dl
+        from ..ingest import ingest_upload
         
-        # Read file content
-        content = await file.read()
+        # Stream, hash and type-check the upload (400 empty / 413 / 415)
+        upload = await ingest_upload(file)
         
-        if len(content) == 0:
-            raise HTTPException(status_code=400, detail="Empty file")
-        
-        # Extract text using EasyOCR
-        raw_text = extract_text_from_bytes(content)
+        # Extract text using EasyOCR (awaited on the OCR worker pool)
+        with upload:
+            raw_text = await extract_text_async(upload.image())
         
         # Parse the text
         parsed = parse_text(raw_text)
@@ -51,6 +50,8 @@ async def ocr_preview(file: UploadFile = File(...)):
             "maskedDl": masked_dl,
             "source": "easyocr-server",
         }
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         return JSONResponse(
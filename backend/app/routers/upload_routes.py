@@ -1,25 +1,34 @@
 # app/upload_routes.py
-from fastapi import APIRouter, File, UploadFile, Depends, HTTPException, status, Form
+from fastapi import APIRouter, File, UploadFile, Depends, HTTPException, status, Form, Response
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Dict, Any, Optional
 from app.security import get_current_user
 
 from app.upload import process_upload
-from app.db import documents_collection
+from app.ingest import ingest_upload
+from app.ocr_readers import normalize_doc_type
+from app.db_async import async_db
+from app.pagination import list_page, DOCUMENT_SUMMARY
 import traceback
 
 router = APIRouter(prefix="/upload", tags=["upload"])
 
 
 @router.post("/file")
-async def upload_file(file: UploadFile = File(...), current_user=Depends(get_current_user)):
+async def upload_file(file: UploadFile = File(...), document_type: Optional[str] = Form(None),
+                      current_user=Depends(get_current_user)):
     """
     Upload a single file and run the full pipeline (verification + fraud + DB).
+    Optional document_type (Aadhaar / PAN / DL) lets OCR use that type's model.
     Returns the single file result (same shape as process_upload()).
     """
+    # Streamed, hashed and type-checked up front (413 / 415 pass through unchanged)
+    upload = await ingest_upload(file)
     try:
-        content = await file.read()
-        # process_upload is expected to accept: user, filename, bytes -> dict/result
-        record = process_upload(current_user, file.filename, content)
+        with upload:
+            # process_upload accepts: user, filename, bytes or DecodedImage -> dict/result
+            record = await run_in_threadpool(process_upload, current_user, file.filename, upload.image(),
+                                             doc_type=normalize_doc_type(document_type))
         return {"message": "File uploaded successfully", "data": record}
     except Exception as e:
         traceback.print_exc()
@@ -30,12 +39,14 @@ async def upload_file(file: UploadFile = File(...), current_user=Depends(get_cur
 async def upload_files(
     files: List[UploadFile] = File(...), 
     device_fingerprint: Optional[str] = Form(None),
+    document_type: Optional[str] = Form(None),
     current_user=Depends(get_current_user)
 ):
     """
     Upload multiple files in one request.
     Each file is processed with the existing process_upload pipeline.
-    Accepts optional device_fingerprint JSON string for fraud analytics.
+    Accepts optional device_fingerprint JSON string for fraud analytics, and an
+    optional document_type (Aadhaar / PAN / DL) shared by the files as an OCR hint.
     Returns a list of per-file results with success/error details.
     """
     if not files:
@@ -53,9 +64,12 @@ async def upload_files(
     results = []
     for f in files:
         try:
-            content = await f.read()
-            res = process_upload(current_user, f.filename, content, device_info=device_info)
+            with await ingest_upload(f) as upload:
+                res = await run_in_threadpool(process_upload, current_user, f.filename, upload.image(),
+                                              device_info=device_info, doc_type=normalize_doc_type(document_type))
             results.append({"filename": f.filename, "success": True, "result": res})
+        except HTTPException as e:
+            results.append({"filename": f.filename, "success": False, "error": e.detail})
         except Exception as e:
             traceback.print_exc()
             results.append({"filename": f.filename, "success": False, "error": str(e)})
@@ -64,12 +78,11 @@ async def upload_files(
 
 
 @router.get("/my-docs", response_model=List[Dict[str, Any]])
-def list_my_docs(current_user=Depends(get_current_user)):
+async def list_my_docs(response: Response, limit: Optional[int] = None, cursor: Optional[str] = None,
+                       fields: Optional[str] = None, current_user=Depends(get_current_user)):
     """
-    Return documents uploaded by the current user.
+    Return documents uploaded by the current user, newest first, one page at a time
+    (next page: ?cursor= from the X-Next-Cursor header; ?fields= selects fields).
     """
-    docs = list(documents_collection.find({"userId": str(current_user["_id"])}))
-    # convert _id to string for JSON compatibility
-    for d in docs:
-        d["_id"] = str(d["_id"])
-    return docs
+    return await list_page(response, async_db.documents, {"userId": str(current_user["_id"])},
+                           limit=limit, cursor=cursor, fields=fields, summary=DOCUMENT_SUMMARY)
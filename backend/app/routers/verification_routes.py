@@ -1,8 +1,10 @@
 from fastapi import APIRouter, HTTPException, Header, Query, File, UploadFile, Depends, Body
+from fastapi.concurrency import run_in_threadpool
 from typing import Optional
 from ..verification import verify_aadhaar, verify_pan, seed_registry, load_registry, verhoeff_check_variants
 from ..config import settings
 from ..upload import process_upload
+from ..ingest import ingest_upload
 from ..security import get_current_user
 
 router = APIRouter(prefix="/verify", tags=["verification"])
@@ -42,9 +44,10 @@ def get_registry(seed_key: Optional[str] = Query(None), x_seed_key: Optional[str
 
 @router.post("/verify-doc")
 async def verify_doc(file: UploadFile = File(...), current_user = Depends(get_current_user)):
+    upload = await ingest_upload(file)
     try:
-        content = await file.read()
-        record = process_upload(current_user, file.filename, content)
+        with upload:
+            record = await run_in_threadpool(process_upload, current_user, file.filename, upload.image())
         return {"docId": record["_id"], "verification": record.get("verification"), "fraud": record.get("fraud")}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -5,7 +5,7 @@ from passlib.context import CryptContext
 import jwt
 
 from .config import settings
-from .db import users_collection
+from .db_async import async_db
 
 # bcrypt_sha256 removes the 72-byte password limit completely
 pwd_context = CryptContext(schemes=["bcrypt_sha256"], deprecated="auto")
@@ -41,12 +41,12 @@ def decode_access_token(token: str) -> dict:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     payload = decode_access_token(token)
     email = payload.get("sub")
     if not email:
         raise HTTPException(status_code=401, detail="Invalid token payload")
-    user = users_collection.find_one({"email": email})
+    user = await async_db.users.find_one({"email": email})
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     return user
@@ -0,0 +1,181 @@
+import os
+import copy
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+from .config import settings
+
+# ============================================
+# Content-addressed cache for pure pipeline stages
+# ============================================
+# Stages such as OCR, blur/crop metrics and the CNN score depend only on the
+# uploaded bytes, so their results are keyed by SHA-256 of the input plus a
+# stage version string. Bump the version whenever a stage's output changes.
+# Every caller gets its own copy of a cached result, so a stage result that
+# is annotated downstream never changes what the next upload reads.
+
+
+def content_key(data: Any) -> str:
+    """SHA-256 hex digest used as the cache key for a stage input."""
+    # A DecodedImage already carries the digest of its bytes
+    digest = getattr(data, "sha256", None)
+    if isinstance(digest, str):
+        return digest
+    return hashlib.sha256(data).hexdigest()
+
+
+class StageCache:
+    """
+    Two-tier cache: a bounded in-memory LRU in front of an optional on-disk
+    tier (one pickle file per entry). Keeps hit/miss counters per stage.
+    """
+
+    def __init__(self, max_entries: int = 512, disk_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._mem: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # ---------- internal helpers ----------
+    def _count(self, stage: str, field: str):
+        c = self._counters.setdefault(stage, {"hits": 0, "disk_hits": 0, "misses": 0})
+        c[field] += 1
+
+    def _disk_path(self, stage: str, version: str, key: str) -> str:
+        return os.path.join(self.disk_dir, stage, version, key[:2], f"{key}.pkl")
+
+    def _disk_get(self, stage: str, version: str, key: str):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(stage, version, key), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"⚠️ Stage cache read error ({stage}): {e}")
+            return None
+
+    def _disk_put(self, stage: str, version: str, key: str, value: Any):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(stage, version, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"⚠️ Stage cache write error ({stage}): {e}")
+
+    def _mem_put(self, mem_key: str, value: Any):
+        self._mem[mem_key] = value
+        self._mem.move_to_end(mem_key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    # ---------- public API ----------
+    def lookup(self, stage: str, version: str, key: str) -> Any:
+        """Return a copy of the cached value (memory, then disk) or None on a miss."""
+        mem_key = f"{stage}:{version}:{key}"
+        with self._lock:
+            if mem_key in self._mem:
+                self._mem.move_to_end(mem_key)
+                self._count(stage, "hits")
+                value = self._mem[mem_key]
+            else:
+                value = None
+        if value is not None:
+            return copy.deepcopy(value)
+
+        value = self._disk_get(stage, version, key)
+        with self._lock:
+            if value is not None:
+                self._count(stage, "disk_hits")
+                self._mem_put(mem_key, copy.deepcopy(value))
+            else:
+                self._count(stage, "misses")
+        return value
+
+    def store(self, stage: str, version: str, key: str, value: Any):
+        """Cache a copy of value; the caller may go on changing its own."""
+        with self._lock:
+            self._mem_put(f"{stage}:{version}:{key}", copy.deepcopy(value))
+        self._disk_put(stage, version, key, value)
+
+    def get_or_compute(self, stage: str, version: str, key: str, compute: Callable[[], Any],
+                       cacheable: Callable[[Any], bool] = lambda r: r is not None) -> Any:
+        """
+        Return the cached result for (stage, version, key), computing and storing
+        it on a miss. Results rejected by `cacheable` (e.g. None on failure) are
+        returned but never stored.
+        """
+        value = self.lookup(stage, version, key)
+        if value is not None:
+            return value
+        value = compute()
+        if cacheable(value):
+            self.store(stage, version, key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._mem),
+                "maxEntries": self.max_entries,
+                "diskEnabled": bool(self.disk_dir),
+                "stages": {k: dict(v) for k, v in self._counters.items()},
+            }
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self._counters.clear()
+
+
+stage_cache = StageCache(
+    max_entries=settings.STAGE_CACHE_MAX_ENTRIES,
+    disk_dir=os.path.join(settings.UPLOAD_DIR, ".stage_cache") if settings.STAGE_CACHE_DISK else None,
+)
+
+
+def cached_stage(stage: str, version: str, cacheable: Callable[[Any], bool] = lambda r: r is not None,
+                 timing: Optional[str] = None):
+    """
+    Decorator for pure stage functions whose first argument is the file bytes
+    (or a DecodedImage of them).
+    Extra arguments are not part of the key, so only decorate functions whose
+    output is fully determined by the bytes.
+    `timing` names a top-level field of a dict result that holds the stage's
+    own run time: it is not cached, and a hit reports what the lookup took.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(data, *args, **kwargs):
+            if not data:
+                return fn(data, *args, **kwargs)
+            t0 = time.perf_counter()
+            key = content_key(data)
+            value = stage_cache.lookup(stage, version, key)
+            if value is not None:
+                if timing and isinstance(value, dict):
+                    value[timing] = round((time.perf_counter() - t0) * 1000, 2)
+                return value
+            value = fn(data, *args, **kwargs)
+            if cacheable(value):
+                stored = value
+                if timing and isinstance(value, dict):
+                    stored = {k: v for k, v in value.items() if k != timing}
+                stage_cache.store(stage, version, key, stored)
+            return value
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
@@ -0,0 +1,207 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from .config import settings
+
+# ============================================
+# Unit of work: one flush for an upload's writes
+# ============================================
+# run_full_pipeline used to write as it went:
+#   documents.insert_one -> documents.update_one (fraud) -> alerts.insert_one
+#   -> kyc_data.insert_one -> audit_logs.insert_one
+# That is five sequential round trips on the request path, and the document
+# id came back from the first of them. A UnitOfWork hands out ObjectIds
+# client-side, so the fraud result goes into the document before it is
+# written and the update disappears. It collects the writes and flushes them
+# as one bulk_write per collection:
+#   1. the primary collection (the first one written to; documents) first,
+#   2. then the dependent collections (alerts, kyc_data) in parallel, only
+#      for units whose primary write landed.
+# Within a collection a unit's writes are ordered only when it mixes inserts
+# with updates.
+#
+# commit() goes through a group committer. Uploads finishing while a flush
+# is in flight queue up, and the next flush writes all of them together:
+# still one bulk_write per collection, however many uploads are waiting. No
+# timer is involved, so a lone upload is flushed immediately. A write error
+# is traced back to the unit that owns the failed op, and only that upload's
+# commit() raises (other units' ops cut off by an ordered bulk are retried).
+# There is no rollback: a unit whose dependent write fails keeps its
+# document, and its commit() raises.
+
+
+class UnitOfWork:
+    """The pending writes of one upload."""
+
+    def __init__(self):
+        self.ops: List[Tuple[Any, Any]] = []  # (collection, pymongo write op), in call order
+
+    @staticmethod
+    def new_id() -> ObjectId:
+        return ObjectId()
+
+    def insert(self, collection, doc: Dict[str, Any]) -> ObjectId:
+        """Queue an insert of a copy of doc (an _id is assigned if missing); returns its _id."""
+        doc = dict(doc)
+        if doc.get("_id") is None:
+            doc["_id"] = ObjectId()
+        self.ops.append((collection, InsertOne(doc)))
+        return doc["_id"]
+
+    def update(self, collection, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False):
+        self.ops.append((collection, UpdateOne(query, update, upsert=upsert)))
+
+    def collections(self) -> List[Any]:
+        """Collections written to, in first-write order (the first one is primary)."""
+        seen: Dict[int, Any] = {}
+        for coll, _ in self.ops:
+            seen.setdefault(id(coll), coll)
+        return list(seen.values())
+
+    def writes(self, collection) -> List[Any]:
+        return [op for coll, op in self.ops if coll is collection]
+
+    def needs_order(self, collection) -> bool:
+        return any(not isinstance(op, InsertOne) for op in self.writes(collection))
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+
+class _Ticket:
+    def __init__(self, unit: UnitOfWork):
+        self.unit = unit
+        self.done = False
+        self.error: Optional[BaseException] = None
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _parallel():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="uow-flush")
+        return _executor
+
+
+def _write_collection(collection, tickets: List[_Ticket]):
+    """One bulk_write covering every ticket's ops on collection; errors go to the owning ticket."""
+    ops, owners = [], []
+    for t in tickets:
+        for op in t.unit.writes(collection):
+            ops.append(op)
+            owners.append(t)
+    if ops:
+        _bulk_write(collection, ops, owners, any(t.unit.needs_order(collection) for t in tickets))
+
+
+def _bulk_write(collection, ops: List[Any], owners: List[_Ticket], ordered: bool):
+    try:
+        collection.bulk_write(ops, ordered=ordered)
+    except BulkWriteError as e:
+        details = e.details or {}
+        failed = sorted(i for i in (err.get("index") for err in details.get("writeErrors", [])) if i is not None)
+        if not failed:
+            # Write concern errors name no op: nobody's writes can be trusted
+            for t in set(owners):
+                t.error = t.error or e
+        elif ordered:
+            # An ordered bulk stops at the first error: that unit failed, and the
+            # ops after it were never attempted. Retry the other units' share.
+            culprit = owners[failed[0]]
+            culprit.error = culprit.error or e
+            rest = [(op, t) for op, t in zip(ops[failed[0] + 1:], owners[failed[0] + 1:]) if t is not culprit]
+            if rest:
+                _bulk_write(collection, [op for op, _ in rest], [t for _, t in rest], ordered)
+        else:
+            for index in failed:
+                owners[index].error = owners[index].error or e
+    except Exception as e:
+        for t in set(owners):
+            t.error = t.error or e
+
+
+def flush(tickets: List[_Ticket]):
+    """Write every ticket's unit: primary collections first, then the dependents in parallel."""
+    primaries: Dict[int, Tuple[Any, List[_Ticket]]] = {}
+    for t in tickets:
+        colls = t.unit.collections()
+        if colls:
+            primaries.setdefault(id(colls[0]), (colls[0], []))[1].append(t)
+    for coll, owners in primaries.values():
+        _write_collection(coll, owners)
+
+    dependents: Dict[int, Tuple[Any, List[_Ticket]]] = {}
+    for t in tickets:
+        if t.error is not None:
+            continue  # nothing references a document that was not stored
+        for coll in t.unit.collections()[1:]:
+            dependents.setdefault(id(coll), (coll, []))[1].append(t)
+    jobs = list(dependents.values())
+    if len(jobs) == 1:
+        _write_collection(*jobs[0])
+    elif jobs:
+        for future in [_parallel().submit(_write_collection, coll, owners) for coll, owners in jobs]:
+            future.result()
+
+
+class GroupCommitter:
+    """Merges units committed while a flush is in flight into the next flush."""
+
+    def __init__(self, max_units: Optional[int] = None):
+        self.max_units = max_units
+        self._cond = threading.Condition()
+        self._pending: List[_Ticket] = []
+        self._flushing = False
+        self.flushes = 0
+        self.units = 0
+
+    def commit(self, unit: UnitOfWork):
+        """Write unit's operations; blocks until they are stored (raises if they failed)."""
+        if not len(unit):
+            return
+        ticket = _Ticket(unit)
+        limit = self.max_units or settings.WRITE_BATCH_MAX_UNITS
+        with self._cond:
+            self._pending.append(ticket)
+        while True:
+            with self._cond:
+                while self._flushing and not ticket.done:
+                    self._cond.wait()
+                if ticket.done:
+                    break
+                # Leader: take what is queued (oldest first, up to the limit) and flush it
+                self._flushing = True
+                batch, self._pending = self._pending[:limit], self._pending[limit:]
+            try:
+                flush(batch)
+            except Exception as e:
+                for t in batch:
+                    t.error = t.error or e
+            finally:
+                with self._cond:
+                    for t in batch:
+                        t.done = True
+                    self.flushes += 1
+                    self.units += len(batch)
+                    self._flushing = False
+                    self._cond.notify_all()
+        if ticket.error is not None:
+            raise ticket.error
+
+    def stats(self) -> Dict[str, Any]:
+        return {"flushes": self.flushes, "units": self.units,
+                "unitsPerFlush": round(self.units / self.flushes, 2) if self.flushes else 0.0}
+
+
+group_committer = GroupCommitter()
+
+
+def commit(unit: UnitOfWork):
+    group_committer.commit(unit)
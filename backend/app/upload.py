@@ -4,7 +4,9 @@ from .utils import save_upload_file, doc_type_from_parsed
 from .db import documents_collection
 from .verification import verify_document
 from .compliance import run_full_pipeline
+from .image_context import DecodedImage
 
-def process_upload(user: dict, filename: str, file_bytes: bytes, device_info: dict = None):
+def process_upload(user: dict, filename: str, file_bytes: bytes | DecodedImage, device_info: dict = None,
+                   doc_type: str = None):
     # Delegate everything to the full pipeline in compliance.py for consistency
-    return run_full_pipeline(user, filename, file_bytes, device_info=device_info)
\ No newline at end of file
+    return run_full_pipeline(user, filename, file_bytes, device_info=device_info, doc_type=doc_type)
\ No newline at end of file
@@ -1,4 +1,4 @@
-import os, uuid, hashlib, re
+import os, uuid, hashlib, re, shutil
 from pathlib import Path
 from .config import settings
 
@@ -11,7 +11,9 @@ def save_upload_file(upload_file, subdir: str = "") -> str:
     dst_dir.mkdir(parents=True, exist_ok=True)
     fpath = dst_dir / fname
     with fpath.open("wb") as f:
-        f.write(upload_file.file.read())
+        # Copy in chunks instead of reading the whole upload into memory
+        upload_file.file.seek(0)
+        shutil.copyfileobj(upload_file.file, f, settings.UPLOAD_CHUNK_BYTES)
     return str(fpath)
 
 def mask_aadhaar(value: str | None) -> str | None:
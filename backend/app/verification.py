@@ -1,7 +1,8 @@
 import json, re, requests
 from pathlib import Path
 from typing import Dict, Any, Optional
-from .ocr import extract_text_from_bytes, parse_text 
+from .ocr import extract_text_with_stats, parse_text
+from .image_context import DecodedImage
 from .config import settings
 from .utils import mask_aadhaar, mask_pan, mask_dl
 
@@ -210,8 +211,10 @@ def heuristic_refine_parsing(parsed: Dict[str, Any], raw_text: str) -> Dict[str,
 
 # ---------------- MAIN VERIFIER ----------------
 
-def verify_document(image_bytes: bytes) -> Dict[str, Any]:
-    text = extract_text_from_bytes(image_bytes)
+def verify_document(image_bytes: bytes | DecodedImage, doc_type: Optional[str] = None) -> Dict[str, Any]:
+    # doc_type (client-supplied, when known) picks the OCR model; otherwise OCR detects it
+    ocr_result = extract_text_with_stats(image_bytes, doc_type)
+    text = ocr_result["text"]
     
     # Debug: Print OCR text length and sample
     print(f"\n🔎 verify_document: OCR returned {len(text)} chars")
@@ -239,6 +242,7 @@ def verify_document(image_bytes: bytes) -> Dict[str, Any]:
     res: Dict[str, Any] = {
         "rawText": text,
         "parsed": parsed,
+        "ocrStats": dict(ocr_result.get("stats") or {}),
     }
 
     aadhaar = parsed.get("aadhaarNumber")
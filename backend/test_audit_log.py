@@ -0,0 +1,313 @@
+import os
+import sys
+import time
+import inspect
+import tempfile
+import threading
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Fail fast instead of waiting on index creation when no MongoDB is running
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=200")
+
+import bson
+import pytest
+from bson import json_util
+from pymongo.errors import BulkWriteError, DocumentTooLarge
+
+from app.audit_log import AuditSink, InvalidAuditEntry
+
+
+class FakeAuditCollection:
+    """insert_one / insert_many with a per-call latency, duplicate _id errors and an outage switch.
+
+    Like pymongo, a document over max_bytes fails the whole insert_many before anything is
+    sent; documents matching `invalid` fail server-side validation (code 121), and while
+    `failing_over` is set every document fails with a retryable code.
+    """
+
+    def __init__(self, latency=0.0, max_bytes=16 * 1024 * 1024, invalid=None):
+        self.latency = latency
+        self.max_bytes = max_bytes
+        self.invalid = invalid
+        self.docs = {}
+        self.batches = []
+        self.down = False
+        self.failing_over = False
+        self._lock = threading.Lock()
+
+    def insert_one(self, doc):
+        time.sleep(self.latency)
+        if self.down:
+            raise ConnectionError("database unreachable")
+        with self._lock:
+            self.docs[doc["_id"]] = doc
+
+    def insert_many(self, docs, ordered=True):
+        time.sleep(self.latency)
+        if self.down:
+            raise ConnectionError("database unreachable")
+        for doc in docs:
+            if len(bson.encode(doc)) > self.max_bytes:
+                raise DocumentTooLarge("BSON document too large")
+        errors = []
+        with self._lock:
+            self.batches.append(len(docs))
+            for i, doc in enumerate(docs):
+                if self.failing_over:
+                    errors.append({"index": i, "code": 10107, "errmsg": "not primary"})
+                elif self.invalid and self.invalid(doc):
+                    errors.append({"index": i, "code": 121, "errmsg": "Document failed validation"})
+                elif doc["_id"] in self.docs:
+                    errors.append({"index": i, "code": 11000, "errmsg": "duplicate key"})
+                else:
+                    self.docs[doc["_id"]] = doc
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+def _sink(coll, path, **kwargs):
+    kwargs.setdefault("flush_interval_ms", 20)
+    return AuditSink(collection=coll, spill_path=path, **kwargs)
+
+
+def test_entries_are_batched_and_spill_is_truncated():
+    coll = FakeAuditCollection(latency=0.002)
+    path = os.path.join(tempfile.mkdtemp(), "audit.jsonl")
+    sink = _sink(coll, path, batch_size=100)
+    sink.start()
+    ids = [sink.submit({"action": "upload", "n": i}) for i in range(1000)]
+    sink.stop()
+    assert set(coll.docs) == set(ids) and max(coll.batches) <= 100
+    assert len(coll.batches) < 100  # insert_many batches, not a round trip per entry
+    assert os.path.getsize(sink.spill_path) == 0 and sink.stats()["pending"] == 0
+    assert sink.spill_path.endswith(f"audit.{os.getpid()}.jsonl")
+    stats = sink.stats()
+    assert stats["flushed"] == 1000 and stats["flushes"] == len(coll.batches) and stats["flushMsAvg"] > 0
+
+    # Not started: the sink writes inline (scripts, tests)
+    inline = AuditSink(collection=coll)
+    assert inline.submit({"action": "x"}) in coll.docs and inline.stats()["inline"] == 1
+
+
+def test_unflushed_entries_survive_a_crash():
+    path = os.path.join(tempfile.mkdtemp(), "audit.jsonl")
+    down = FakeAuditCollection()
+    down.down = True
+    sink = _sink(down, path)
+    sink.start()
+    ids = [sink.submit({"action": "decision", "n": i}) for i in range(50)]
+    # "Crash": the flusher stops without a clean shutdown; the entries are only in the spill file
+    sink._stop.set()
+    sink._thread.join(5)
+    sink._spill.close()  # the dead process's lock goes with it
+    with open(sink.spill_path, "a", encoding="utf-8") as f:
+        f.write('{"_id": {"$oid": "torn')  # half-written last line
+    assert not down.docs
+
+    coll = FakeAuditCollection()
+    for i in ids[:10]:
+        coll.docs[i] = {"_id": i}  # reached Mongo before the crash
+    restarted = _sink(coll, path)
+    assert restarted.start() == 50
+    restarted.stop()
+    assert set(coll.docs) == set(ids) and os.path.getsize(restarted.spill_path) == 0
+
+
+def test_full_queue_applies_backpressure():
+    coll = FakeAuditCollection(latency=0.02)
+    path = os.path.join(tempfile.mkdtemp(), "audit.jsonl")
+    sink = _sink(coll, path, max_queue=10, batch_size=5, block_seconds=0.01)
+    sink.start()
+    depths = []
+    ids = []
+    for i in range(200):
+        ids.append(sink.submit({"n": i}))
+        depths.append(sink.stats()["queueDepth"])
+    sink.stop()
+    assert max(depths) <= 10 and sink.stats()["blocked"] > 0
+    assert set(coll.docs) == set(ids) and len(coll.docs) == 200  # nothing dropped or doubled
+
+
+def test_poison_entries_are_dead_lettered_not_retried():
+    path = os.path.join(tempfile.mkdtemp(), "audit.jsonl")
+    # The shared spill file of an older build may hold entries the server refuses
+    poison = [{"_id": bson.ObjectId(), "n": -1, "blob": "x" * 5000}, {"_id": bson.ObjectId(), "n": -2}]
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(json_util.dumps(e) + "\n" for e in poison)
+    coll = FakeAuditCollection(max_bytes=4096, invalid=lambda doc: doc.get("n") == -2)
+    sink = _sink(coll, path, batch_size=50)
+    assert sink.start() == 2
+    ids = [sink.submit({"n": i}) for i in range(200)]
+    sink.stop()
+    # The flusher kept going: every good entry landed, each poison entry once in the dead-letter file
+    assert set(coll.docs) == set(ids)
+    stats = sink.stats()
+    assert stats["deadLettered"] == 2 and stats["pending"] == 0 and os.path.getsize(sink.spill_path) == 0
+    assert not os.path.exists(path)  # adopted, then removed
+    with open(sink.dead_letter_path, encoding="utf-8") as f:
+        dead = [json_util.loads(line) for line in f]
+    assert {d["entry"]["_id"] for d in dead} == {e["_id"] for e in poison}
+    assert any("DocumentTooLarge" in d["error"] for d in dead) and any(d["error"].startswith("121") for d in dead)
+
+    # A failover error is transient: the same entries are retried, nothing is dead-lettered
+    coll = FakeAuditCollection()
+    coll.failing_over = True
+    sink = _sink(coll, os.path.join(tempfile.mkdtemp(), "audit.jsonl"))
+    sink.start()
+    ids = [sink.submit({"n": i}) for i in range(20)]
+    time.sleep(0.15)
+    coll.failing_over = False
+    sink.stop()
+    assert set(coll.docs) == set(ids) and sink.stats()["deadLettered"] == 0 and sink.stats()["failedFlushes"] > 0
+
+
+def test_unstorable_entries_are_rejected_at_submit(monkeypatch):
+    coll = FakeAuditCollection()
+    sink = _sink(coll, os.path.join(tempfile.mkdtemp(), "audit.jsonl"))
+    sink.start()
+    for entry, status in (({"blob": "x" * (2 * 1024 * 1024)}, 413), ({"bad": object()}, 400), ({"$set": 1, 2: 3}, 400)):
+        try:
+            sink.submit(entry)
+            assert False, entry
+        except InvalidAuditEntry as e:
+            assert e.status_code == status, entry
+    sink.stop()
+    assert sink.stats()["submitted"] == 0 and not coll.docs
+
+    # Through the route: a 4xx, and the decision is not written when its notes are refused
+    import asyncio
+    import httpx
+    from fastapi import FastAPI
+    from app.routers import compliance_routes
+    app = FastAPI()
+    app.include_router(compliance_routes.router)
+    monkeypatch.setattr(compliance_routes, "audit_sink", sink)
+
+    async def post(body):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/compliance/logs/add", json=body)
+
+    assert asyncio.run(post({"blob": "x" * (2 * 1024 * 1024)})).status_code == 413
+    ok = asyncio.run(post({"action": "login"}))
+    assert ok.status_code == 200 and bson.ObjectId(ok.json()["id"]) in coll.docs  # stopped: inline
+
+
+def test_full_queue_never_blocks_past_the_bound():
+    coll = FakeAuditCollection()
+    coll.down = True
+    path = os.path.join(tempfile.mkdtemp(), "audit.jsonl")
+    sink = _sink(coll, path, max_queue=4, batch_size=2, block_seconds=0.02)
+    sink.start()
+    t0 = time.perf_counter()
+    ids = [sink.submit({"n": i}) for i in range(30)]
+    # Database down and queue full: each caller waits about block_seconds, then the entry overflows
+    assert time.perf_counter() - t0 < 30 * 0.02 + 1.0
+    assert sink.stats()["overflowed"] > 0
+    with open(sink.spill_path, encoding="utf-8") as f:
+        assert {json_util.loads(line)["_id"] for line in f} >= set(ids)  # all durable
+    coll.down = False
+    sink.stop(timeout=30)
+    assert set(coll.docs) == set(ids) and sink.stats()["overflow"] == 0
+
+    # Submitting while stop() closes the spill file falls back to inline writes, never crashes
+    path = os.path.join(tempfile.mkdtemp(), "audit.jsonl")
+    sink = _sink(coll, path)
+    sink.start()
+    errors = []
+
+    def producer():
+        for i in range(300):
+            try:
+                ids.append(sink.submit({"late": i}))
+            except Exception as e:
+                errors.append(e)
+
+    t = threading.Thread(target=producer)
+    t.start()
+    time.sleep(0.005)
+    sink.stop()
+    t.join()
+    assert not errors
+    restarted = _sink(coll, path)
+    restarted.start()
+    restarted.stop()
+    assert set(coll.docs) == set(ids)
+
+
+def test_workers_keep_their_own_spill_files_and_adopt_dead_ones():
+    fcntl = pytest.importorskip("fcntl")
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, "audit.jsonl")
+
+    def spill(pid, n):
+        entries = [{"_id": bson.ObjectId(), "worker": pid, "n": i} for i in range(n)]
+        with open(os.path.join(folder, f"audit.{pid}.jsonl"), "w", encoding="utf-8") as f:
+            f.writelines(json_util.dumps(e) + "\n" for e in entries)
+        return {e["_id"] for e in entries}
+
+    live, dead = spill(4242, 5), spill(4343, 7)
+    # Another uvicorn worker is running and holds its file; the other one crashed
+    held = open(os.path.join(folder, "audit.4242.jsonl"), "r", encoding="utf-8")
+    fcntl.flock(held.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    try:
+        coll = FakeAuditCollection()
+        sink = _sink(coll, path)
+        assert sink.start() == 7
+        ids = {sink.submit({"n": i}) for i in range(20)}
+        sink.stop()
+        assert set(coll.docs) == dead | ids and os.path.getsize(sink.spill_path) == 0
+        # The live worker's entries are untouched and still only its own
+        assert not os.path.exists(os.path.join(folder, "audit.4343.jsonl"))
+        with open(os.path.join(folder, "audit.4242.jsonl"), encoding="utf-8") as f:
+            assert {json_util.loads(line)["_id"] for line in f} == live
+    finally:
+        held.close()
+
+    # Once that worker is gone too, the next start picks its entries up
+    restarted = _sink(coll, path)
+    assert restarted.start() == 5
+    restarted.stop()
+    assert live <= set(coll.docs) and sorted(os.listdir(folder)) == [f"audit.{os.getpid()}.jsonl"]
+
+
+def benchmark(entries=500, latency=0.002):
+    print(f"\n⏱️ Audit log sink benchmark ({entries} entries, {int(latency * 1000)} ms per round trip)")
+    coll = FakeAuditCollection(latency)
+    inline = AuditSink(collection=coll)
+    t0 = time.perf_counter()
+    for i in range(entries):
+        inline.submit({"n": i})
+    before = (time.perf_counter() - t0) * 1e6 / entries
+
+    coll = FakeAuditCollection(latency)
+    sink = _sink(coll, os.path.join(tempfile.mkdtemp(), "audit.jsonl"))
+    sink.start()
+    t0 = time.perf_counter()
+    for i in range(entries):
+        sink.submit({"n": i})
+    after = (time.perf_counter() - t0) * 1e6 / entries
+    sink.stop()
+    stats = sink.stats()
+    print(f"   caller cost per entry: {before:.0f} µs inline -> {after:.0f} µs queued (spill write included)")
+    print(f"   {stats['flushes']} insert_many flushes, avg {stats['flushMsAvg']} ms, p95 {stats['flushMsP95']} ms")
+
+
+if __name__ == "__main__":
+    print("🔍 Testing audit log sink...")
+    for test in (test_entries_are_batched_and_spill_is_truncated, test_unflushed_entries_survive_a_crash,
+                 test_full_queue_applies_backpressure, test_poison_entries_are_dead_lettered_not_retried,
+                 test_unstorable_entries_are_rejected_at_submit, test_full_queue_never_blocks_past_the_bound,
+                 test_workers_keep_their_own_spill_files_and_adopt_dead_ones):
+        try:
+            with pytest.MonkeyPatch.context() as monkeypatch:
+                test(monkeypatch) if "monkeypatch" in inspect.signature(test).parameters else test()
+            print(f"   ✅ {test.__name__}")
+        except pytest.skip.Exception as e:
+            print(f"   ⚠️ {test.__name__} skipped: {e}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    benchmark()
+    print("\n--- Test Complete ---")
@@ -0,0 +1,352 @@
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import inspect
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Fail fast instead of waiting on index creation when no MongoDB is running
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=200")
+
+import httpx
+import numpy as np
+import pytest
+from fastapi import FastAPI, UploadFile
+
+from app import bulk_verify as bv
+from app import identifier_index as ix
+from app.config import settings
+from app.db_async import async_db
+from app.ingest import ingest_upload, SPREADSHEET_KINDS
+from app.routers import routers
+from app.security import create_access_token
+from app.verification import verhoeff_validate
+from test_db_async import FakeAsyncCollection
+from test_identifier_index import FakeIdentifierCollection, FakeAsyncIdentifiers
+
+
+def _aadhaar(rng):
+    """A 12-digit number that passes the Verhoeff check."""
+    while True:
+        number = "".join(str(d) for d in rng.integers(0, 10, 12))
+        if number[0] != "0" and verhoeff_validate(number):
+            return number
+
+
+def _rows(n, seed=0, unique=True):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n):
+        aadhaar = _aadhaar(rng) if rng.random() < 0.85 else str(rng.choice(["", "1234", "12345678901X"]))
+        pan = (f"{''.join(rng.choice(list('ABCDEFGHJK'), 5))}{int(rng.integers(10000)):04d}Z"
+               if rng.random() < 0.8 else str(rng.choice(["", "abc12"])))
+        year = int(rng.integers(1950, datetime.now().year))
+        dob = str(rng.choice([f"{rng.integers(1, 29)}/{rng.integers(1, 13)}/{year}",
+                              f"{rng.integers(1, 29):02d}-{rng.integers(1, 13):02d}-{year}",
+                              f"{year}-{rng.integers(1, 13):02d}-{rng.integers(1, 29):02d}",
+                              f"{rng.integers(1, 29)}/{rng.integers(1, 13)}/{year % 100:02d}",
+                              "31/02/1990", "unknown", ""]))
+        rows.append({"Name": str(rng.choice(["Ravi Kumar", "Al", "", "Priya Sharma"])),
+                     "Aadhaar": aadhaar, "PAN": pan, "DOB": dob, "Address": "Pune"})
+    if unique:  # the old engine had no in-file check; keep the parity rows distinct
+        for kind in ("Aadhaar", "PAN"):
+            counts = {}
+            for r in rows:
+                counts[r[kind]] = counts.get(r[kind], 0) + 1
+            rows = [r for r in rows if not r[kind] or counts[r[kind]] == 1]
+    return rows
+
+
+def _old_result(idx, row, seen):
+    """The row checks bulk-verify ran before the streaming engine."""
+    norm_row = {k.lower().strip() if k else '': v for k, v in row.items()}
+    name = norm_row.get('name', '')
+    aadhaar = str(norm_row.get('aadhaar', '') or '').replace(' ', '').replace('-', '')
+    pan = str(norm_row.get('pan', '') or '').upper().replace(' ', '')
+    dob = str(norm_row.get('dob', '') or '')
+    errors, warnings, fraud_score = [], [], 0
+    if aadhaar:
+        if not re.match(r'^\d{12}$', aadhaar):
+            errors.append("Invalid Aadhaar format (must be 12 digits)")
+            fraud_score += 30
+        elif ("aadhaar", aadhaar) in seen:
+            warnings.append("Aadhaar already exists in system")
+            fraud_score += 20
+    else:
+        warnings.append("Aadhaar not provided")
+    if pan:
+        if not re.match(r'^[A-Z]{5}\d{4}[A-Z]$', pan):
+            errors.append("Invalid PAN format (must be ABCDE1234F)")
+            fraud_score += 25
+        elif ("pan", pan) in seen:
+            warnings.append("PAN already exists in system")
+            fraud_score += 20
+    else:
+        warnings.append("PAN not provided")
+    if dob:
+        for fmt in ['%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%d/%m/%y']:
+            try:
+                age = (datetime.now() - datetime.strptime(dob.strip(), fmt)).days // 365
+                if age < 18:
+                    errors.append(f"Underage: {age} years old")
+                    fraud_score += 40
+                break
+            except ValueError:
+                continue
+    if not name or len(name.strip()) < 3:
+        errors.append("Name is required (min 3 characters)")
+        fraud_score += 10
+    status = "Failed" if errors else "Review" if warnings else "Pass"
+    return {
+        "row": idx + 1, "filename": f"Row {idx + 1}", "name": name,
+        "aadhaar": f"XXXX-XXXX-{aadhaar[-4:]}" if len(aadhaar) >= 4 else aadhaar,
+        "pan": f"XXXXX{pan[-5:]}" if len(pan) >= 5 else pan,
+        "success": status != "Failed", "status": status, "fraudScore": min(fraud_score, 100),
+        "decision": status, "errors": errors, "warnings": warnings,
+    }
+
+
+def _csv(rows):
+    lines = ["Name,Aadhaar,PAN,DOB,Address"]
+    lines += [",".join(r[k] for k in ("Name", "Aadhaar", "PAN", "DOB", "Address")) for r in rows]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def _ingest(data, filename):
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spool.write(data)
+    spool.seek(0)
+    return asyncio.run(ingest_upload(UploadFile(spool, size=len(data), filename=filename), kinds=SPREADSHEET_KINDS))
+
+
+def _verify(upload, filename, known):
+    verifier = bv.BulkVerifier()
+    results = []
+    with upload:
+        for rows in bv.chunks(bv.iter_rows(upload, filename), 64):
+            prepared = verifier.prepare(rows)
+            ids = verifier.identifiers(prepared)
+            results.extend(verifier.finish(prepared, ix.IdentifierMatches(ids, [
+                {"_id": ix.identifier_key(k, v), "userIds": ["u0"], "docIds": ["d0"]} for k, v in ids if (k, v) in known])))
+    return results, verifier.summary()
+
+
+def test_results_match_per_row_checks():
+    rows = _rows(800)
+    known = {("aadhaar", r["Aadhaar"]) for r in rows[::7]} | {("pan", r["PAN"]) for r in rows[::5]}
+    results, summary = _verify(_ingest(_csv(rows), "kyc.csv"), "kyc.csv", known)
+    # Same results; the database duplicate warnings now come after the field checks
+    ordered = lambda rs: [{**r, "warnings": sorted(r["warnings"])} for r in rs]
+    assert ordered(results) == ordered([_old_result(i, r, known) for i, r in enumerate(rows)])
+    assert summary["total"] == len(rows) == sum(summary[k] for k in ("passed", "review", "failed"))
+
+    for value in {r["DOB"] for r in _rows(2000, seed=3, unique=False)} | {"29/02/2001", "1/1/99", "2000-1-5", "5/6/7"}:
+        expected = None
+        for fmt in ['%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%d/%m/%y']:
+            try:
+                expected = datetime.strptime(value.strip(), fmt).date()
+                break
+            except ValueError:
+                continue
+        assert bv.parse_dob(value) == expected, value
+
+
+def test_in_file_duplicates_and_checksum():
+    rng = np.random.default_rng(4)
+    keys = rng.integers(0, 5000, 20_000).astype(np.int64)
+    seen, first = bv.SeenKeys(), {}
+    for start in range(0, len(keys), 700):
+        chunk = keys[start:start + 700]
+        got = seen.check_and_add(chunk, np.arange(start + 1, start + len(chunk) + 1))
+        expected = [first.setdefault(int(k), start + i + 1) for i, k in enumerate(chunk)]
+        assert [e if e != start + i + 1 else -1 for i, e in enumerate(expected)] == got.tolist()
+    assert len(seen) == len(first) and len(seen.runs) <= int(np.log2(len(first))) + 1
+
+    numbers = ["".join(str(d) for d in rng.integers(0, 10, 12)) for _ in range(3000)]
+    assert bv.verhoeff_ok(numbers).tolist() == [verhoeff_validate(n) for n in numbers]
+
+    good = _aadhaar(rng)
+    bad = good[:-1] + next(d for d in "0123456789" if not verhoeff_validate(good[:-1] + d))
+    rows = [{"Name": "Ravi Kumar", "Aadhaar": good, "PAN": "ABCDE1234F"},
+            {"Name": "Ravi Kumar", "Aadhaar": bad, "PAN": "abcde 1234f"},
+            {"Name": "Ravi Kumar", "Aadhaar": good, "PAN": "PQRST6789Z"}]
+    verifier = bv.BulkVerifier()
+    first_half, second_half = verifier.prepare(rows[:2]), verifier.prepare(rows[2:])
+    assert first_half[0]["warnings"] == [] and first_half[0]["fraudScore"] == 0
+    assert first_half[1]["warnings"] == ["Aadhaar checksum (Verhoeff) failed", "PAN repeats row 1 of this file"]
+    assert second_half[0]["warnings"] == ["Aadhaar repeats row 1 of this file"]  # across chunks
+    assert second_half[0]["fraudScore"] == 20
+
+
+def test_route_streams_ndjson_with_one_lookup_per_chunk(monkeypatch):
+    rows = _rows(260, seed=6)
+    identifiers = FakeIdentifierCollection()
+    monkeypatch.setattr(ix, "identifiers_collection", identifiers)
+    ix.record_identifiers("d0", "u9", [("aadhaar", rows[0]["Aadhaar"])])
+    users = FakeAsyncCollection([{"_id": "u1", "email": "admin@example.com", "role": "admin"}])
+    monkeypatch.setattr(async_db, "_database", lambda: {"identifiers": FakeAsyncIdentifiers(identifiers), "users": users},
+                        raising=False)
+    monkeypatch.setattr(settings, "BULK_CHUNK_ROWS", 50)
+    app = FastAPI()
+    for router in routers:
+        app.include_router(router)
+
+    async def post(data, **params):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = {"Authorization": f"Bearer {create_access_token({'sub': 'admin@example.com'})}"}
+            return await client.post("/compliance/bulk-verify", files={"file": ("kyc.csv", data, "text/csv")},
+                                     headers=headers, params=params)
+
+    finds = identifiers.finds
+    streamed = asyncio.run(post(_csv(rows), format="ndjson"))
+    assert streamed.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert identifiers.finds - finds == -(-len(rows) // 50)
+    row_lines = [m for m in lines if m["type"] == "row"]
+    summaries = [{k: v for k, v in m.items() if k != "type"} for m in lines if m["type"] == "summary"]
+    assert [s["total"] for s in summaries] == [min(n, len(rows)) for n in range(50, len(rows) + 50, 50)]
+    assert lines[-1]["type"] == "done" and lines[-1]["summary"] == summaries[-1]
+    assert row_lines[0]["warnings"][-1] == "Aadhaar already exists in system"
+
+    body = asyncio.run(post(_csv(rows))).json()  # default stays one JSON body
+    assert body["results"] == [{k: v for k, v in m.items() if k != "type"} for m in row_lines]
+    assert body["summary"] == summaries[-1] and body["message"] == f"Processed {len(rows)} rows"
+    empty = asyncio.run(post(_csv([]), format="ndjson"))
+    assert empty.status_code == 400 and empty.json() == {"error": "No data rows found in file"}
+
+
+def _xlsx(rows):
+    import io
+    import openpyxl
+    wb = openpyxl.Workbook()
+    for row in rows:
+        wb.active.append(row)
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def test_spreadsheet_cells_and_bom_headers_read_as_displayed():
+    rng = np.random.default_rng(9)
+    good = _aadhaar(rng)
+    child = datetime.now() - timedelta(days=3660)
+    data = _xlsx([
+        ["Name", "Aadhaar", "PAN", "DOB", None],
+        ["Ravi Kumar", int(good), "ABCDE1234F", child, "unnamed column"],
+        [None, None, None, None, None],  # blank row between records
+        ["Priya Sharma", float(good), "pqrst6789z", datetime(1990, 5, 12).date(), None],
+        [None, "  ", None, None, None],
+    ])
+    results, summary = _verify(_ingest(data, "kyc.xlsx"), "kyc.xlsx", set())
+    assert [r["row"] for r in results] == [1, 2] and summary["total"] == 2
+    # Excel dates are DOBs (the child is caught), numeric Aadhaar cells are not "12345.0"
+    assert results[0]["errors"] == ["Underage: 10 years old"]
+    assert results[0]["aadhaar"] == f"XXXX-XXXX-{good[-4:]}" and results[1]["errors"] == []
+    assert results[1]["warnings"] == ["Aadhaar repeats row 1 of this file"]
+
+    # Excel's "CSV UTF-8" export starts with a BOM; the Name column is still found
+    rows = [{"Name": "Ravi Kumar", "Aadhaar": good, "PAN": "ABCDE1234F", "DOB": "12/05/1990", "Address": "Pune"}]
+    results, _ = _verify(_ingest(b"\xef\xbb\xbf" + _csv(rows), "kyc.csv"), "kyc.csv", set())
+    assert results[0]["name"] == "Ravi Kumar" and results[0]["status"] == "Pass"
+
+    # Short and long CSV rows: missing cells are empty, extra cells are ignored
+    data = b"Name,Aadhaar,PAN\nRavi Kumar\nPriya Sharma," + good.encode() + b",ABCDE1234F,extra,cells\n"
+    results, _ = _verify(_ingest(data, "kyc.csv"), "kyc.csv", set())
+    assert results[0]["warnings"] == ["Aadhaar not provided", "PAN not provided"]
+    assert results[1]["status"] == "Pass"
+
+
+def test_a_failing_chunk_ends_the_stream_with_what_was_verified(monkeypatch):
+    rows = _rows(120, seed=10)
+
+    class FailingIdentifiers(FakeAsyncIdentifiers):
+        calls = 0
+
+        def find(self, query, projection=None):
+            FailingIdentifiers.calls += 1
+            if FailingIdentifiers.calls == 2:
+                raise RuntimeError("identifier index unavailable")
+            return super().find(query, projection)
+
+    users = FakeAsyncCollection([{"_id": "u1", "email": "admin@example.com", "role": "admin"}])
+    identifiers = FailingIdentifiers(FakeIdentifierCollection())
+    monkeypatch.setattr(async_db, "_database", lambda: {"identifiers": identifiers, "users": users}, raising=False)
+    monkeypatch.setattr(settings, "BULK_CHUNK_ROWS", 50)
+    app = FastAPI()
+    for router in routers:
+        app.include_router(router)
+
+    async def post(data, filename="kyc.csv", **params):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = {"Authorization": f"Bearer {create_access_token({'sub': 'admin@example.com'})}"}
+            return await client.post("/compliance/bulk-verify", files={"file": (filename, data, "text/csv")},
+                                     headers=headers, params=params)
+
+    lines = [json.loads(line) for line in asyncio.run(post(_csv(rows), format="ndjson")).text.splitlines()]
+    # The first chunk is delivered; the error line's summary counts only rows with a result
+    assert [m["type"] for m in lines] == ["row"] * 50 + ["summary", "error"]
+    assert lines[-1]["error"] == "identifier index unavailable" and lines[-1]["summary"]["total"] == 50
+
+    FailingIdentifiers.calls = 1  # the next lookup fails: the whole JSON body is an error
+    failed = asyncio.run(post(_csv(rows)))
+    assert failed.status_code == 500 and failed.json()["error"] == "identifier index unavailable"
+
+    unsupported = asyncio.run(post(_csv(rows), filename="kyc.txt"))
+    assert unsupported.status_code == 400 and "Unsupported file format" in unsupported.json()["error"]
+    header_only = asyncio.run(post(_xlsx([["Name", "Aadhaar", "PAN"], [None, None, None]]), filename="kyc.xlsx"))
+    assert header_only.status_code == 400 and header_only.json() == {"error": "No data rows found in file"}
+
+
+def benchmark(n=200_000):
+    print(f"\n⏱️ Bulk verify benchmark ({n:,} rows)")
+    rng = np.random.default_rng(7)
+    pool = _rows(2000, seed=8, unique=False)
+    picks = rng.integers(0, len(pool), n)
+    data = _csv([pool[i] for i in picks])
+
+    def run(upload):
+        verifier = bv.BulkVerifier()
+        with upload:
+            for rows in bv.chunks(bv.iter_rows(upload, "kyc.csv"), settings.BULK_CHUNK_ROWS):
+                prepared = verifier.prepare(rows)
+                verifier.finish(prepared, ix.IdentifierMatches(verifier.identifiers(prepared)))
+        return verifier
+
+    upload = _ingest(data, "kyc.csv")
+    t0 = time.perf_counter()
+    verifier = run(upload)
+    elapsed = time.perf_counter() - t0
+    upload = _ingest(data, "kyc.csv")
+    tracemalloc.start()
+    run(upload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"   {len(data) / 1e6:.1f} MB CSV in {elapsed:.2f} s ({n / elapsed:,.0f} rows/s)")
+    print(f"   peak traced memory: {peak / 1e6:.1f} MB (chunks of {settings.BULK_CHUNK_ROWS} rows, "
+          f"one identifier query each)")
+    print(f"   summary: {verifier.summary()}")
+
+
+if __name__ == "__main__":
+    print("🔍 Testing streaming bulk verify...")
+    for test in (test_results_match_per_row_checks, test_in_file_duplicates_and_checksum,
+                 test_route_streams_ndjson_with_one_lookup_per_chunk,
+                 test_spreadsheet_cells_and_bom_headers_read_as_displayed,
+                 test_a_failing_chunk_ends_the_stream_with_what_was_verified):
+        try:
+            with pytest.MonkeyPatch.context() as monkeypatch:
+                test(monkeypatch) if "monkeypatch" in inspect.signature(test).parameters else test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    benchmark()
+    print("\n--- Test Complete ---")
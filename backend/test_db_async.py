@@ -0,0 +1,188 @@
+import os
+import sys
+import time
+import asyncio
+import inspect
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Fail fast instead of waiting on index creation when no MongoDB is running
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=200")
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app import db_async
+from app.config import settings
+from app.security import create_access_token
+from app.routers import routers
+
+
+# ----------------------------------------------------
+# Minimal motor stand-in with a fixed per-query latency
+# ----------------------------------------------------
+def _matches(doc, query):
+    for key, cond in query.items():
+        if key == "$and":
+            if not all(_matches(doc, q) for q in cond):
+                return False
+            continue
+        value = doc
+        for part in key.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        if isinstance(cond, dict):
+            if "$ne" in cond and value == cond["$ne"]:
+                return False
+            if "$in" in cond and value not in cond["$in"]:
+                return False
+            if cond.get("$type") == "string" and not isinstance(value, str):
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+class _AsyncCursor:
+    def __init__(self, docs, latency):
+        self.docs, self.latency = docs, latency
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def limit(self, n):
+        return _AsyncCursor(self.docs[:n], self.latency)
+
+    async def to_list(self, length=None):
+        await asyncio.sleep(self.latency)
+        return [dict(d) for d in self.docs[:length]]
+
+
+class _Result:
+    inserted_id = "new-id"
+    modified_count = 1
+
+
+class FakeAsyncCollection:
+    def __init__(self, docs=(), latency=0.0):
+        self.docs = list(docs)
+        self.latency = latency
+        self.queries = 0
+
+    def find(self, query=None, projection=None):
+        self.queries += 1
+        return _AsyncCursor([d for d in self.docs if _matches(d, query or {})], self.latency)
+
+    async def find_one(self, query=None, projection=None):
+        self.queries += 1
+        await asyncio.sleep(self.latency)
+        found = [d for d in self.docs if _matches(d, query or {})]
+        return dict(found[0]) if found else None
+
+    async def insert_one(self, doc):
+        await asyncio.sleep(self.latency)
+        self.docs.append(doc)
+        return _Result()
+
+
+def _fake_db(latency=0.0, n_docs=30):
+    users = [{"_id": "u1", "email": "admin@example.com", "role": "admin", "name": "Admin"}] + [
+        {"_id": f"u{i}", "email": f"user{i}@example.com", "role": "user"} for i in range(2, 6)]
+    documents = [{"_id": f"doc{i}", "userId": "u1", "userEmail": f"user{2 + i % 4}@example.com",
+                  "filename": f"f{i}.png", "createdAt": f"2024-01-01T00:00:{i:02d}"} for i in range(n_docs)]
+    kyc = [{"_id": f"k{i}", "docId": f"doc{i}", "userEmail": f"user{2 + i % 4}@example.com",
+            "createdAt": f"2024-01-01T00:00:{i:02d}"} for i in range(n_docs)]
+    alerts = [{"_id": f"a{i}", "seen": False, "timestamp": f"2024-01-01T00:00:{i:02d}"} for i in range(5)]
+    return {name: FakeAsyncCollection(docs, latency) for name, docs in (
+        ("users", users), ("uploaded_documents", documents), ("kyc_data", kyc), ("alerts", alerts),
+        ("audit_logs", []), ("aml_blacklist", [{"aadhaar": "234567890123", "reason": "Sanctions"}]))}
+
+
+def _app():
+    app = FastAPI()
+    for router in routers:
+        app.include_router(router)
+    return app
+
+
+def _install(monkeypatch, db):
+    monkeypatch.setattr(db_async.async_db, "_database", lambda: db, raising=False)
+
+
+def _headers():
+    return {"Authorization": f"Bearer {create_access_token({'sub': 'admin@example.com'})}"}
+
+
+async def _get_all(paths, headers=None):
+    transport = httpx.ASGITransport(app=_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(client.get(p, headers=headers) for p in paths))
+
+
+def test_routes_read_through_async_layer(monkeypatch):
+    db = _fake_db()
+    _install(monkeypatch, db)
+    me, docs, submissions, alerts, aml = asyncio.run(_get_all(
+        ["/auth/me", "/compliance/docs", "/compliance/submissions", "/compliance/alerts",
+         "/compliance/aml/check/234567890123"], _headers()))
+    assert me.json()["role"] == "admin"
+    assert len(docs.json()) == 30
+    body = submissions.json()
+    assert len(body) == 30 and body[0]["filename"] == "f0.png" and body[0]["userRole"] == "user"
+    # Submissions: kyc + one batched users query + one batched documents query (was 2 per row)
+    assert db["kyc_data"].queries == 1 and db["uploaded_documents"].queries == 2
+    assert len(alerts.json()) == 5
+    assert aml.json() == {"flagged": True, "reason": "Aadhaar in AML blacklist: Sanctions"}
+
+
+def test_slow_database_does_not_stall_event_loop(monkeypatch):
+    _install(monkeypatch, _fake_db(latency=0.2))
+    t0 = time.perf_counter()
+    responses = asyncio.run(_get_all(["/compliance/alerts"] * 50 + ["/compliance/logs"] * 50))
+    elapsed = time.perf_counter() - t0
+    assert all(r.status_code == 200 for r in responses)
+    # 100 queries of 200 ms overlap on one loop (serial or 40 threadpool workers: >= 0.6 s)
+    assert elapsed < 0.6, elapsed
+
+
+def test_client_uses_pool_settings_and_follows_event_loop():
+    db = db_async.AsyncDB()
+
+    async def pool():
+        database = db._database()
+        return database.client, database.client.options.pool_options
+
+    try:
+        first, options = asyncio.run(pool())
+        second, _ = asyncio.run(pool())
+        assert options.max_pool_size == settings.MONGO_MAX_POOL_SIZE
+        assert options.min_pool_size == settings.MONGO_MIN_POOL_SIZE
+        assert first is not second  # a client bound to a closed loop is replaced
+    finally:
+        db.close()
+
+
+def benchmark(requests=200, latency=0.05):
+    print(f"\n⏱️ Async data layer benchmark ({requests} requests, {int(latency * 1000)} ms per query)")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        _install(monkeypatch, _fake_db(latency=latency))
+        t0 = time.perf_counter()
+        asyncio.run(_get_all(["/compliance/alerts"] * requests))
+        elapsed = time.perf_counter() - t0
+    print(f"   concurrent on one event loop: {elapsed:.2f} s")
+    print(f"   blocking driver on the loop would take >= {requests * latency:.1f} s")
+
+
+if __name__ == "__main__":
+    print("🔍 Testing async MongoDB layer...")
+    for test in (test_routes_read_through_async_layer, test_slow_database_does_not_stall_event_loop,
+                 test_client_uses_pool_settings_and_follows_event_loop):
+        try:
+            with pytest.MonkeyPatch.context() as monkeypatch:
+                test(monkeypatch) if "monkeypatch" in inspect.signature(test).parameters else test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    benchmark()
+    print("\n--- Test Complete ---")
@@ -0,0 +1,760 @@
+import io
+import os
+import re
+import sys
+import time
+import random
+import contextlib
+from typing import Dict
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+from app.extractors import extract_fields, match_pan
+
+
+# ----------------------------------------------------
+# Reference: the line-by-line parse_text this engine replaced
+# ----------------------------------------------------
+def legacy_parse_text(text: str) -> Dict:
+    parsed = {
+        "panNumber": None,
+        "aadhaarNumber": None,
+        "name": None,
+        "fatherName": None,
+        "dob": None,
+        "gender": None,
+        "address": None,
+        "dlNumber": None,
+        "issueDate": None,
+        "validUntil": None,
+        "pinCode": None,      # NEW: 6-digit Indian postal code
+        "pinZone": None,      # NEW: Region derived from PIN
+        "state": None,        # NEW: Indian state from address
+        "documentType": None, # Detect early
+    }
+    
+    # Filter out empty lines and very short noise
+    lines = [l.strip() for l in text.splitlines() if len(l.strip()) > 2]
+    full = " ".join(lines)
+    full_upper = full.upper()
+
+    # ==========================================
+    # STEP 0: Detect Document Type FIRST (Critical for avoiding misclassification)
+    # ==========================================
+    if any(kw in full_upper for kw in ["AADHAAR", "UNIQUE IDENTIFICATION", "UIDAI", "आधार"]):
+        parsed["documentType"] = "Aadhaar"
+    elif any(kw in full_upper for kw in ["INCOME TAX", "PERMANENT ACCOUNT", "INCOME TAX DEPARTMENT", "PAN CARD", "आयकर विभाग"]):
+        parsed["documentType"] = "PAN"
+    elif any(kw in full_upper for kw in ["DRIVING LICENCE", "DRIVING LICENSE", "MOTOR DRIVING", "FORM 7", "LMV", "MCWG"]):
+        parsed["documentType"] = "DrivingLicence"
+    # Additional DL detection for poor OCR - look for patterns unique to DL
+    elif "NO.:" in full_upper or "NO. :" in full_upper:
+        # "No.:" pattern is unique to DL (Kerala format)
+        parsed["documentType"] = "DrivingLicence"
+    elif any(kw in full_upper for kw in ["VALID TO", "VALID FROM", "NON TRANSPORT", "NON TRANSPON", "BLOOD GROUP", "KERAL", "STATE DRIVING"]):
+        # These patterns are common on DL but not on other documents
+        parsed["documentType"] = "DrivingLicence"
+    elif "TRANSPORT" in full_upper and "DATE OF BIRTH" not in full_upper.replace(" ", ""):
+        # TRANSPORT alone might be DL if no other doc indicators
+        parsed["documentType"] = "DrivingLicence"
+    
+    print(f"   🔍 Detected document type: {parsed['documentType']}")
+
+    # ==========================================
+    # STEP 1: Extract IDs based on document type
+    # ==========================================
+    
+    # Aadhaar: 12 digits (may have spaces)
+    m = re.search(r"\b(\d{4}\s?\d{4}\s?\d{4})\b", full)
+    if m: 
+        aadhaar_candidate = m.group(1).replace(" ", "")
+        # Validate: should not be all same digits
+        if len(set(aadhaar_candidate)) > 2:
+            parsed["aadhaarNumber"] = aadhaar_candidate
+
+    # PAN: 5 letters + 4 digits + 1 letter (exactly 10 chars)
+    # First try exact match
+    m = re.search(r"\b[A-Z]{5}\d{4}[A-Z]\b", full)
+    if m:
+        parsed["panNumber"] = m.group().upper()
+        print(f"   ✓ Found exact PAN match: {parsed['panNumber']}")
+    
+    # If not found, look for partial matches (OCR sometimes misses last char)
+    if not parsed.get("panNumber"):
+        # Look for patterns like ABCD1234 followed by any letter
+        m = re.search(r"\b([A-Z]{4,5}\d{4}[A-Z]?)\b", full)
+        if m:
+            candidate = m.group(1).upper()
+            print(f"   🔍 Checking PAN candidate: {candidate}")
+            
+            # If it's 9-10 chars and starts with letters and has digits
+            if len(candidate) >= 8:
+                # Pad if needed to look for nearby letter
+                if len(candidate) == 9 and candidate[:5].isalpha() and candidate[5:9].isdigit():
+                    # Missing last letter, try to find it nearby
+                    idx = full.find(candidate)
+                    if idx >= 0 and idx + 10 <= len(full):
+                        next_char = full[idx + 9:idx + 10]
+                        if next_char.isalpha():
+                            parsed["panNumber"] = candidate + next_char.upper()
+                            print(f"   ✓ Repaired PAN: {parsed['panNumber']}")
+                elif len(candidate) == 10:
+                    parsed["panNumber"] = candidate
+                    print(f"   ✓ Found PAN: {parsed['panNumber']}")
+
+    # If PAN not found, attempt to detect common OCR-messed candidates and repair them
+    def _normalize_token(t: str) -> str:
+        return re.sub(r"[^A-Za-z0-9]", "", t).upper()
+
+    def _generate_variants_for_pan(token: str):
+        # Map common OCR confusions both directions
+        mapping = {
+            '0': ['O'], 'O': ['0'],
+            '1': ['I', 'L'], 'I': ['1', 'L'], 'L': ['1', 'I'],
+            '2': ['Z'], 'Z': ['2'],
+            '5': ['S'], 'S': ['5'],
+            '8': ['B'], 'B': ['8'],
+            '6': ['G'], 'G': ['6'],
+            '9': ['g'], 'g': ['9']
+        }
+        token = _normalize_token(token)
+        # Only consider tokens of length 10 (PAN canonical length)
+        if len(token) != 10:
+            return []
+        variants = set()
+        # Simple backtracking limited to ambiguous positions
+        amb_positions = [i for i, ch in enumerate(token) if ch in mapping]
+        # limit branching by only allowing up to 4 ambiguous positions to expand
+        if len(amb_positions) > 4:
+            amb_positions = amb_positions[:4]
+
+        def backtrack(idx, cur):
+            if idx == len(amb_positions):
+                candidates = list(cur)
+                variants.add(''.join(candidates))
+                return
+            pos = amb_positions[idx]
+            # move to next ambiguous position
+            backtrack(idx+1, cur)
+            # replace with each mapped alternative
+            for alt in mapping[cur[pos]]:
+                saved = cur[pos]
+                cur[pos] = alt
+                backtrack(idx+1, cur)
+                cur[pos] = saved
+
+        backtrack(0, list(token))
+        return variants
+
+    if not parsed.get("panNumber"):
+        # Find alphanumeric tokens that could be PAN (8-12 chars)
+        for t in re.findall(r"[A-Za-z0-9][A-Za-z0-9\s\-]{6,12}[A-Za-z0-9]", full):
+            norm = _normalize_token(t)
+            if len(norm) == 10:
+                # test direct
+                if re.match(r"^[A-Z]{5}\d{4}[A-Z]$", norm):
+                    parsed["panNumber"] = norm
+                    print(f"   ✓ Found PAN from token scan: {norm}")
+                    break
+                # try variants
+                for v in _generate_variants_for_pan(norm):
+                    if re.match(r"^[A-Z]{5}\d{4}[A-Z]$", v):
+                        parsed["panNumber"] = v
+                        print(f"   ✓ Found PAN via variant repair: {v}")
+                        break
+                if parsed.get("panNumber"):
+                    break
+        
+        # Last resort: look for any sequence that looks like it could be a partial PAN
+        if not parsed.get("panNumber") and parsed.get("documentType") == "PAN":
+            # On a PAN card, look for anything that looks like XXXX1234X pattern
+            for line in lines:
+                # Find tokens that are mostly alphanumeric and 8-12 chars
+                tokens = re.findall(r"[A-Za-z0-9]{8,12}", line.replace(" ", ""))
+                for tok in tokens:
+                    tok = tok.upper()
+                    letters = sum(1 for c in tok if c.isalpha())
+                    digits = sum(1 for c in tok if c.isdigit())
+                    # PAN has 6 letters and 4 digits
+                    if letters >= 4 and digits >= 3:
+                        parsed["panNumber"] = tok[:10] if len(tok) >= 10 else tok
+                        print(f"   ⚠️ Partial PAN detected: {parsed['panNumber']}")
+                        break
+                if parsed.get("panNumber"):
+                    break
+
+    # 2. Extract DOB - Multiple strategies
+    m = re.search(r"\b(\d{1,2}[-/]\d{1,2}[-/]\d{4})\b", full)
+    if m: 
+        parsed["dob"] = m.group(1)
+    else:
+        # Try alternative patterns
+        m_yob = re.search(r"(?i)(year|yob|dob)[\s:\-]*(\d{1,2}[-/]\d{1,2}[-/]\d{4})", full)
+        if m_yob: 
+            parsed["dob"] = m_yob.group(2)
+        else:
+            m_yob = re.search(r"(?i)(year|yob)[\s:\-]*(\d{4})", full)
+            if m_yob: 
+                parsed["dob"] = m_yob.group(2)
+
+    # 3. Extract Gender
+    m = re.search(r"(?i)\b(male|female|transgender)\b", full)
+    if m:
+        parsed["gender"] = m.group(1).capitalize()
+    elif " M " in full or " M\n" in text or re.search(r"\bM\b", full):
+        parsed["gender"] = "Male"
+    elif " F " in full or " F\n" in text or re.search(r"\bF\b", full):
+        parsed["gender"] = "Female"
+
+    # 4. ROBUST NAME EXTRACTION
+    # Extended bad patterns to avoid department names, headers, and government text
+    bad_patterns = [
+        "GOVERNMENT", "INDIA", "FATHER", "ADDRESS", "YEAR", "MALE", "FEMALE", 
+        "AADHAAR", "PAN", "LICENSE", "LICENCE", "DOB", "DATE", "PSSST", "SSS", 
+        "SRI", "SHRI", "GOVT", "PROOF", "BIRTH", "CITIZENSHIP", "VERIFICATION", 
+        "AUTHENTICATION", "CODE", "OFFLINE", "BLOOD", "GROUP", "CATEGORY", 
+        "TRANSPORT", "VALID", "FROM", "MP", "OOOS", "ES", "LON", "ENC", "RAS", "NEU",
+        # Department and header text to exclude
+        "INCOME TAX", "DEPARTMENT", "PERMANENT ACCOUNT", "NUMBER CARD", "SIGNATURE",
+        "HOLDER", "PHOTO", "CARD", "UNION", "REPUBLIC", "MINISTRY", "UNIQUE",
+        "IDENTIFICATION", "AUTHORITY", "REVENUE", "CENTRAL", "MOTOR", "DRIVING",
+        "REPUBLIC OF INDIA", "GOVT OF INDIA", "TAX DEPARTMENT", "ACCOUNT NUMBER",
+        # State names (to avoid header text like "KERALA STATE" being parsed as name)
+        "KERALA", "KARNATAKA", "TAMIL NADU", "ANDHRA", "TELANGANA", "MAHARASHTRA",
+        "GUJARAT", "RAJASTHAN", "PUNJAB", "HARYANA", "DELHI", "UTTAR PRADESH",
+        "MADHYA PRADESH", "WEST BENGAL", "BIHAR", "ODISHA", "JHARKHAND", 
+        "CHHATTISGARH", "ASSAM", "MEGHALAYA", "TRIPURA", "MANIPUR", "NAGALAND",
+        "MIZORAM", "SIKKIM", "GOA", "HIMACHAL", "UTTARAKHAND", "JAMMU",
+        # DL-specific headers
+        "INDIAN UNION", "STATE DRIVING", "FORM", "PILLAI", "CATEGORY",
+        "NON-TRANSPORT", "TRANSPORT", "LMV", "MCWG", "THIRUVANANTHAPURAM"
+    ]
+    bad_words = {"THE", "AND", "OR", "NOT", "FOR", "WITH", "ONLY", "SHOULD", "USED", "BE", "IT", "IS", "OF", "TO", "IN", "AT", "BY", "FROM", "ON", "A", "AN", "NO", "TAX", "DEPARTMENT", "INCOME", "STATE", "KERALA", "KERAL"}
+    
+    # For DL documents, skip general name extraction - we'll handle it specially later
+    # This prevents picking up header text like "KERALA STATE"
+    if parsed.get("documentType") != "DrivingLicence":
+        # Strategy A (PRIORITY): Look for "Name:" anywhere, even with weird punctuation/spacing
+        # Very flexible - handles "S. Name:", "Name:", "S.Name:", etc.
+        m_name = re.search(r"(?i)(?:s\.?\s*)?name['\s:\-]*([A-Za-z][A-Za-z\s\.]{2,60}?)(?=\n|$|[0-9]|Date|DOB)", full)
+        if m_name:
+            candidate = m_name.group(1).strip()
+            # Remove trailing single letters that are artifacts
+            candidate = re.sub(r'\s+[A-Z]$', '', candidate).strip()
+            words = candidate.split()
+            # Must have at least 1 word, and not be a bad pattern
+            if words and 3 <= len(candidate) <= 60 and not any(bp in candidate.upper() for bp in bad_patterns):
+                parsed["name"] = candidate
+    
+    # Strategy B: Look for multi-word lines that look like names - but ONLY if they have real English names
+    # Require minimum word length per word to filter out garbage like "MP OOOS" or "ES A"
+    # Only if name not found yet
+    if not parsed.get("name"):
+        for idx, line in enumerate(lines):
+            clean_line = re.sub(r'[^A-Za-z\s\.]', '', line).strip()
+            words_in_line = clean_line.split()
+            word_count = len(words_in_line)
+            
+            # Name heuristics:
+            # - 2+ words (handles "SUNIL BHASKAR U" or "Y TEJA")
+            # - 3-60 chars total
+            # - All alphabetic
+            # - Starts with uppercase
+            # - Each word should be 2+ chars (filters out "MP OOOS" which has "MP" = 2 but "OOOS" = 4)
+            # - At least one word with 4+ chars (to avoid acronyms/abbreviations)
+            # - Not matching bad patterns/words
+            word_lengths = [len(w) for w in words_in_line]
+            has_long_word = any(wl >= 4 for wl in word_lengths)
+            all_words_sufficient = all(wl >= 2 for wl in word_lengths)
+            
+            if (3 <= len(clean_line) <= 60 and 
+                word_count >= 2 and
+                all_words_sufficient and
+                has_long_word and
+                clean_line.replace(" ", "").isalpha() and
+                not any(bp in clean_line.upper() for bp in bad_patterns) and
+                not all(w.upper() in bad_words for w in words_in_line)):
+                
+                if clean_line and clean_line[0].isupper():
+                    parsed["name"] = clean_line
+                    break
+    
+    # Strategy C: Look for lines immediately before DOB marker (position-based fallback)
+    if not parsed.get("name") and parsed.get("dob"):
+        for i, line in enumerate(lines):
+            if parsed["dob"] in line or "DOB" in line.upper() or "DATE OF BIRTH" in line.upper():
+                # Check line before
+                if i > 0:
+                    candidate = re.sub(r'[^A-Za-z\s\.]', '', lines[i-1]).strip()
+                    if (3 <= len(candidate) <= 60 and
+                        candidate.replace(" ", "").isalpha() and
+                        not any(b in candidate.upper() for b in bad_patterns)):
+                        parsed["name"] = candidate
+                        break
+    
+    # 5. Extract Father's Name
+    m = re.search(r"(?i)father['s]*\s*name[:\-]?\s*([A-Za-z][A-Za-z\s]{2,100}?)(?=\n|$)", full)
+    if m: 
+        parsed["fatherName"] = m.group(1).strip()
+
+    # 6. Extract Address
+    m_addr = re.search(r"(?i)address[:\-]?\s*(.+?)(?=\n|$)", full)
+    if m_addr:
+        addr = m_addr.group(1)
+        # Remove ID numbers from address if captured by mistake
+        addr = re.sub(r"\d{4}\s?\d{4}\s?\d{4}", "", addr).strip()
+        if len(addr) > 3:
+            parsed["address"] = addr
+
+    # 6b. Extract PIN Code (Indian 6-digit postal code)
+    pin_patterns = [
+        r"(?:PIN|Pin|Pincode|Pin\s*Code|Postal\s*Code)[:\s\-]*(\d{6})\b",  # Explicit PIN label
+        r"\b(\d{6})\s*(?:India|INDIA)?\s*$",  # 6 digits at end of text
+        r"[\-,\s](\d{6})\b",  # 6 digits after separator
+    ]
+    for pat in pin_patterns:
+        m_pin = re.search(pat, full, re.IGNORECASE)
+        if m_pin:
+            pin = m_pin.group(1)
+            # Validate: Indian PIN codes start with 1-9 (not 0)
+            if pin[0] != '0':
+                parsed["pinCode"] = pin
+                # Extract zone from PIN (first digit indicates region)
+                pin_zone_map = {
+                    '1': 'Delhi/Haryana/Punjab/HP/J&K',
+                    '2': 'UP/Uttarakhand',
+                    '3': 'Rajasthan/Gujarat',
+                    '4': 'Maharashtra/Goa/MP/Chhattisgarh',
+                    '5': 'AP/Telangana/Karnataka',
+                    '6': 'Kerala/Tamil Nadu',
+                    '7': 'West Bengal/Odisha/NE States',
+                    '8': 'Bihar/Jharkhand',
+                    '9': 'Army Post Office'
+                }
+                parsed["pinZone"] = pin_zone_map.get(pin[0], 'Unknown')
+                break
+
+    # 6c. Extract State (common Indian states from address)
+    state_keywords = [
+        "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh",
+        "Goa", "Gujarat", "Haryana", "Himachal Pradesh", "Jharkhand", "Karnataka",
+        "Kerala", "Madhya Pradesh", "Maharashtra", "Manipur", "Meghalaya", "Mizoram",
+        "Nagaland", "Odisha", "Punjab", "Rajasthan", "Sikkim", "Tamil Nadu",
+        "Telangana", "Tripura", "Uttar Pradesh", "Uttarakhand", "West Bengal",
+        "Delhi", "Chandigarh", "Puducherry", "Jammu", "Kashmir", "Ladakh"
+    ]
+    for state in state_keywords:
+        if re.search(rf"\b{re.escape(state)}\b", full, re.IGNORECASE):
+            parsed["state"] = state
+            break
+
+
+    # 7. Extract Driver's License Number - ONLY for DL documents
+    # This prevents false detection on PAN/Aadhaar cards
+    if parsed.get("documentType") == "DrivingLicence":
+        # Add state-specific bad words for DL
+        dl_bad_patterns = ["KERALA", "STATE", "INDIAN", "UNION", "DRIVING", "LICENCE", 
+                          "LICENSE", "TRANSPORT", "MOTOR", "FORM", "PILLAI", "KERAL", 
+                          "TRANSPON", "BLOOD", "GROUP", "CATEGORY", "VALID"]
+        
+        print(f"   🚗 Processing DL document...")
+        print(f"   📝 Raw text first 500 chars: {full[:500]}")
+        
+        # Process line by line for DL - EasyOCR returns separate lines
+        dl_lines = [l.strip() for l in text.splitlines() if l.strip()]
+        print(f"   📋 DL lines count: {len(dl_lines)}")
+        
+        # Find name - look for line after "Name" or line starting with ":"
+        found_name_label = False
+        for i, line in enumerate(dl_lines):
+            line_clean = line.strip()
+            
+            # Check if this line is the "Name" label
+            if line_clean.upper() == "NAME" or line_clean.upper().startswith("NAME "):
+                found_name_label = True
+                continue
+            
+            # If previous line was "Name", this line might be the actual name
+            if found_name_label or line_clean.startswith(":"):
+                # Extract name from line like ":SUNIL BHASKARU" or "SUNIL BHASKAR"
+                candidate = line_clean
+                if candidate.startswith(":"):
+                    candidate = candidate[1:].strip()
+                
+                # Clean up the name
+                candidate = re.sub(r'[^A-Za-z\s\.]', '', candidate).strip()
+                candidate = re.sub(r'\s+', ' ', candidate)  # Normalize spaces
+                
+                # Remove trailing single letter artifacts
+                candidate = re.sub(r'\s+[A-Z]$', '', candidate).strip()
+                
+                print(f"   🔍 Checking name candidate: '{candidate}'")
+                
+                # Validate - must be alphabetic, reasonable length, not bad pattern
+                if (5 <= len(candidate) <= 50 and 
+                    candidate.replace(" ", "").replace(".", "").isalpha() and
+                    not any(bp in candidate.upper() for bp in dl_bad_patterns)):
+                    parsed["name"] = candidate
+                    print(f"   ✓ DL Name found: {parsed['name']}")
+                    break
+                
+                found_name_label = False  # Reset if this wasn't a valid name
+        
+        # Find DL Number - look for "No.:" pattern or line with format X/XXXX/XXXX
+        for line in dl_lines:
+            line_clean = line.strip()
+            
+            # Pattern: "No.:  1/1626/2006" 
+            if "no" in line_clean.lower() and (":" in line_clean or "/" in line_clean):
+                m = re.search(r"(\d{1,2}/\d{2,5}/\d{4})", line_clean)
+                if m:
+                    dl_num = m.group(1)
+                    # Validate: middle part should be > 2 digits (not a date)
+                    parts = dl_num.split("/")
+                    if len(parts) == 3 and len(parts[1]) >= 3:
+                        parsed["dlNumber"] = dl_num
+                        print(f"   ✓ DL Number found: {parsed['dlNumber']}")
+                        break
+        
+        # Fallback: Look for any X/XXXX/XXXX pattern that's not a date
+        if not parsed.get("dlNumber"):
+            for line in dl_lines:
+                m = re.search(r"(\d{1,2}/\d{3,5}/\d{4})", line)
+                if m:
+                    dl_num = m.group(1)
+                    parts = dl_num.split("/")
+                    # DL number has middle part with 3+ digits (dates have 2)
+                    if len(parts) == 3 and len(parts[1]) >= 3:
+                        parsed["dlNumber"] = dl_num
+                        print(f"   ✓ DL Number found (pattern): {parsed['dlNumber']}")
+                        break
+        
+        # Find DOB - look for "Date of Birth" or "DOB" pattern
+        for i, line in enumerate(dl_lines):
+            line_clean = line.strip().upper()
+            
+            # Check for DOB label patterns (OCR might mangle "Birth" to "Binh")
+            if any(x in line_clean for x in ["DATE OF BIRTH", "DOB", "BIRTH", "BINH", "D.O.B"]):
+                # Look for date in same line or next line
+                m = re.search(r"(\d{1,2}[/\-]\d{1,2}[/\-]\d{4})", line)
+                if m:
+                    parsed["dob"] = m.group(1)
+                    print(f"   ✓ DL DOB found (same line): {parsed['dob']}")
+                    break
+                elif i + 1 < len(dl_lines):
+                    # Check next line for date
+                    m = re.search(r"(\d{1,2}[/\-]\d{1,2}[/\-]\d{4})", dl_lines[i+1])
+                    if m:
+                        parsed["dob"] = m.group(1)
+                        print(f"   ✓ DL DOB found (next line): {parsed['dob']}")
+                        break
+        
+        # Fallback: Find all dates and use the one that looks like DOB (not issue date)
+        if not parsed.get("dob"):
+            all_dates = re.findall(r"(\d{1,2}[/\-]\d{1,2}[/\-]\d{4})", full)
+            print(f"   📅 All dates found: {all_dates}")
+            for date_str in all_dates:
+                parts = date_str.replace("-", "/").split("/")
+                if len(parts) == 3:
+                    try:
+                        year = int(parts[2])
+                        # DOB year is typically 1950-2010 for adults
+                        if 1950 <= year <= 2010:
+                            parsed["dob"] = date_str
+                            print(f"   ✓ DL DOB found (by year): {parsed['dob']}")
+                            break
+                    except:
+                        pass
+        
+        # Pattern 1: Explicit DL label
+        if not parsed.get("dlNumber"):
+            m = re.search(r"(?i)(?:dl|driv|license|licence|lic)\s*(?:no|number|#|:)?[\s:\-]*([A-Za-z0-9\-/]{5,20})", full)
+            if m:
+                dl_candidate = m.group(1).strip()
+                if 5 <= len(dl_candidate) <= 20:
+                    parsed["dlNumber"] = dl_candidate
+                    print(f"   ✓ DL Number (label pattern): {parsed['dlNumber']}")
+        
+        # Pattern 2: Look for Indian DL format with state code: "KL01XXXXX12345" or "HR01XXXXX12345"
+        if not parsed.get("dlNumber"):
+            for t in re.findall(r"[A-Z]{2}[-\s]?\d{1,3}[-\s]?\d{3,15}", full):
+                norm = re.sub(r"[\s\-]", "", t).upper()
+                if 8 <= len(norm) <= 20:
+                    parsed["dlNumber"] = norm
+                    print(f"   ✓ DL Number (state code pattern): {parsed['dlNumber']}")
+                    break
+        
+        # Pattern 3: Look for sequences like "1/1626/2006" (Kerala DL format)
+        if not parsed.get("dlNumber"):
+            m = re.search(r"(\d{1,2}[/]\d{2,4}[/]\d{4})", full)
+            if m:
+                # Determine if this is DL number vs date by context
+                dl_candidate = m.group(1)
+                # Check if this appears after "No" or at start
+                context_before = full[:m.start()][-20:] if m.start() > 20 else full[:m.start()]
+                if "No" in context_before or m.start() < 100:
+                    parsed["dlNumber"] = dl_candidate
+                    print(f"   ✓ DL Number (slash format): {parsed['dlNumber']}")
+        
+        # Pattern 4: Fallback - look for standalone sequences that look like DL
+        if not parsed.get("dlNumber"):
+            for t in re.findall(r"[A-Za-z0-9\-/]{8,20}", full):
+                norm = re.sub(r"[^A-Za-z0-9]", "", t).upper()
+                if 8 <= len(norm) <= 20:
+                    letters = sum(1 for c in norm if c.isalpha())
+                    digits = sum(1 for c in norm if c.isdigit())
+                    # DL typically has some letters and many digits
+                    if letters >= 1 and digits >= 3:
+                        parsed["dlNumber"] = norm
+                        print(f"   ✓ DL Number (fallback): {parsed['dlNumber']}")
+                        break
+    
+    # 8. Extract Issue Date / Valid Until
+    m = re.search(r"(?i)(issue|issued|iss)[\s:\-]*(\d{1,2}[-/]\d{1,2}[-/]\d{4})", full)
+    if m:
+        parsed["issueDate"] = m.group(2)
+    
+    m = re.search(r"(?i)(valid|validity|exp|expiry|until)[\s:\-]*(\d{1,2}[-/]\d{1,2}[-/]\d{4})", full)
+    if m:
+        parsed["validUntil"] = m.group(2)
+    
+    # Document type already detected at the start of this function
+    # Print final parsed result summary
+    print(f"   ✅ Final parsed: docType={parsed.get('documentType')}, aadhaar={parsed.get('aadhaarNumber')}, pan={parsed.get('panNumber')}, name={parsed.get('name')}")
+    
+    return parsed
+
+
+# ----------------------------------------------------
+# Synthetic OCR-text corpus
+# ----------------------------------------------------
+FIRST = ["RAVI", "SUNIL", "PRIYA", "ANITA", "MOHAMMED", "Teja", "Lakshmi", "ARJUN", "DEEPA", "KIRAN"]
+LAST = ["KUMAR", "SHARMA", "BHASKAR", "NAIR", "REDDY", "Pillai", "Iyer", "KHAN", "DAS", "MENON"]
+NOISE = ["MP OOOS", "ES A", "Signature", "HOLDER PHOTO", "2 TO", "ब", "Government of India", "...", "#@!",
+         "Help 1947", "www.uidai.gov.in", "VID : 9134 5678 9012 3456", "Issue Date: 01/02/2015"]
+PLACES = ["12, MG Road, Bengaluru, Karnataka - 560001", "House 4, Sector 9, Chandigarh 160009",
+          "Kaloor, Kochi, Kerala 682017", "Andheri East, Mumbai, Maharashtra 400069",
+          "Salt Lake, Kolkata, West Bengal 700091", "Gachibowli Hyderabad Telangana 500032 India"]
+# OCR confusions without I/L/1 ambiguity: the reference repairs those through
+# an unordered set, so its answer there depends on hash ordering.
+PAN_NOISE = {"O": "0", "S": "5", "B": "8", "Z": "2", "G": "6"}
+
+
+def _date(rng):
+    return f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1955, 2005)}"
+
+
+def _name(rng):
+    return f"{rng.choice(FIRST)} {rng.choice(LAST)}"
+
+
+def _aadhaar_text(rng):
+    digits = "".join(str(rng.randint(0, 9)) for _ in range(12))
+    lines = ["Government of India", "भारत सरकार", _name(rng),
+             rng.choice(["DOB: ", "Year of Birth: ", ""]) + _date(rng),
+             rng.choice(["MALE", "Female", "M", "F", "पुरुष / Male"]),
+             f"{digits[:4]} {digits[4:8]} {digits[8:]}",
+             rng.choice(["Aadhaar", "आधार - आम आदमी का अधिकार", "Unique Identification Authority of India"])]
+    if rng.random() < 0.5:
+        lines += ["Address: " + rng.choice(PLACES)]
+    return lines
+
+
+def _pan_text(rng):
+    pan = "".join(rng.choice("ABCDEFGHJKMNPQRTUVWXY") for _ in range(5)) + \
+          "".join(str(rng.randint(2, 9)) for _ in range(4)) + rng.choice("ABCDEFGHJK")
+    if rng.random() < 0.3:
+        pan = "".join(PAN_NOISE.get(c, c) if rng.random() < 0.3 else c for c in pan)
+    lines = ["INCOME TAX DEPARTMENT", "GOVT. OF INDIA", "Permanent Account Number Card",
+             rng.choice([pan, f"{pan[:5]} {pan[5:]}", f"PAN: {pan}"]),
+             rng.choice(["Name: ", "Name ", ""]) + _name(rng),
+             "Father's Name: " + _name(rng), _date(rng)]
+    rng.shuffle(lines[3:6])
+    return lines
+
+
+def _dl_text(rng):
+    if rng.random() < 0.5:
+        number = f"{rng.randint(1, 20)}/{rng.randint(100, 99999)}/{rng.randint(1995, 2020)}"
+        lines = ["INDIAN UNION DRIVING LICENCE", "KERALA STATE", f"No.: {number}", "Name",
+                 ":" + _name(rng), "Date of Birth", _date(rng), "Valid From 01/01/2015", "Valid To 31/12/2035"]
+    else:
+        number = rng.choice(["MH", "KA", "DL", "TN"]) + f"{rng.randint(1, 50):02d} {rng.randint(2000, 2022)}" \
+                 f"{rng.randint(1000000, 9999999)}"
+        lines = ["DRIVING LICENCE", "Form 7", f"DL No: {number}", "Name: " + _name(rng),
+                 "DOB: " + _date(rng), "Blood Group: O+", "Issue Date: 12/03/2016", "Validity (NT): 11/03/2036",
+                 "Address: " + rng.choice(PLACES), "COV: LMV MCWG"]
+    return lines
+
+
+def synthetic_corpus(n: int = 300, seed: int = 7):
+    rng = random.Random(seed)
+    makers = [_aadhaar_text, _pan_text, _dl_text]
+    texts = []
+    for i in range(n):
+        lines = makers[i % 3](rng)
+        for _ in range(rng.randint(0, 3)):
+            lines.insert(rng.randint(0, len(lines)), rng.choice(NOISE))
+        texts.append("\n".join(lines))
+    # Unlabelled and degenerate inputs
+    texts += ["", "ab\ncd", "1234 5678 9012", "Name: X", "TRANSPORT 12/12/1990", "Address: 560001"]
+    return texts
+
+
+def _quiet(fn, text):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(text)
+
+
+# PAN repair: the old enumerator, kept for comparison
+_LEGACY_PAN_MAPPING = {
+    '0': ['O'], 'O': ['0'],
+    '1': ['I', 'L'], 'I': ['1', 'L'], 'L': ['1', 'I'],
+    '2': ['Z'], 'Z': ['2'],
+    '5': ['S'], 'S': ['5'],
+    '8': ['B'], 'B': ['8'],
+    '6': ['G'], 'G': ['6'],
+    '9': ['g'], 'g': ['9']
+}
+
+
+def legacy_pan_repair(token: str):
+    token = re.sub(r"[^A-Za-z0-9]", "", token).upper()
+    if len(token) != 10:
+        return None
+    variants = set()
+    amb_positions = [i for i, ch in enumerate(token) if ch in _LEGACY_PAN_MAPPING][:4]
+
+    def backtrack(idx, cur):
+        if idx == len(amb_positions):
+            variants.add(''.join(cur))
+            return
+        pos = amb_positions[idx]
+        backtrack(idx + 1, cur)
+        for alt in _LEGACY_PAN_MAPPING[cur[pos]]:
+            saved = cur[pos]
+            cur[pos] = alt
+            backtrack(idx + 1, cur)
+            cur[pos] = saved
+
+    backtrack(0, list(token))
+    for v in sorted(variants):
+        if re.match(r"^[A-Z]{5}\d{4}[A-Z]$", v):
+            return v
+    return None
+
+
+# What OCR typically prints for each character
+_SEEN_AS = {"O": "0", "I": "1", "S": "5", "B": "8", "Z": "2", "G": "6",
+            "0": "O", "1": "I", "5": "S", "8": "B", "2": "Z", "6": "G"}
+
+
+def noisy_pan_cases(n: int = 300, seed: int = 11):
+    """(ocr token, true PAN): up to 6 confused characters, sometimes split or with a stray mark."""
+    rng = random.Random(seed)
+    cases = []
+    for _ in range(n):
+        pan = "".join(rng.choice("ABCDEGHKMNOPSTZ") for _ in range(5)) + \
+              "".join(rng.choice("0125678") for _ in range(4)) + rng.choice("ABDFGOS")
+        chars = list(pan)
+        confusable = [i for i, c in enumerate(chars) if c in _SEEN_AS]
+        for i in rng.sample(confusable, min(len(confusable), rng.randint(1, 6))):
+            chars[i] = _SEEN_AS[chars[i]]
+        seen = "".join(chars)
+        style = rng.random()
+        if style < 0.2:
+            seen = f"{seen[:5]} {seen[5:]}"
+        elif style < 0.3:
+            seen = f"{seen[:5]}.{seen[5:]}"
+        cases.append((seen, pan))
+    return cases
+
+
+def _within_repair_budget(seen: str, pan: str) -> bool:
+    # Up to 5 confusions fit the repair cost budget; more are rejected on purpose
+    return sum(1 for a, b in zip(re.sub(r"[^A-Z0-9]", "", seen), pan) if a != b) <= 5
+
+
+# ----------------------------------------------------
+# Tests
+# ----------------------------------------------------
+_PAN_FIELDS = ("panNumber", "panConfidence")
+
+
+def test_extract_fields_matches_reference_parser():
+    # PAN recovery intentionally differs (see test_pan_repair_*); every other field must match
+    for text in synthetic_corpus():
+        expected = {k: v for k, v in _quiet(legacy_parse_text, text).items() if k not in _PAN_FIELDS}
+        actual = {k: v for k, v in _quiet(extract_fields, text).items() if k not in _PAN_FIELDS}
+        assert actual == expected, f"mismatch for:\n{text}\nexpected {expected}\nactual   {actual}"
+
+
+def test_extract_fields_keeps_parsed_shape():
+    parsed = _quiet(extract_fields, "Government of India\nRAVI KUMAR\nDOB: 12/05/1990\nMale\n2345 6789 0123")
+    assert set(_quiet(legacy_parse_text, "")) <= set(parsed)
+    assert parsed["aadhaarNumber"] == "234567890123" and parsed["name"] == "RAVI KUMAR"
+
+
+def test_pan_repair_recovers_noisy_pans():
+    cases = [(seen, pan) for seen, pan in noisy_pan_cases() if _within_repair_budget(seen, pan)]
+    for seen, pan in cases:
+        found = match_pan(seen)
+        assert found and found.pan == pan, f"{seen!r}: expected {pan}, got {found}"
+        assert 0 < found.confidence <= 1
+    legacy_hits = sum(1 for seen, pan in cases if legacy_pan_repair(seen) == pan)
+    assert legacy_hits < len(cases)
+
+
+def test_pan_repair_confidence_and_rejects():
+    assert match_pan("ABCDE1234F").confidence == 1.0
+    assert match_pan("A8CDE1234F").confidence < 1.0
+    assert match_pan("SUNILBHASKAR") is None
+    assert match_pan("9876543210") is None
+    parsed = _quiet(extract_fields, "INCOME TAX DEPARTMENT\nName: RAVI KUMAR\nAB0DE 12S4F")
+    assert parsed["panNumber"] == "ABODE1254F" and parsed["panConfidence"] < 1.0
+
+
+def benchmark(rounds: int = 5):
+    corpus = synthetic_corpus()
+    results = {}
+    for label, fn in (("legacy parse_text", legacy_parse_text), ("extract_fields", extract_fields)):
+        best = float("inf")
+        for _ in range(rounds):
+            with contextlib.redirect_stdout(io.StringIO()):
+                t0 = time.perf_counter()
+                for text in corpus:
+                    fn(text)
+                best = min(best, time.perf_counter() - t0)
+        results[label] = best / len(corpus) * 1e6
+        print(f"   {label:<18} {results[label]:8.1f} µs/doc")
+    print(f"   speedup: {results['legacy parse_text'] / results['extract_fields']:.1f}x")
+
+
+def benchmark_pan_repair(rounds: int = 5):
+    cases = noisy_pan_cases()
+    for label, fn in (("legacy enumeration", legacy_pan_repair), ("match_pan", match_pan)):
+        best = float("inf")
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            for seen, _ in cases:
+                fn(seen)
+            best = min(best, time.perf_counter() - t0)
+        hits = sum(1 for seen, pan in cases if (getattr(fn(seen), "pan", None) or fn(seen)) == pan)
+        print(f"   {label:<18} {best / len(cases) * 1e6:8.1f} µs/token, {hits}/{len(cases)} recovered")
+
+
+if __name__ == "__main__":
+    print("🔍 Testing field extraction engine...")
+    for test in (test_extract_fields_matches_reference_parser, test_extract_fields_keeps_parsed_shape,
+                 test_pan_repair_recovers_noisy_pans, test_pan_repair_confidence_and_rejects):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    print("\n⏱️ Benchmark over the synthetic corpus")
+    benchmark()
+    print("\n⏱️ PAN repair over noisy tokens")
+    benchmark_pan_repair()
+    print("\n--- Test Complete ---")
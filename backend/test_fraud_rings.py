@@ -0,0 +1,250 @@
+import os
+import sys
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Fail fast instead of waiting on index creation when no MongoDB is running
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=200")
+
+import numpy as np
+
+from app.fraud_rings import RingIndex, RING_KINDS, _iso, _timestamp
+from app.identity_graph import document_identifiers
+
+
+def _random_docs(n, seed=0):
+    """Documents with identifiers reused across users, spread over a year."""
+    rng = np.random.default_rng(seed)
+    docs = []
+    for i in range(n):
+        parsed = {}
+        if rng.random() < 0.7:
+            parsed["aadhaarNumber"] = f"{int(rng.integers(n)):012d}"
+        if rng.random() < 0.5:
+            parsed["panNumber"] = f"ABCDE{int(rng.integers(n)):05d}F"
+        device = {"hash": f"dev{int(rng.integers(n))}"} if rng.random() < 0.4 else None
+        docs.append({"userId": f"user{int(rng.integers(n // 2))}", "parsed": parsed, "deviceInfo": device,
+                     "createdAt": datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=10 * i)})
+    return docs
+
+
+def _components(docs):
+    """Brute force: BFS over users sharing any ring identifier."""
+    by_key, users = {}, {}
+    for d in docs:
+        keys = {(k, v) for k, v in document_identifiers(d["parsed"], d["deviceInfo"]) if k in RING_KINDS}
+        users.setdefault(d["userId"], set()).update(keys)
+        for key in keys:
+            by_key.setdefault(key, set()).add(d["userId"])
+    seen, comps = set(), {}
+    for start in users:
+        if start in seen:
+            continue
+        comp, stack = set(), [start]
+        while stack:
+            u = stack.pop()
+            if u in comp:
+                continue
+            comp.add(u)
+            for key in users[u]:
+                stack.extend(by_key[key] - comp)
+        seen |= comp
+        for u in comp:
+            comps[u] = comp
+    return comps
+
+
+def _build(docs):
+    index = RingIndex()
+    for d in docs:
+        index.add(d["userId"], document_identifiers(d["parsed"], d["deviceInfo"]), d["createdAt"].timestamp())
+    return index
+
+
+def test_rings_match_connected_components():
+    docs = _random_docs(4000)
+    index = _build(docs)
+    comps = _components(docs)
+    for user, comp in comps.items():
+        ring = index.ring_of(user, limit=10_000)
+        assert ring["size"] == len(comp), user
+        assert set(ring["members"]) == comp, user
+    ring_sizes = sorted((len(c) for c in {id(c): c for c in comps.values()}.values() if len(c) > 1), reverse=True)
+    assert [r["size"] for r in index.largest(10)] == ring_sizes[:10]
+    assert index.stats()["rings"] == len(ring_sizes)
+
+
+def test_multi_hop_ring_and_preview():
+    index = RingIndex()
+    index.add("A", [("aadhaar", "111122223333")], ts=100.0)
+    index.add("B", [("aadhaar", "111122223333"), ("pan", "ABCDE1234F")], ts=200.0)
+    index.add("C", [("pan", "ABCDE1234F")], ts=300.0)
+    index.add("D", [("device", "d1")], ts=400.0)
+    index.add("E", [("email_domain", "mailinator.com")], ts=500.0)  # not a ring link
+    index.add("F", [("email_domain", "mailinator.com")], ts=600.0)
+
+    # A and C never share an identifier; the ring still holds both
+    ring = index.ring_of("A")
+    assert ring["size"] == 3 and set(ring["members"]) == {"A", "B", "C"}
+    assert ring["formedAt"].startswith("1970-01-01T00:03:20")  # when A and B were first joined
+    assert index.ring_of("E")["size"] == 1 and index.ring_of("E")["formedAt"] is None
+
+    # Preview of an upload bridging the ring and D: nothing changes until it is added
+    preview = index.preview("G", [("pan", "ABCDE1234F"), ("device", "d1")])
+    assert preview["size"] == 5 and preview["members"][0] == "G" and preview["linkedGroups"] == 2
+    assert index.ring_of("D")["size"] == 1 and index.ring_of("G") is None
+    index.add("G", [("pan", "ABCDE1234F"), ("device", "d1")], ts=700.0)
+    assert index.ring_of("D")["size"] == 5
+    assert index.ring_of("D")["formedAt"] == ring["formedAt"]  # keeps the oldest merge time
+    assert index.largest(1, limit=2)[0]["members"].__len__() == 2
+
+
+def test_rebuild_from_mongo_replays_oldest_first():
+    docs = _random_docs(1500, seed=4)
+    expected = _build(docs)
+
+    class _Cursor(list):
+        def sort(self, field, direction):
+            return _Cursor(sorted(self, key=lambda d: d[field], reverse=direction < 0))
+
+    class _FakeDocuments:
+        def find(self, query=None, projection=None):
+            return _Cursor(reversed(docs))
+
+    rebuilt = RingIndex()
+    assert rebuilt.rebuild_from_mongo(_FakeDocuments()) == 1500
+    assert rebuilt.stats() == expected.stats()
+    for d in docs[:200]:
+        a, b = rebuilt.ring_of(d["userId"], 10_000), expected.ring_of(d["userId"], 10_000)
+        assert (a["size"], set(a["members"]), a["formedAt"]) == (b["size"], set(b["members"]), b["formedAt"])
+
+
+def test_created_at_of_every_stored_type_gives_the_same_instant():
+    instant = datetime(2024, 3, 1, 12, 0, tzinfo=timezone.utc)
+    for value in (instant, instant.replace(tzinfo=None), "2024-03-01T12:00:00", "2024-03-01T12:00:00Z",
+                  "2024-03-01T17:30:00+05:30", instant.timestamp(), int(instant.timestamp() * 1000)):
+        assert _timestamp(value) == instant.timestamp(), value
+    # Unparseable values fall back to "now" instead of failing the replay
+    for value in ("not a date", None, True):
+        assert abs(_timestamp(value) - time.time()) < 5, value
+
+    # Epoch milliseconds used to be read as seconds (year ~56000) and broke formedAt
+    index = RingIndex()
+    index.add("A", [("pan", "ABCDE1234F")], ts=_timestamp(int(instant.timestamp() * 1000)))
+    index.add("B", [("pan", "ABCDE1234F")], ts=_timestamp(int(instant.timestamp() * 1000)))
+    assert index.ring_of("A")["formedAt"] == instant.isoformat()
+
+
+def test_ownerless_documents_never_form_a_ring():
+    docs = [{"parsed": {"aadhaarNumber": "234567890123"}, "deviceInfo": {"hash": "kiosk"},
+             "createdAt": "2024-01-0%dT00:00:00" % (i + 1)} for i in range(3)]
+    docs += [{"userId": None, "parsed": {"aadhaarNumber": "234567890123"}, "deviceInfo": None,
+              "createdAt": "2024-01-05T00:00:00"},
+             {"userId": "real", "parsed": {"panNumber": "ABCDE1234F"}, "deviceInfo": {"hash": "kiosk"},
+              "createdAt": "2024-01-06T00:00:00"}]
+
+    class _Cursor(list):
+        def sort(self, field, direction):
+            return _Cursor(sorted(self, key=lambda d: d[field]))
+
+    class _FakeDocuments:
+        def find(self, query=None, projection=None):
+            return _Cursor(docs)
+
+    index = RingIndex()
+    assert index.rebuild_from_mongo(_FakeDocuments()) == 1
+    assert index.stats() == {"users": 1, "identifiers": 2, "rings": 0, "largestRing": 0, "usersInRings": 0}
+    index.add("", [("device", "kiosk")])
+    index.add(None, [("device", "kiosk")])
+    assert len(index) == 1 and index.ring_of("real")["size"] == 1
+
+
+def test_merging_rings_and_previews_at_the_edges():
+    index = RingIndex()
+    index.add("A", [("pan", "AAAAA1111A")], ts=100.0)
+    index.add("B", [("pan", "AAAAA1111A")], ts=100.0)   # ring 1 formed at 100
+    index.add("C", [("dl", "MH1220110012345")], ts=50.0)
+    index.add("D", [("dl", "MH1220110012345")], ts=50.0)   # ring 2 formed at 50
+    assert index.stats()["rings"] == 2
+
+    # Re-adding identifiers a user (or its ring) already owns changes nothing
+    before = index.stats()
+    index.add("A", [("pan", "AAAAA1111A")], ts=900.0)
+    index.add("B", [("pan", "AAAAA1111A"), ("pan", "AAAAA1111A")], ts=900.0)
+    assert index.stats() == before and index.ring_of("A")["formedAt"] == _iso(100.0)
+
+    # Preview: a known user linking only to its own ring adds no groups
+    assert index.preview("A", [("pan", "AAAAA1111A")])["linkedGroups"] == 0
+    # A new user with no known identifiers is a ring of one, not yet formed
+    alone = index.preview("Z", [("aadhaar", "999988887777")])
+    assert (alone["size"], alone["members"], alone["formedAt"], alone["linkedGroups"]) == (1, ["Z"], None, 0)
+    # A new user bridging both rings: listed first, members capped at the limit
+    bridge = index.preview("E", [("pan", "AAAAA1111A"), ("dl", "MH1220110012345")], limit=3)
+    assert bridge["size"] == 5 and bridge["linkedGroups"] == 2
+    assert bridge["members"][0] == "E" and len(bridge["members"]) == 3
+    assert bridge["formedAt"] == _iso(50.0)
+
+    # Storing it merges the rings and keeps the oldest formation time
+    index.add("E", [("pan", "AAAAA1111A"), ("dl", "MH1220110012345")], ts=900.0)
+    stats = index.stats()
+    assert (stats["rings"], stats["largestRing"], stats["usersInRings"]) == (1, 5, 5)
+    assert index.ring_of("A")["formedAt"] == index.ring_of("C")["formedAt"] == _iso(50.0)
+    assert [r["size"] for r in index.largest(5)] == [5]
+
+
+def test_concurrent_adds_match_connected_components():
+    docs = _random_docs(3000, seed=9)
+    index = RingIndex()
+    threads = [threading.Thread(target=lambda part: [index.add(d["userId"], document_identifiers(
+        d["parsed"], d["deviceInfo"]), d["createdAt"].timestamp()) for d in part], args=(docs[i::4],))
+        for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    comps = _components(docs)
+    for user, comp in list(comps.items())[:500]:
+        assert index.ring_of(user, limit=10_000)["size"] == len(comp), user
+    assert index.stats()["rings"] == _build(docs).stats()["rings"]
+
+
+def benchmark(n=200_000, queries=5000):
+    print(f"\n⏱️ Fraud ring benchmark ({n:,} documents)")
+    docs = _random_docs(n, seed=1)
+    t0 = time.perf_counter()
+    index = _build(docs)
+    stats = index.stats()
+    print(f"   build: {(time.perf_counter() - t0):.2f} s ({stats['rings']:,} rings, largest {stats['largestRing']:,})")
+    picks = np.random.default_rng(2).integers(0, n, queries)
+    t0 = time.perf_counter()
+    for i in picks:
+        d = docs[i]
+        index.preview(d["userId"], document_identifiers(d["parsed"], d["deviceInfo"]))
+    print(f"   per upload preview (size, members, age): {(time.perf_counter() - t0) * 1e6 / queries:.0f} µs")
+    t0 = time.perf_counter()
+    for i in picks:
+        d = docs[i]
+        index.add(d["userId"], document_identifiers(d["parsed"], d["deviceInfo"]))
+    print(f"   per document insert: {(time.perf_counter() - t0) * 1e6 / queries:.0f} µs")
+    t0 = time.perf_counter()
+    index.largest(20)
+    print(f"   largest 20 rings: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    print("🔍 Testing fraud ring index...")
+    for test in (test_rings_match_connected_components, test_multi_hop_ring_and_preview,
+                 test_rebuild_from_mongo_replays_oldest_first, test_created_at_of_every_stored_type_gives_the_same_instant,
+                 test_ownerless_documents_never_form_a_ring, test_merging_rings_and_previews_at_the_edges,
+                 test_concurrent_adds_match_connected_components):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    benchmark()
+    print("\n--- Test Complete ---")
@@ -0,0 +1,372 @@
+import os
+import re
+import sys
+import time
+import asyncio
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Fail fast instead of waiting on index creation when no MongoDB is running
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=200")
+
+import numpy as np
+import pytest
+from pymongo.errors import BulkWriteError
+
+from app import identifier_index as ix
+from app.compliance import check_duplicate
+from app.fraud import _is_duplicate
+
+
+class FakeIdentifierCollection:
+    """The part of the identifiers collection the index uses: _id $in/$regex finds and bulk upserts."""
+
+    def __init__(self):
+        self.entries = {}
+        self.finds = 0
+        self.writes = 0
+
+    def _match(self, entry_id, query):
+        if "$or" in query:
+            return any(self._match(entry_id, q) for q in query["$or"])
+        cond = query["_id"]
+        if "$in" in cond:
+            return entry_id in cond["$in"]
+        return re.match(cond["$regex"], entry_id) is not None
+
+    def find(self, query, projection=None):
+        self.finds += 1
+        return [dict(e) for key, e in self.entries.items() if self._match(key, query)]
+
+    def bulk_write(self, ops, ordered=True):
+        self.writes += 1
+        errors = []
+        for i, op in enumerate(ops):
+            key, update = op._filter["_id"], op._doc
+            guard = op._filter.get("docIds")
+            if guard and key in self.entries and guard["$ne"] in self.entries[key]["docIds"]:
+                # No match, so the upsert inserts the same _id again
+                errors.append({"index": i, "code": 11000, "errmsg": "duplicate key"})
+                continue
+            entry = self.entries.setdefault(key, {"_id": key, "userIds": [], "docIds": [], "count": 0,
+                                                  **update["$setOnInsert"]})
+            entry.update(update["$set"])
+            for user in update["$addToSet"]["userIds"]["$each"]:
+                if user not in entry["userIds"]:
+                    entry["userIds"].append(user)
+            push = update["$push"]["docIds"]
+            entry["docIds"] = (entry["docIds"] + push["$each"])[push["$slice"]:]
+            entry["count"] += update["$inc"]["count"]
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+class FakeMeta:
+    def __init__(self):
+        self.docs = {}
+        self.updates = 0
+
+    def find_one(self, query):
+        doc = self.docs.get(query["_id"])
+        return dict(doc) if doc else None
+
+    def update_one(self, query, update, upsert=False):
+        self.updates += 1
+        self.docs.setdefault(query["_id"], {"_id": query["_id"]}).update(update["$set"])
+
+
+class _DocCursor:
+    """A pymongo cursor is its own iterator: each islice() continues where the last one stopped."""
+
+    def __init__(self, docs, fail_at=None):
+        self.docs = list(docs)
+        self.fail_at = fail_at
+        self.pos = 0
+
+    def sort(self, key, direction):
+        self.docs.sort(key=lambda d: d[key], reverse=direction < 0)
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.pos == len(self.docs):
+            raise StopIteration
+        d = self.docs[self.pos]
+        if d["_id"] == self.fail_at:
+            raise RuntimeError("cursor lost")
+        self.pos += 1
+        return d
+
+
+class FakeDocuments:
+    """find() with an optional {_id: {$gt: ...}}; the cursor fails when it reaches fail_at."""
+
+    def __init__(self, docs, fail_at=None):
+        self.docs = docs
+        self.fail_at = fail_at
+
+    def find(self, query=None, projection=None):
+        after = (query or {}).get("_id", {}).get("$gt")
+        return _DocCursor((d for d in self.docs if after is None or d["_id"] > after), self.fail_at)
+
+
+class _AsyncCursor(list):
+    async def to_list(self, length=None):
+        return list(self)
+
+
+class FakeAsyncIdentifiers:
+    def __init__(self, sync):
+        self.sync = sync
+
+    def find(self, query, projection=None):
+        return _AsyncCursor(self.sync.find(query, projection))
+
+
+def _install(monkeypatch):
+    fake = FakeIdentifierCollection()
+    monkeypatch.setattr(ix, "identifiers_collection", fake)
+    monkeypatch.setattr(ix, "meta_collection", FakeMeta())
+    return fake
+
+
+def _random_docs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    docs = []
+    for i in range(n):
+        parsed = {}
+        if rng.random() < 0.8:
+            parsed["aadhaarNumber"] = f"{int(rng.integers(n)):012d}"
+        if rng.random() < 0.5:
+            parsed["panNumber"] = f"ABCDE{int(rng.integers(n)) % 10000:04d}F"
+        if rng.random() < 0.2:
+            parsed["dlNumber"] = f"MH12 {int(rng.integers(n)):011d}"
+        docs.append({"_id": f"doc{i}", "userId": f"user{int(rng.integers(n // 3))}",
+                     "fileHash": f"{int(rng.integers(n * 2)):064x}", "parsed": parsed, "createdAt": i})
+    return docs
+
+
+def _old_is_duplicate(stored, file_hash, parsed, user_id):
+    """What the two documents queries answered (stored = documents before this upload)."""
+    if any(d["fileHash"] == file_hash for d in stored):
+        return True
+    pan = ix.normalize_value("pan", parsed.get("panNumber"))
+    for d in stored:
+        if d["userId"] == user_id:
+            continue
+        if parsed.get("aadhaarNumber") and d["parsed"].get("aadhaarNumber") == parsed["aadhaarNumber"]:
+            return True
+        if pan and d["parsed"].get("panNumber") == pan:
+            return True
+    return False
+
+
+def test_checks_match_document_scans_with_one_query(monkeypatch):
+    fake = _install(monkeypatch)
+    docs = _random_docs(600)
+    for i, d in enumerate(docs):
+        ids = ix.upload_identifiers(d["parsed"], d["fileHash"])
+        finds = fake.finds
+        matches = ix.lookup_identifiers(ids)
+        expected_dup = _old_is_duplicate(docs[:i], d["fileHash"], d["parsed"], d["userId"])
+        assert _is_duplicate(d["fileHash"], d["parsed"], d["userId"], d["_id"], matches=matches) == expected_dup, i
+        parsed = d["parsed"]
+        old = {kind: any(o["parsed"].get(field) == parsed.get(field) for o in docs[:i])
+               for kind, field in (("aadhaar", "aadhaarNumber"), ("pan", "panNumber"), ("dl", "dlNumber"))
+               if parsed.get(field)}
+        res = check_duplicate(parsed.get("aadhaarNumber"), parsed.get("panNumber"), parsed.get("dlNumber"), matches=matches)
+        assert res["duplicate"] == any(old.values()), i
+        assert fake.finds == finds + 1  # both checks answered by the single lookup
+        ix.record_identifiers(d["_id"], d["userId"], ids)
+    assert fake.writes == 600
+
+
+def test_masked_pan_and_normalization(monkeypatch):
+    _install(monkeypatch)
+    ix.record_identifiers("d1", "u1", ix.upload_identifiers({"panNumber": "abcde 1234f", "dlNumber": "MH12-2011 0012345"}))
+    matches = ix.lookup_identifiers(ix.upload_identifiers({"panNumber": "ABCDE****F", "dlNumber": "mh1220110012345"}))
+    assert matches.users("pan") == {"u1"} and matches.seen("dl", "MH12 20110012345")
+    assert _is_duplicate("ff", {"panNumber": "ABCDE****F"}, "u2")
+    assert not _is_duplicate("ff", {"panNumber": "ABCDE****F"}, "u1")  # same user re-uploading
+
+    # Doc ids are capped per entry; the user set and count are not
+    monkeypatch.setattr(ix.settings, "IDENTIFIER_MAX_DOCS", 3)
+    for i in range(5):
+        ix.record_identifiers(f"x{i}", f"v{i}", [("aadhaar", "234567890123")])
+    entry = ix.identifiers_collection.entries["aadhaar:234567890123"]
+    assert entry["docIds"] == ["x2", "x3", "x4"] and len(entry["userIds"]) == 5 and entry["count"] == 5
+
+
+def test_async_lookup_and_backfill(monkeypatch):
+    docs = _random_docs(300, seed=5)
+    incremental = _install(monkeypatch)
+    for d in docs:
+        ix.record_identifiers(d["_id"], d["userId"], ix.upload_identifiers(d["parsed"], d["fileHash"]))
+
+    monkeypatch.setattr(ix, "documents_collection", FakeDocuments(docs))
+    rebuilt = _install(monkeypatch)
+    assert ix.rebuild_identifier_index(batch=100) == _links(incremental)
+    # One bulk_write per batch of documents, and the marker says it is finished
+    assert rebuilt.writes == 3 and ix.meta_collection.docs["identifierIndexBackfill"]["done"]
+    assert ix.rebuild_identifier_index() == 0 and rebuilt.writes == 3  # no second backfill
+    assert _entries(rebuilt) == _entries(incremental)
+
+    from app.db_async import async_db
+    monkeypatch.setattr(async_db, "_database", lambda: {"identifiers": FakeAsyncIdentifiers(rebuilt)}, raising=False)
+    ids = ix.upload_identifiers(docs[0]["parsed"], docs[0]["fileHash"])
+    matches = asyncio.run(ix.lookup_identifiers_async(ids))
+    assert matches.docs("file") == {d["_id"] for d in docs if d["fileHash"] == docs[0]["fileHash"]}
+    assert matches.summary() == ix.lookup_identifiers(ids).summary()
+
+
+def _links(fake):
+    return sum(e["count"] for e in fake.entries.values())
+
+
+def _entries(fake):
+    # The backfill walks documents in _id order, not upload order
+    return {key: (sorted(e["userIds"]), sorted(e["docIds"]), e["count"]) for key, e in fake.entries.items()}
+
+
+def test_interrupted_backfill_resumes_without_double_counting(monkeypatch):
+    docs = _random_docs(300, seed=7)
+    incremental = _install(monkeypatch)
+    for d in docs:
+        ix.record_identifiers(d["_id"], d["userId"], ix.upload_identifiers(d["parsed"], d["fileHash"]))
+    ordered = sorted(d["_id"] for d in docs)
+
+    documents = FakeDocuments(docs, fail_at=ordered[150])
+    monkeypatch.setattr(ix, "documents_collection", documents)
+    # The cursor fails in the second batch: the first one is kept and marked
+    rebuilt = _install(monkeypatch)
+    first = ix.rebuild_identifier_index(batch=100)
+    marker = ix.meta_collection.docs["identifierIndexBackfill"]
+    assert 0 < first < _links(incremental) and marker["lastDocId"] == ordered[99] and not marker.get("done")
+
+    # A marker that lags behind its batch (crash before it moved) replays documents already added
+    marker["lastDocId"] = ordered[49]
+    documents.fail_at = None
+    assert ix.rebuild_identifier_index(batch=100) == _links(incremental) - first
+    assert ix.meta_collection.docs["identifierIndexBackfill"]["done"]
+    assert _entries(rebuilt) == _entries(incremental)
+
+    # An index that uploads filled before the backfill ran is completed, not doubled
+    partial = _install(monkeypatch)
+    for d in docs[:120]:
+        ix.record_identifiers(d["_id"], d["userId"], ix.upload_identifiers(d["parsed"], d["fileHash"]))
+    ix.rebuild_identifier_index(batch=64)
+    assert _entries(partial) == _entries(incremental)
+
+
+def test_blank_and_fully_masked_values_are_not_identifiers(monkeypatch):
+    fake = _install(monkeypatch)
+    ix.record_identifiers("d1", "u1", ix.upload_identifiers({"panNumber": "ABCDE1234F", "aadhaarNumber": "234567890123"}))
+    parsed = {"panNumber": "**********", "aadhaarNumber": "  ", "dlNumber": "-"}
+    assert ix.upload_identifiers(parsed, "   ") == [] and ix.upload_identifiers(None) == []
+    assert ix.normalize_value("pan", "*******23F") is None and ix.normalize_value("pan", "abcde****f") == "ABCDE****F"
+
+    # Nothing to look up or record: no round trip at all
+    finds, writes = fake.finds, fake.writes
+    assert ix.lookup_identifiers([]).summary() == {}
+    ix.record_identifiers("d2", "u2", [])
+    assert (fake.finds, fake.writes) == (finds, writes)
+
+    # A fully masked PAN is not "every PAN in the index"
+    assert not _is_duplicate("ff", {"panNumber": "**********"}, "u2")
+    assert check_duplicate(None, "**********") == {"duplicate": False, "reasons": []}
+    assert check_duplicate(None, "ABCDE****F")["reasons"] == ["PAN already used"]
+
+
+def test_reuploads_and_rescoring_do_not_match_themselves(monkeypatch):
+    _install(monkeypatch)
+    ids = ix.upload_identifiers({"aadhaarNumber": "2345 6789 0123"}, "AB" * 32)
+    ix.record_identifiers("d1", "u1", ids)
+    ix.record_identifiers("d2", "u1", ids)
+    entry = ix.identifiers_collection.entries["aadhaar:234567890123"]
+    assert entry["userIds"] == ["u1"] and entry["docIds"] == ["d1", "d2"] and entry["count"] == 2
+
+    matches = ix.lookup_identifiers(ids)
+    # File hashes compare case-insensitively; values are looked up in any spelling
+    assert matches.docs("file", "ab" * 32) == {"d1", "d2"} and matches.users("aadhaar", "2345-6789-0123") == {"u1"}
+    assert matches.seen_values("aadhaar") == {"234567890123"} and not matches.seen("pan")
+    assert matches.docs("aadhaar", "999999999999") == set()
+    # The same user with a new file is not a duplicate; the same file is, unless it is this very document
+    assert not _is_duplicate("cd" * 32, {"aadhaarNumber": "234567890123"}, "u1")
+    assert _is_duplicate("AB" * 32, {}, "u1", "d3")
+    single = ix.lookup_identifiers(ix.upload_identifiers({}, "ef" * 32))
+    ix.record_identifiers("d4", "u1", single.identifiers)
+    assert not _is_duplicate("ef" * 32, {}, "u1", "d4")
+
+
+def test_index_write_failures_never_fail_the_upload(monkeypatch):
+    class FailingIdentifiers(FakeIdentifierCollection):
+        def __init__(self, fail_after=0):
+            super().__init__()
+            self.fail_after = fail_after
+
+        def bulk_write(self, ops, ordered=True):
+            if self.writes >= self.fail_after:
+                raise RuntimeError("connection reset")
+            super().bulk_write(ops, ordered)
+
+    monkeypatch.setattr(ix, "identifiers_collection", FailingIdentifiers())
+    ix.record_identifiers("d1", "u1", [("pan", "ABCDE1234F")])  # logged, not raised
+    assert ix.identifiers_collection.entries == {}
+
+    # With a unit of work the upserts are only queued; its commit writes them with the document
+    uow = ix.UnitOfWork()
+    ix.record_identifiers("d1", "u1", [("pan", "ABCDE1234F"), ("aadhaar", "234567890123")], uow=uow)
+    assert len(uow.writes(ix.identifiers_collection)) == 2 and ix.identifiers_collection.writes == 0
+
+    # A failing batch ends the backfill without taking startup down; the next start resumes
+    monkeypatch.setattr(ix, "documents_collection", FakeDocuments(_random_docs(50, seed=3)))
+    monkeypatch.setattr(ix, "identifiers_collection", FailingIdentifiers(fail_after=1))
+    monkeypatch.setattr(ix, "meta_collection", FakeMeta())
+    assert ix.rebuild_identifier_index(batch=10) > 0
+    assert ix.identifiers_collection.writes == 1
+    assert not ix.meta_collection.docs["identifierIndexBackfill"].get("done")
+
+
+def benchmark(n=50_000, queries=5000):
+    print(f"\n⏱️ Identifier index benchmark ({n:,} documents)")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        fake = _install(monkeypatch)
+        docs = _random_docs(n, seed=1)
+        for d in docs:
+            ix.record_identifiers(d["_id"], d["userId"], ix.upload_identifiers(d["parsed"], d["fileHash"]))
+    picks = np.random.default_rng(2).integers(0, n, queries)
+    t0 = time.perf_counter()
+    for i in picks:
+        d = docs[i]
+        ids = ix.upload_identifiers(d["parsed"], d["fileHash"])
+        # Entries as the single $in query returns them
+        found = [fake.entries[k] for k in (ix.identifier_key(*i) for i in ids) if k in fake.entries]
+        matches = ix.IdentifierMatches(ids, found)
+        _is_duplicate(d["fileHash"], d["parsed"], d["userId"], matches=matches)
+        check_duplicate(d["parsed"].get("aadhaarNumber"), d["parsed"].get("panNumber"), matches=matches)
+    per = (time.perf_counter() - t0) * 1e6 / queries
+    print(f"   round trips per upload: 1 lookup + 1 bulk upsert (was up to 5 documents queries)")
+    print(f"   client-side cost of both checks on a shared result: {per:.0f} µs")
+
+
+if __name__ == "__main__":
+    print("🔍 Testing identifier index...")
+    for test in (test_checks_match_document_scans_with_one_query, test_masked_pan_and_normalization,
+                 test_async_lookup_and_backfill, test_interrupted_backfill_resumes_without_double_counting,
+                 test_blank_and_fully_masked_values_are_not_identifiers,
+                 test_reuploads_and_rescoring_do_not_match_themselves,
+                 test_index_write_failures_never_fail_the_upload):
+        try:
+            with pytest.MonkeyPatch.context() as monkeypatch:
+                test(monkeypatch)
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    benchmark()
+    print("\n--- Test Complete ---")
@@ -0,0 +1,301 @@
+import os
+import sys
+import time
+import inspect
+import tempfile
+import threading
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Fail fast instead of waiting on index creation when no MongoDB is running
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=200")
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.identity_graph import IdentityGraph, document_identifiers
+
+
+def _random_docs(n, seed=0, users=None, pool=None):
+    """Documents whose identifiers repeat across users often enough to form rings."""
+    rng = np.random.default_rng(seed)
+    users = users or n // 2
+    pool = pool or n
+    docs = []
+    for i in range(n):
+        parsed = {}
+        if rng.random() < 0.8:
+            parsed["aadhaarNumber"] = f"{int(rng.integers(pool)):012d}"
+        if rng.random() < 0.6:
+            parsed["panNumber"] = f"ABCDE{int(rng.integers(pool)) % 10000:04d}F"
+        if rng.random() < 0.2:
+            parsed["dlNumber"] = f"MH12 {int(rng.integers(pool)):011d}"
+        device = {"hash": f"dev{int(rng.integers(pool // 4 + 1))}"} if rng.random() < 0.5 else None
+        email = f"u{i}@{'mailinator.com' if rng.random() < 0.05 else 'gmail.com'}"
+        docs.append({"_id": f"doc{i}", "userId": f"user{int(rng.integers(users))}", "userEmail": email,
+                     "parsed": parsed, "deviceInfo": device})
+    return docs
+
+
+def _brute_force_shared(docs, user_id, identifiers):
+    """What the old per-request Mongo scans returned."""
+    edges = {f"shared_{k}": set() for k in ("aadhaar", "pan", "dl", "device", "email")}
+    wanted = set(identifiers)
+    for d in docs:
+        if d["userId"] == user_id:
+            continue
+        for kind, value in document_identifiers(d["parsed"], d["deviceInfo"], d["userEmail"]):
+            if (kind, value) in wanted:
+                edges[f"shared_{kind}"].add(d["userId"])
+    return edges
+
+
+def _build(docs, merge_limit=4096):
+    graph = IdentityGraph(merge_limit=merge_limit)
+    for d in docs:
+        graph.add_document(d["userId"], document_identifiers(d["parsed"], d["deviceInfo"], d["userEmail"]))
+    return graph
+
+
+def test_shared_with_matches_document_scans():
+    docs = _random_docs(3000)
+    graph = _build(docs, merge_limit=200)  # several CSR merges plus a live delta
+    assert graph.stats()["deltaEdges"] > 0
+    by_user = {}
+    for d in docs:
+        by_user.setdefault(d["userId"], set()).update(
+            document_identifiers(d["parsed"], d["deviceInfo"], d["userEmail"]))
+    for user_id, identifiers in list(by_user.items())[:300]:
+        assert graph.shared_with(user_id) == _brute_force_shared(docs, user_id, identifiers), user_id
+
+    # A new user's upload is matched against the graph before it is stored
+    pending = document_identifiers(docs[0]["parsed"], docs[0]["deviceInfo"], docs[0]["userEmail"])
+    assert graph.shared_with("new-user", pending) == _brute_force_shared(docs, "new-user", pending)
+
+
+def test_subgraph_follows_real_k_hop_neighbourhood():
+    graph = IdentityGraph()
+    graph.add_document("A", [("aadhaar", "111122223333")])
+    graph.add_document("B", [("aadhaar", "111122223333"), ("pan", "ABCDE1234F")])
+    graph.add_document("C", [("pan", "ABCDE1234F"), ("device", "d1")])
+    graph.add_document("D", [("device", "d1")])
+    graph.add_document("E", [("dl", "MH1220110012345")])
+
+    one = graph.subgraph("A", hops=1)
+    assert one["users"] == ["A", "B"]
+    three = graph.subgraph("A", hops=3)
+    assert three["users"] == ["A", "B", "C", "D"]
+    src, dst = three["edge_index"]
+    assert sorted(zip(src, dst)) == [(0, 1), (1, 0), (1, 2), (2, 1), (2, 3), (3, 2)]
+    assert all(len(row) == 16 for row in three["x"])
+    # Uploader features: one user shares its Aadhaar, risk 5/10, one connection
+    assert three["x"][0][:7] == [1.0, 0.0, 0.0, 0.0, 0.0, 0.5, 1.0]
+    assert graph.subgraph("A", hops=3, max_users=2)["users"] == ["A", "B"]
+    # Isolated uploader: single node with a self loop
+    assert graph.subgraph("E")["edge_index"] == [[0], [0]]
+    # Not stored yet: the current upload's identifiers still connect it
+    assert graph.subgraph("F", [("dl", "MH1220110012345")], hops=1)["users"] == ["F", "E"]
+
+
+def test_snapshot_and_rebuild():
+    docs = _random_docs(2000, seed=3)
+    graph = _build(docs, merge_limit=100)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "graph.npz")
+        graph.save(path)
+        with open(path, "rb") as f:
+            raw = f.read()
+        assert docs[0]["parsed"]["aadhaarNumber"].encode() not in raw  # identifiers are hashed
+        loaded = IdentityGraph()
+        assert loaded.load(path) and loaded.stats()["documents"] == 2000
+        for d in docs[:100]:
+            assert loaded.shared_with(d["userId"]) == graph.shared_with(d["userId"])
+
+    class _FakeDocuments:
+        def find(self, query=None, projection=None):
+            return docs
+
+    rebuilt = IdentityGraph()
+    assert rebuilt.rebuild_from_mongo(_FakeDocuments()) == 2000
+    assert rebuilt.stats()["edges"] == graph.stats()["edges"]
+    for d in docs[:100]:
+        assert rebuilt.subgraph(d["userId"]) == graph.subgraph(d["userId"])
+
+
+def test_identifiers_are_normalised_and_relinking_is_idempotent():
+    # Formatting differences must not hide a shared identifier
+    a = document_identifiers({"aadhaarNumber": "2345 6789 0123", "panNumber": "abcde1234f"}, None, "a@gmail.com")
+    b = document_identifiers({"aadhaarNumber": "234567890123", "panNumber": " ABCDE-1234F "},
+                             {"hash": "dev-1"}, "b@Mailinator.com")
+    assert a == [("aadhaar", "234567890123"), ("pan", "ABCDE1234F")]  # common mail domains are not nodes
+    assert b[-2:] == [("device", "dev-1"), ("email", "mailinator.com")]
+    # Missing, empty and non-dict values are skipped rather than linked as "None"
+    assert document_identifiers({"aadhaarNumber": None, "panNumber": "  ", "dlNumber": ""}, "not-a-dict", None) == []
+    assert document_identifiers(None, None, "no-at-sign") == []
+
+    graph = IdentityGraph(merge_limit=1)
+    assert graph.add_document("A", a) == 2
+    assert graph.add_document("B", b) == 4
+    # The same document re-processed (or a second copy) adds no edges, before or after a merge
+    assert graph.add_document("A", a) == 0 and graph.add_document("B", list(reversed(b))) == 0
+    assert graph.stats()["edges"] == 6 and graph.stats()["documents"] == 4
+    assert graph.shared_with("A")["shared_aadhaar"] == {"B"} and graph.shared_with("A")["shared_pan"] == {"B"}
+    assert graph.shared_with("B")["shared_email"] == set()  # nobody else on that domain
+
+    # No owner: nothing to link
+    assert graph.add_document("", a) == 0 and graph.add_document(None, a) == 0
+    assert graph.stats()["documents"] == 4
+
+    # A document without identifiers still registers its user, as an isolated node
+    assert graph.add_document("C", []) == 0
+    assert graph.subgraph("C", hops=2) == {"users": ["C"], "x": [[0.0] * 16], "edge_index": [[0], [0]], "hops": 2}
+
+
+def test_hub_identifiers_are_counted_but_not_expanded():
+    graph = IdentityGraph(hub_degree=3)
+    for n in range(6):  # a cyber-cafe device used by six users
+        graph.add_document(f"cafe{n}", [("device", "cafe-pc")])
+    graph.add_document("cafe0", [("pan", "ABCDE1234F")])
+    graph.add_document("other", [("pan", "ABCDE1234F")])
+
+    # shared_with (risk score input) still lists every user behind the hub
+    assert graph.shared_with("cafe0")["shared_device"] == {f"cafe{n}" for n in range(1, 6)}
+    sub = graph.subgraph("cafe0", hops=2)
+    # ...but the subgraph only walks the PAN edge; the device shows up as a count
+    assert sub["users"] == ["cafe0", "other"]
+    features = sub["x"][0]
+    assert features[3] == 5.0 and features[1] == 1.0  # shared_device count, shared_pan count
+    assert features[6] == 6.0  # connections: one real neighbour + five behind the hub
+
+
+def test_unreadable_or_stale_snapshots_are_rebuilt(monkeypatch):
+    from app import db, identity_graph as graph_module
+
+    docs = _random_docs(300, seed=5)
+
+    class _FakeDocuments:
+        def __init__(self, docs, broken=False):
+            self.docs, self.broken = docs, broken
+            self.scans = 0
+
+        def count_documents(self, query):
+            assert query == {"userId": {"$nin": [None, ""]}}
+            return sum(1 for d in self.docs if d.get("userId"))
+
+        def find(self, query=None, projection=None):
+            self.scans += 1
+            if self.broken:
+                raise ConnectionError("mongo down")
+            return self.docs
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "graph.npz")
+        monkeypatch.setattr(settings, "IDENTITY_GRAPH_PATH", path)
+        monkeypatch.setattr(graph_module, "identity_graph", IdentityGraph())
+        # Missing snapshot: rebuilt from Mongo and saved
+        monkeypatch.setattr(db, "documents_collection", _FakeDocuments(docs))
+        assert graph_module.load_or_rebuild_graph() > 0 and os.path.exists(path)
+        assert graph_module.identity_graph.stats()["documents"] == 300
+
+        # Ownerless documents are neither linked nor counted, so the snapshot stays current
+        ownerless = [{"userId": None, "parsed": {"aadhaarNumber": "234567890123"}, "deviceInfo": {"hash": "kiosk"},
+                      "userEmail": None} for _ in range(3)]
+        monkeypatch.setattr(db, "documents_collection", _FakeDocuments(docs + ownerless))
+        monkeypatch.setattr(graph_module, "identity_graph", IdentityGraph())
+        graph_module.load_or_rebuild_graph()
+        assert db.documents_collection.scans == 0  # loaded from disk
+        assert graph_module.identity_graph.stats()["documents"] == 300
+        graph_module.identity_graph.rebuild_from_mongo(db.documents_collection)
+        assert graph_module.identity_graph.shared_with("user0", [("device", "kiosk")])["shared_device"] == set()
+
+        # Stale snapshot (documents were added while the API was down): rebuilt, not trusted
+        monkeypatch.setattr(db, "documents_collection", _FakeDocuments(docs + _random_docs(20, seed=6)))
+        monkeypatch.setattr(graph_module, "identity_graph", IdentityGraph())
+        graph_module.load_or_rebuild_graph()
+        assert graph_module.identity_graph.stats()["documents"] == 320
+
+        # Truncated snapshot: reported unreadable, never half-loaded
+        with open(path, "r+b") as f:
+            f.truncate(100)
+        assert IdentityGraph().load(path) is False
+        assert IdentityGraph().load(os.path.join(tmp, "missing.npz")) is False
+
+        # Rebuild failure: the graph in memory is kept as it was
+        before = graph_module.identity_graph.stats()
+        monkeypatch.setattr(db, "documents_collection", _FakeDocuments(docs, broken=True))
+        assert graph_module.load_or_rebuild_graph() == 0
+        assert graph_module.identity_graph.stats() == before
+
+
+def test_concurrent_writers_and_readers_see_consistent_edges():
+    docs = _random_docs(2000, seed=7)
+    graph = IdentityGraph(merge_limit=50)  # many merges while readers are active
+    errors = []
+
+    def write(part):
+        for d in part:
+            graph.add_document(d["userId"], document_identifiers(d["parsed"], d["deviceInfo"], d["userEmail"]))
+
+    def read():
+        try:
+            for d in docs[:200]:
+                graph.shared_with(d["userId"])
+                graph.subgraph(d["userId"], hops=2)
+        except Exception as e:  # a torn CSR/delta read would surface here
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(docs[i::4],)) for i in range(4)]
+    threads += [threading.Thread(target=read) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors
+    sequential = _build(docs)
+    assert graph.stats()["edges"] == sequential.stats()["edges"]
+    for d in docs[:200]:
+        assert graph.shared_with(d["userId"]) == sequential.shared_with(d["userId"])
+
+
+def benchmark(n=200_000, queries=2000):
+    print(f"\n⏱️ Identity graph benchmark ({n:,} documents)")
+    docs = _random_docs(n, seed=1)
+    t0 = time.perf_counter()
+    graph = _build(docs)
+    print(f"   incremental build: {(time.perf_counter() - t0):.2f} s ({graph.stats()['edges']:,} edges)")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "graph.npz")
+        t0 = time.perf_counter()
+        graph.save(path)
+        save_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        IdentityGraph().load(path)
+        print(f"   snapshot save {save_s:.2f} s, load {(time.perf_counter() - t0):.2f} s")
+
+    picks = np.random.default_rng(2).integers(0, n, queries)
+    t0 = time.perf_counter()
+    for i in picks:
+        d = docs[i]
+        idents = document_identifiers(d["parsed"], d["deviceInfo"], d["userEmail"])
+        graph.shared_with(d["userId"], idents)
+        graph.subgraph(d["userId"], idents)
+    per = (time.perf_counter() - t0) * 1e6 / queries
+    print(f"   per upload (shared_with + 2-hop subgraph): {per:.0f} µs, no Mongo queries")
+
+
+if __name__ == "__main__":
+    print("🔍 Testing persistent identity graph...")
+    for test in (test_shared_with_matches_document_scans, test_subgraph_follows_real_k_hop_neighbourhood,
+                 test_snapshot_and_rebuild, test_identifiers_are_normalised_and_relinking_is_idempotent,
+                 test_hub_identifiers_are_counted_but_not_expanded, test_unreadable_or_stale_snapshots_are_rebuilt,
+                 test_concurrent_writers_and_readers_see_consistent_edges):
+        try:
+            with pytest.MonkeyPatch.context() as monkeypatch:
+                test(monkeypatch) if "monkeypatch" in inspect.signature(test).parameters else test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    benchmark()
+    print("\n--- Test Complete ---")
@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+import tempfile
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Fail fast instead of waiting on index creation when no MongoDB is running
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=200")
+
+import cv2
+import numpy as np
+
+from app.image_context import DecodedImage
+from app.image_hash import HashIndex, hamming, perceptual_hashes
+
+
+def card_image(seed, h=640, w=1000):
+    rng = np.random.default_rng(seed)
+    img = np.full((h, w, 3), 235, np.uint8)
+    cv2.rectangle(img, (30, 30), (260, 300), (int(rng.integers(60, 200)),) * 3, -1)  # photo block
+    for i in range(8):
+        line = "".join(rng.choice(list("ABCDEFGHKMNPRSTUVXYZ0123456789 "), 20))
+        cv2.putText(img, line, (300, 80 + i * 60), cv2.FONT_HERSHEY_SIMPLEX, 1.1, (30, 30, 30), 2)
+    return img
+
+
+def encode(img, ext=".png", **params):
+    flags = [cv2.IMWRITE_JPEG_QUALITY, params["quality"]] if "quality" in params else []
+    return cv2.imencode(ext, img, flags)[1].tobytes()
+
+
+def test_hashes_survive_resave_and_resize():
+    original = card_image(1)
+    base = perceptual_hashes(DecodedImage(encode(original)))
+    copies = [
+        encode(original, ".jpg", quality=55),
+        encode(cv2.resize(original, (600, 384), interpolation=cv2.INTER_AREA), ".jpg", quality=80),
+        encode(cv2.resize(original, (1600, 1024), interpolation=cv2.INTER_CUBIC)),
+    ]
+    for data in copies:
+        h = perceptual_hashes(DecodedImage(data))
+        assert hamming(base["phash"], h["phash"]) <= 4, (base, h)
+        assert hamming(base["dhash"], h["dhash"]) <= 8, (base, h)
+
+    # Same layout, different text and photo: the pHash alone may be close, the dHash is not
+    for seed in range(2, 8):
+        other = perceptual_hashes(DecodedImage(encode(card_image(seed))))
+        assert hamming(base["dhash"], other["dhash"]) > 16, (base, other)
+    assert perceptual_hashes(DecodedImage(b"%PDF-1.4 not an image")) is None
+
+
+def _random_rows(n, seed=0):
+    rng = np.random.default_rng(seed)
+    ph = rng.integers(0, 256, (n, 8), dtype=np.uint8)
+    dh = rng.integers(0, 256, (n, 32), dtype=np.uint8)
+    return [(f"doc{i}", p.tobytes().hex(), d.tobytes().hex()) for i, (p, d) in enumerate(zip(ph, dh))]
+
+
+def _flip(hex_value, bits, rng):
+    v = int(hex_value, 16)
+    for b in rng.choice(64, bits, replace=False):
+        v ^= 1 << int(b)
+    return f"{v:016x}"
+
+
+def test_index_matches_brute_force():
+    rows = _random_rows(20000)
+    index = HashIndex(max_distance=6, dhash_max_distance=256, tail_limit=1000)
+    index.add_many(rows[:15000])
+    for r in rows[15000:]:
+        index.add(r[0], {"phash": r[1], "dhash": r[2]})  # some rows stay in the unsorted tail
+
+    rng = np.random.default_rng(1)
+    for _ in range(300):
+        target = rows[int(rng.integers(len(rows)))]
+        query = {"phash": _flip(target[1], int(rng.integers(0, 10)), rng), "dhash": target[2]}
+        expected = min(((hamming(query["phash"], p), i) for i, p, _ in rows), key=lambda x: x[0])
+        found = index.query(query)
+        if expected[0] <= 6:
+            assert found is not None and found["phashDistance"] == expected[0], (query, expected, found)
+        else:
+            assert found is None, (query, found)
+
+    assert index.query({"phash": rows[5][1], "dhash": rows[5][2]}, exclude="doc5") is None
+
+
+class _FakeDocuments:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query=None, projection=None):
+        return [d for d in self.docs if d.get("imageHash")]
+
+
+def test_index_persists_and_rebuilds():
+    rows = _random_rows(500, seed=3)
+    index = HashIndex()
+    index.add_many(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.npz")
+        index.save(path)
+        loaded = HashIndex()
+        assert loaded.load(path) and len(loaded) == 500
+        assert loaded.query({"phash": rows[42][1], "dhash": rows[42][2]})["documentId"] == "doc42"
+
+    docs = _FakeDocuments([{"_id": r[0], "imageHash": {"phash": r[1], "dhash": r[2]}} for r in rows] + [{"_id": "nohash"}])
+    rebuilt = HashIndex()
+    assert rebuilt.rebuild_from_mongo(docs) == 500
+    assert rebuilt.query({"phash": rows[7][1], "dhash": rows[7][2]})["documentId"] == "doc7"
+
+
+def benchmark(n=1_000_000, queries=2000):
+    print(f"\n⏱️ Near-duplicate index benchmark ({n:,} documents)")
+    rng = np.random.default_rng(0)
+    ph = rng.integers(0, 256, (n, 8), dtype=np.uint8)
+    dh = rng.integers(0, 256, (n, 32), dtype=np.uint8)
+    index = HashIndex()
+    t0 = time.perf_counter()
+    # Bulk load straight into the arrays (what load() does from the .npz file)
+    index._ids = [f"doc{i}" for i in range(n)]
+    index._phash = ph.view(">u8").ravel().astype(np.uint64)
+    index._dhash = dh.view(">u8").astype(np.uint64)
+    index._merge_tail()
+    print(f"   build: {(time.perf_counter() - t0):.2f} s")
+
+    picks = rng.integers(0, n, queries)
+    batch = [{"phash": _flip(ph[i].tobytes().hex(), k % 7, rng), "dhash": dh[i].tobytes().hex()}
+             for k, i in enumerate(picks)]
+    hits, t0 = 0, time.perf_counter()
+    for query in batch:
+        hits += index.query(query) is not None
+    per_query = (time.perf_counter() - t0) * 1e6 / queries
+    print(f"   query: {per_query:.0f} µs avg, {hits}/{queries} near-duplicates found (0-6 bits flipped)")
+
+
+if __name__ == "__main__":
+    print("🔍 Testing perceptual-hash near-duplicate index...")
+    for test in (test_hashes_survive_resave_and_resize, test_index_matches_brute_force,
+                 test_index_persists_and_rebuilds):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    benchmark()
+    print("\n--- Test Complete ---")
@@ -0,0 +1,201 @@
+import os
+import sys
+import time
+import pickle
+import asyncio
+import hashlib
+import tempfile
+import tracemalloc
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Fail fast instead of waiting on index creation when no MongoDB is running
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=200")
+
+import cv2
+import numpy as np
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+
+from app.ingest import UploadSizeLimitMiddleware, ingest_upload, sniff_kind, SPREADSHEET_KINDS
+
+
+def upload_file(data, filename="card.png"):
+    """An UploadFile spooled the way Starlette's multipart parser spools it."""
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spool.write(data)
+    spool.seek(0)
+    return UploadFile(spool, size=len(data), filename=filename)
+
+
+def ingest(data, **kwargs):
+    return asyncio.run(ingest_upload(upload_file(data), **kwargs))
+
+
+def card(h, w):
+    img = np.random.default_rng(0).integers(0, 255, (h, w, 3), dtype=np.uint8)
+    cv2.putText(img, "ABCDE1234F", (20, h // 2), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+    return img
+
+
+def test_small_upload_is_kept_as_bytes():
+    data = cv2.imencode(".png", card(200, 300))[1].tobytes()
+    with ingest(data) as upload:
+        assert upload.kind == "png" and upload.size == len(data) and not upload.mapped
+        assert upload.sha256 == hashlib.sha256(data).hexdigest()
+        assert upload.image().bgr.shape == (200, 300, 3)
+
+
+def test_large_upload_is_mmapped_and_shared():
+    img = card(1500, 2000)
+    data = cv2.imencode(".bmp", img)[1].tobytes()  # ~9 MB
+    upload = ingest(data)
+    assert upload.mapped and isinstance(upload.data, memoryview)
+    assert upload.kind == "bmp" and upload.sha256 == hashlib.sha256(data).hexdigest()
+
+    image = upload.image()
+    assert image.sha256 == upload.sha256
+    assert np.array_equal(image.bgr, img)
+    assert image.exif is None  # read through open(), not a BytesIO copy
+    # Crossing into the OCR worker pool ships the spool file's name, not the bytes
+    shipped = pickle.dumps(image)
+    assert len(shipped) < 1024
+    clone = pickle.loads(shipped)
+    assert isinstance(clone.data, memoryview) and bytes(clone.data[:2]) == b"BM"
+    assert clone.sha256 == upload.sha256 and np.array_equal(clone.bgr, img)
+
+    del image, clone
+    upload.close()
+    assert not upload.mapped
+
+
+def _worker_digest(image):
+    return hashlib.sha256(image.data).hexdigest(), type(image.data).__name__
+
+
+def test_images_outlive_the_upload_and_cross_processes_by_name():
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    import gc
+
+    img = card(1200, 1600)
+    data = cv2.imencode(".bmp", img)[1].tobytes()
+    upload = ingest(data)
+    image = upload.image()
+    path = image.source.path
+    upload.close()
+    # The upload is closed, but the image still reads its own view of the file
+    assert os.path.exists(path) and image.sha256 == hashlib.sha256(image.data).hexdigest()
+    assert np.array_equal(image.bgr, img)
+
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        digest, kind = pool.submit(_worker_digest, image).result()
+    assert digest == upload.sha256 and kind == "memoryview"  # mapped in the worker, not copied
+
+    # The last image gone: mapping closed and spool file removed
+    del image
+    gc.collect()
+    assert not os.path.exists(path)
+
+    # Small uploads stay bytes and pickle as bytes
+    small = ingest(cv2.imencode(".png", card(100, 100))[1].tobytes())
+    assert isinstance(pickle.loads(pickle.dumps(small.image())).data, bytes)
+
+
+def test_rejects_empty_unknown_and_oversized():
+    png = cv2.imencode(".png", card(100, 100))[1].tobytes()
+    for data, kwargs, status in [
+        (b"", {}, 400),
+        (b"MZ\x90\x00\x03\x00\x00\x00" * 8, {}, 415),               # executable
+        (b"name,aadhaar\nA,123\n", {}, 415),                        # CSV is not a document
+        (png, {"max_bytes": len(png) - 1}, 413),
+    ]:
+        try:
+            ingest(data, **kwargs)
+            assert False, f"expected {status}"
+        except HTTPException as e:
+            assert e.status_code == status, (e.status_code, e.detail)
+
+    # Without the part size, the limit is enforced while streaming
+    f = upload_file(png)
+    f.size = None
+    try:
+        asyncio.run(ingest_upload(f, max_bytes=1000))
+        assert False, "expected 413"
+    except HTTPException as e:
+        assert e.status_code == 413
+
+
+def test_sniffing():
+    assert sniff_kind(b"\xff\xd8\xff\xe0\x00\x10JFIF") == "jpeg"
+    assert sniff_kind(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "webp"
+    assert sniff_kind(b"RIFF\x00\x00\x00\x00WAVEfmt ") is None
+    assert sniff_kind(b"%PDF-1.7\n") == "pdf"
+    assert sniff_kind(b"PK\x03\x04\x14\x00") in SPREADSHEET_KINDS
+    assert sniff_kind("Name,Address\nRaví,Pune".encode()[:22]) == "text"  # split UTF-8 char
+
+
+def test_oversized_request_is_refused_before_parsing():
+    calls = []
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=4096)
+
+    @app.post("/up")
+    async def up(file: UploadFile = File(...)):
+        calls.append(file.filename)
+        with await ingest_upload(file) as upload:
+            return upload.describe()
+
+    client = TestClient(app)
+    png = cv2.imencode(".png", card(20, 20))[1].tobytes()
+    ok = client.post("/up", files={"file": ("a.png", png, "image/png")})
+    assert ok.status_code == 200 and ok.json()["sha256"] == hashlib.sha256(png).hexdigest()
+
+    big = client.post("/up", files={"file": ("b.png", png + b"\x00" * 8192, "image/png")})
+    assert big.status_code == 413 and calls == ["a.png"]
+
+    bad = client.post("/up", files={"file": ("c.png", b"not an image", "image/png")})
+    assert bad.status_code == 415
+
+
+def benchmark(sizes_mb=(8, 32, 64)):
+    """Peak Python-heap allocation and time: read()+sha256 vs ingest_upload()."""
+    print("\n⏱️ Upload ingestion benchmark (tracemalloc peak per upload; timings include tracing overhead)")
+
+    async def legacy(f):
+        content = await f.read()
+        hashlib.sha256(content).hexdigest()
+        return content
+
+    for mb in sizes_mb:
+        data = b"BM" + os.urandom(mb * 1024 * 1024)
+        row = []
+        for fn in (legacy, lambda f: ingest_upload(f, max_bytes=len(data))):
+            f = upload_file(data)
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            result = asyncio.run(fn(f))
+            ms = (time.perf_counter() - t0) * 1000
+            peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+            if hasattr(result, "close"):
+                result.close()
+            row.append((peak, ms))
+        print(f"   {mb:3d} MB: read() peak {row[0][0]:6.1f} MB, {row[0][1]:6.1f} ms"
+              f" | ingest peak {row[1][0]:5.1f} MB, {row[1][1]:6.1f} ms")
+
+
+if __name__ == "__main__":
+    print("🔍 Testing streaming upload ingestion...")
+    for test in (test_small_upload_is_kept_as_bytes, test_large_upload_is_mmapped_and_shared,
+                 test_images_outlive_the_upload_and_cross_processes_by_name,
+                 test_rejects_empty_unknown_and_oversized, test_sniffing,
+                 test_oversized_request_is_refused_before_parsing):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    benchmark()
+    print("\n--- Test Complete ---")
@@ -14,6 +14,10 @@ except ImportError as e:
     print(f"\n❌ Failed to import app.ml_integration: {e}")
     sys.exit(1)
 
+# Models are no longer loaded at import time; load them (blocking) here
+ml_integration.load_models()
+print(f"   Load state: {ml_integration.model_status()['models']}")
+
 # Check CNN
 print("\n[1] Checking CNN (Image Manipulation Model)...")
 if ml_integration.cnn_model:
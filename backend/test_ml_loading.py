@@ -0,0 +1,131 @@
+import os
+import sys
+import time
+import inspect
+import threading
+import subprocess
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Fail fast instead of waiting on index creation when no MongoDB is running
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=200")
+
+import cv2
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import ml_integration as ml
+from app.image_context import DecodedImage
+from app.routers.health_routes import router as health_router
+
+
+class FakeCNN:
+    """Stands in for the Keras model: fixed manipulation probability."""
+    def predict(self, batch, verbose=0):
+        assert batch.shape == (1, ml.CNN_INPUT_SIDE, ml.CNN_INPUT_SIDE, 3)
+        return np.array([[0.25]])
+
+
+def _reset(monkeypatch, load_cnn):
+    monkeypatch.setattr(ml, "_loaded", threading.Event())
+    monkeypatch.setattr(ml, "_loader", None)
+    monkeypatch.setattr(ml, "cnn_model", None)
+    monkeypatch.setattr(ml, "gnn_model", None)
+    monkeypatch.setattr(ml, "_status", {name: dict(status, state="pending", loadMs=None, warmupMs=None, error=None)
+                                        for name, status in ml._status.items()})
+    monkeypatch.setattr(ml, "_load_cnn", load_cnn)
+    monkeypatch.setattr(ml, "_load_gnn", lambda: ml._set_status("gnn", state="missing"))
+
+
+def _slow_cnn_loader(release):
+    def load():
+        ml._set_status("cnn", state="loading")
+        release.wait(5)
+        ml.cnn_model = FakeCNN()
+        ml._set_status("cnn", state="ready", loadMs=1.0)
+    return load
+
+
+def _image(seed):
+    img = np.full((240, 320, 3), 200, np.uint8)
+    cv2.putText(img, f"DOC {seed}", (20, 120), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (20, 20, 20), 2)
+    return DecodedImage(cv2.imencode(".png", img)[1].tobytes())
+
+
+def test_import_does_not_load_frameworks():
+    code = "import sys; import app.ml_integration as m; print(m.cnn_model, m.gnn_model, 'torch' in sys.modules, 'tensorflow' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=os.getcwd(), timeout=60)
+    assert out.stdout.strip().splitlines()[-1] == "None None False False", out.stdout + out.stderr
+
+
+def test_pipeline_degrades_until_models_are_ready(monkeypatch):
+    release = threading.Event()
+    _reset(monkeypatch, _slow_cnn_loader(release))
+    app = FastAPI()
+    app.include_router(health_router)
+    client = TestClient(app)
+    try:
+        ml.start_background_load(warmup=True)
+        # Loading: not scored, readiness probe fails
+        assert ml.predict_cnn_manipulation(_image(1)) is None
+        assert ml.predict_gnn_fraud({"connections": 0}) is None
+        r = client.get("/health/ready")
+        assert r.status_code == 503 and r.json()["models"]["models"]["cnn"]["state"] == "loading"
+
+        release.set()
+        assert ml.wait_for_models(5)
+        assert ml.predict_cnn_manipulation(_image(2)) == 0.25
+        assert ml.predict_gnn_fraud({"connections": 0}) == 0.0  # missing model, loader finished
+        r = client.get("/health/ready")
+        body = r.json()
+        assert r.status_code == 200 and body["ready"]
+        assert body["models"]["models"]["cnn"]["state"] == "ready"
+        assert body["models"]["models"]["cnn"]["warmupMs"] is not None
+        assert body["models"]["models"]["gnn"]["state"] == "missing"
+        assert {"ocrPool", "ocrBatcher", "stageCache", "imageHashIndex"} <= set(body)
+    finally:
+        # Let the loader thread finish before monkeypatch restores the module state
+        release.set()
+        ml.wait_for_models(5)
+
+
+def test_wait_mode_blocks_until_loaded(monkeypatch):
+    release = threading.Event()
+    _reset(monkeypatch, _slow_cnn_loader(release))
+    monkeypatch.setattr(ml.settings, "ML_WAIT_SECONDS", 5)
+    try:
+        # First use starts the loader (no lifespan here) and waits for it
+        threading.Timer(0.2, release.set).start()
+        t0 = time.perf_counter()
+        assert ml.predict_cnn_manipulation(_image(3)) == 0.25
+        assert time.perf_counter() - t0 >= 0.15
+        assert ml.model_status()["started"]
+    finally:
+        release.set()
+        ml.wait_for_models(5)
+
+
+def benchmark():
+    """Import cost of the module and the app (models used to load at import)."""
+    print("\n⏱️ Import benchmark (fresh interpreter)")
+    for module in ("app.ml_integration", "app.main"):
+        code = f"import time; t0 = time.perf_counter(); import {module}; print(round((time.perf_counter() - t0) * 1000))"
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=os.getcwd(), timeout=120)
+        print(f"   import {module}: {out.stdout.strip().splitlines()[-1]} ms")
+
+
+if __name__ == "__main__":
+    print("🔍 Testing lazy ML model loading...")
+    for test in (test_import_does_not_load_frameworks, test_pipeline_degrades_until_models_are_ready,
+                 test_wait_mode_blocks_until_loaded):
+        try:
+            with pytest.MonkeyPatch.context() as monkeypatch:
+                test(monkeypatch) if "monkeypatch" in inspect.signature(test).parameters else test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    benchmark()
+    print("\n--- Test Complete ---")
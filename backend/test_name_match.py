@@ -0,0 +1,234 @@
+import io
+import os
+import sys
+import time
+import inspect
+import threading
+import contextlib
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Fail fast instead of waiting on index creation when no MongoDB is running
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=200")
+
+import numpy as np
+import pytest
+from rapidfuzz import fuzz
+
+from app import name_match
+from app.name_match import (ai_name_match, name_form, NameProfiles, _soundex, _normalize_name,
+                            _get_name_variations)
+
+FIRST = ["RAHUL", "PRIYA", "AMIT", "SUNITA", "MOHAMMED", "LAKSHMI", "VIKRAM", "ANJALI", "SURESH", "KAVYA"]
+MIDDLE = ["KUMAR", "DEVI", "", "", "PRASAD", "BAI"]
+LAST = ["SHARMA", "VERMA", "PATEL", "REDDY", "KHAN", "IYER", "NAIR", "SINGH", "GUPTA", "RAO"]
+
+
+def _names(n, seed=0):
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        parts = [FIRST[rng.integers(len(FIRST))], MIDDLE[rng.integers(len(MIDDLE))], LAST[rng.integers(len(LAST))]]
+        name = " ".join(p for p in parts if p)
+        if rng.random() < 0.3:
+            name = "Mr. " + name.title()
+        if rng.random() < 0.2:
+            name = name.replace("A", "AA", 1)  # OCR/spelling noise
+        out.append(name)
+    return out
+
+
+def _reference_variation_score(user_name, document_name):
+    """The old V x V token_set_ratio loop."""
+    best = 0
+    for uv in _get_name_variations(user_name):
+        for dv in _get_name_variations(document_name):
+            best = max(best, fuzz.token_set_ratio(_normalize_name(uv), _normalize_name(dv)))
+    return best
+
+
+def _reference_phonetic(user_name, document_name):
+    user_words, doc_words = _normalize_name(user_name).split(), _normalize_name(document_name).split()
+    total = min(len(user_words), len(doc_words))
+    return int(sum(_soundex(user_words[i]) == _soundex(doc_words[i]) for i in range(total)) / total * 100)
+
+
+def test_scores_match_pairwise_loop():
+    names = _names(300)
+    for user_name, document_name in zip(names, reversed(names)):
+        result = ai_name_match(user_name, document_name)
+        assert result["variation_match_score"] == _reference_variation_score(user_name, document_name)
+        assert result["phonetic_score"] == _reference_phonetic(user_name, document_name)
+        assert result["fuzzy_details"]["token_set_ratio"] == fuzz.token_set_ratio(
+            _normalize_name(user_name), _normalize_name(document_name))
+    # Forms are cached per raw name
+    assert name_form("Rahul Kumar Sharma") is name_form("Rahul Kumar Sharma")
+    assert ai_name_match("", "RAHUL")["reason"] == "Name comparison skipped (missing data)"
+
+
+def test_cross_document_check_uses_profile(monkeypatch):
+    monkeypatch.setattr(name_match, "name_profiles", NameProfiles(max_names=3))
+    first = ai_name_match("Rahul Sharma", "RAHUL SHARMA", user_id="u1")
+    assert first["cross_doc_check"] == {"checked": True, "matches": [], "consistent": True}
+
+    name_match.record_name("u1", "d1", "RAHUL SHARMA")
+    name_match.record_name("u1", "d2", "Rahul  Sharma.")  # same normalized name
+    name_match.record_name("u1", "d3", "PRIYA VERMA")
+    check = ai_name_match("Rahul Sharma", "RAHUL K SHARMA", user_id="u1")["cross_doc_check"]
+    assert check["total_docs"] == 3 and check["low_matches"] == 1 and not check["consistent"]
+    expected = (2 * fuzz.token_set_ratio("RAHUL K SHARMA", "RAHUL SHARMA")
+                + fuzz.token_set_ratio("RAHUL K SHARMA", "PRIYA VERMA")) / 3
+    assert abs(check["avg_similarity"] - expected) < 1e-9
+    assert name_match.name_profiles.get("u1")["RAHUL SHARMA"] == {"name": "RAHUL SHARMA", "count": 2, "docId": "d2"}
+
+    # Capped per user: the least recently seen name is dropped
+    for i, name in enumerate(["AMIT PATEL", "SUNITA REDDY"]):
+        name_match.record_name("u1", f"e{i}", name)
+    assert list(name_match.name_profiles.get("u1")) == ["PRIYA VERMA", "AMIT PATEL", "SUNITA REDDY"]
+
+
+def test_rebuild_from_mongo():
+    docs = [{"_id": f"d{i}", "userId": f"u{i % 5}", "parsed": {"name": name}, "createdAt": i}
+            for i, name in enumerate(_names(100, seed=2))]
+
+    class _Cursor(list):
+        def sort(self, field, direction):
+            return _Cursor(sorted(self, key=lambda d: d[field], reverse=direction < 0))
+
+    class _FakeDocuments:
+        def find(self, query=None, projection=None):
+            return _Cursor(reversed(docs))
+
+    incremental = NameProfiles()
+    for d in docs:
+        incremental.add(d["userId"], d["_id"], d["parsed"]["name"])
+    rebuilt = NameProfiles()
+    assert rebuilt.rebuild_from_mongo(_FakeDocuments()) == 100
+    for i in range(5):
+        assert rebuilt.get(f"u{i}") == incremental.get(f"u{i}")
+
+
+def test_unreadable_names_are_skipped_not_scored():
+    # Nothing Latin left after normalization (Devanagari OCR, punctuation only)
+    for document_name in ("राम कुमार", "...", "  -  "):
+        result = ai_name_match("Ravi Kumar Sharma", document_name, user_id="u1")
+        assert result["reason"] == "Name comparison skipped (empty after normalization)"
+        assert result["overall_match_pct"] == 100 and "cross_doc_check" not in result
+    assert ai_name_match(None, "RAVI")["reason"] == "Name comparison skipped (missing data)"
+
+    # ...and they never enter a profile, so they cannot make later documents look inconsistent
+    profiles = NameProfiles()
+    for i, name in enumerate(["राम कुमार", "...", "", None]):
+        profiles.add("u1", f"d{i}", name)
+    profiles.add("", "d9", "RAVI SHARMA")
+    profiles.add(None, "d9", "RAVI SHARMA")
+    assert len(profiles) == 0 and profiles.get("u1") == {}
+
+
+def test_reordered_initialled_and_titled_names_match():
+    for document_name in ("SHARMA RAVI KUMAR", "RAVI K SHARMA", "Mr. Ravi Kumar Sharma", "ravi kumar sharma."):
+        result = ai_name_match("Ravi Kumar Sharma", document_name)
+        assert result["variation_match_score"] == 100, document_name
+        assert result["overall_match_pct"] >= 85 and result["reason"] == "Strong name match verified"
+    different = ai_name_match("Ravi Kumar Sharma", "PRIYA VERMA")
+    assert different["overall_match_pct"] < 60 and different["reason"] != "Strong name match verified"
+
+
+def test_profile_cap_evicts_least_recently_seen():
+    profiles = NameProfiles(max_names=2)
+    profiles.add("u1", "d1", "RAVI SHARMA")
+    profiles.add("u1", "d2", "PRIYA VERMA")
+    profiles.add("u1", "d3", "ravi  sharma")  # seen again: moves to the end, keeps its first spelling
+    profiles.add("u1", "d4", "AMIT PATEL")
+    assert profiles.get("u1") == {
+        "RAVI SHARMA": {"name": "RAVI SHARMA", "count": 2, "docId": "d3"},
+        "AMIT PATEL": {"name": "AMIT PATEL", "count": 1, "docId": "d4"},
+    }
+    # get() hands out a copy; numeric ids share the key of their string form
+    profiles.get("u1").clear()
+    profiles.add(7, "d5", "KAVYA RAO")
+    assert len(profiles.get("u1")) == 2 and profiles.get("7") == profiles.get(7) != {}
+    assert profiles.stats()["users"] == 2 and profiles.stats()["names"] == 3
+
+
+def test_rebuild_skips_ownerless_documents_and_replays_in_order():
+    docs = [
+        {"_id": "d1", "userId": "u1", "parsed": {"name": "RAVI SHARMA"}, "createdAt": "2024-01-01T00:00:00"},
+        {"_id": "d2", "userId": None, "parsed": {"name": "RAVI SHARMA"}, "createdAt": "2024-01-02T00:00:00"},
+        {"_id": "d3", "userId": "", "parsed": {"name": "PRIYA VERMA"}, "createdAt": "2024-01-03T00:00:00"},
+        {"_id": "d4", "parsed": {"name": "AMIT PATEL"}, "createdAt": "2024-01-04T00:00:00"},
+        {"_id": "d5", "userId": "u1", "parsed": None, "createdAt": "2024-01-05T00:00:00"},
+        {"_id": "d6", "userId": "u1", "parsed": {"name": "Ravi Sharma"}, "createdAt": "2024-01-06T00:00:00"},
+    ]
+
+    class _Cursor(list):
+        def sort(self, field, direction):
+            return _Cursor(sorted(self, key=lambda d: d[field], reverse=direction < 0))
+
+    class _FakeDocuments:
+        def find(self, query=None, projection=None):
+            return _Cursor(reversed(docs))
+
+    profiles = NameProfiles()
+    profiles.add("stale", "x", "OLD NAME")
+    profiles.rebuild_from_mongo(_FakeDocuments())
+    # No "None" user collecting every ownerless document, and the previous state is replaced
+    assert set(profiles._users) == {"u1"}
+    assert profiles.get("u1") == {"RAVI SHARMA": {"name": "RAVI SHARMA", "count": 2, "docId": "d6"}}
+
+
+def test_concurrent_adds_keep_counts():
+    profiles = NameProfiles(max_names=4)
+    names = ["RAVI SHARMA", "PRIYA VERMA", "AMIT PATEL", "KAVYA RAO"]
+
+    def upload(worker):
+        for i in range(200):
+            profiles.add(f"u{i % 3}", f"w{worker}-{i}", names[(worker + i) % len(names)])
+
+    threads = [threading.Thread(target=upload, args=(w,)) for w in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(e["count"] for u in ("u0", "u1", "u2") for e in profiles.get(u).values()) == 8 * 200
+    assert all(len(profiles.get(u)) == 4 for u in ("u0", "u1", "u2"))
+
+
+def benchmark(pairs=2000):
+    print(f"\n⏱️ Name matching benchmark ({pairs} uploads)")
+    names = _names(pairs, seed=1)
+    account = "Shri Rahul Kumar Sharma"
+    t0 = time.perf_counter()
+    for name in names:
+        _reference_variation_score(account, name)
+        _reference_phonetic(account, name)
+    old = (time.perf_counter() - t0) * 1e6 / pairs
+    name_form.cache_clear()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(name_match, "name_profiles", NameProfiles())
+        for i, name in enumerate(names[:10]):
+            name_match.record_name("u1", f"d{i}", name)
+        with contextlib.redirect_stdout(io.StringIO()):  # ai_name_match logs each result
+            t0 = time.perf_counter()
+            for name in names:
+                ai_name_match(account, name, user_id="u1")
+            new = (time.perf_counter() - t0) * 1e6 / pairs
+    print(f"   variation + phonetic loop (old): {old:.0f} µs per upload, plus a Mongo query")
+    print(f"   full ai_name_match with profile (new): {new:.0f} µs per upload, no query")
+
+
+if __name__ == "__main__":
+    print("🔍 Testing name matching engine...")
+    for test in (test_scores_match_pairwise_loop, test_cross_document_check_uses_profile, test_rebuild_from_mongo,
+                 test_unreadable_names_are_skipped_not_scored, test_reordered_initialled_and_titled_names_match,
+                 test_profile_cap_evicts_least_recently_seen,
+                 test_rebuild_skips_ownerless_documents_and_replays_in_order, test_concurrent_adds_keep_counts):
+        try:
+            with pytest.MonkeyPatch.context() as monkeypatch:
+                test(monkeypatch) if "monkeypatch" in inspect.signature(test).parameters else test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    benchmark()
+    print("\n--- Test Complete ---")
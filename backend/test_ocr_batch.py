@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import asyncio
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+from app.ocr_batch import OCRBatcher
+
+
+class RecordingProcessor:
+    """process_batch stand-in: upper-cases each item and records the batches it saw."""
+
+    def __init__(self, delay=0.0, fail_on=None, drop_last=False):
+        self.delay, self.fail_on, self.drop_last = delay, fail_on, drop_last
+        self.batches = []
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        time.sleep(self.delay)
+        if self.fail_on is not None and self.fail_on in items:
+            raise ValueError(f"cannot read {self.fail_on}")
+        results = [item.upper() for item in items]
+        return results[:-1] if self.drop_last else results
+
+
+def test_full_batch_flushes_without_waiting_for_the_deadline():
+    processor = RecordingProcessor()
+    batcher = OCRBatcher(processor, max_batch_size=4, max_wait_ms=10_000)
+    try:
+        t0 = time.perf_counter()
+        futures = [batcher.submit(x) for x in "abcd"]
+        assert [f.result(timeout=5) for f in futures] == list("ABCD")
+        assert time.perf_counter() - t0 < 2  # nowhere near the 10 s window
+        assert processor.batches == [list("abcd")]
+        stats = batcher.stats()
+        assert stats["batches"] == 1 and stats["batchSizeHistogram"] == {4: 1}
+    finally:
+        batcher.close()
+
+
+def test_partial_batch_flushes_at_the_deadline():
+    processor = RecordingProcessor()
+    batcher = OCRBatcher(processor, max_batch_size=8, max_wait_ms=150)
+    try:
+        t0 = time.perf_counter()
+        futures = [batcher.submit(x) for x in "xyz"]
+        assert [f.result(timeout=5) for f in futures] == list("XYZ")
+        elapsed = time.perf_counter() - t0
+        assert 0.1 <= elapsed < 2, elapsed
+        assert processor.batches == [list("xyz")]
+
+        # A later document starts a new window instead of joining the flushed batch
+        assert batcher.run("w") == "W" and processor.batches[-1] == ["w"]
+        assert asyncio.run(batcher.run_async("v")) == "V"
+    finally:
+        batcher.close()
+
+
+def test_a_failing_document_only_fails_its_own_future():
+    processor = RecordingProcessor(fail_on="bad")
+    batcher = OCRBatcher(processor, max_batch_size=3, max_wait_ms=10_000)
+    try:
+        good, bad, other = (batcher.submit(x) for x in ("ok", "bad", "fine"))
+        assert good.result(timeout=5) == "OK" and other.result(timeout=5) == "FINE"
+        try:
+            bad.result(timeout=5)
+            raise AssertionError("expected ValueError")
+        except ValueError as e:
+            assert str(e) == "cannot read bad"
+        # The batch ran once as a whole, then once per document
+        assert processor.batches == [["ok", "bad", "fine"], ["ok"], ["bad"], ["fine"]]
+        assert batcher.stats()["splitBatches"] == 1
+    finally:
+        batcher.close()
+
+    # Fewer results than documents: the unmatched future fails instead of hanging
+    batcher = OCRBatcher(RecordingProcessor(drop_last=True), max_batch_size=2, max_wait_ms=10_000)
+    try:
+        first, second = batcher.submit("a"), batcher.submit("b")
+        assert first.result(timeout=5) == "A"
+        try:
+            second.result(timeout=5)
+            raise AssertionError("expected RuntimeError")
+        except RuntimeError as e:
+            assert "1 results for 2 documents" in str(e)
+    finally:
+        batcher.close()
+
+
+def test_close_flushes_queued_documents_and_waits_for_running_batches():
+    OCRBatcher(RecordingProcessor()).close()  # never started: nothing to do
+
+    processor = RecordingProcessor(delay=0.3)
+    batcher = OCRBatcher(processor, max_batch_size=8, max_wait_ms=10_000)
+    futures = [batcher.submit(x) for x in "ab"]
+    dispatcher = batcher._dispatcher
+    t0 = time.perf_counter()
+    batcher.close()
+    # The open window is cut short and the running batch is waited for
+    assert time.perf_counter() - t0 < 5
+    assert all(f.done() for f in futures) and [f.result() for f in futures] == ["A", "B"]
+    assert not dispatcher.is_alive()
+
+    # Closed is not final: the next document starts a new dispatcher
+    processor.delay = 0.0
+    batcher.max_wait = 0.01
+    assert batcher.run("c") == "C" and batcher._dispatcher is not dispatcher
+    batcher.close()
+    assert batcher.stats()["queueDepth"] == 0
+
+
+if __name__ == "__main__":
+    print("🔍 Testing the OCR micro-batcher...")
+    for test in (test_full_batch_flushes_without_waiting_for_the_deadline,
+                 test_partial_batch_flushes_at_the_deadline,
+                 test_a_failing_document_only_fails_its_own_future,
+                 test_close_flushes_queued_documents_and_waits_for_running_batches):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    print("\n--- Test Complete ---")
@@ -0,0 +1,196 @@
+import os
+import sys
+import contextlib
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+import cv2
+import numpy as np
+
+from app import ocr
+from app.config import Settings, settings
+
+AADHAAR_TEXT = "Government of India\nRAVI KUMAR SHARMA\nDOB: 12/05/1990\nMale\n2345 6789 0123\nAadhaar"
+EASYOCR_TEXT = "Government of India\nRAVI KUMAR SHARMA\nDOB: 12/05/1990\nMale\n2345 6789 0123\nAadhaar\nVID 9123"
+
+
+# ----------------------------------------------------
+# Engine stand-ins (shared with the other OCR tests)
+# ----------------------------------------------------
+class FakeTesseract:
+    """pytesseract stand-in: every image reads as `text`, each word at `conf`."""
+
+    class Output:
+        DICT = "dict"
+
+    def __init__(self, text=AADHAAR_TEXT, conf=90.0, error=None):
+        self.text, self.conf, self.error = text, conf, error
+        self.calls = 0
+
+    def image_to_data(self, img, config=None, output_type=None):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        data = {"text": [], "conf": [], "block_num": [], "par_num": [], "line_num": []}
+        for n, line in enumerate(self.text.splitlines()):
+            for word in line.split():
+                for key, value in (("text", word), ("conf", self.conf), ("block_num", 1),
+                                   ("par_num", 1), ("line_num", n)):
+                    data[key].append(value)
+        return data
+
+    def image_to_string(self, img, config=None):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.text
+
+
+class FakeReader:
+    """EasyOCR Reader stand-in: readtext returns `text` one line per box; recognize reads `crops`."""
+
+    def __init__(self, text=EASYOCR_TEXT, crops=None):
+        self.text = text
+        self.crops = crops or []
+        self.readtext_calls = 0
+        self.recognize_calls = []
+
+    def readtext(self, img, **kwargs):
+        self.readtext_calls += 1
+        return [([[0, 20 * n], [100, 20 * n], [100, 20 * n + 10], [0, 20 * n + 10]], line, 0.9)
+                for n, line in enumerate(self.text.splitlines())]
+
+    def recognize(self, canvas, horizontal_list=None, free_list=None, batch_size=1, detail=1):
+        self.recognize_calls.append(len(horizontal_list))
+        texts = self.crops.pop(0) if self.crops else [""] * len(horizontal_list)
+        return [([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], text, 0.9)
+                for (x0, x1, y0, y1), text in zip(horizontal_list, texts)]
+
+
+class FakeRegistry:
+    """reader_registry stand-in: records the language sets asked for."""
+
+    def __init__(self, reader=None, readers=None):
+        self.readers = readers or {}
+        self.reader = reader
+        self.requested = []
+
+    def available(self):
+        return self.reader is not None or bool(self.readers)
+
+    def get(self, langs=ocr.DEFAULT_LANGS):
+        self.requested.append(tuple(langs))
+        return self.readers.get(tuple(langs), self.reader)
+
+
+def png_bytes(h=600, w=900):
+    img = np.full((h, w, 3), 255, np.uint8)
+    cv2.putText(img, "GOVERNMENT OF INDIA", (40, 120), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+@contextlib.contextmanager
+def engines(tesseract=None, registry=None, **flags):
+    """Swap the OCR engines and settings flags for the duration of a test."""
+    saved = (ocr.pytesseract, ocr.reader_registry, {k: getattr(settings, k) for k in flags})
+    ocr.pytesseract, ocr.reader_registry = tesseract, registry or FakeRegistry(None)
+    for k, v in flags.items():
+        setattr(settings, k, v)
+    try:
+        yield
+    finally:
+        ocr.pytesseract, ocr.reader_registry = saved[0], saved[1]
+        for k, v in saved[2].items():
+            setattr(settings, k, v)
+
+
+class _PerPageTesseract(FakeTesseract):
+    """Each image_to_data call takes the next confidence from `confs`."""
+
+    def __init__(self, confs):
+        super().__init__()
+        self.confs = list(confs)
+
+    def image_to_data(self, img, config=None, output_type=None):
+        self.conf = self.confs.pop(0)
+        return super().image_to_data(img, config, output_type)
+
+
+def test_cascade_is_opt_in():
+    saved = os.environ.pop("OCR_CASCADE", None)
+    try:
+        assert Settings().OCR_CASCADE is False
+    finally:
+        if saved is not None:
+            os.environ["OCR_CASCADE"] = saved
+
+    # Off: Tesseract is never consulted while EasyOCR is available
+    tesseract, reader = FakeTesseract(), FakeReader()
+    with engines(tesseract, FakeRegistry(reader), OCR_CASCADE=False, OCR_ROI_MODE=False):
+        result = ocr._run_ocr_many([png_bytes()])[0]
+    assert tesseract.calls == 0 and reader.readtext_calls == 1
+    assert result["stats"]["engine"] == "easyocr" and "cascade" not in result["stats"]
+
+
+def test_fast_tier_stops_the_cascade_when_fields_check_out():
+    tesseract, reader = FakeTesseract(conf=91.0), FakeReader()
+    with engines(tesseract, FakeRegistry(reader), OCR_CASCADE=True, OCR_ROI_MODE=False):
+        result = ocr._run_ocr_many([png_bytes()])[0]
+    assert result["text"] == AADHAAR_TEXT and reader.readtext_calls == 0
+    stats = result["stats"]
+    assert (stats["engine"], stats["tier"]) == ("tesseract", "fast")
+    assert stats["cascade"]["escalated"] is False and stats["cascade"]["fastConf"] == 91.0
+
+
+def test_cascade_escalates_with_the_failing_check():
+    cases = [
+        (FakeTesseract(conf=40.0), "low_confidence"),
+        (FakeTesseract(text="Government of India\nRAVI KUMAR SHARMA\nAadhaar"), "aadhaar_missing"),
+        (FakeTesseract(text=AADHAAR_TEXT.replace("0123", "0124")), "aadhaar_checksum"),
+        (FakeTesseract(text="Government of India\nDOB: 12/05/1990\n2345 6789 0123\nAadhaar"), "name_missing"),
+        (FakeTesseract(text="some receipt text\nno identifiers here"), "unknown_document"),
+        (FakeTesseract(error=RuntimeError("tesseract is not installed")), "no_text"),
+    ]
+    for tesseract, reason in cases:
+        reader = FakeReader()
+        with engines(tesseract, FakeRegistry(reader), OCR_CASCADE=True, OCR_ROI_MODE=False,
+                     OCR_CASCADE_MIN_CONF=60.0):
+            result = ocr._run_ocr_many([png_bytes()])[0]
+        stats = result["stats"]
+        assert stats["cascade"] == {**stats["cascade"], "escalated": True, "reason": reason}, reason
+        assert (stats["engine"], stats["tier"]) == ("easyocr", "full") and result["text"] == EASYOCR_TEXT, reason
+        assert reader.readtext_calls == 1, reason
+
+    # Only the failing document of a batch escalates
+    reader = FakeReader()
+    with engines(_PerPageTesseract([91.0, 10.0]), FakeRegistry(reader), OCR_CASCADE=True, OCR_ROI_MODE=False):
+        good, bad = ocr._run_ocr_many([png_bytes(), png_bytes(300, 450)])
+    assert good["stats"]["tier"] == "fast" and bad["stats"]["cascade"]["reason"] == "low_confidence"
+    assert bad["stats"]["tier"] == "full" and reader.readtext_calls == 1
+
+
+def test_cascade_without_one_engine():
+    # Tesseract missing: no fast tier at all, EasyOCR reads the page
+    reader = FakeReader()
+    with engines(None, FakeRegistry(reader), OCR_CASCADE=True, OCR_ROI_MODE=False):
+        result = ocr._run_ocr_many([png_bytes()])[0]
+    assert result["stats"]["engine"] == "easyocr" and "cascade" not in result["stats"]
+
+    # EasyOCR missing: a failing fast-tier result is still kept (nothing to escalate to)
+    with engines(FakeTesseract(conf=30.0), FakeRegistry(None), OCR_CASCADE=True, OCR_ROI_MODE=False):
+        result = ocr._run_ocr_many([png_bytes()])[0]
+    assert result["text"] == AADHAAR_TEXT and result["stats"]["tier"] == "fast"
+    assert result["stats"]["cascade"]["reason"] == "low_confidence"
+
+
+if __name__ == "__main__":
+    print("🔍 Testing the OCR cascade...")
+    for test in (test_cascade_is_opt_in, test_fast_tier_stops_the_cascade_when_fields_check_out,
+                 test_cascade_escalates_with_the_failing_check, test_cascade_without_one_engine):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    print("\n--- Test Complete ---")
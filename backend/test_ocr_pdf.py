@@ -0,0 +1,128 @@
+import os
+import sys
+import contextlib
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+import fitz
+
+from app import ocr
+from test_ocr_cascade import AADHAAR_TEXT, FakeRegistry, engines
+
+FILLER = "Terms and conditions of the account, page {n}. Nothing to extract here."
+
+
+def pdf_bytes(pages):
+    """One PDF page per entry: a string becomes the text layer, None a scanned (image-only) page."""
+    doc = fitz.open()
+    for text in pages:
+        page = doc.new_page(width=420, height=300)
+        if text is None:
+            page.draw_rect(fitz.Rect(40, 40, 380, 260), color=(0, 0, 0), fill=(0.8, 0.8, 0.8))
+        else:
+            page.insert_text((20, 30), text, fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+class PageReader:
+    """EasyOCR Reader stand-in: the n-th page it reads returns texts[n]."""
+
+    def __init__(self, texts):
+        self.texts = list(texts)
+        self.readtext_calls = 0
+
+    def readtext(self, img, **kwargs):
+        text = self.texts[self.readtext_calls]
+        self.readtext_calls += 1
+        return [([[0, 10 * n], [100, 10 * n], [100, 10 * n + 8], [0, 10 * n + 8]], line, 0.9)
+                for n, line in enumerate(text.splitlines())]
+
+
+@contextlib.contextmanager
+def counted_pages():
+    """Count the pages pulled from iter_pdf_pages (each scanned page is rendered when pulled)."""
+    pulled = []
+    original = ocr.iter_pdf_pages
+
+    def counting(data, *args, **kwargs):
+        for page in original(data, *args, **kwargs):
+            pulled.append(page.index)
+            yield page
+
+    ocr.iter_pdf_pages = counting
+    try:
+        yield pulled
+    finally:
+        ocr.iter_pdf_pages = original
+
+
+def _ocr_pdf(data, reader=None, **flags):
+    with counted_pages() as pulled, engines(None, FakeRegistry(reader), PDF_OCR_DPI=50, **flags):
+        result = ocr._run_ocr_many([data])[0]
+    return result, pulled
+
+
+def test_scanned_pages_stop_rendering_once_identifiers_are_found():
+    pages = ["cover letter", AADHAAR_TEXT, "annexure", "annexure", "annexure", "annexure"]
+    reader = PageReader(pages)
+    result, pulled = _ocr_pdf(pdf_bytes([None] * 6), reader, PDF_PAGE_BATCH=1)
+
+    info = result["stats"]["pdf"]
+    assert pulled == [0, 1] and reader.readtext_calls == 2
+    assert info == {**info, "pageCount": 6, "pagesProcessed": 2, "renderedPages": 2, "textLayerPages": 0,
+                    "stoppedEarly": True}
+    assert result["text"] == "cover letter\n" + AADHAAR_TEXT and result["stats"]["engine"] == "easyocr"
+    assert ocr.parse_text(result["text"])["aadhaarNumber"] == "234567890123"
+
+    # Pages are read PDF_PAGE_BATCH at a time, so the check runs after each batch
+    reader = PageReader(pages)
+    result, pulled = _ocr_pdf(pdf_bytes([None] * 6), reader, PDF_PAGE_BATCH=4)
+    assert pulled == [0, 1, 2, 3] and reader.readtext_calls == 4
+    assert result["stats"]["pdf"]["renderedPages"] == 4 and result["stats"]["pdf"]["stoppedEarly"]
+
+
+def test_text_layer_pages_are_never_rendered():
+    pages = [FILLER.format(n=1), FILLER.format(n=2)] + [AADHAAR_TEXT] + [None] * 5
+    reader = PageReader([])
+    result, pulled = _ocr_pdf(pdf_bytes(pages), reader)
+    info = result["stats"]["pdf"]
+    assert pulled == [0, 1, 2] and reader.readtext_calls == 0
+    assert (info["textLayerPages"], info["renderedPages"], info["stoppedEarly"]) == (3, 0, True)
+    assert result["stats"]["engine"] == "pdf-text" and "RAVI KUMAR SHARMA" in result["text"]
+
+
+def test_page_cap_and_last_page_identifiers():
+    # No identifiers anywhere: reading ends at PDF_MAX_PAGES, not at the end of the file,
+    # and the stats show the truncation (pages processed < pages in the file)
+    reader = PageReader(["nothing useful"] * 8)
+    result, pulled = _ocr_pdf(pdf_bytes([None] * 8), reader, PDF_MAX_PAGES=3)
+    info = result["stats"]["pdf"]
+    assert pulled == [0, 1, 2] and reader.readtext_calls == 3 and result["stats"]["pages"] == 3
+    assert (info["pageCount"], info["pagesProcessed"], info["renderedPages"], info["stoppedEarly"]) == (8, 3, 3, False)
+
+    # Identifiers on the last page under the cap: still a truncation, not an early stop
+    reader = PageReader(["cover letter", "annexure", AADHAAR_TEXT, "annexure"])
+    result, pulled = _ocr_pdf(pdf_bytes([None] * 4), reader, PDF_MAX_PAGES=3)
+    info = result["stats"]["pdf"]
+    assert pulled == [0, 1, 2] and (info["pageCount"], info["pagesProcessed"], info["stoppedEarly"]) == (4, 3, False)
+
+    # Identifiers on the last page: every page is read, and that is not an early stop
+    reader = PageReader(["cover letter", "annexure", AADHAAR_TEXT])
+    result, pulled = _ocr_pdf(pdf_bytes([None] * 3), reader)
+    assert pulled == [0, 1, 2] and result["stats"]["pdf"]["stoppedEarly"] is False
+    assert ocr.parse_text(result["text"])["name"] == "RAVI KUMAR SHARMA"
+
+
+if __name__ == "__main__":
+    print("🔍 Testing PDF OCR...")
+    for test in (test_scanned_pages_stop_rendering_once_identifiers_are_found,
+                 test_text_layer_pages_are_never_rendered, test_page_cap_and_last_page_identifiers):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    print("\n--- Test Complete ---")
@@ -0,0 +1,154 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Fail fast instead of waiting on index creation when no MongoDB is running
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=200")
+
+from app import ocr_pool
+
+
+# Worker functions live at module level so the spawned workers can import them
+def _pid_and_square(x):
+    return os.getpid(), x * x
+
+
+def _fail(error, message):
+    raise error(message)
+
+
+def _crash_outside(parent_pid, value):
+    """Kill every worker process it runs in; run inline it would just return."""
+    if os.getpid() != parent_pid:
+        os._exit(1)
+    return value
+
+
+def _crash_once(marker, value):
+    """Kill the first worker that runs it; the resubmitted call finds the marker and returns."""
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return os.getpid(), value
+
+
+def _sleep_then_pid(seconds):
+    time.sleep(seconds)
+    return os.getpid()
+
+
+def _with_pool(test):
+    def wrapper():
+        assert ocr_pool.start_pool(1) == 1
+        try:
+            test()
+        finally:
+            ocr_pool.shutdown_pool()
+    wrapper.__name__ = test.__name__
+    return wrapper
+
+
+def test_calls_run_inline_without_a_pool():
+    assert ocr_pool.pool_status()["running"] is False
+    assert ocr_pool.start_pool(0) == 0 and ocr_pool.pool_status()["running"] is False
+    assert ocr_pool.run_sync(_pid_and_square, 3) == (os.getpid(), 9)
+
+
+@_with_pool
+def test_calls_run_in_a_worker_and_errors_propagate():
+    assert ocr_pool.start_pool(4) == 1  # idempotent: the running pool is kept
+    worker, value = ocr_pool.run_sync(_pid_and_square, 5)
+    assert value == 25 and worker != os.getpid()
+
+    # An exception raised by the function reaches the caller; the pool is not restarted
+    for error in (ValueError, RuntimeError):
+        try:
+            ocr_pool.run_sync(_fail, error, "bad page")
+            raise AssertionError(f"expected {error.__name__}")
+        except error as e:
+            assert str(e) == "bad page" and not isinstance(e, ocr_pool.OCRWorkerError)
+    assert ocr_pool.pool_status() == {"running": True, "workers": 1, "restarts": 0}
+    assert ocr_pool.run_sync(_pid_and_square, 2) == (worker, 4)
+
+
+@_with_pool
+def test_crashed_call_is_resubmitted_once_and_never_run_inline():
+    worker, _ = ocr_pool.run_sync(_pid_and_square, 1)
+
+    # One crash: the call is retried on the restarted pool, in a new worker
+    with tempfile.TemporaryDirectory() as tmp:
+        new_worker, value = ocr_pool.run_sync(_crash_once, os.path.join(tmp, "crashed"), "once")
+    assert value == "once" and new_worker not in (worker, os.getpid())
+    assert ocr_pool.pool_status()["restarts"] == 1
+
+    # A call that kills the replacement too is an OCR error, not an inline run in this process
+    try:
+        ocr_pool.run_sync(_crash_outside, os.getpid(), "always")
+        raise AssertionError("expected OCRWorkerError")
+    except ocr_pool.OCRWorkerError as e:
+        assert "crashed twice" in str(e)
+    status = ocr_pool.pool_status()
+    assert status["running"] and status["restarts"] == 3
+    assert ocr_pool.run_sync(_pid_and_square, 7)[1] == 49  # the pool left behind works
+
+    # Other callers that failed on the same broken pool find it already replaced
+    broken = ocr_pool._pool
+    try:
+        ocr_pool.run_sync(_crash_outside, os.getpid(), "again")
+    except ocr_pool.OCRWorkerError:
+        pass
+    replacement = ocr_pool._pool
+    for _ in range(3):
+        ocr_pool._restart_after_crash(broken)
+    assert ocr_pool._pool is replacement and ocr_pool.pool_status()["restarts"] == 5
+
+
+def test_shutdown_lets_running_calls_finish_and_fails_queued_calls():
+    assert ocr_pool.start_pool(1) == 1
+    ocr_pool.run_sync(_pid_and_square, 1)  # worker is up
+    results = {}
+
+    def call(name, seconds):
+        try:
+            results[name] = ocr_pool.run_sync(_sleep_then_pid, seconds)
+        except ocr_pool.OCRWorkerError as e:
+            results[name] = e
+
+    running = threading.Thread(target=call, args=("running", 1.0))
+    running.start()
+    time.sleep(0.3)
+    # The executor hands a couple of calls to the worker ahead of time; the rest stay queued
+    queued = [threading.Thread(target=call, args=(n, 0.0)) for n in range(5)]
+    for t in queued:
+        t.start()
+    time.sleep(0.2)
+
+    ocr_pool.shutdown_pool()
+    assert ocr_pool.pool_status()["running"] is False
+    for t in [running] + queued:
+        t.join(30)
+    worker = results["running"]
+    assert isinstance(worker, int) and worker != os.getpid()  # finished in the worker
+    # Every queued call gets an answer: from the worker, or an error once cancelled; none ran here
+    assert len(results) == 6 and os.getpid() not in results.values()
+    assert any(isinstance(r, ocr_pool.OCRWorkerError) for r in results.values())
+    assert all(r == worker or isinstance(r, ocr_pool.OCRWorkerError) for r in results.values())
+    # With the pool stopped for good, calls run inline again (as with OCR_POOL_SIZE=0)
+    assert ocr_pool.run_sync(_pid_and_square, 2) == (os.getpid(), 4)
+
+if __name__ == "__main__":
+    print("🔍 Testing the OCR worker pool...")
+    for test in (test_calls_run_inline_without_a_pool, test_calls_run_in_a_worker_and_errors_propagate,
+                 test_crashed_call_is_resubmitted_once_and_never_run_inline,
+                 test_shutdown_lets_running_calls_finish_and_fails_queued_calls):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    print("\n--- Test Complete ---")
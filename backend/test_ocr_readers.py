@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+import threading
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+from app import ocr, ocr_pool
+from app.ocr_readers import DEFAULT_LANGS, ReaderRegistry, normalize_doc_type, parse_lang_sets
+from test_ocr_cascade import FakeReader, FakeRegistry, FakeTesseract, engines, png_bytes
+
+PAN_TEXT = "INCOME TAX DEPARTMENT\nGOVT. OF INDIA\nRAVI KUMAR SHARMA\n12/05/1990\nPermanent Account Number\nABCPK1234F"
+
+
+class CountingRegistry(ReaderRegistry):
+    """A ReaderRegistry whose models are FakeReaders that take `load_seconds` to load."""
+
+    def __init__(self, idle_seconds=900.0, load_seconds=0.0, missing=False):
+        super().__init__(idle_seconds)
+        self.load_seconds, self.missing = load_seconds, missing
+        self.loads = []
+
+    def _load(self, langs):
+        if self.missing:
+            raise ImportError("No module named 'easyocr'")
+        time.sleep(self.load_seconds)
+        self.loads.append(langs)
+        return {"reader": FakeReader(), "loadMs": 1.0, "memoryBytes": None, "uses": 0, "lastUsed": time.time()}
+
+
+def test_get_loads_each_language_set_once():
+    registry = CountingRegistry(load_seconds=0.05)
+    got = []
+    threads = [threading.Thread(target=lambda: got.append(registry.get(("en",)))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # Concurrent first uses wait for one load and share the reader
+    assert registry.loads == [("en",)] and len({id(r) for r in got}) == 1
+    assert registry.get(["en", "hi"]) is registry.get(DEFAULT_LANGS) and registry.loads == [("en",), ("en", "hi")]
+    assert registry.stats()["en"]["uses"] == 8 and registry.stats()["en+hi"]["uses"] == 2
+
+    # EasyOCR missing: None from then on, without retrying the import
+    missing = CountingRegistry(missing=True)
+    assert missing.get() is None and missing.get(("en",)) is None and not missing.available()
+
+
+def test_idle_readers_are_evicted_including_the_default():
+    registry = CountingRegistry(idle_seconds=60)
+    registry.get(DEFAULT_LANGS)
+    registry.get(("en",))
+    now = time.time()
+    assert registry.evict_idle(now + 30) == 0
+    registry.get(("en",))  # keeps en warm
+    registry._readers[DEFAULT_LANGS]["lastUsed"] = now - 120
+    assert registry.evict_idle(now) == 1 and set(registry.stats()) == {"en"}
+    # Next Aadhaar upload loads it again
+    registry.get(DEFAULT_LANGS)
+    assert registry.loads.count(DEFAULT_LANGS) == 2
+
+    never = CountingRegistry(idle_seconds=0)
+    never.get(DEFAULT_LANGS)
+    assert never.evict_idle(time.time() + 10 ** 6) == 0
+
+
+def test_readers_are_routed_by_document_type_before_loading():
+    # Hinted PAN: only the English model is touched
+    registry = FakeRegistry(FakeReader())
+    with engines(None, registry, OCR_CASCADE=False, OCR_ROI_MODE=False):
+        result = ocr._run_ocr_many([png_bytes()], ["PAN"])[0]
+    assert registry.requested == [("en",)] and result["stats"]["reader"] == "en"
+
+    # Unhinted, but the fast tier identified a PAN before escalating: still English only
+    registry = FakeRegistry(FakeReader())
+    with engines(FakeTesseract(PAN_TEXT, conf=20.0), registry, OCR_CASCADE=True, OCR_ROI_MODE=False):
+        result = ocr._run_ocr_many([png_bytes()])[0]
+    assert result["stats"]["cascade"]["reason"] == "low_confidence" and registry.requested == [("en",)]
+
+    # Accepted by the fast tier: no model loaded at all
+    registry = FakeRegistry(FakeReader())
+    with engines(FakeTesseract(PAN_TEXT), registry, OCR_CASCADE=True, OCR_ROI_MODE=False):
+        ocr._run_ocr_many([png_bytes(), png_bytes()])
+    assert registry.requested == []
+
+    # Unknown type (header not recognised by the English pre-read): the default
+    # en+hi reader; mixed batches one call per set
+    registry = FakeRegistry(FakeReader())
+    with engines(None, registry, OCR_CASCADE=False, OCR_ROI_MODE=False):
+        ocr._run_ocr_many([png_bytes(), png_bytes(), png_bytes()], [None, "DrivingLicence", "Aadhaar"])
+    assert registry.requested[0] == ("en",) and sorted(registry.requested[1:]) == [("en",), ("en", "hi")]
+
+    # Worker start-up preloads only OCR_PRELOAD_READERS (nothing by default)
+    assert parse_lang_sets(" en+hi , en,") == [("en", "hi"), ("en",)]
+    for spec, expected in (("", []), ("en", [("en",)])):
+        registry = FakeRegistry(FakeReader())
+        with engines(None, registry, OCR_PRELOAD_READERS=spec):
+            ocr_pool._init_worker(1)
+        assert registry.requested == expected, spec
+
+
+def test_default_config_reads_pan_cards_with_the_english_model_only():
+    from app.config import Settings
+    from test_ocr_roi import AADHAAR_TEXT, PAN_TEXT as PAN_BOXES, LevelReader, canonical_card, card_photo
+    import cv2
+
+    defaults = Settings()
+    assert defaults.OCR_PREDETECT and not defaults.OCR_CASCADE and not defaults.OCR_ROI_MODE
+    flags = {k: getattr(defaults, k) for k in ("OCR_PREDETECT", "OCR_CASCADE", "OCR_ROI_MODE")}
+    pan = cv2.imencode(".png", card_photo(canonical_card("PAN", PAN_BOXES)))[1].tobytes()
+    aadhaar = cv2.imencode(".png", card_photo(canonical_card("Aadhaar", AADHAAR_TEXT)))[1].tobytes()
+
+    # Unhinted PAN upload: header read with "en", then the full page with "en" -- en+hi never loads
+    registry = FakeRegistry(LevelReader(PAN_BOXES, AADHAAR_TEXT))
+    with engines(None, registry, **flags):
+        result = ocr._run_ocr_many([pan])[0]
+    assert registry.requested == [("en",), ("en",)]
+    assert result["stats"]["detectedType"] == "PAN" and result["stats"]["reader"] == "en"
+
+    # Aadhaar still gets the Devanagari model; one pre-read covers the whole batch
+    registry = FakeRegistry(LevelReader(PAN_BOXES, AADHAAR_TEXT))
+    with engines(None, registry, **flags):
+        results = ocr._run_ocr_many([aadhaar, pan])
+    assert registry.requested[0] == ("en",) and sorted(registry.requested[1:]) == [("en",), ("en", "hi")]
+    assert [r["stats"]["reader"] for r in results] == ["en+hi", "en"]
+
+    # A client hint skips the pre-read; route values are normalised first
+    registry = FakeRegistry(LevelReader(PAN_BOXES))
+    with engines(None, registry, **flags):
+        ocr._run_ocr_many([pan], [normalize_doc_type("pan")])
+    assert registry.requested == [("en",)]
+    assert [normalize_doc_type(v) for v in ("Aadhar", "driving_licence", "DL", "passport", None)] == \
+        ["Aadhaar", "DrivingLicence", "DrivingLicence", None, None]
+
+
+if __name__ == "__main__":
+    print("🔍 Testing the EasyOCR reader registry...")
+    for test in (test_get_loads_each_language_set_once, test_idle_readers_are_evicted_including_the_default,
+                 test_readers_are_routed_by_document_type_before_loading,
+                 test_default_config_reads_pan_cards_with_the_english_model_only):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    print("\n--- Test Complete ---")
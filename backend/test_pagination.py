@@ -0,0 +1,374 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import inspect
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Fail fast instead of waiting on index creation when no MongoDB is running
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=200")
+
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI, Response
+
+from app import db, db_async
+from app.pagination import (list_page, decode_cursor, encode_cursor, backfill_page_keys,
+                            DOCUMENT_SUMMARY, NEXT_CURSOR_HEADER)
+from app.routers import routers
+from app.security import create_access_token
+
+
+# ----------------------------------------------------
+# Motor stand-in with the operators and projections the pages use
+# ----------------------------------------------------
+_MISSING = object()
+
+
+def _get(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return _MISSING
+        doc = doc[part]
+    return doc
+
+
+def _bson_rank(value):
+    """MongoDB's cross-type sort order (missing/null < numbers < strings < ... < dates)."""
+    if value is _MISSING or value is None:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 5
+
+
+def _sort_key(value):
+    return (_bson_rank(value), 0 if value is _MISSING or value is None else value)
+
+
+def _cond_matches(value, cond):
+    if "$ne" in cond and value == cond["$ne"]:
+        return False
+    # Comparisons only match within one BSON type
+    if "$lt" in cond and (_bson_rank(value) != _bson_rank(cond["$lt"]) or not value < cond["$lt"]):
+        return False
+    if "$type" in cond and not (cond["$type"] == "string" and isinstance(value, str)):
+        return False
+    if "$not" in cond and _cond_matches(value, cond["$not"]):
+        return False
+    return True
+
+
+def _matches(doc, query):
+    for key, cond in query.items():
+        if key == "$and":
+            if not all(_matches(doc, q) for q in cond):
+                return False
+            continue
+        if key == "$or":
+            if not any(_matches(doc, q) for q in cond):
+                return False
+            continue
+        value = _get(doc, key)
+        if isinstance(cond, dict):
+            if not _cond_matches(value, cond):
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+def _drop(doc, path):
+    head, _, rest = path.partition(".")
+    if head in doc:
+        if rest:
+            if isinstance(doc[head], dict):
+                doc[head] = dict(doc[head])
+                _drop(doc[head], rest)
+        else:
+            del doc[head]
+
+
+def _project(doc, projection):
+    if not projection:
+        return dict(doc)
+    if all(v == 0 for v in projection.values()):
+        out = dict(doc)
+        for path in projection:
+            _drop(out, path)
+        return out
+    out = {"_id": doc["_id"]}
+    for path in projection:
+        value = _get(doc, path)
+        if value is not _MISSING:
+            target = out
+            parts = path.split(".")
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+    return out
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+        self.n = None
+
+    def sort(self, keys):
+        for key, direction in reversed(keys):
+            self.docs.sort(key=lambda d: _sort_key(_get(d, key)), reverse=direction < 0)
+        return self
+
+    def __iter__(self):
+        return iter(self.docs[:self.n])
+
+    def limit(self, n):
+        self.n = n
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs[:self.n]
+
+
+class FakeListCollection:
+    name = "fake"
+
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+        self.queries = []
+
+    def find(self, query=None, projection=None):
+        self.queries.append(query)
+        return _Cursor([_project(d, projection) for d in self.docs if _matches(d, query or {})])
+
+    async def find_one(self, query=None, projection=None):
+        found = [d for d in self.docs if _matches(d, query or {})]
+        return dict(found[0]) if found else None
+
+    def bulk_write(self, ops, ordered=True):
+        by_id = {d["_id"]: d for d in self.docs}
+        for op in ops:
+            by_id[op._filter["_id"]].update(op._doc["$set"])
+
+    async def insert_one(self, doc):
+        self.docs.append(doc)
+
+    async def count_documents(self, query):
+        return sum(1 for d in self.docs if _matches(d, query))
+
+
+def _documents(n, user="u1", ties=7):
+    return [{"_id": ObjectId(), "userId": user, "filename": f"f{i}.png", "createdAt": f"2025-01-01T00:{i // ties:04d}",
+             "rawText": "x" * 2000, "parsed": {"aadhaarNumber": "234567890123"},
+             "verification": {"rawText": "x" * 2000, "ocrStats": {"engine": "easyocr"}, "filename": f"f{i}.png"},
+             "imageHash": {"phash": "ff" * 8}, "fraud": {"score": i % 100, "reasons": [], "details": {
+                 "imageHash": {"phash": "ff" * 8}, "fraud_ring": {"size": 3, "members": ["a", "b", "c"]}}}}
+            for i in range(n)]
+
+
+def _walk(coll, query, **kwargs):
+    pages, cursor = [], None
+    while True:
+        response = Response()
+        items = asyncio.run(list_page(response, coll, query, cursor=cursor, **kwargs))
+        pages.append(items)
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return pages
+
+
+def test_cursor_walks_every_row_once_in_order():
+    docs = _documents(1050) + _documents(40, user="u2")
+    coll = FakeListCollection(docs)
+    pages = _walk(coll, {"userId": "u1"}, limit=100)
+    assert [len(p) for p in pages] == [100] * 10 + [50]
+    walked = [d["_id"] for p in pages for d in p]
+    expected = sorted((d for d in docs if d["userId"] == "u1"), key=lambda d: (d["createdAt"], d["_id"]), reverse=True)
+    assert walked == [str(d["_id"]) for d in expected]  # ties on createdAt are split by _id
+    # Later pages are a range condition on (createdAt, _id), not a skip
+    assert "$and" in coll.queries[-1] and len(coll.queries) == len(pages)
+
+    key, last_id = decode_cursor(asyncio.run(_first_cursor(coll)))
+    assert isinstance(last_id, ObjectId) and key == expected[99]["createdAt"]
+
+
+async def _first_cursor(coll):
+    response = Response()
+    await list_page(response, coll, {"userId": "u1"}, limit=100)
+    return response.headers[NEXT_CURSOR_HEADER]
+
+
+def test_summary_and_field_projections():
+    coll = FakeListCollection(_documents(5))
+    summary = asyncio.run(list_page(Response(), coll, {}, summary=DOCUMENT_SUMMARY))[0]
+    assert "rawText" not in summary and "rawText" not in summary["verification"] and "imageHash" not in summary
+    assert summary["verification"]["filename"] and summary["parsed"] and summary["fraud"]["score"] is not None
+    assert summary["fraud"]["details"]["fraud_ring"] == {"size": 3}
+
+    picked = asyncio.run(list_page(Response(), coll, {}, fields="filename,fraud.score", summary=DOCUMENT_SUMMARY))[0]
+    assert set(picked) == {"_id", "filename", "fraud", "createdAt"} and set(picked["fraud"]) == {"score"}
+
+    for bad in ({"fields": "rawText,$where"}, {"cursor": "not-a-cursor"}):
+        try:
+            asyncio.run(list_page(Response(), coll, {}, **bad))
+            assert False, bad
+        except Exception as e:
+            assert getattr(e, "status_code", None) == 400, bad
+
+
+def test_listing_routes_page_and_detail_route_fetches_full_document(monkeypatch):
+    docs = _documents(30)
+    other = _documents(1, user="u9")[0]
+    logs = [{"_id": ObjectId(), "action": "upload", "createdAt": f"2025-02-01T{i:02d}", "deviceInfo": {"ua": "x"}}
+            for i in range(25)]
+    alerts = [{"_id": ObjectId(), "seen": i % 5 == 0, "timestamp": f"2025-03-01T{i:02d}"} for i in range(20)]
+    db = {"users": FakeListCollection([{"_id": "u1", "email": "user@example.com", "role": "user"}]),
+          "uploaded_documents": FakeListCollection(docs + [other]), "audit_logs": FakeListCollection(logs),
+          "alerts": FakeListCollection(alerts)}
+    monkeypatch.setattr(db_async.async_db, "_database", lambda: db, raising=False)
+    app = FastAPI()
+    for router in routers:
+        app.include_router(router)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'user@example.com'})}"}
+
+    async def get(path, **params):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers, params=params)
+
+    for path in ("/compliance/docs", "/upload/my-docs", "/docs/my-docs"):
+        first = asyncio.run(get(path, limit=20))
+        rest = asyncio.run(get(path, limit=20, cursor=first.headers[NEXT_CURSOR_HEADER]))
+        assert len(first.json()) == 20 and len(rest.json()) == 10 and NEXT_CURSOR_HEADER not in rest.headers
+        assert "rawText" not in first.json()[0], path
+
+    page = asyncio.run(get("/compliance/logs", limit=10))
+    assert [l["createdAt"] for l in page.json()] == [f"2025-02-01T{i:02d}" for i in range(24, 14, -1)]
+    assert "deviceInfo" not in page.json()[0]
+    unseen = asyncio.run(get("/compliance/alerts"))
+    assert len(unseen.json()) == 16 and NEXT_CURSOR_HEADER not in unseen.headers
+    # The badge count comes from the server, not from walking every page
+    assert NEXT_CURSOR_HEADER in asyncio.run(get("/compliance/alerts", limit=5)).headers
+    assert asyncio.run(get("/compliance/alerts/count")).json() == {"count": 16}
+
+    full = asyncio.run(get(f"/compliance/docs/{docs[3]['_id']}"))
+    assert full.json()["rawText"] == docs[3]["rawText"]
+    assert asyncio.run(get(f"/compliance/docs/{other['_id']}")).status_code == 403
+    assert asyncio.run(get("/compliance/docs", cursor="bogus")).status_code == 400
+
+
+def _legacy_logs():
+    """Audit logs as older builds left them: datetime, epoch, null and missing createdAt."""
+    start = datetime(2025, 1, 1)
+    logs = []
+    for i in range(60):
+        created = start + timedelta(minutes=i)
+        epoch = (created - datetime(1970, 1, 1)).total_seconds()
+        value = {0: created.isoformat(), 1: created, 2: epoch, 3: None, 4: _MISSING}[i % 5]
+        log = {"_id": ObjectId.from_datetime(created), "n": i}
+        if value is not _MISSING:
+            log["createdAt"] = value
+        logs.append(log)
+    return logs
+
+
+def test_mixed_and_missing_page_keys_are_never_skipped_or_repeated(monkeypatch):
+    logs = _legacy_logs()
+    coll = FakeListCollection(logs)
+    # Before the backfill: pages only scan string keys, so each visible row comes back once
+    walked = [d["n"] for p in _walk(coll, {}, limit=5) for d in p]
+    assert walked == [i for i in range(59, -1, -1) if i % 5 == 0]
+
+    # A cursor must carry a string key (None or a datetime would cross BSON types)
+    for key in (None, datetime(2025, 1, 1), 1735689600):
+        try:
+            asyncio.run(list_page(Response(), coll, {}, cursor=encode_cursor(key, ObjectId())))
+            assert False, key
+        except Exception as e:
+            assert getattr(e, "status_code", None) == 400, key
+
+    # The start-up backfill rewrites every other key as an ISO string
+    monkeypatch.setattr(db, "documents_collection", FakeListCollection())
+    monkeypatch.setattr(db, "audit_logs_collection", coll)
+    monkeypatch.setattr(db, "alerts_collection", FakeListCollection([{"_id": ObjectId(), "seen": False}]))
+    assert backfill_page_keys(batch=7) == 48 + 1 and backfill_page_keys() == 0
+    assert all(isinstance(d["createdAt"], str) for d in logs)
+    walked = [d["n"] for p in _walk(coll, {}, limit=7) for d in p]
+    assert walked == list(range(59, -1, -1))  # every row once, in time order
+    by_n = {d["n"]: d["createdAt"] for d in logs}
+    # From the datetime, the epoch seconds, and the _id's creation time for null/missing
+    assert [by_n[i] for i in range(1, 5)] == [f"2025-01-01T00:0{i}:00" for i in range(1, 5)]
+
+    # /logs/add stores a string key whatever the client sent
+    monkeypatch.setattr(db_async.async_db, "_database", lambda: {"audit_logs": coll}, raising=False)
+    app = FastAPI()
+    for router in routers:
+        app.include_router(router)
+
+    async def post(body):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/compliance/logs/add", json=body)
+
+    from app.routers import compliance_routes
+    from app.audit_log import AuditSink
+    monkeypatch.setattr(compliance_routes, "audit_sink", AuditSink(collection=_SyncInsert(coll)))
+    for body in ({"action": "a"}, {"action": "b", "createdAt": 1735689600}, {"action": "c", "createdAt": "2025-06-01"}):
+        assert asyncio.run(post(body)).status_code == 200
+    added = {d["action"]: d["createdAt"] for d in coll.docs if "action" in d}
+    assert all(isinstance(v, str) for v in added.values()) and added["b"] == "2025-01-01T00:00:00"
+
+
+class _SyncInsert:
+    def __init__(self, coll):
+        self.coll = coll
+
+    def insert_one(self, doc):
+        self.coll.docs.append(doc)
+
+
+def benchmark(n=2000, page=100):
+    print(f"\n⏱️ Listing pages benchmark ({n:,} documents with 2 KB OCR text each)")
+    coll = FakeListCollection(_documents(n))
+    everything = asyncio.run(coll.find({}).to_list())
+    for d in everything:
+        d["_id"] = str(d["_id"])
+    full_bytes = len(json.dumps(everything))
+    t0 = time.perf_counter()
+    pages = _walk(coll, {}, limit=page, summary=DOCUMENT_SUMMARY)
+    elapsed = (time.perf_counter() - t0) * 1000
+    first_bytes = len(json.dumps(pages[0]))
+    print(f"   old response: {full_bytes / 1e6:.1f} MB per refresh (whole collection, every field)")
+    print(f"   first page: {first_bytes / 1e3:.1f} KB ({page} summary rows); "
+          f"{len(pages)} pages walked in {elapsed:.0f} ms with the in-memory stand-in")
+
+
+if __name__ == "__main__":
+    print("🔍 Testing keyset-paginated listings...")
+    for test in (test_cursor_walks_every_row_once_in_order, test_summary_and_field_projections,
+                 test_listing_routes_page_and_detail_route_fetches_full_document,
+                 test_mixed_and_missing_page_keys_are_never_skipped_or_repeated):
+        try:
+            with pytest.MonkeyPatch.context() as monkeypatch:
+                test(monkeypatch) if "monkeypatch" in inspect.signature(test).parameters else test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    benchmark()
+    print("\n--- Test Complete ---")
@@ -0,0 +1,163 @@
+import os
+import sys
+import time
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Fail fast instead of waiting on index creation when no MongoDB is running
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=200")
+
+import cv2
+import numpy as np
+
+from app import quality
+from app.image_context import DecodedImage
+
+
+# ----------------------------------------------------
+# Full-resolution reference (the fraud.py helpers before quality.py)
+# ----------------------------------------------------
+def legacy_laplacian_variance(file_bytes):
+    nparr = np.frombuffer(file_bytes, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gray = cv2.GaussianBlur(gray, (3, 3), 0)
+    lap = cv2.Laplacian(gray, cv2.CV_64F)
+    return float(lap.var())
+
+
+def legacy_crop_ratio(file_bytes):
+    nparr = np.frombuffer(file_bytes, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    h, w = img.shape[:2]
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    _, th = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    contours, _ = cv2.findContours(th, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    largest = max(contours, key=cv2.contourArea)
+    x, y, bw, bh = cv2.boundingRect(largest)
+    return float(bw * bh) / float(w * h)
+
+
+# ----------------------------------------------------
+# Synthetic uploads: a light card with text on a darker background
+# ----------------------------------------------------
+SIZES = [(600, 950), (900, 1400), (1536, 2048), (2250, 3000), (3000, 4000)]
+
+
+def synthetic_card(rng, h, w, blur, noise, fill):
+    img = np.full((h, w, 3), int(rng.integers(20, 120)), np.uint8)
+    ch, cw = int(h * fill), int(w * fill)
+    card = np.full((ch, cw, 3), int(rng.integers(200, 245)), np.uint8)
+    scale = cw / 900
+    for i in range(9):
+        line = "".join(rng.choice(list("ABCDEFGHKMNPRSTUVXYZ0123456789 /"), 18))
+        y = int((60 + i * 55) * scale)
+        cv2.putText(card, line, (int(30 * scale), y), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.9 * scale, (25, 25, 25), max(1, int(round(1.5 * scale))))
+    y0, x0 = (h - ch) // 2, (w - cw) // 2
+    img[y0:y0 + ch, x0:x0 + cw] = card
+    if blur:
+        img = cv2.GaussianBlur(img, (0, 0), blur)
+    if noise:
+        img = np.clip(img + rng.standard_normal(img.shape, dtype=np.float32) * noise, 0, 255).astype(np.uint8)
+    return cv2.imencode(".bmp", img)[1].tobytes()  # uncompressed: keeps corpus generation fast
+
+
+def corpus(seed=7):
+    rng = np.random.default_rng(seed)
+    docs = []
+    for h, w in SIZES:
+        for blur in (0, 0.8, 1.5, 3.0):
+            for noise in (0, 6):
+                docs.append(synthetic_card(rng, h, w, blur, noise, rng.uniform(0.55, 0.95)))
+    return docs
+
+
+_RESULTS = None
+
+
+def _results():
+    """(legacy blur, legacy crop, analyze_quality result) per corpus image, computed once."""
+    global _RESULTS
+    if _RESULTS is None:
+        _RESULTS = [(legacy_laplacian_variance(data), legacy_crop_ratio(data),
+                     quality.analyze_quality.uncached(DecodedImage(data))) for data in corpus()]
+    return _RESULTS
+
+
+def test_blur_and_crop_decisions_match_full_resolution():
+    blur_diff, crop_diff = [], []
+    for i, (ref_blur, ref_crop, q) in enumerate(_results()):
+        if (ref_blur < quality.BLUR_THRESHOLD) != q["blurry"]:
+            blur_diff.append((i, round(ref_blur, 1), round(q["blurVariance"], 1)))
+        if (ref_crop < quality.CROP_THRESHOLD) != q["cropped"]:
+            crop_diff.append((i, round(ref_crop, 3), round(q["cropRatio"], 3)))
+    assert not blur_diff, f"blur decisions differ: {blur_diff}"
+    assert not crop_diff, f"crop decisions differ: {crop_diff}"
+
+
+def test_blur_estimate_tracks_full_resolution_value():
+    for ref, _, q in _results():
+        est = q["blurVariance"]
+        assert abs(est - ref) <= 0.15 * ref + 1.0, f"blur estimate {est:.1f} vs full-resolution {ref:.1f}"
+
+
+def test_glare_and_exposure():
+    gray = np.full((400, 600), 130, np.uint8)
+    assert quality.exposure(gray)["label"] == "ok"
+    gray[100:200, 100:300] = 255
+    assert quality.exposure(gray)["bright"] > quality.GLARE_THRESHOLD
+    assert quality.exposure(np.full((400, 600), 8, np.uint8))["label"] == "under"
+    assert quality.exposure(np.full((400, 600), 252, np.uint8))["label"] == "over"
+
+
+def test_level_is_bounded():
+    q = _results()[-1][2]  # 3000 x 4000
+    assert max(q["level"]["shape"]) <= quality.settings.QUALITY_MAX_SIDE
+    assert quality.analyze_quality.uncached(DecodedImage(b"%PDF-1.4 not an image")) is None
+
+
+def benchmark(repeats=3):
+    """Per-image time of the legacy blur+crop checks vs analyze_quality (decode and hashing excluded)."""
+    print(f"\n⏱️ Quality benchmark ({repeats} runs per image, decode excluded)")
+    for h, w in SIZES:
+        data = synthetic_card(np.random.default_rng(0), h, w, 0.8, 4, 0.8)
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            cv2.Laplacian(cv2.GaussianBlur(gray, (3, 3), 0), cv2.CV_64F).var()
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            _, th = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            cv2.findContours(th, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        legacy_ms = (time.perf_counter() - t0) * 1000 / repeats
+
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            # Same decoded array and digest, so only the analysis is timed
+            image = DecodedImage(data, sha256="benchmark")
+            image.__dict__["bgr"] = img
+            quality.analyze_quality.uncached(image)
+        new_ms = (time.perf_counter() - t0) * 1000 / repeats
+        print(f"   {w}x{h}: legacy {legacy_ms:7.1f} ms | quality.py {new_ms:6.1f} ms | {legacy_ms / new_ms:4.1f}x")
+
+
+if __name__ == "__main__":
+    print("🔍 Testing bounded image quality analysis...")
+    for test in (test_blur_and_crop_decisions_match_full_resolution, test_blur_estimate_tracks_full_resolution_value,
+                 test_glare_and_exposure, test_level_is_bounded):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    benchmark()
+    print("\n--- Test Complete ---")
@@ -0,0 +1,200 @@
+import os
+import sys
+import time
+import glob
+import inspect
+import tempfile
+import contextlib
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+import pytest
+
+from app import ocr, stage_cache as stage_cache_module
+from app.image_context import DecodedImage
+from app.stage_cache import StageCache, cached_stage, content_key
+
+
+@contextlib.contextmanager
+def fresh_cache(**kwargs):
+    """Swap the module-level cache used by cached_stage and the OCR entry points."""
+    cache = StageCache(**kwargs)
+    saved = (stage_cache_module.stage_cache, ocr.stage_cache)
+    stage_cache_module.stage_cache = ocr.stage_cache = cache
+    try:
+        yield cache
+    finally:
+        stage_cache_module.stage_cache, ocr.stage_cache = saved
+
+
+class CountingBatcher:
+    """ocr_batcher stand-in: records each (bytes, doc_type) it is asked to OCR."""
+
+    def __init__(self, text="RAVI KUMAR SHARMA"):
+        self.text = text
+        self.calls = []
+
+    def run(self, item):
+        self.calls.append(item[1])
+        return {"text": self.text, "stats": {"docType": item[1]}}
+
+
+def test_memory_tier_is_a_bounded_lru():
+    cache = StageCache(max_entries=3)
+    for key in "abc":
+        cache.store("ocr", "v1", key, {"text": key})
+    assert cache.lookup("ocr", "v1", "a") == {"text": "a"}  # a is now the most recent
+    cache.store("ocr", "v1", "d", {"text": "d"})
+
+    # b was the least recently used, so it is the one dropped
+    assert cache.lookup("ocr", "v1", "b") is None
+    assert [cache.lookup("ocr", "v1", k)["text"] for k in "acd"] == ["a", "c", "d"]
+    stats = cache.stats()
+    assert stats["entries"] == 3 and stats["maxEntries"] == 3 and stats["diskEnabled"] is False
+    assert stats["stages"]["ocr"] == {"hits": 4, "disk_hits": 0, "misses": 1}
+
+
+def test_disk_tier_survives_restart_and_eviction():
+    with tempfile.TemporaryDirectory() as tmp:
+        first = StageCache(max_entries=1, disk_dir=tmp)
+        first.store("image_quality", "v1", "k1", {"label": "ok"})
+        first.store("image_quality", "v1", "k2", {"label": "under"})
+        # k1 left memory, but the disk tier still has it and promotes it back
+        assert first.lookup("image_quality", "v1", "k1") == {"label": "ok"}
+        assert first.stats()["stages"]["image_quality"]["disk_hits"] == 1
+
+        # A new process (new cache over the same directory) starts warm
+        second = StageCache(max_entries=8, disk_dir=tmp)
+        assert second.lookup("image_quality", "v1", "k2") == {"label": "under"}
+        assert second.lookup("image_quality", "v1", "k2") == {"label": "under"}
+        assert second.stats()["stages"]["image_quality"] == {"hits": 1, "disk_hits": 1, "misses": 0}
+        assert not glob.glob(os.path.join(tmp, "**", "*.tmp"), recursive=True)
+
+        # A corrupt entry is a miss that gets recomputed, never an error
+        path = second._disk_path("image_quality", "v1", "k3")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"not a pickle")
+        assert second.get_or_compute("image_quality", "v1", "k3", lambda: {"label": "over"}) == {"label": "over"}
+        assert StageCache(disk_dir=tmp).lookup("image_quality", "v1", "k3") == {"label": "over"}
+
+
+def test_failed_results_are_returned_but_not_stored():
+    cache = StageCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return None
+
+    assert cache.get_or_compute("cnn_manipulation", "v1", "k", compute) is None
+    assert cache.get_or_compute("cnn_manipulation", "v1", "k", compute) is None
+    assert len(calls) == 2 and cache.stats()["entries"] == 0
+
+
+def test_keys_cover_content_and_stage_params(monkeypatch):
+    data, other = b"\x89PNG first upload", b"\x89PNG second upload"
+    # A DecodedImage reuses the digest of its bytes
+    assert content_key(DecodedImage(data)) == content_key(data) != content_key(other)
+
+    calls = []
+
+    @cached_stage("image_quality", "test")
+    def stage(image):
+        calls.append(bytes(image.data if isinstance(image, DecodedImage) else image))
+        return {"n": len(calls)}
+
+    with fresh_cache():
+        assert stage(data) == stage(DecodedImage(data)) == {"n": 1}
+        assert stage(other) == {"n": 2}
+        assert stage(b"") == {"n": 3} and stage(b"") == {"n": 4}  # empty input is never cached
+        assert stage.uncached(data) == {"n": 5}
+
+    # OCR: the document type hint picks the recognition model, so it is part of the key
+    batcher = CountingBatcher()
+    monkeypatch.setattr(ocr, "ocr_batcher", batcher)
+    with fresh_cache():
+        for doc_type in ("PAN", "PAN", "Aadhaar", None, None):
+            ocr.extract_text_with_stats(data, doc_type)
+        assert batcher.calls == ["PAN", "Aadhaar", None]
+
+        # An empty OCR result is not cached: the next request tries again
+        batcher.text = ""
+        ocr.extract_text_with_stats(other, "PAN")
+        ocr.extract_text_with_stats(other, "PAN")
+        assert batcher.calls[-2:] == ["PAN", "PAN"]
+
+
+def test_version_bump_invalidates_memory_and_disk(monkeypatch):
+    data = b"\x89PNG same upload"
+    calls = []
+
+    def make_stage(version):
+        @cached_stage("cnn_manipulation", version)
+        def stage(image):
+            calls.append(version)
+            return {"version": version}
+        return stage
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with fresh_cache(disk_dir=tmp):
+            assert make_stage("model-v1")(data) == {"version": "model-v1"}
+            assert make_stage("model-v2")(data) == {"version": "model-v2"}
+        # After a restart each version still reads only its own entries
+        with fresh_cache(disk_dir=tmp):
+            assert make_stage("model-v1")(data) == {"version": "model-v1"}
+            assert make_stage("model-v2")(data) == {"version": "model-v2"}
+        assert calls == ["model-v1", "model-v2"]
+
+    # Bumping OCR_STAGE_VERSION drops every cached OCR result
+    batcher = CountingBatcher()
+    monkeypatch.setattr(ocr, "ocr_batcher", batcher)
+    with fresh_cache():
+        ocr.extract_text_with_stats(data, "PAN")
+        ocr.extract_text_with_stats(data, "PAN")
+        monkeypatch.setattr(ocr, "OCR_STAGE_VERSION", ocr.OCR_STAGE_VERSION + "-next")
+        ocr.extract_text_with_stats(data, "PAN")
+    assert batcher.calls == ["PAN", "PAN"]
+
+
+def test_hits_are_private_copies_without_replayed_timings():
+    cache = StageCache()
+    result = {"text": "RAVI", "stats": {"pages": [1]}}
+    cache.store("ocr", "v1", "k", result)
+    result["stats"]["pages"].append(2)  # the caller keeps annotating its own result
+    hit = cache.lookup("ocr", "v1", "k")
+    hit["stats"]["engine"] = "changed downstream"
+    assert cache.lookup("ocr", "v1", "k") == {"text": "RAVI", "stats": {"pages": [1]}}
+
+    # A stage's own run time is measured on a miss and never replayed from the cache
+    calls = []
+
+    @cached_stage("image_quality", "test", timing="ms")
+    def stage(image):
+        calls.append(1)
+        time.sleep(0.05)
+        return {"label": "ok", "ms": 50.0}
+
+    data = b"\x89PNG upload"
+    with fresh_cache() as fresh:
+        first = stage(data)
+        first["label"] = "mutated"
+        second = stage(data)
+        assert len(calls) == 1 and first["ms"] == 50.0
+        assert second["label"] == "ok" and second["ms"] < 50.0
+        assert "ms" not in fresh._mem[f"image_quality:test:{content_key(data)}"]
+
+
+if __name__ == "__main__":
+    print("🔍 Testing the stage cache...")
+    for test in (test_memory_tier_is_a_bounded_lru, test_disk_tier_survives_restart_and_eviction,
+                 test_failed_results_are_returned_but_not_stored, test_keys_cover_content_and_stage_params,
+                 test_version_bump_invalidates_memory_and_disk, test_hits_are_private_copies_without_replayed_timings):
+        try:
+            with pytest.MonkeyPatch.context() as monkeypatch:
+                test(monkeypatch) if "monkeypatch" in inspect.signature(test).parameters else test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    print("\n--- Test Complete ---")
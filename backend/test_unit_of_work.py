@@ -0,0 +1,262 @@
+import os
+import sys
+import time
+import inspect
+import threading
+
+# Add current directory to path so we can import app modules
+sys.path.append(os.getcwd())
+
+# Fail fast instead of waiting on index creation when no MongoDB is running
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=200")
+
+import pytest
+from bson import ObjectId
+from pymongo import InsertOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from app import compliance
+from app.unit_of_work import UnitOfWork, GroupCommitter, flush, _Ticket
+from test_pipeline import _install_fakes
+
+
+class SlowCollection:
+    """A collection where every call is one round trip of `latency` seconds."""
+
+    def __init__(self, name, latency=0.0, reject=None, fail=None):
+        self.name, self.latency, self.reject, self.fail = name, latency, reject, fail
+        self.docs = []
+        self.updates = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+
+    def insert_one(self, doc):
+        self._round_trip()
+        doc.setdefault("_id", ObjectId())
+        self.docs.append(doc)
+
+    def update_one(self, query, update):
+        self._round_trip()
+
+    def bulk_write(self, ops, ordered=True):
+        self._round_trip()
+        if self.fail:
+            raise self.fail
+        errors = []
+        for i, op in enumerate(ops):
+            if self.reject and self.reject(op._doc):
+                errors.append({"index": i, "code": 11000, "errmsg": "duplicate key"})
+                if ordered:
+                    break
+            elif isinstance(op, InsertOne):
+                self.docs.append(op._doc)
+            else:
+                self.updates.append(op._filter["_id"])
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(self.docs)})
+
+
+def _unit(collections, i, bad=False):
+    documents, alerts, kyc, audit = collections
+    uow = UnitOfWork()
+    doc_id = uow.insert(documents, {"upload": i, "bad": bad})
+    if i % 3 == 0:
+        uow.insert(alerts, {"docId": str(doc_id)})
+    uow.insert(kyc, {"docId": str(doc_id)})
+    uow.insert(audit, {"docId": str(doc_id)})
+    return uow
+
+
+def _collections(latency=0.0, reject=None):
+    return (SlowCollection("documents", latency, reject), SlowCollection("alerts", latency),
+            SlowCollection("kyc_data", latency), SlowCollection("audit_logs", latency))
+
+
+def _commit_all(committer, units):
+    errors = [None] * len(units)
+
+    def run(i):
+        try:
+            committer.commit(units[i])
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(units))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+
+def test_pipeline_writes_once_per_collection(monkeypatch):
+    collections, _ = _install_fakes(monkeypatch)
+    user = {"_id": "user-1", "email": "a@example.com"}
+    compliance.run_full_pipeline(user, "a.png", b"\x89PNG first")
+    result = compliance.run_full_pipeline({"_id": "user-2", "email": "b@example.com"}, "b.png", b"\x89PNG second")
+    assert result["decision"] == "Flagged" and result["alerts"]
+
+    documents = collections["documents_collection"].docs
+    doc = documents[-1]
+    assert isinstance(doc["_id"], ObjectId) and str(doc["_id"]) == result["docId"]
+    assert doc["fraud"]["score"] == result["fraud"]["score"] and doc["fileHash"]  # no follow-up update
+    kyc = collections["kyc_data_collection"].docs[-1]
+    assert kyc["docId"] == result["docId"] and kyc["alerts"] == [result["alerts"][0]["_id"]]
+    assert str(collections["alerts_collection"].docs[0]["_id"]) == result["alerts"][0]["_id"]
+    for name, uploads in (("documents_collection", 2), ("kyc_data_collection", 2), ("alerts_collection", 1)):
+        assert collections[name].bulk_writes == uploads, name
+    assert len(collections["audit_logs_collection"].docs) == 2  # through the audit sink (inline here)
+
+
+def test_concurrent_commits_share_flushes():
+    collections = _collections(latency=0.02)
+    committer = GroupCommitter(max_units=64)
+    units = [_unit(collections, i) for i in range(32)]
+    assert _commit_all(committer, units) == [None] * 32
+    documents, alerts, kyc, audit = collections
+    assert sorted(d["upload"] for d in documents.docs) == list(range(32))
+    assert len(kyc.docs) == len(audit.docs) == 32 and len(alerts.docs) == 11
+    # Uploads waiting on an in-flight flush go out together in the next one
+    assert committer.flushes < 32 and documents.calls == kyc.calls == committer.flushes
+    assert committer.stats()["units"] == 32
+
+    # A limit of one unit per flush degrades to a flush per upload
+    committer = GroupCommitter(max_units=1)
+    collections = _collections(latency=0.002)
+    assert _commit_all(committer, [_unit(collections, i) for i in range(8)]) == [None] * 8
+    assert committer.flushes == 8 and collections[0].calls == 8
+
+
+def test_write_error_fails_only_its_upload():
+    collections = _collections(latency=0.01, reject=lambda doc: doc.get("bad"))
+    committer = GroupCommitter()
+    units = [_unit(collections, i, bad=(i == 5)) for i in range(12)]
+    errors = _commit_all(committer, units)
+    assert isinstance(errors[5], BulkWriteError) and errors.count(None) == 11
+    documents, alerts, kyc, audit = collections
+    assert 5 not in {d["upload"] for d in documents.docs} and len(documents.docs) == 11
+    # The failed upload's snapshot and audit entry are not written either
+    bad_id = str(units[5].ops[0][1]._doc["_id"])
+    assert bad_id not in {d["docId"] for d in kyc.docs + audit.docs + alerts.docs}
+    assert len(kyc.docs) == len(audit.docs) == 11
+
+
+def test_ordered_error_does_not_fail_the_units_behind_it():
+    # Insert + update on the same collection: the merged bulk is ordered and stops at the error
+    documents, kyc = SlowCollection("documents", reject=lambda doc: doc.get("bad")), SlowCollection("kyc_data")
+    units = []
+    for i in range(6):
+        uow = UnitOfWork()
+        doc_id = uow.insert(documents, {"upload": i, "bad": i == 2})
+        uow.update(documents, {"_id": doc_id}, {"$set": {"scored": True}})
+        uow.insert(kyc, {"upload": i})
+        units.append(uow)
+    tickets = [_Ticket(u) for u in units]
+    flush(tickets)
+
+    assert [t.error is not None for t in tickets] == [False, False, True, False, False, False]
+    # Units 3-5 were cut off by unit 2's error and written by the retry
+    assert documents.calls == 2 and sorted(d["upload"] for d in documents.docs) == [0, 1, 3, 4, 5]
+    assert len(documents.updates) == 5 and units[2].ops[0][1]._doc["_id"] not in documents.updates
+    assert sorted(d["upload"] for d in kyc.docs) == [0, 1, 3, 4, 5]
+
+
+def test_dependent_write_failure_fails_only_its_upload():
+    alerts = SlowCollection("alerts", reject=lambda doc: doc.get("docId") == "poison")
+    documents, kyc, audit = SlowCollection("documents"), SlowCollection("kyc_data"), SlowCollection("audit_logs")
+    units = []
+    for i in range(4):
+        uow = UnitOfWork()
+        uow.insert(documents, {"upload": i})
+        uow.insert(alerts, {"docId": "poison" if i == 1 else str(i)})
+        uow.insert(kyc, {"upload": i})
+        uow.insert(audit, {"upload": i})
+        units.append(uow)
+    tickets = [_Ticket(u) for u in units]
+    flush(tickets)
+
+    assert [t.error is not None for t in tickets] == [False, True, False, False]
+    # No rollback: the failed upload's document and other dependents stay written
+    assert len(documents.docs) == len(kyc.docs) == len(audit.docs) == 4 and len(alerts.docs) == 3
+
+    # Through the committer the failed upload's commit() raises, the others return
+    committer = GroupCommitter()
+    errors = _commit_all(committer, units)
+    assert isinstance(errors[1], BulkWriteError) and errors.count(None) == 3
+
+
+def test_unattributable_errors_fail_every_unit_in_the_bulk():
+    for error in (AutoReconnect("connection reset"),
+                  BulkWriteError({"writeErrors": [], "writeConcernErrors": [{"code": 64, "errmsg": "waiting for replication timed out"}]})):
+        documents = SlowCollection("documents", fail=error)
+        kyc, audit = SlowCollection("kyc_data"), SlowCollection("audit_logs")
+        units = []
+        for i in range(3):
+            uow = UnitOfWork()
+            uow.insert(documents, {"upload": i})
+            uow.insert(kyc, {"upload": i})
+            units.append(uow)
+        # A unit whose primary collection is another one is not affected
+        other = UnitOfWork()
+        other.insert(audit, {"upload": "audit-only"})
+        tickets = [_Ticket(u) for u in units + [other]]
+        flush(tickets)
+        assert [t.error for t in tickets] == [error, error, error, None]
+        assert kyc.calls == 0 and len(audit.docs) == 1  # nothing references the unstored documents
+
+    # An empty unit never reaches a collection
+    committer = GroupCommitter()
+    committer.commit(UnitOfWork())
+    assert committer.flushes == 0
+
+
+def benchmark(latency=0.005, uploads=64):
+    print(f"\n⏱️ Unit of work benchmark ({int(latency * 1000)} ms per round trip)")
+    documents, alerts, kyc, audit = _collections(latency)
+    t0 = time.perf_counter()
+    for i in range(20):
+        doc = {"upload": i}
+        documents.insert_one(doc)
+        documents.update_one({"_id": doc["_id"]}, {"$set": {"fraud": {}}})
+        alerts.insert_one({"docId": str(doc["_id"])})
+        kyc.insert_one({"docId": str(doc["_id"])})
+        audit.insert_one({"docId": str(doc["_id"])})
+    before = (time.perf_counter() - t0) * 1000 / 20
+
+    collections = _collections(latency)
+    committer = GroupCommitter()
+    t0 = time.perf_counter()
+    for i in range(20):
+        committer.commit(_unit(collections, 0))  # i=0: every upload also writes an alert
+    after = (time.perf_counter() - t0) * 1000 / 20
+    print(f"   one upload: {before:.1f} ms sequential writes -> {after:.1f} ms unit of work")
+
+    collections = _collections(latency)
+    committer = GroupCommitter()
+    t0 = time.perf_counter()
+    _commit_all(committer, [_unit(collections, i) for i in range(uploads)])
+    elapsed = (time.perf_counter() - t0) * 1000
+    print(f"   {uploads} concurrent uploads: {elapsed:.0f} ms, {committer.flushes} flushes "
+          f"({committer.stats()['unitsPerFlush']} uploads each); sequential writes would be "
+          f">= {uploads * 5 * latency * 1000:.0f} ms of round trips")
+
+
+if __name__ == "__main__":
+    print("🔍 Testing unit of work...")
+    for test in (test_pipeline_writes_once_per_collection, test_concurrent_commits_share_flushes,
+                 test_write_error_fails_only_its_upload, test_ordered_error_does_not_fail_the_units_behind_it,
+                 test_dependent_write_failure_fails_only_its_upload,
+                 test_unattributable_errors_fail_every_unit_in_the_bulk):
+        try:
+            with pytest.MonkeyPatch.context() as monkeypatch:
+                test(monkeypatch) if "monkeypatch" in inspect.signature(test).parameters else test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"   ❌ {test.__name__}: {e}")
+    benchmark()
+    print("\n--- Test Complete ---")
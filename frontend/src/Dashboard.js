@@ -12,9 +12,10 @@ import DeviceFingerprint, { collectDeviceFingerprint } from "./components/Device
 import ModelMonitoringDashboard from "./components/ModelMonitoringDashboard";
 import BulkUpload from "./components/BulkUpload";
 import { runClientOCR } from "./services/clientOCR";
+import { fetchPage } from "./api";
 
 
-import { Upload, Activity, Fingerprint, CreditCard, Search, BarChart3, FileSpreadsheet, Eye, AlertCircle, Shield, User, LogOut, ShieldOff } from "lucide-react";
+import { Upload, Activity, Fingerprint, CreditCard, Search, BarChart3, FileSpreadsheet, Eye, AlertCircle, Shield, User, LogOut, ShieldOff, RefreshCw } from "lucide-react";
 
 /**
  * Dashboard (full file)
@@ -34,6 +35,8 @@ function Dashboard() {
   const [verificationResult, setVerificationResult] = useState(null);
   const [submissionsList, setSubmissionsList] = useState([]);
   const [docs, setDocs] = useState([]);
+  const [docsCursor, setDocsCursor] = useState(null); // next documents page, if any
+  const [docsLoadingMore, setDocsLoadingMore] = useState(false);
 
   const [message, setMessage] = useState("");
   const [imageQuality, setImageQuality] = useState(null);
@@ -104,16 +107,13 @@ function Dashboard() {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
-  const fetchDocuments = async (token) => {
+  // First page (again, after an upload or decision) or, with a cursor, the next page appended
+  const fetchDocuments = async (token, cursor = null) => {
+    const setBusy = cursor ? setDocsLoadingMore : setLoading;
     try {
-      setLoading(true);
-      const res = await fetch("/compliance/docs", {
-        headers: { Authorization: token ? `Bearer ${token}` : "" },
-      });
-      if (!res.ok) throw new Error("Failed to fetch");
-      const body = await res.json();
-      const arr = Array.isArray(body) ? body : body.documents || [];
-      const normalized = arr.map((d) => ({
+      setBusy(true);
+      const page = await fetchPage("/compliance/docs", { token, cursor, what: "documents" });
+      const normalized = page.items.map((d) => ({
         ...d,
         _id: d._id || d.id,
         submissionId: d._id,
@@ -122,11 +122,12 @@ function Dashboard() {
           d.docType ||
           (d.parsed?.aadhaarNumber ? "Aadhaar" : d.parsed?.panNumber ? "PAN" : "Unknown"),
       }));
-      setDocs(normalized);
+      setDocs((prev) => (cursor ? prev.concat(normalized) : normalized));
+      setDocsCursor(page.nextCursor);
     } catch (err) {
       console.error("Fetch docs failed", err);
     } finally {
-      setLoading(false);
+      setBusy(false);
     }
   };
 
@@ -445,6 +446,20 @@ function Dashboard() {
   const openSubmissionDetail = async (submission) => {
     setDetailSubmission(submission);
     setDetailModalOpen(true);
+    // List pages carry summary fields only; load rawText etc. for the stored document
+    const id = submission?.submissionId || submission?._id;
+    if (!id || submission?.rawText) return;
+    try {
+      const token = localStorage.getItem("token");
+      const res = await fetch(`/compliance/docs/${id}`, {
+        headers: { Authorization: token ? `Bearer ${token}` : "" },
+      });
+      if (!res.ok) return;
+      const full = await res.json();
+      setDetailSubmission((current) => (current === submission ? { ...submission, ...full } : current));
+    } catch (err) {
+      console.error("Fetch document failed", err);
+    }
   };
 
   const closeDetailModal = () => {
@@ -812,6 +827,15 @@ function Dashboard() {
             <h2 className="text-xl font-bold text-white">Your Submissions</h2>
             <div className="glass-panel p-6">
               <SubmissionsTable submissions={[...submissionsList, ...docs]} onOpen={openSubmissionDetail} loading={loading} />
+              {docsCursor && (
+                <button
+                  onClick={() => fetchDocuments(localStorage.getItem("token"), docsCursor)}
+                  disabled={docsLoadingMore}
+                  className="mt-4 w-full px-4 py-2 bg-cyan-500/10 border border-cyan-500/30 text-cyan-300 rounded-lg text-xs font-bold uppercase hover:bg-cyan-500/20 transition-all flex items-center justify-center gap-2"
+                >
+                  <RefreshCw className={`w-4 h-4 ${docsLoadingMore ? "animate-spin" : ""}`} /> Load older submissions
+                </button>
+              )}
             </div>
           </div>
         )}
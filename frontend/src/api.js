@@ -61,17 +61,38 @@ export async function verifyDocument(token, file) {
   return await res.json();
 }
 
+// --- Paged listings ---
+// List routes return one page, newest first. When there is more, the cursor
+// for the next page comes back in the X-Next-Cursor header.
+export const NEXT_CURSOR_HEADER = "X-Next-Cursor";
+
+export async function fetchPage(url, { cursor, token, what = "items" } = {}) {
+  const full = new URL(url, window.location.origin);
+  if (cursor) full.searchParams.set("cursor", cursor);
+  const res = await fetch(full.toString(), {
+    headers: token ? { Authorization: `Bearer ${token}` } : {},
+  });
+  if (!res.ok) throw new Error(`Failed to fetch ${what}`);
+  const body = await res.json();
+  return { items: Array.isArray(body) ? body : [], nextCursor: res.headers.get(NEXT_CURSOR_HEADER) };
+}
+
 // --- Compliance & Admin ---
-export async function getLogs() {
-  const res = await fetch(`${API_URL}/compliance/logs`);
-  if (!res.ok) throw new Error("Failed to fetch logs");
-  return await res.json();
+// Audit logs grow without bound: one page at a time ({ items, nextCursor })
+export async function getLogs(cursor = null) {
+  return fetchPage(`${API_URL}/compliance/logs`, { cursor, what: "logs" });
 }
 
-export async function getAlerts() {
-  const res = await fetch(`${API_URL}/compliance/alerts`);
-  if (!res.ok) throw new Error("Failed to fetch alerts");
-  return await res.json();
+export async function getAlerts(cursor = null) {
+  return fetchPage(`${API_URL}/compliance/alerts`, { cursor, what: "alerts" });
+}
+
+// Undismissed alerts in total (the list itself is paged)
+export async function getAlertCount() {
+  const res = await fetch(`${API_URL}/compliance/alerts/count`);
+  if (!res.ok) throw new Error("Failed to fetch alert count");
+  const body = await res.json();
+  return body.count || 0;
 }
 
 // --- NEW: Dismiss Alert ---
@@ -83,12 +104,8 @@ export async function dismissAlert(alertId) {
   return await res.json();
 }
 
-export async function getUserDocs(token) {
-  const res = await fetch(`${API_URL}/docs/my-docs`, {
-    headers: { Authorization: `Bearer ${token}` },
-  });
-  if (!res.ok) throw new Error("Failed to fetch documents");
-  return await res.json();
+export async function getUserDocs(token, cursor = null) {
+  return fetchPage(`${API_URL}/docs/my-docs`, { cursor, token, what: "documents" });
 }
 
 export async function getSubmissions(token) {
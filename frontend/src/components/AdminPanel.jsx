@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from "react";
-import { getAlerts, getLogs, addLog, dismissAlert, getSubmissions, setDocumentDecision } from "../api";
+import { getAlerts, getAlertCount, getLogs, addLog, dismissAlert, getSubmissions, setDocumentDecision } from "../api";
 import { Eye, BarChart3, Users, FileText, CheckCircle, XCircle, Clock, X, ChevronRight, AlertTriangle, Shield, ShieldCheck, RefreshCw, Inbox, Search, Clipboard, ScrollText, Mail, Check } from "lucide-react";
 import FraudExplanation from "./FraudExplanation";
 import { useToast } from "../contexts/ToastContext";
@@ -46,7 +46,12 @@ const alertStyles = `
 export default function AdminPanel() {
   const { showToast } = useToast();
   const [alerts, setAlerts] = useState([]);
+  const [alertsCursor, setAlertsCursor] = useState(null); // next alerts page, if any
+  const [alertCount, setAlertCount] = useState(0); // all undismissed alerts, not just the loaded ones
+  const [alertsLoading, setAlertsLoading] = useState(false);
   const [logs, setLogs] = useState([]);
+  const [logsCursor, setLogsCursor] = useState(null); // next audit log page, if any
+  const [logsLoading, setLogsLoading] = useState(false);
   const [submissions, setSubmissions] = useState([]);
   const [loading, setLoading] = useState(false);
   const [selectedSubmission, setSelectedSubmission] = useState(null);
@@ -133,19 +138,50 @@ export default function AdminPanel() {
     try {
       setLoading(true);
       const token = localStorage.getItem("token");
-      const [a, l, s] = await Promise.all([getAlerts(), getLogs(), getSubmissions(token)]);
-      setAlerts(Array.isArray(a) ? a : []);
-      setLogs(Array.isArray(l) ? l : []);
+      const [a, n, l, s] = await Promise.all([getAlerts(), getAlertCount(), getLogs(), getSubmissions(token)]);
+      setAlerts(a.items);
+      setAlertsCursor(a.nextCursor);
+      setAlertCount(n);
+      setLogs(l.items);
+      setLogsCursor(l.nextCursor);
       setSubmissions(Array.isArray(s) ? s : []);
     } catch (err) { console.error(err); } finally { setLoading(false); }
   }
 
+  // Back to the first audit log page (an action just added an entry)
+  async function refreshLogs() {
+    const l = await getLogs();
+    setLogs(l.items);
+    setLogsCursor(l.nextCursor);
+  }
+
+  async function loadMoreLogs() {
+    if (!logsCursor) return;
+    try {
+      setLogsLoading(true);
+      const l = await getLogs(logsCursor);
+      setLogs(prev => prev.concat(l.items));
+      setLogsCursor(l.nextCursor);
+    } catch (err) { console.error(err); } finally { setLogsLoading(false); }
+  }
+
+  async function loadMoreAlerts() {
+    if (!alertsCursor) return;
+    try {
+      setAlertsLoading(true);
+      const a = await getAlerts(alertsCursor);
+      setAlerts(prev => prev.concat(a.items));
+      setAlertsCursor(a.nextCursor);
+    } catch (err) { console.error(err); } finally { setAlertsLoading(false); }
+  }
+
   async function acknowledgeAlert(alert) {
     try {
       await dismissAlert(alert._id);
       await addLog({ userId: "admin", details: `Dismissed: ${alert.alert}` });
       setAlerts(prev => prev.filter(a => a._id !== alert._id));
-      const newLogs = await getLogs(); setLogs(newLogs);
+      setAlertCount(prev => Math.max(0, prev - 1));
+      await refreshLogs();
     } catch (err) { console.error(err); }
   }
 
@@ -156,7 +192,7 @@ export default function AdminPanel() {
       await addLog({ userId: 'admin', details: `Approved doc ${s.docId}` });
       const newSubs = await getSubmissions(token);
       setSubmissions(newSubs);
-      const newLogs = await getLogs(); setLogs(newLogs);
+      await refreshLogs();
       setSelectedSubmission(null);
       showToast('Document approved successfully', 'success');
     } catch (err) { console.error(err); showToast('Failed to approve', 'error'); }
@@ -169,7 +205,7 @@ export default function AdminPanel() {
       await addLog({ userId: 'admin', details: `Rejected doc ${s.docId}` });
       const newSubs = await getSubmissions(token);
       setSubmissions(newSubs);
-      const newLogs = await getLogs(); setLogs(newLogs);
+      await refreshLogs();
       setSelectedSubmission(null);
       showToast('Document rejected', 'info');
     } catch (err) { console.error(err); showToast('Failed to reject', 'error'); }
@@ -228,9 +264,9 @@ export default function AdminPanel() {
               >
                 <AlertTriangle className="w-4 h-4" />
                 Alerts
-                {alerts.length > 0 && (
+                {alertCount > 0 && (
                   <span className={`px-1.5 py-0.5 text-[10px] rounded-full animate-pulse ${activeTab === 'alerts' ? 'bg-rose-500/30 text-rose-200' : 'bg-rose-500/50 text-rose-200'}`}>
-                    {alerts.length}
+                    {alertCount}
                   </span>
                 )}
               </button>
@@ -461,6 +497,15 @@ export default function AdminPanel() {
                 ))}
               </div>
             )}
+            {alertsCursor && (
+              <button
+                onClick={loadMoreAlerts}
+                disabled={alertsLoading}
+                className="mt-4 w-full px-4 py-2 bg-rose-500/10 border border-rose-500/30 text-rose-300 rounded-lg text-xs font-bold uppercase hover:bg-rose-500/20 transition-all flex items-center justify-center gap-2"
+              >
+                <RefreshCw className={`w-4 h-4 ${alertsLoading ? "animate-spin" : ""}`} /> Load more alerts
+              </button>
+            )}
           </div>
         </div>
       )}
@@ -471,7 +516,7 @@ export default function AdminPanel() {
           <div className="bg-white/5 border border-white/10 rounded-2xl p-6">
             <h3 className="text-purple-400 font-bold mb-4 flex items-center gap-2">
               <ScrollText className="w-5 h-5" /> Audit Trail
-              <span className="px-2 py-0.5 bg-purple-500/20 text-purple-300 text-xs rounded-full">{logs.length} entries</span>
+              <span className="px-2 py-0.5 bg-purple-500/20 text-purple-300 text-xs rounded-full">{logs.length}{logsCursor ? '+' : ''} entries</span>
             </h3>
             {logs.length === 0 ? (
               <div className="text-slate-500 text-sm text-center py-12 font-mono">
@@ -480,7 +525,7 @@ export default function AdminPanel() {
               </div>
             ) : (
               <div className="grid md:grid-cols-2 gap-3 max-h-[500px] overflow-y-auto pr-2">
-                {logs.slice(0, 50).map((l, i) => {
+                {logs.map((l, i) => {
                   // Determine action type and styling
                   const isApprove = l.decision === 'Approve';
                   const isReject = l.decision === 'Reject';
@@ -572,6 +617,15 @@ export default function AdminPanel() {
                 })}
               </div>
             )}
+            {logsCursor && (
+              <button
+                onClick={loadMoreLogs}
+                disabled={logsLoading}
+                className="mt-4 w-full px-4 py-2 bg-purple-500/10 border border-purple-500/30 text-purple-300 rounded-lg text-xs font-bold uppercase hover:bg-purple-500/20 transition-all flex items-center justify-center gap-2"
+              >
+                <RefreshCw className={`w-4 h-4 ${logsLoading ? "animate-spin" : ""}`} /> Load older entries
+              </button>
+            )}
           </div>
         </div>
       )}